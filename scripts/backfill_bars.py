@@ -0,0 +1,266 @@
+# Polygon REST の 1分足を、銘柄リスト×日付範囲でまとめて取り寄せ、compute_indicators と同じ形で日ごとに保存するバックフィルです。
+# 目的：ws_run がその日に受けた分しか場中の履歴が無いので、バックテストやパラメータ研究用に何年分でも揃えられるようにする。
+# しくみ：
+#  - 仕事の単位は (銘柄, 営業日 N 日ぶん)。1回の応答は 50,000 本までなので、既定の 20 営業日（時間外込みで約2万本）で1単位。
+#  - 単位ごとに並列（スレッド）で取り寄せ、ET 日付ごとに分けて <out>/_backfill/parts/YYYYMMDD/<銘柄>.parquet に置き、
+#    終わった単位を <out>/_backfill/state.json に記録します（途中で止まっても、次回は残りの単位から再開）。
+#  - 全部そろったら日ごとに部品を集め、VWAP/AVWAP/ORB を付けて <out>/bars_1m_YYYYMMDD.parquet / indicators_YYYYMMDD.parquet に保存します
+#    （列は compute_indicators と同じ。既にある日は、取り寄せた銘柄の行だけを差し替えます）。
+# 使い方：
+#   poetry run python scripts/backfill_bars.py --symbols AAPL MSFT --start 2023-01-01 --end 2024-12-31
+#   poetry run python scripts/backfill_bars.py --symbols-file configs/manual_watchlist.txt --start 2024-01-01 --workers 8
+#   poetry run python scripts/backfill_bars.py --symbols AAPL --start 2025-09-02 --end 2025-09-12 --standin   # 通信なし（代役サーバ）
+
+from __future__ import annotations
+from pathlib import Path           # 入出力パス
+from datetime import date, datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed  # 単位ごとの並列取得
+import argparse                    # 銘柄・期間・並列数の指定
+import os                          # 環境変数・一時ファイルの置き換え
+import shutil                      # 組み立て済みの部品を消す
+import threading                   # スレッドごとのセッション・呼び出し間隔
+import time                        # 呼び出し間隔の待ち
+import orjson
+import pandas as pd
+from loguru import logger
+
+from rh_pdc_daytrade.utils.envutil import load_dotenv_if_exists  # 何をする関数？：.envを先に読む
+from rh_pdc_daytrade.utils.logutil import configure_logging       # 何をする関数？：ログ初期化（冪等）
+from rh_pdc_daytrade.utils.configutil import load_config          # config.yaml（AVWAP のアンカー）
+from rh_pdc_daytrade.utils.io import read_parquet, write_parquet  # Parquet の標準保存口
+from rh_pdc_daytrade.utils.metrics import timer, incr, init_run_metrics  # 何をする関数？：段ごとの時間・件数を記録
+from rh_pdc_daytrade.utils.latency import now_ns                   # indicators の computed_ns
+from rh_pdc_daytrade.utils.market_calendar import get_calendar      # 営業日の列挙
+from rh_pdc_daytrade.store.ndjson import to_et                       # t(ns) → ET
+from rh_pdc_daytrade.providers import polygon_rest                   # _session / fetch_aggs_1m
+
+_tls = threading.local()
+
+def _archive_dir(path: str | None) -> Path:
+    """何をする関数？：保存先（引数 → 環境変数 BARS_ARCHIVE_DIR → data/archive/bars の順）を返します。"""
+    return Path(path or os.environ.get("BARS_ARCHIVE_DIR") or Path("data") / "archive" / "bars")
+
+class _RateLimiter:
+    # 何をするクラス？：全スレッドで共有する“1分あたり最大 N 回”の呼び出し間隔（0 なら制限なし）。Basic プランは 5回/分。
+    def __init__(self, per_min: int):
+        self.interval = 60.0 / per_min if per_min > 0 else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self) -> None:
+        if self.interval <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            at = max(now, self._next)
+            self._next = at + self.interval
+        if at > now:
+            time.sleep(at - now)
+
+# ---- チェックポイント ------------------------------------------------------------------------------
+
+def _load_state(p: Path) -> dict:
+    """何をする関数？：state.json（done=終わった単位, failed=失敗した単位と理由）を読みます。無ければ空。"""
+    try:
+        st = orjson.loads(p.read_bytes())
+    except (OSError, orjson.JSONDecodeError):
+        st = {}
+    return {"done": set(st.get("done") or []), "failed": dict(st.get("failed") or {})}
+
+def _save_state(p: Path, st: dict) -> None:
+    """何をする関数？：state.json を一時ファイルに書いてから置き換えます（書きかけで止まっても前の版が残る）。"""
+    p.parent.mkdir(parents=True, exist_ok=True)
+    tmp = p.with_suffix(p.suffix + ".tmp")
+    tmp.write_bytes(orjson.dumps({"done": sorted(st["done"]), "failed": st["failed"],
+                                  "updated": datetime.now().isoformat(timespec="seconds")}, option=orjson.OPT_INDENT_2))
+    os.replace(tmp, p)
+
+def _units(symbols: list[str], days: list[date], per_request: int) -> list[tuple[str, str, str]]:
+    """何をする関数？：(銘柄, 開始日, 終了日) の仕事の単位を作ります（営業日を per_request 日ずつに区切る）。"""
+    per_request = max(1, int(per_request))
+    spans = [(days[i].isoformat(), days[min(i + per_request, len(days)) - 1].isoformat())
+             for i in range(0, len(days), per_request)]
+    return [(s, a, b) for s in symbols for a, b in spans]
+
+def _unit_key(u: tuple[str, str, str]) -> str:
+    return "|".join(u)
+
+# ---- 取得（スレッド側） ----------------------------------------------------------------------------
+
+def _fetch_unit(u: tuple[str, str, str], api_key: str, parts_dir: Path, limiter: _RateLimiter,
+                record_dir: str | None) -> tuple[int, int]:
+    """
+    何をする関数？：
+      - 1単位ぶんの1分足を取り寄せ、ET 日付ごとに parts/YYYYMMDD/<銘柄>.parquet へ書きます（同じ単位をやり直しても上書きで同じ結果）。
+    戻り値：(本数, 日数)
+    """
+    sym, start, end = u
+    s = getattr(_tls, "session", None)
+    if s is None:
+        s = _tls.session = polygon_rest._session(api_key)  # 何をする行？：requests.Session はスレッドごとに1つ
+    limiter.wait()
+    raw = polygon_rest.fetch_aggs_1m(s, sym, start, end, record_dir=record_dir)
+    if raw.empty:
+        return 0, 0
+    t_ns = raw["t"].to_numpy(dtype="int64") * 1_000_000   # 何をする行？：Polygon の t は ms
+    df = pd.DataFrame({"symbol": sym, "et": to_et(t_ns),
+                       "o": raw["o"].to_numpy(dtype="float64"), "h": raw["h"].to_numpy(dtype="float64"),
+                       "l": raw["l"].to_numpy(dtype="float64"), "c": raw["c"].to_numpy(dtype="float64"),
+                       "v": raw["v"].to_numpy(dtype="float64")})
+    d = df["et"].dt.strftime("%Y%m%d")
+    keep = (d >= start.replace("-", "")) & (d <= end.replace("-", ""))
+    df, d = df[keep], d[keep]
+    ndays = 0
+    for day, part in df.groupby(d, sort=True):
+        out = parts_dir / day
+        out.mkdir(parents=True, exist_ok=True)
+        write_parquet(part.reset_index(drop=True), out / f"{sym}.parquet", compact=True)
+        ndays += 1
+    return len(df), ndays
+
+# ---- 日ごとの組み立て --------------------------------------------------------------------------------
+
+def _assemble_day(day_dir: Path, out_dir: Path, anchor: str, orb_minutes: int = 5) -> tuple[Path, int] | None:
+    """
+    何をする関数？：
+      - 1日ぶんの部品（銘柄ごと）を集め、既にある bars_1m_YYYYMMDD.parquet の“同じ銘柄の行”を差し替えて、
+        VWAP/AVWAP（indicators.chunked、compute_indicators と同じ定義）と ORB（orb_minutes 分）を付けて保存し、部品を消します。
+    戻り値：(bars_1m の Path, 行数)。部品が空なら None。
+    """
+    from rh_pdc_daytrade.indicators.chunked import ChunkedIndicators  # 関数内だけで使うためここでインポート
+    files = sorted(day_dir.glob("*.parquet"))
+    if not files:
+        shutil.rmtree(day_dir, ignore_errors=True)
+        return None
+    new = pd.concat([read_parquet(f, compact=False) for f in files], ignore_index=True)
+    new["symbol"] = new["symbol"].astype(str)
+    et_date = day_dir.name
+    p1 = out_dir / f"bars_1m_{et_date}.parquet"
+    if p1.exists():
+        old = read_parquet(p1, columns=["symbol", "et", "o", "h", "l", "c", "v"], compact=False)
+        old = old[~old["symbol"].astype(str).isin(set(new["symbol"]))]
+        new = pd.concat([old.assign(symbol=old["symbol"].astype(str)), new], ignore_index=True)
+    ci = ChunkedIndicators(anchor=anchor, orb_minutes=orb_minutes, settle_minutes=0)
+    done = [x for x in (ci.push(new), ci.finish()) if not x.empty]  # 何をする行？：最新の分は保留に残るので finish で全部確定させる
+    df = pd.concat(done, ignore_index=True) if len(done) > 1 else done[0]
+    write_parquet(df, p1, compact=True)
+    snap = ci.summary()
+    snap["computed_ns"] = now_ns()
+    write_parquet(snap, out_dir / f"indicators_{et_date}.parquet", compact=True)
+    shutil.rmtree(day_dir, ignore_errors=True)
+    return p1, len(df)
+
+def main() -> int:
+    """
+    何をする関数？：
+      - 銘柄リストと日付範囲から仕事の単位を作り、チェックポイントにある分を飛ばして並列で取り寄せ、日ごとに組み立てて保存します。
+      - 失敗した単位は state.json の failed に残し、終了コード 1 を返します（もう一度実行すれば残りだけ取り直す）。
+    """
+    ap = argparse.ArgumentParser(description="Backfill Polygon 1-minute aggregates into the local bar archive.")
+    ap.add_argument("--symbols", nargs="+", default=None, help="銘柄（複数可）")
+    ap.add_argument("--symbols-file", default=None, help="銘柄の TXT/CSV（--symbols が無いとき。どちらも無ければ watchlist A/B）")
+    ap.add_argument("--start", required=True, help="開始日 YYYY-MM-DD（含む）")
+    ap.add_argument("--end", default=None, help="終了日 YYYY-MM-DD（含む。既定はきょうより前の最後の営業日）")
+    ap.add_argument("--out", default=None, help="保存先（既定 BARS_ARCHIVE_DIR または data/archive/bars）")
+    ap.add_argument("--workers", type=int, default=4, help="同時に取り寄せる数")
+    ap.add_argument("--days-per-request", type=int, default=20, help="1単位の営業日数（1応答 50,000 本に収まるように）")
+    ap.add_argument("--max-per-min", type=int, default=int(os.environ.get("POLYGON_MAX_PER_MIN", "0") or 0),
+                    help="1分あたりの最大呼び出し数（0=制限なし。Basic は 5）")
+    ap.add_argument("--record", default=None, help="応答をこのフォルダに保存（代役サーバで再生できる）")
+    ap.add_argument("--restart", action="store_true", help="チェックポイントを無視して最初から")
+    ap.add_argument("--standin", action="store_true", help="ローカルの代役サーバ（providers.polygon_replay）に向けて実行")
+    ap.add_argument("--standin-records", default=None, help="代役サーバが返す記録済み応答のフォルダ（無い分は合成データ）")
+    ap.add_argument("--standin-fail-every", type=int, default=0, help="代役サーバが N 回に1回 429 を返す（再試行の確認用）")
+    args = ap.parse_args()
+
+    load_dotenv_if_exists()
+    configure_logging()
+    cfg = load_config()
+    init_run_metrics("backfill_bars")
+
+    if args.symbols:
+        symbols = [s.strip().upper() for s in args.symbols if s.strip()]
+    elif args.symbols_file:
+        from rh_pdc_daytrade.store.refdata import symbol_list  # 関数内だけで使うためここでインポート
+        symbols = list(symbol_list(args.symbols_file))
+    else:
+        from rh_pdc_daytrade.store.refdata import watchlist_symbols  # 関数内だけで使うためここでインポート
+        symbols = list(dict.fromkeys(watchlist_symbols("A") + watchlist_symbols("B")))
+    if not symbols:
+        logger.error("backfill: no symbols (use --symbols / --symbols-file)")
+        return 2
+
+    cal = get_calendar()
+    start = date.fromisoformat(args.start)
+    end = date.fromisoformat(args.end) if args.end else cal.previous_session(date.today())
+    days = cal.sessions_in_range(start, end)
+    if not days:
+        logger.error("backfill: no sessions in {}..{}", start, end)
+        return 2
+
+    standin = None
+    if args.standin:
+        from rh_pdc_daytrade.providers.polygon_replay import PolygonStandIn  # 関数内だけで使うためここでインポート
+        standin = PolygonStandIn(record_dir=args.standin_records, synthetic=True,
+                                 fail_every=args.standin_fail_every).start()
+        os.environ["POLYGON_BASE_URL"] = standin.url
+    api_key = os.getenv("POLYGON_API_KEY", "").strip()
+    if not api_key and standin is None:
+        logger.error("backfill: POLYGON_API_KEY is not set")
+        return 2
+
+    out_dir = _archive_dir(args.out)
+    work = out_dir / "_backfill"
+    parts_dir = work / "parts"
+    state_p = work / "state.json"
+    if args.restart:
+        shutil.rmtree(work, ignore_errors=True)
+    st = _load_state(state_p)
+    units = _units(symbols, days, args.days_per_request)
+    todo = [u for u in units if _unit_key(u) not in st["done"]]
+    logger.info("backfill: symbols={} sessions={} ({}..{}) units={} done={} todo={} workers={} -> {}",
+                len(symbols), len(days), days[0], days[-1], len(units), len(units) - len(todo), len(todo),
+                args.workers, out_dir)
+
+    limiter = _RateLimiter(args.max_per_min)
+    rows = failed = 0
+    try:
+        with timer("stage_seconds", stage="backfill_fetch"), ThreadPoolExecutor(max_workers=max(1, args.workers)) as ex:
+            futs = {ex.submit(_fetch_unit, u, api_key, parts_dir, limiter, args.record): u for u in todo}
+            for i, fut in enumerate(as_completed(futs), 1):
+                u = futs[fut]
+                key = _unit_key(u)
+                try:
+                    n, nd = fut.result()
+                except Exception as e:
+                    failed += 1
+                    st["failed"][key] = str(e)[:300]
+                    incr("backfill_units", 1, result="error")
+                    logger.error("backfill: failed {} {}..{} ({})", u[0], u[1], u[2], e)
+                else:
+                    rows += n
+                    st["done"].add(key)
+                    st["failed"].pop(key, None)
+                    incr("backfill_units", 1, result="ok" if n else "empty")
+                    incr("backfill_bars", n)
+                _save_state(state_p, st)  # 何をする行？：1単位ごとに記録（止まっても、ここまでの分はやり直さない）
+                if i % 50 == 0 or i == len(futs):
+                    logger.info("backfill: {}/{} units fetched (bars={} failed={})", i, len(futs), rows, failed)
+    finally:
+        if standin is not None:
+            standin.stop()
+
+    written = 0
+    strat = cfg.get("strategy", {}) or {}
+    with timer("stage_seconds", stage="backfill_assemble"):
+        for day_dir in sorted(p for p in parts_dir.glob("*") if p.is_dir()) if parts_dir.exists() else []:
+            res = _assemble_day(day_dir, out_dir, anchor=strat.get("avwap_anchor", "09:30:00"),
+                                orb_minutes=int(strat.get("orb_minutes", 5)))
+            if res is not None:
+                written += 1
+                logger.debug("backfill: wrote {} ({} rows)", res[0], res[1])
+    logger.info("backfill: done bars_fetched={} days_written={} failed_units={} -> {}", rows, written, len(st["failed"]), out_dir)
+    return 1 if st["failed"] else 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
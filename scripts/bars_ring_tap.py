@@ -0,0 +1,127 @@
+# 共有メモリのバー・リング（ws_run を BARS_SHM=1 で起動したときに作られる）を別プロセスから読む監視スクリプトです。
+# 目的：WS接続は1本のまま、後段プロセスがディスクを経由せずに同じバーを受け取れていることを確かめる。
+#       一定間隔で「受信本数・取りこぼし本数・バー時刻からの遅れ」と、ストリーミング VWAP（訂正は寄与を差し替え）の
+#       銘柄数・訂正本数をログに出します。--indicators を付けると、EMA/ATR/HOD などのストリーミング指標も同じバーで更新します。
+#       --grid / --snapshot を付けると、受け取ったバーを [銘柄, 場中の分] の格子（indicators.grid.MinuteGrid）にも入れ、
+#       ログのたびに全銘柄の VWAP/AVWAP/ORB/HOD を一括で出します（--snapshot ならその表を parquet に置き換え保存）。
+
+from __future__ import annotations
+from datetime import datetime, timezone   # 遅れ（いま − バー時刻）の計算
+from pathlib import Path                   # スナップショットの保存先
+import argparse                            # 引数（間隔・実行秒数）の受け取り
+import os                                  # スナップショットの置き換え保存
+import time                                # ポーリング間隔
+from loguru import logger                  # 共通ログ
+
+from rh_pdc_daytrade.utils.envutil import load_dotenv_if_exists  # 何をする関数？：.envを先に読む
+from rh_pdc_daytrade.utils.logutil import configure_logging       # 何をする関数？：ログ初期化（冪等）
+from rh_pdc_daytrade.store.barring import BarRingReader, shm_name  # 何をする関数？：共有メモリのリングを読む
+from rh_pdc_daytrade.indicators.streaming import StreamingVwap, StreamingIndicatorSet  # 何をするクラス？：1本ずつ VWAP・EMA/ATR などを更新（訂正は差し替え）
+from rh_pdc_daytrade.indicators.grid import MinuteGrid  # 何をするクラス？：全銘柄を [銘柄, 分] の配列で持ち、指標を一括計算
+
+def _attach(wait_s: float) -> BarRingReader | None:
+    """何をする関数？：リングが作られるまで最大 wait_s 秒待って接続します（WSより先に起動しても良いように）。"""
+    deadline = time.monotonic() + wait_s
+    while True:
+        try:
+            return BarRingReader(start="oldest")
+        except FileNotFoundError:
+            if time.monotonic() >= deadline:
+                return None
+            time.sleep(1.0)
+
+def _grid_for(grid: MinuteGrid | None, recs) -> MinuteGrid:
+    """何をする関数？：最新バーの ET 日付の格子を返します（日付が変わったら新しい格子に切り替える）。"""
+    from rh_pdc_daytrade.utils.timeutil import get_et_tz  # 関数内だけで使うためここでインポート
+    day = datetime.fromtimestamp(int(recs["t"][-1]) / 1e9, tz=timezone.utc).astimezone(get_et_tz()).date()
+    if grid is None or grid.session_date != day:
+        grid = MinuteGrid(day, max_symbols=256)
+    return grid
+
+def _grid_report(grid: MinuteGrid, orb_minutes: int, anchor: str, out: Path | None) -> None:
+    """
+    何をする関数？：格子から全銘柄のスナップショット（vwap/avwap/orb_high/orb_low/hod と最新終値）を作り、
+    VWAP より上・ORB 高値より上の銘柄数をログに出します。out があれば parquet に置き換え保存します（読み手が途中の状態を見ない）。
+    """
+    import numpy as np  # 関数内だけで使うためここでインポート
+    snap = grid.snapshot(orb_minutes=orb_minutes, anchor=anchor)
+    last = grid.last_minute()
+    snap["c"] = np.where(last >= 0, grid.c[np.arange(len(grid)), np.maximum(last, 0)], np.nan)
+    logger.info("bars_ring_tap: grid session={} symbols={} above_vwap={} above_orb_high={}",
+                grid.session_date, len(snap), int((snap["c"] > snap["vwap"]).sum()), int((snap["c"] > snap["orb_high"]).sum()))
+    if out is not None:
+        from rh_pdc_daytrade.utils.io import write_parquet  # 関数内だけで使うためここでインポート
+        tmp = out.with_name(out.name + ".tmp")
+        write_parquet(snap, tmp)
+        os.replace(tmp, out)
+
+def main() -> int:
+    """
+    何をする関数？：
+      - リングに接続し、--interval 秒ごとに新着バーの本数・取りこぼし・遅れ（最大/最後）をログに出します。
+    使い方：
+      poetry run python scripts/bars_ring_tap.py --seconds 600
+      poetry run python scripts/bars_ring_tap.py --snapshot data/stream/grid_snapshot.parquet   # 全銘柄の VWAP/ORB/HOD 表を更新し続ける
+    """
+    ap = argparse.ArgumentParser(description="Tail the shared-memory bar ring published by the WS process.")
+    ap.add_argument("--interval", type=float, default=5.0, help="集計ログの間隔（秒）")
+    ap.add_argument("--seconds", type=float, default=0.0, help="実行秒数（0=無期限）")
+    ap.add_argument("--wait", type=float, default=60.0, help="リングが作られるまで待つ秒数")
+    ap.add_argument("--indicators", nargs="*", default=[], help="一緒に更新する指標（ema9 ema20 atr14 hod lod hh20 ll20 …）")
+    ap.add_argument("--grid", action="store_true", help="バーを [銘柄, 分] の格子にも入れ、ログのたびに全銘柄の VWAP/AVWAP/ORB/HOD を出す")
+    ap.add_argument("--snapshot", default=None, help="格子のスナップショットを保存する parquet（--grid を含む）")
+    args = ap.parse_args()
+
+    load_dotenv_if_exists()
+    logfile = configure_logging()
+    from rh_pdc_daytrade.utils.configutil import load_config  # 関数内だけで使うためここでインポート
+    strat = load_config().get("strategy", {}) or {}
+    orb_minutes, anchor = int(strat.get("orb_minutes", 5)), str(strat.get("avwap_anchor", "09:30:00"))
+    snap_path = Path(args.snapshot) if args.snapshot else None
+    if snap_path is not None:
+        snap_path.parent.mkdir(parents=True, exist_ok=True)
+    use_grid = args.grid or snap_path is not None
+    rd = _attach(args.wait)
+    if rd is None:
+        logger.warning("bars_ring_tap: ring {} not found; is ws_run running with BARS_SHM=1?", shm_name())
+        return 0
+    logger.info("bars_ring_tap: attached {} capacity={} (logfile={})", rd.name, rd.capacity, logfile)
+
+    stop_at = time.monotonic() + args.seconds if args.seconds > 0 else None
+    n, max_lag_ms, last_lag_ms, next_log = 0, 0.0, 0.0, time.monotonic() + args.interval
+    vwap = StreamingVwap()
+    ind = StreamingIndicatorSet(args.indicators) if args.indicators else None
+    grid = None
+    try:
+        while stop_at is None or time.monotonic() < stop_at:
+            recs = rd.poll()
+            if len(recs):
+                now_ns = int(datetime.now(timezone.utc).timestamp() * 1_000_000_000)
+                lags = (now_ns - recs["t"]) / 1e6
+                n += len(recs)
+                max_lag_ms = max(max_lag_ms, float(lags.max()))
+                last_lag_ms = float(lags[-1])
+                for r in recs:
+                    sym = r["S"].decode("ascii", "replace")
+                    vwap.update(sym, int(r["t"]), float(r["c"]), float(r["v"]))
+                    if ind is not None:
+                        ind.update(sym, int(r["t"]), float(r["h"]), float(r["l"]), float(r["c"]))
+                if use_grid:
+                    grid = _grid_for(grid, recs)
+                    grid.insert_ring(recs)  # 何をする行？：添字計算だけで [銘柄, 分] のマスへ（同じ分の訂正は上書き）
+            if time.monotonic() >= next_log:
+                logger.info("bars_ring_tap: bars={} dropped={} restarts={} lag_ms(last/max)={:.0f}/{:.0f} next_seq={} vwap_symbols={} corrected={}",
+                            n, rd.dropped, rd.restarts, last_lag_ms, max_lag_ms, rd.next_seq, len(vwap.snapshot()), vwap.corrections)
+                if ind is not None:
+                    logger.info("bars_ring_tap: indicators={} symbols={} revised={} late={}",
+                                ind.names, len(ind.snapshot()), ind.revisions, ind.late)
+                if grid is not None and len(grid):
+                    _grid_report(grid, orb_minutes, anchor, snap_path)
+                n, max_lag_ms, next_log = 0, 0.0, time.monotonic() + args.interval
+            time.sleep(0.05)
+    finally:
+        rd.close()
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,72 @@
+# 1分バーの“コンパクト列型”（utils.io.BAR_DTYPES）で、メモリとParquetサイズがどれだけ減るかを測るベンチマークです。
+# 目的：Russell 規模（既定 3000銘柄 × 390分）の1セッションを providers.synthetic で合成し、従来型（object文字列＋float64）と比べて
+#       DataFrame のメモリ量・Parquet サイズ・読み込み時間を表示します（複数日の場中履歴をRAMに載せる見積もり用）。
+
+from __future__ import annotations
+from pathlib import Path      # 一時出力先
+from datetime import date     # 合成セッションの日付
+import argparse               # 規模の指定
+import tempfile               # ベンチ用の一時フォルダ
+import time                   # 読み込み時間の計測
+import numpy as np
+import pandas as pd
+
+from rh_pdc_daytrade.utils.io import write_parquet, read_parquet, compact_frame  # 何をする関数？：保存/読込の標準口
+from rh_pdc_daytrade.providers.synthetic import SyntheticMarket  # 何をするクラス？：ベンチ共通の合成データ
+
+def _session(n_symbols: int, minutes: int, seed: int = 7) -> pd.DataFrame:
+    """何をする関数？：合成マーケットの1セッションを、従来型（symbol=object, 価格/出来高=float64）の縦長バーにします。"""
+    day = next(SyntheticMarket(n_symbols=n_symbols, seed=seed, minutes=minutes).sessions(date(2025, 9, 9), days=1))
+    n, m = day.c.shape
+    df = pd.DataFrame({
+        "symbol": np.repeat(np.asarray(day.symbols, dtype=object), m),
+        "et": pd.to_datetime(np.tile(day.t_ns, n), unit="ns", utc=True).tz_convert("America/New_York"),
+        "o": day.o.ravel(), "h": day.h.ravel(), "l": day.l.ravel(), "c": day.c.ravel(),
+        "v": day.v.ravel().astype(np.float64),
+    })
+    df["symbol"] = df["symbol"].astype(object)
+    df["vwap"] = (df["c"] * df["v"]).groupby(df["symbol"]).cumsum() / df["v"].groupby(df["symbol"]).cumsum()
+    df["avwap"] = df["vwap"]
+    return df
+
+def _measure(df: pd.DataFrame, path: Path, compact: bool) -> dict:
+    """何をする関数？：メモリ量（deep）・Parquetサイズ・読み込み時間を測ります。"""
+    frame = compact_frame(df) if compact else df
+    mem = int(frame.memory_usage(deep=True).sum())
+    write_parquet(frame, path, compact=compact)
+    t0 = time.perf_counter()
+    back = read_parquet(path, compact=compact)
+    read_s = time.perf_counter() - t0
+    return {"mem_mb": mem / 1e6, "file_mb": path.stat().st_size / 1e6, "read_s": read_s,
+            "read_mem_mb": int(back.memory_usage(deep=True).sum()) / 1e6}
+
+def main() -> int:
+    """
+    何をする関数？：
+      - 合成セッションを従来型とコンパクト型で保存・読込し、比較表を表示します。
+    使い方：
+      poetry run python scripts/bench_compact_dtypes.py --symbols 3000 --minutes 390
+    """
+    ap = argparse.ArgumentParser(description="Compare memory/parquet size of wide vs compact bar dtypes.")
+    ap.add_argument("--symbols", type=int, default=3000, help="銘柄数（Russell 3000 相当が既定）")
+    ap.add_argument("--minutes", type=int, default=390, help="1セッションの分数")
+    args = ap.parse_args()
+
+    df = _session(args.symbols, args.minutes)
+    with tempfile.TemporaryDirectory() as td:
+        wide = _measure(df, Path(td) / "wide.parquet", compact=False)
+        comp = _measure(df, Path(td) / "compact.parquet", compact=True)
+
+    err = (compact_frame(df)["c"].astype("float64") - df["c"]).abs() / df["c"]
+    print(f"rows={len(df):,} symbols={args.symbols} minutes={args.minutes}")
+    print(f"{'':10s}{'mem_MB':>10s}{'file_MB':>10s}{'read_s':>10s}{'read_MB':>10s}")
+    for name, r in (("wide", wide), ("compact", comp)):
+        print(f"{name:10s}{r['mem_mb']:10.1f}{r['file_mb']:10.1f}{r['read_s']:10.3f}{r['read_mem_mb']:10.1f}")
+    print(f"ratio     {comp['mem_mb'] / wide['mem_mb']:10.2f}{comp['file_mb'] / wide['file_mb']:10.2f}"
+          f"{comp['read_s'] / max(wide['read_s'], 1e-9):10.2f}{comp['read_mem_mb'] / wide['read_mem_mb']:10.2f}")
+    print(f"float32 price max rel err={float(err.max()):.2e}  (1 day compact = {comp['mem_mb']:.0f} MB -> "
+          f"{comp['mem_mb'] * 252 / 1e3:.1f} GB/year)")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,146 @@
+# compute_indicators の“1日分まとめて”処理と“塊ごと”処理（BARS_CHUNK_ROWS）の、ピークメモリと所要時間を比べるベンチです。
+# 目的：塊処理のピークメモリがファイルの大きさに依らず一定であることを“数字で”確かめる。
+#       providers.synthetic の合成データで銘柄数ごとに NDJSON を作り、モードごとに別プロセスで処理させて
+#       そのプロセスのピーク RSS を測ります（同じプロセスで続けて測ると、前の回のピークが残るため）。
+# 使い方：
+#   poetry run python scripts/bench_memory.py --symbols 200 1000 3000 --chunk-rows 100000
+#   poetry run python scripts/bench_memory.py --symbols 3000 --modes chunked --out data/bench/mem.json
+
+from __future__ import annotations
+from pathlib import Path        # 入出力パス
+from datetime import date, datetime
+import argparse                 # 規模・モードの指定
+import os                       # 子プロセスへの環境変数
+import subprocess               # モードごとに別プロセスで測る
+import sys                      # 子プロセスの python / 引数
+import tempfile                 # 合成 NDJSON と出力の一時フォルダ
+import time                     # perf_counter
+import orjson
+from loguru import logger
+
+from rh_pdc_daytrade.utils.envutil import load_dotenv_if_exists  # 何をする関数？：.envを先に読む
+from rh_pdc_daytrade.utils.logutil import configure_logging       # 何をする関数？：ログ初期化（冪等）
+
+MODES = ["full", "chunked"]
+
+def _peak_rss_mb() -> float:
+    """
+    何をする関数？：このプロセスのピーク RSS（MB）を返します（Linux は VmHWM、他の Unix は getrusage、Windows は PeakWorkingSetSize）。
+    Linux の getrusage の ru_maxrss は exec をまたいで親（fork 元）のピークを引き継ぐので、子プロセスの計測には VmHWM を使います。
+    """
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        import resource  # Unix だけにあるのでここでインポート
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024  # macOS はバイト、Linux は KB
+    except ImportError:
+        import ctypes                      # Windows：GetProcessMemoryInfo の PeakWorkingSetSize
+        from ctypes import wintypes
+
+        class _PMC(ctypes.Structure):
+            _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD),
+                        ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                        ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                        ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t), ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                        ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t)]
+        pmc = _PMC()
+        pmc.cb = ctypes.sizeof(_PMC)
+        h = ctypes.windll.kernel32.GetCurrentProcess()
+        ctypes.windll.psapi.GetProcessMemoryInfo(h, ctypes.byref(pmc), pmc.cb)
+        return pmc.PeakWorkingSetSize / (1024 * 1024)
+
+def _child(mode: str, ndjson: str, out_dir: str, chunk_rows: int) -> int:
+    """
+    何をする関数？：
+      - （子プロセス側）1つのモードで NDJSON → 指標 → 保存 を行い、行数・秒数・ピーク RSS を1行の JSON で標準出力に出します。
+    """
+    import compute_indicators as ci   # 本番スクリプトの“中の関数”をそのまま測るため関数内でインポート
+    base = _peak_rss_mb()
+    p, out = Path(ndjson), Path(out_dir)
+    cfg = {"strategy": {"avwap_anchor": "09:30:00"}}
+    t0 = time.perf_counter()
+    if mode == "full":
+        df = ci._read_bars_ndjson(p, symbols=[])
+        df = ci._compute_avwap(ci._compute_vwap(df), anchor="09:30:00")
+        orb = ci._compute_orb(df)
+        cwd = os.getcwd()
+        os.chdir(out)  # 何をする行？：_save_outputs は data/bars/ に書くので、一時フォルダの中で保存させる
+        try:
+            ci._save_outputs(df, orb)
+        finally:
+            os.chdir(cwd)
+        rows = len(df)
+    else:
+        ci._run_chunked(p, cfg, chunk_rows, out_dir=out / "data" / "bars")
+        rows = None
+    sec = time.perf_counter() - t0
+    print(orjson.dumps({"mode": mode, "rows": rows, "seconds": sec, "peak_rss_mb": _peak_rss_mb(),
+                        "baseline_rss_mb": base}).decode())
+    return 0
+
+def _measure(mode: str, nd: Path, chunk_rows: int) -> dict:
+    """何をする関数？：別プロセスで _child を走らせ、その結果（JSON 1行）を返します。"""
+    with tempfile.TemporaryDirectory() as td:
+        env = dict(os.environ, LOG_JSON="0")
+        cmd = [sys.executable, str(Path(__file__).resolve()), "_child", mode, str(nd), td, str(chunk_rows)]
+        res = subprocess.run(cmd, capture_output=True, text=True, env=env)
+        if res.returncode != 0:
+            raise RuntimeError(f"bench child failed ({mode}): {res.stderr.strip()[-500:]}")
+        return orjson.loads(res.stdout.strip().splitlines()[-1])
+
+def main() -> int:
+    """
+    何をする関数？：
+      - 銘柄数ごとに合成 NDJSON を作り、full（1日分まとめて）/ chunked（塊ごと）のピーク RSS と秒数を表にして表示・保存します。
+    """
+    if len(sys.argv) > 1 and sys.argv[1] == "_child":
+        _, _, mode, nd, out_dir, chunk_rows = sys.argv
+        return _child(mode, nd, out_dir, int(chunk_rows))
+
+    ap = argparse.ArgumentParser(description="Peak-RSS benchmark: whole-day vs chunked indicator processing.")
+    ap.add_argument("--symbols", type=int, nargs="+", default=[200, 1000, 3000], help="銘柄数（複数可）")
+    ap.add_argument("--minutes", type=int, default=390, help="セッション分数")
+    ap.add_argument("--chunk-rows", type=int, default=100_000, help="chunked の1塊の行数")
+    ap.add_argument("--modes", nargs="+", choices=MODES, default=MODES, help="測るモード")
+    ap.add_argument("--seed", type=int, default=7, help="合成データの乱数シード")
+    ap.add_argument("--out", default=None, help="結果JSON（既定 data/bench/mem_YYYYmmdd_HHMMSS.json）")
+    args = ap.parse_args()
+
+    load_dotenv_if_exists()
+    configure_logging()
+    from rh_pdc_daytrade.providers.synthetic import SyntheticMarket, write_ndjson  # 関数内だけで使うためここでインポート
+
+    cases = []
+    with tempfile.TemporaryDirectory() as td:
+        for n in args.symbols:
+            mk = SyntheticMarket(n_symbols=n, seed=args.seed, minutes=args.minutes)
+            day = next(mk.sessions(date(2025, 9, 9), days=1))
+            nd = write_ndjson(day, Path(td) / f"bars_{n}.ndjson")
+            del mk, day
+            size_mb = nd.stat().st_size / (1024 * 1024)
+            for mode in args.modes:
+                r = _measure(mode, nd, args.chunk_rows)
+                r.update({"symbols": n, "minutes": args.minutes, "ndjson_mb": size_mb, "chunk_rows": args.chunk_rows})
+                cases.append(r)
+                logger.info("bench_memory: {}x{} ({:.0f}MB) {:<8s} peak_rss={:.0f}MB time={:.2f}s",
+                            n, args.minutes, size_mb, mode, r["peak_rss_mb"], r["seconds"])
+            nd.unlink()
+
+    print(f"{'symbols':>8s}{'ndjson_mb':>11s}  {'mode':<8s}{'peak_mb':>9s}{'seconds':>9s}")
+    for r in cases:
+        print(f"{r['symbols']:8d}{r['ndjson_mb']:11.0f}  {r['mode']:<8s}{r['peak_rss_mb']:9.0f}{r['seconds']:9.2f}")
+    out = Path(args.out) if args.out else Path("data") / "bench" / f"mem_{datetime.now():%Y%m%d_%H%M%S}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_bytes(orjson.dumps({"created": datetime.now().isoformat(timespec="seconds"), "cases": cases},
+                                 option=orjson.OPT_INDENT_2))
+    logger.info("bench_memory: saved -> {}", out)
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
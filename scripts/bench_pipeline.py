@@ -0,0 +1,205 @@
+# パイプラインの各段（読込→指標→シグナル→EODスクリーナ→保存）の所要時間を測るベンチマークスイートです。
+# 目的：性能改善を“数字で”確かめられるようにする。providers.synthetic の合成データを銘柄数×セッション分数の組で作り、
+#       段ごとの時間（repeat 回の最小・中央値）を JSON に保存。compare で基準 JSON と比べ、しきい値を超えて遅くなった段があれば
+#       終了コード 1 を返します（CI や手元の前後比較用）。
+# 使い方：
+#   poetry run python scripts/bench_pipeline.py run --symbols 500 3000 --minutes 390 --out data/bench/base.json
+#   poetry run python scripts/bench_pipeline.py compare data/bench/base.json data/bench/new.json --threshold 0.10
+
+from __future__ import annotations
+from pathlib import Path        # 入出力パス
+from datetime import date, datetime
+import argparse                 # run / compare のサブコマンド
+import os                       # 作業フォルダの一時切替（watchlist を読まないため）
+import platform                 # 実行環境の記録
+import statistics               # 中央値
+import tempfile                 # 合成データ・保存ベンチの一時フォルダ
+import time                     # perf_counter
+from typing import Any, Callable
+import orjson
+from loguru import logger
+
+from rh_pdc_daytrade.utils.envutil import load_dotenv_if_exists  # 何をする関数？：.envを先に読む
+from rh_pdc_daytrade.utils.logutil import configure_logging       # 何をする関数？：ログ初期化（冪等）
+from rh_pdc_daytrade.utils.configutil import load_settings, Settings  # 何をする関数？：config.yaml の凍結スナップショット（A/B・スコア重み）
+
+STAGES = ["read_ndjson", "vwap", "avwap", "orb_5m", "gen_A", "gen_B",
+          "features_from_aggs", "eod_screen", "write_parquet"]
+
+def _timeit(fn: Callable[[Any], Any], setup: Callable[[], Any] | None, repeat: int) -> dict:
+    """
+    何をする関数？：
+      - setup() で入力を作り（時間に含めない）、fn(入力) を repeat 回測って最小・中央値・全回の秒数を返します。
+      - 最小値は“雑音の少ない本来の速さ”、中央値は“普段の速さ”の目安です（compare は最小値で比べます）。
+    """
+    runs = []
+    for _ in range(max(1, int(repeat))):
+        arg = setup() if setup else None
+        t0 = time.perf_counter()
+        fn(arg)
+        runs.append(time.perf_counter() - t0)
+    return {"min_s": min(runs), "median_s": statistics.median(runs), "runs_s": runs}
+
+def _bench_case(n_symbols: int, minutes: int, repeat: int, history_days: int, seed: int,
+                stages: list[str], st: Settings) -> dict:
+    """
+    何をする関数？：
+      - 1つの規模（銘柄数×分数）で合成データを作り、指定の段を順に測ります。
+      - 前段の出力を次段の入力にする（vwap→avwap→シグナル）ので、本番と同じ形のデータで測れます。
+    """
+    # 本番スクリプトの“中の関数”をそのまま測るため、scripts/ の2モジュールを関数内でインポート
+    import compute_indicators as ci
+    import run_signals as rs
+    from rh_pdc_daytrade.providers.synthetic import SyntheticMarket, write_ndjson, eod_features
+    from rh_pdc_daytrade.providers.polygon_rest import _features_from_aggs
+    from rh_pdc_daytrade.screening.eod_screen import apply_hard_filters, compute_scores_basic
+    from rh_pdc_daytrade.utils.io import write_parquet
+
+    res: dict[str, Any] = {"symbols": n_symbols, "minutes": minutes, "stages": {}}
+    with tempfile.TemporaryDirectory() as td:
+        tdp = Path(td)
+        mk = SyntheticMarket(n_symbols=n_symbols, seed=seed, minutes=minutes)
+        mk.history(history_days, end=date(2025, 9, 9))
+        day = next(mk.sessions(date(2025, 9, 9), days=1))
+        nd = write_ndjson(day, tdp / "bars_20250909.ndjson")
+        daily = mk.daily_frame()
+        res["rows"] = int(day.c.size)
+
+        bars = ci._read_bars_ndjson(nd, symbols=[])
+        with_vwap = ci._compute_vwap(bars.copy())
+        df_1m = ci._compute_avwap(with_vwap.copy())
+        orb = ci._compute_orb(df_1m)
+        df_ind = (df_1m.groupby("symbol", observed=True).tail(1)[["symbol", "vwap", "avwap"]]
+                  .merge(orb, on="symbol", how="left"))
+        feats = eod_features(daily)
+        groups = [(s, g[["o", "h", "l", "c", "v", "t"]].reset_index(drop=True))
+                  for s, g in daily.groupby("symbol", sort=False)]
+
+        plan: dict[str, tuple[Callable[[Any], Any], Callable[[], Any] | None]] = {
+            "read_ndjson": (lambda _: ci._read_bars_ndjson(nd, symbols=[]), None),
+            "vwap": (ci._compute_vwap, bars.copy),
+            "avwap": (ci._compute_avwap, with_vwap.copy),
+            "orb_5m": (ci._compute_orb, lambda: df_1m),
+            "gen_A": (lambda _: rs._gen_A(df_1m, df_ind, st), None),
+            "gen_B": (lambda _: rs._gen_B(df_1m, df_ind, st), None),
+            "features_from_aggs": (lambda _: [_features_from_aggs(s, g) for s, g in groups], None),
+            "eod_screen": (lambda x: compute_scores_basic(apply_hard_filters(x, st.raw), st.raw), feats.copy),
+            "write_parquet": (lambda _: write_parquet(df_1m, tdp / "bars_1m.parquet", compact=True), None),
+        }
+        cwd = os.getcwd()
+        os.chdir(td)  # 何をする行？：data/eod/watchlist_*.json を拾わないよう（全銘柄を判定させる）作業フォルダを一時へ
+        try:
+            for name in stages:
+                fn, setup = plan[name]
+                res["stages"][name] = _timeit(fn, setup, repeat)
+                logger.info("bench: {}x{} {:<18s} min={:.4f}s median={:.4f}s", n_symbols, minutes, name,
+                            res["stages"][name]["min_s"], res["stages"][name]["median_s"])
+        finally:
+            os.chdir(cwd)
+    return res
+
+def _git_rev() -> str | None:
+    # 何をする関数？：結果に“どのコミットで測ったか”を残す（git が無ければ None）。
+    import subprocess  # この関数内だけで使うためここでインポート
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=10,
+                             cwd=Path(__file__).resolve().parent)
+        return out.stdout.strip() or None
+    except Exception:
+        return None
+
+def cmd_run(args: argparse.Namespace) -> int:
+    """何をする関数？：規模の全組み合わせを測って JSON に保存します。"""
+    import numpy as np   # バージョン記録用
+    import pandas as pd  # 同上
+    st = load_settings()
+    stages = args.stages or STAGES
+    unknown = [s for s in stages if s not in STAGES]
+    if unknown:
+        logger.error("bench_pipeline: unknown stages {} (choose from {})", unknown, STAGES)
+        return 2
+    cases = [_bench_case(n, m, args.repeat, args.history_days, args.seed, stages, st)
+             for n in args.symbols for m in args.minutes]
+    doc = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "git": _git_rev(),
+        "env": {"python": platform.python_version(), "pandas": pd.__version__, "numpy": np.__version__,
+                "machine": platform.machine(), "system": platform.system()},
+        "params": {"repeat": args.repeat, "history_days": args.history_days, "seed": args.seed},
+        "cases": cases,
+    }
+    out = Path(args.out) if args.out else Path("data") / "bench" / f"bench_{datetime.now():%Y%m%d_%H%M%S}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_bytes(orjson.dumps(doc, option=orjson.OPT_INDENT_2))
+    logger.info("bench_pipeline: saved -> {}", out)
+    print(out)
+    return 0
+
+def _index(doc: dict) -> dict[tuple[int, int, str], float]:
+    # 何をする関数？：結果 JSON を {(銘柄数, 分数, 段): 最小秒} に直す。
+    return {(int(c["symbols"]), int(c["minutes"]), name): float(r["min_s"])
+            for c in doc.get("cases", []) for name, r in (c.get("stages") or {}).items()}
+
+def cmd_compare(args: argparse.Namespace) -> int:
+    """
+    何をする関数？：
+      - 基準と今回の結果を、同じ（銘柄数, 分数, 段）どうしで比べます。
+      - 今回/基準 − 1 が --threshold を超え、かつ差が --min-delta 秒を超えた段を“劣化”として数え、1件でもあれば 1 を返します。
+        （ごく短い段の揺らぎで落ちないよう、絶対差の下限を設けています）
+    """
+    base = _index(orjson.loads(Path(args.baseline).read_bytes()))
+    cur = _index(orjson.loads(Path(args.current).read_bytes()))
+    keys = sorted(set(base) & set(cur))
+    if not keys:
+        logger.error("bench_pipeline: no common (symbols, minutes, stage) between {} and {}", args.baseline, args.current)
+        return 2
+    regressions = 0
+    print(f"{'symbols':>8s}{'minutes':>8s}  {'stage':<20s}{'base_s':>10s}{'cur_s':>10s}{'change':>9s}")
+    for k in keys:
+        b, c = base[k], cur[k]
+        change = (c / b - 1.0) if b > 0 else 0.0
+        bad = change > args.threshold and (c - b) > args.min_delta
+        regressions += bad
+        print(f"{k[0]:8d}{k[1]:8d}  {k[2]:<20s}{b:10.4f}{c:10.4f}{change:+9.1%}{'  REGRESSION' if bad else ''}")
+    missing = sorted(set(base) - set(cur))
+    if missing:
+        logger.warning("bench_pipeline: {} stage(s) only in baseline: {}", len(missing), missing)
+    if regressions:
+        logger.error("bench_pipeline: {} stage(s) regressed beyond {:.0%}", regressions, args.threshold)
+        return 1
+    logger.info("bench_pipeline: no regression beyond {:.0%} ({} stages compared)", args.threshold, len(keys))
+    return 0
+
+def main() -> int:
+    """
+    何をする関数？：
+      - run：合成データで各段を測り、JSON に保存します。
+      - compare：2つの結果 JSON を比べ、劣化があれば終了コード 1 を返します。
+    """
+    ap = argparse.ArgumentParser(description="Pipeline benchmark suite (synthetic data) with regression compare.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    ap_run = sub.add_parser("run", help="各段の時間を測って JSON に保存")
+    ap_run.add_argument("--symbols", type=int, nargs="+", default=[500], help="銘柄数（複数可）")
+    ap_run.add_argument("--minutes", type=int, nargs="+", default=[390], help="セッション分数（複数可）")
+    ap_run.add_argument("--stages", nargs="+", default=None, help=f"測る段（既定は全部：{' '.join(STAGES)}）")
+    ap_run.add_argument("--repeat", type=int, default=3, help="各段の繰り返し回数")
+    ap_run.add_argument("--history-days", type=int, default=260, help="EOD特徴量に使う日足の営業日数")
+    ap_run.add_argument("--seed", type=int, default=7, help="合成データの乱数シード")
+    ap_run.add_argument("--out", default=None, help="結果JSON（既定 data/bench/bench_YYYYmmdd_HHMMSS.json）")
+    ap_run.set_defaults(func=cmd_run)
+
+    ap_cmp = sub.add_parser("compare", help="基準と今回の結果を比べ、劣化で失敗")
+    ap_cmp.add_argument("baseline", help="基準の結果JSON")
+    ap_cmp.add_argument("current", help="今回の結果JSON")
+    ap_cmp.add_argument("--threshold", type=float, default=0.10, help="劣化とみなす遅くなり率（0.10=10%%）")
+    ap_cmp.add_argument("--min-delta", type=float, default=0.005, help="劣化とみなす最小の絶対差（秒）")
+    ap_cmp.set_defaults(func=cmd_compare)
+
+    args = ap.parse_args()
+    load_dotenv_if_exists()
+    configure_logging()
+    return int(args.func(args))
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -57,11 +57,9 @@ def _unique(seq: list[str]) -> list[str]:
 
 def _latest_eod_file(eod_dir: str) -> Path | None:
     # 何をする関数か：最新の eod_features_YYYYMMDD.(parquet|csv) を探す
-    d = Path(eod_dir)
-    cands = list(d.glob("eod_features_*.parquet")) + list(d.glob("eod_features_*.csv"))
-    if not cands:
-        return None
-    return max(cands, key=lambda p: p.stat().st_mtime)  # 最終更新が最新のもの
+    #   data/eod/latest.json（nightly_screen が書くマニフェスト）を優先し、無ければ glob して最終更新が最新のもの
+    from rh_pdc_daytrade.store.refdata import latest_eod_features_path  # 関数内だけで使うためここでインポート
+    return latest_eod_features_path(eod_dir)
 
 def _load_eod_df(path: Path) -> pd.DataFrame:
     # 何をする関数か：EOD特徴量を読み込む（parquet/csv どちらでも可）
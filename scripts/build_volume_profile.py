@@ -0,0 +1,62 @@
+# 時刻別の出来高プロファイル（銘柄 × 寄りからの分 の累積出来高の中央値）を、1分足アーカイブから作り直すスクリプトです。
+# 目的：RVOL の分母を夜に1回だけ作っておき、compute_indicators（rvol 列）・場中スキャナ・夜間スコアで O(1) で引けるようにする。
+#       ふだんは nightly_screen が同じ処理（差分更新）を呼ぶので、これは手動の作り直し・窓の変更・確認用です。
+# 使い方：
+#   poetry run python scripts/build_volume_profile.py                         # 差分（新しい日・変わった日だけ読む）
+#   poetry run python scripts/build_volume_profile.py --days 30 --rebuild     # 全部読み直し
+#   poetry run python scripts/build_volume_profile.py --show AAPL --minutes 0 4 29 389
+
+from __future__ import annotations
+from pathlib import Path        # 入出力パス
+import argparse                 # 窓・置き場の指定
+from loguru import logger
+
+from rh_pdc_daytrade.utils.envutil import load_dotenv_if_exists  # 何をする関数？：.envを先に読む
+from rh_pdc_daytrade.utils.logutil import configure_logging       # 何をする関数？：ログ初期化（冪等）
+from rh_pdc_daytrade.utils.configutil import load_config          # 何をする関数？：config.yaml の volume_profile 節
+from rh_pdc_daytrade.indicators.volprofile import update_profile, default_sources, profile_path
+
+def main() -> int:
+    """
+    何をする関数？：
+      - 1分足の置き場（既定 data/bars と BARS_ARCHIVE_DIR）から直近 N 日のプロファイルを作り、VOLUME_PROFILE_PATH に保存します。
+      - --show の銘柄は、指定した分のふだんの累積出来高と1日に占める割合を表示します。
+    """
+    ap = argparse.ArgumentParser(description="Build the time-of-day cumulative volume profile from 1-minute bar archives.")
+    ap.add_argument("--sources", nargs="+", default=None, help="bars_1m_YYYYMMDD.parquet のあるフォルダ（既定 data/bars と BARS_ARCHIVE_DIR）")
+    ap.add_argument("--days", type=int, default=None, help="直近何営業日の中央値か（既定 config volume_profile.days または 20）")
+    ap.add_argument("--min-days", type=int, default=None, help="この日数に満たない銘柄は載せない（既定 config または 5）")
+    ap.add_argument("--min-coverage", type=float, default=None,
+                    help="銘柄×日でバーのある分の割合がこれ未満ならその日は数えない（既定 config または 0.5）")
+    ap.add_argument("--out", default=None, help="保存先（既定 VOLUME_PROFILE_PATH または data/profile/volprofile.npz）")
+    ap.add_argument("--rebuild", action="store_true", help="状態ファイルを使わず全部読み直す")
+    ap.add_argument("--show", nargs="*", default=[], help="確認表示する銘柄")
+    ap.add_argument("--minutes", type=int, nargs="+", default=[0, 4, 14, 29, 59, 389], help="--show で表示する寄りからの分")
+    args = ap.parse_args()
+
+    load_dotenv_if_exists()
+    configure_logging()
+    vp = (load_config().get("volume_profile", {}) or {})
+    days = args.days if args.days is not None else int(vp.get("days", 20))
+    min_days = args.min_days if args.min_days is not None else int(vp.get("min_days", 5))
+    min_coverage = args.min_coverage if args.min_coverage is not None else float(vp.get("min_coverage", 0.5))
+    sources = [Path(s) for s in args.sources] if args.sources else default_sources()
+
+    prof = update_profile(sources, days=days, min_days=min_days, out=args.out, rebuild=args.rebuild,
+                          min_coverage=min_coverage)
+    if prof is None:
+        logger.warning("build_volume_profile: no complete sessions of minute bars found in {}", [str(s) for s in sources])
+        return 1
+    logger.info("build_volume_profile: {} symbols, days {}..{} -> {}", len(prof),
+                prof.meta["days"][0], prof.meta["days"][-1], profile_path(args.out))
+    for sym in args.show:
+        sym = sym.upper()
+        if sym not in prof:
+            print(f"{sym}: not in profile")
+            continue
+        cells = "  ".join(f"m{m}={prof.expected(sym, m):,.0f} ({prof.frac(sym, m):.1%})" for m in args.minutes)
+        print(f"{sym} (days={int(prof.ndays[prof.symbols.index(sym)])}): {cells}")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,102 @@
+# ストリーミング版（1本ずつ）の指標と、バッチ版（ベクトル化）の指標が同じ値になることを確かめるスクリプトです。
+# 目的：indicators.streaming の StreamingIndicatorSet（EMA・Wilder ATR・HOD/LOD・直近 N 本の高値/安値）を
+#       合成マーケット（providers.synthetic）の複数日・複数銘柄のバーで“時刻順に全銘柄を混ぜて”流し、
+#       updatedBars のような同じ分の訂正（最初は違う値 → すぐ正しい値）も混ぜたうえで、batch_indicators の結果と突き合わせます。
+#       ずれが --tol を超えたら終了コード 1（CI やデプロイ前の確認用）。
+# 使い方：
+#   poetry run python scripts/check_streaming_indicators.py
+#   poetry run python scripts/check_streaming_indicators.py --symbols 200 --days 3 --indicators ema9 ema20 atr14 hod lod hh20 ll20
+
+from __future__ import annotations
+from datetime import date
+import argparse                 # 規模・指標の指定
+import time                     # perf_counter
+import numpy as np
+import pandas as pd
+from loguru import logger
+
+from rh_pdc_daytrade.utils.envutil import load_dotenv_if_exists  # 何をする関数？：.envを先に読む
+from rh_pdc_daytrade.utils.logutil import configure_logging       # 何をする関数？：ログ初期化（冪等）
+from rh_pdc_daytrade.indicators.streaming import StreamingIndicatorSet, batch_indicators
+
+DEFAULT_INDICATORS = ["ema9", "ema20", "atr14", "hod", "lod", "hh20", "ll20"]
+
+def _stream_frame(df: pd.DataFrame, fix_rate: float, seed: int) -> pd.DataFrame:
+    """
+    何をする関数？：(t, 銘柄) 順の“受信順”の表を作り、fix_rate の割合の行の直前に“同じ分の間違った値”の行を差し込みます
+    （差し込んだ行はストリーミング側だけが見る。バッチ側は正しい値だけ）。
+    """
+    rng = np.random.default_rng(seed)
+    live = df.sort_values(["et", "symbol"], kind="mergesort").reset_index(drop=True)
+    bad = live[rng.random(len(live)) < fix_rate].copy()
+    for k in ("h", "l", "c"):
+        bad[k] = bad[k] * (1.0 + rng.normal(0, 0.01, len(bad)))
+    bad["_o"] = 0
+    return (pd.concat([bad, live.assign(_o=1)], ignore_index=True)
+              .sort_values(["et", "symbol", "_o"], kind="mergesort").drop(columns="_o").reset_index(drop=True))
+
+def check(df: pd.DataFrame, names: list[str], fix_rate: float = 0.02, seed: int = 0) -> dict:
+    """
+    何をする関数？：df（symbol, et, h, l, c）をストリーミングとバッチの両方で計算し、指標ごとの最大絶対誤差・秒数を返します。
+    """
+    t0 = time.perf_counter()
+    ref = batch_indicators(df, names)
+    t_batch = time.perf_counter() - t0
+
+    feed = _stream_frame(df, fix_rate, seed)
+    ind = StreamingIndicatorSet(names)
+    t_ns = pd.DatetimeIndex(feed["et"]).as_unit("ns").asi8
+    t0 = time.perf_counter()
+    got = ind.update_many(feed["symbol"].astype(str).tolist(), t_ns, feed["h"], feed["l"], feed["c"])
+    t_stream = time.perf_counter() - t0
+
+    # 何をする行？：訂正前の行を落とし（各 (銘柄, t) の最後の行）、バッチと同じ行に並べ直して比べる
+    res = pd.DataFrame(got).assign(symbol=feed["symbol"].astype(str).to_numpy(), t=t_ns)
+    res = res.drop_duplicates(["symbol", "t"], keep="last").set_index(["symbol", "t"])
+    key = pd.MultiIndex.from_arrays([df["symbol"].astype(str).to_numpy(), pd.DatetimeIndex(df["et"]).as_unit("ns").asi8])
+    res = res.reindex(key)
+    err = {}
+    for n in names:
+        a, b = res[n].to_numpy(), ref[n].to_numpy()
+        both_nan = np.isnan(a) & np.isnan(b)
+        err[n] = float(np.max(np.where(both_nan, 0.0, np.abs(a - b)), initial=0.0))
+        if np.isnan(err[n]):
+            err[n] = float("inf")   # 何をする行？：片方だけ NaN は不一致
+    return {"rows": len(df), "stream_rows": len(feed), "revisions": ind.revisions, "late": ind.late,
+            "batch_s": t_batch, "stream_s": t_stream, "max_abs_err": err}
+
+def main() -> int:
+    """
+    何をする関数？：
+      - 合成マーケットで --days 日 × --symbols 銘柄の 1分足を作り、check の結果を表示します。ずれが --tol を超えたら 1。
+    """
+    ap = argparse.ArgumentParser(description="Check that streaming indicators agree with their batch (vectorized) forms.")
+    ap.add_argument("--symbols", type=int, default=50, help="銘柄数")
+    ap.add_argument("--days", type=int, default=2, help="営業日数（日ごとにリセットされることも確かめる）")
+    ap.add_argument("--minutes", type=int, default=390, help="1日の分数")
+    ap.add_argument("--indicators", nargs="+", default=DEFAULT_INDICATORS, help="指標名（ema9, atr14, hod, lod, hh20, ll20 …）")
+    ap.add_argument("--fix-rate", type=float, default=0.02, help="同じ分の訂正を差し込む割合")
+    ap.add_argument("--tol", type=float, default=1e-9, help="許す最大絶対誤差")
+    ap.add_argument("--seed", type=int, default=11, help="乱数シード")
+    args = ap.parse_args()
+
+    load_dotenv_if_exists()
+    configure_logging()
+    from rh_pdc_daytrade.providers.synthetic import SyntheticMarket  # 関数内だけで使うためここでインポート
+    mk = SyntheticMarket(n_symbols=args.symbols, seed=args.seed, minutes=args.minutes)
+    df = pd.concat([d.to_frame() for d in mk.sessions(date(2025, 9, 8), days=args.days)], ignore_index=True)
+
+    r = check(df, args.indicators, fix_rate=args.fix_rate, seed=args.seed)
+    logger.info("check_streaming_indicators: rows={} fed={} revisions={} late={} batch={:.3f}s stream={:.3f}s ({:.2f}us/bar)",
+                r["rows"], r["stream_rows"], r["revisions"], r["late"], r["batch_s"], r["stream_s"],
+                r["stream_s"] / max(1, r["stream_rows"]) * 1e6)
+    bad = {n: e for n, e in r["max_abs_err"].items() if not e <= args.tol}
+    for n, e in r["max_abs_err"].items():
+        print(f"{n:>8s}  max_abs_err={e:.3e}  {'NG' if n in bad else 'ok'}")
+    if bad:
+        logger.error("check_streaming_indicators: mismatch over tol={}: {}", args.tol, bad)
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -41,9 +41,11 @@ def _is_force_close_time(now_et: datetime, cfg: dict) -> bool:
     """
     何をする関数？：
       - config.yaml の orders.force_close_by（既定 "15:55:00"）と現在ET時刻を比べ、クローズ時刻か判定します。  :contentReference[oaicite:7]{index=7}
+      - 短縮取引日（13:00 引け）は締切を引けに合わせて前倒しします（15:55 → 12:55、orders.scheduler.deadline_on と同じ規則）。
     """
+    from rh_pdc_daytrade.orders.scheduler import deadline_on  # 関数内だけで使うためここでインポート
     t_str = ((cfg.get("orders") or {}).get("force_close_by") or "15:55:00")
-    return now_et.time() >= time.fromisoformat(t_str)
+    return now_et >= deadline_on(now_et.date(), time.fromisoformat(t_str))
 
 def _cancel_file(p: Path, cancelled_dir: Path) -> Path:
     """
@@ -3,7 +3,7 @@
 
 from __future__ import annotations
 from pathlib import Path           # 入出力パス操作
-from datetime import datetime, timezone, time
+from datetime import datetime, timezone
 import pandas as pd                # 集計と指標計算に使う
 from loguru import logger          # ログ（共通ルールで data/logs/bot.log へ）
 import os        # 何をする行？：ファイル存在確認・パス操作（fallbackで使用）
@@ -15,7 +15,10 @@ from rh_pdc_daytrade.utils.envutil import load_dotenv_if_exists  # .env を先
 from rh_pdc_daytrade.utils.logutil import configure_logging       # ログ初期化（冪等）
 from rh_pdc_daytrade.utils.configutil import load_config          # config.yaml のロード
 from rh_pdc_daytrade.utils.timeutil import get_et_tz              # ET日付の決定（tzdata+フォールバック）  :contentReference[oaicite:6]{index=6}
-from rh_pdc_daytrade.utils.io import write_parquet, write_csv     # Parquet/CSVの標準保存口  :contentReference[oaicite:7]{index=7}
+from rh_pdc_daytrade.utils.timeutil import et_time_of_day_ns, time_to_ns, orb_window_mask  # 何をする関数？：時刻判定を配列で一括計算
+from rh_pdc_daytrade.utils.io import write_parquet, write_csv, compact_frame  # Parquet/CSVの標準保存口・コンパクト列型  :contentReference[oaicite:7]{index=7}
+from rh_pdc_daytrade.utils.metrics import timer, incr, init_run_metrics  # 何をする関数？：段ごとの時間・件数を記録（実行ごとに data/metrics/ へ）
+from rh_pdc_daytrade.utils.latency import now_ns  # 何をする関数？：遅れトレース用の時刻スタンプ（UTC ns）
 
 _original_read_json = pd.read_json  # 何をする行？：元の pandas.read_json を退避。以後のラッパーから“本物”を確実に呼べるようにする。
 
@@ -43,90 +46,121 @@ def _bars_ndjson_path(channel: str = "bars") -> Path:
     return Path(stream_dir) / f"{channel}_{et_date}.ndjson"  # 何をする行？：当日のNDJSONファイルのフルパスを返す
 
 
+def _edge_messages(p: Path) -> tuple[dict, dict] | None:
+    """
+    何をする関数？：NDJSON の最初と最後のバー（t を持つ行）を dict で返します（先頭と末尾の数KBだけ読む）。読めなければ None。
+      末尾が書き込み途中の行でも、最後に読める完全な行を使います。
+    """
+    import orjson  # 関数内だけで使うためここでインポート
+
+    def _msg(line: bytes) -> dict | None:
+        try:
+            m = orjson.loads(line)
+        except Exception:
+            return None
+        return m if isinstance(m, dict) and m.get("t") is not None else None
+
+    with open(p, "rb") as f:
+        head = f.read(8192).splitlines()
+        f.seek(0, 2)
+        f.seek(max(0, f.tell() - 8192))
+        tail = f.read().splitlines()
+    first = next((m for m in map(_msg, head) if m is not None), None)
+    last = next((m for m in map(_msg, reversed(tail)) if m is not None), None)
+    return None if first is None or last is None else (first, last)
+
+def _edge_bar_keys(p: Path) -> tuple[tuple[str, int], tuple[str, int]] | None:
+    """何をする関数？：NDJSON の最初と最後のバーの (銘柄, t[ns]) を返します（.bin が NDJSON を全部含むかの確認用）。"""
+    from rh_pdc_daytrade.store.ndjson import parse_t_ns  # 関数内だけで使うためここでインポート
+    edges = _edge_messages(p)
+    if edges is None:
+        return None
+    first, last = ((str(m.get("S") or "").upper(), int(parse_t_ns([m.get("t")])[0])) for m in edges)
+    return first, last
+
+def _pick_bars_input(ndjson_path: Path) -> tuple[Path, str]:
+    """
+    何をする関数？：
+      - 読む入力（NDJSON か、WSが STREAM_BINARY=1 で並行して書いた固定長バイナリ bars_YYYYMMDD.bin か）を決めて、(パス, "ndjson"/"bin") を返します。
+      - 既定は NDJSON（遅れトレースの ws_recv_ns / persisted_ns を持つのは NDJSON だけ）。BARS_READ_BINARY=1 のときだけ .bin を使い、
+        それも「.bin の最初と最後のバーが NDJSON と同じ」＝途中から書き始めた（STREAM_BINARY を場中に有効にした）.bin ではない場合に限ります。
+      - NDJSON が無く .bin だけある日（make_synthetic_data --format bin など）は .bin を読みます（失うものが無いため）。
+    """
+    bin_path = ndjson_path.with_suffix(".bin")
+    if not bin_path.exists():
+        return ndjson_path, "ndjson"
+    if not ndjson_path.exists():
+        return bin_path, "bin"
+    if os.environ.get("BARS_READ_BINARY", "0").lower() not in ("1", "true", "yes", "on"):
+        return ndjson_path, "ndjson"
+    from rh_pdc_daytrade.store.barstream import open_bars, read_symbols  # 関数内だけで使うためここでインポート
+    try:
+        arr, syms = open_bars(bin_path), read_symbols(bin_path)
+        edges = _edge_bar_keys(ndjson_path)
+        covers = (edges is not None and len(arr) > 0
+                  and edges == ((syms[int(arr[0]["sym"])], int(arr[0]["t"])), (syms[int(arr[-1]["sym"])], int(arr[-1]["t"]))))
+    except (OSError, ValueError, IndexError) as e:
+        logger.warning(f"bars binary unreadable: {bin_path} ({e}); using ndjson")
+        return ndjson_path, "ndjson"
+    if not covers:
+        logger.warning(f"bars binary does not cover the ndjson (started mid-day?): {bin_path}; using ndjson")
+        return ndjson_path, "ndjson"
+    return bin_path, "bin"
+
+def _resolve_ndjson_path(p: Path) -> Path | None:
+    """
+    何をする関数？：
+      - 読む NDJSON を決めます。p があればそのまま返し、無ければ（ALLOW_BARS_FALLBACK が有効なら）STREAM_DIR と data/stream から
+        更新時刻が最新の bars_*.ndjson を返します。見つからない・フォールバック無効なら None。
+      - 1日分をまとめて読む道（_read_bars_ndjson）と塊ごとに読む道（_run_chunked）で同じ規則を使うための共通口です。
+    """
+    if p.exists():
+        return p
+    # 何をする行？：環境変数でフォールバックの有効/無効を切替（本番で前日データ誤参照を防ぐ）
+    _allow_fb = os.environ.get("ALLOW_BARS_FALLBACK", "1").lower()
+    if _allow_fb not in ("1", "true", "yes", "on"):
+        logger.warning(f"bars ndjson not found: {p} (fallback disabled)")  # 何をする行？：無効化されていることを明示
+        return None
+
+    # 何をする行？：今日のbarsが無いとき、候補ディレクトリから“最新bars”を探して p を差し替える
+    search_dirs = []
+    ext_dir = os.environ.get("STREAM_DIR")
+    if ext_dir:
+        search_dirs.append(Path(ext_dir))
+    search_dirs.append(Path("data") / "stream")  # 何をする行？：通常の保存先
+
+    candidates = []
+    for root in search_dirs:
+        if root and root.exists():
+            # 何をする行？：bars_*.ndjson を更新時刻の新しい順に集める
+            candidates.extend(sorted(root.glob("bars_*.ndjson"),
+                                    key=lambda q: q.stat().st_mtime,
+                                    reverse=True))
+
+    if candidates:
+        logger.warning(f"bars ndjson not found: {p} -> fallback to latest: {candidates[0]}")  # 何をする行？：切替先をログに出す
+        return candidates[0]  # 何をする行？：ここが肝心。以降はこの実在ファイルを読む
+    logger.warning(f"bars ndjson not found: {p}")  # 何をする行？：見つからなかったことを記録
+    logger.warning("no bars to compute (searched: {})".format(", ".join(str(x) for x in search_dirs)))  # 何をする行？：探した場所も記録
+    return None
+
 def _read_bars_ndjson(p: Path, symbols: list[str]) -> pd.DataFrame:
     """
     何をする関数？：
       - NDJSON（1行=1メッセージ）を読み、必要なキー（S,t,o,h,l,c,v）だけを取り出して DataFrame にします。
-      - 指定の symbols に含まれるものだけに絞ります。ファイルが無ければ空DataFrameを返します。
+      - 指定の symbols に含まれるものだけに絞ります。ファイルが無ければ _resolve_ndjson_path の規則で最新の bars を探し、それも無ければ空DataFrameを返します。
+      - 同じ (銘柄, t) は1行にまとめます（同じ値の再送は捨て、updatedBars の訂正は後勝ちで上書き。store/barindex と同じ規則）。
     """
     import orjson  # この関数内でのみ使う高速JSON
-    if not p.exists():
-# 何をする行？：環境変数でフォールバックの有効/無効を切替（本番で前日データ誤参照を防ぐ）
-        _allow_fb = os.environ.get("ALLOW_BARS_FALLBACK", "1").lower()
-        if _allow_fb not in ("1", "true", "yes", "on"):
-            logger.warning(f"bars ndjson not found: {p} (fallback disabled)")  # 何をする行？：無効化されていることを明示
-            return pd.DataFrame(columns=["symbol", "et", "o", "h", "l", "c", "v"])  # 何をする行？：空DFで正常終了（後段はスキップ）
-
-        # 何をする行？：今日のbarsが無いとき、候補ディレクトリから“最新bars”を探して p を差し替える
-        search_dirs = []
-        ext_dir = os.environ.get("STREAM_DIR")
-        if ext_dir:
-            search_dirs.append(Path(ext_dir))
-        search_dirs.append(Path("data") / "stream")  # 何をする行？：通常の保存先
-
-
-        candidates = []
-        for root in search_dirs:
-            if root and root.exists():
-                # 何をする行？：bars_*.ndjson を更新時刻の新しい順に集める
-                candidates.extend(sorted(root.glob("bars_*.ndjson"),
-                                        key=lambda q: q.stat().st_mtime,
-                                        reverse=True))
-
-        if candidates:
-            logger.warning(f"bars ndjson not found: {p} -> fallback to latest: {candidates[0]}")  # 何をする行？：切替先をログに出す
-            p = candidates[0]  # 何をする行？：ここが肝心。以降はこの実在ファイルを読む
-        else:
-            logger.warning(f"bars ndjson not found: {p}")  # 何をする行？：見つからなかったことを記録
-            logger.warning("no bars to compute (searched: {})".format(", ".join(str(x) for x in search_dirs)))  # 何をする行？：探した場所も記録
-            return pd.DataFrame(columns=["symbol", "et", "o", "h", "l", "c", "v"])  # 何をする行？：空DFで正常終了（後段はスキップ）
-
-
-
-    def _parse_ts(val):
-        # 何をする関数？：Alpacaの 't' を ns/us/ms/s の数値 or ISO文字列('...Z') どちらでも
-        # 安全に「ETタイムスタンプ(pd.Timestamp, tz=America/New_York)」へ変換する。
-        tz = get_et_tz()
-
-        # 1) 数値エポック（桁数で単位を推定）
-        if isinstance(val, (int, float)):
-            v = int(val)
-            # 10^18台=ns, 10^15台=us, 10^12台=ms, それ以外=s
-            if v >= 1_000_000_000_000_000_000:
-                dt = pd.to_datetime(v, unit="ns", utc=True)
-            elif v >= 1_000_000_000_000_000:
-                dt = pd.to_datetime(v, unit="us", utc=True)
-            elif v >= 1_000_000_000_000:
-                dt = pd.to_datetime(v, unit="ms", utc=True)
-            else:
-                dt = pd.to_datetime(v, unit="s", utc=True)
-            return dt.tz_convert(tz)
-
-        # 2) ISO文字列（例：'2025-08-28T09:02:00Z'）
-        if isinstance(val, str):
-            s = val.strip().replace("Z", "+00:00")  # 'Z' を UTC オフセットに正規化
-            try:
-                dt = pd.to_datetime(s, utc=True)
-                return dt.tz_convert(tz)
-            except Exception:
-                # 予備策：文字列中の数字だけを拾って再判定（ログに載せるほどではないので黙ってNaT可）
-                digits = "".join(ch for ch in s if ch.isdigit())
-                if digits:
-                    try:
-                        return _parse_ts(int(digits))  # 再帰で数値ルートへ
-                    except Exception:
-                        return pd.NaT
-                return pd.NaT
-
-        # 3) それ以外は欠損扱い
-        return pd.NaT
-
-
-
+    p = _resolve_ndjson_path(p)
+    if p is None:
+        return pd.DataFrame(columns=["symbol", "et", "o", "h", "l", "c", "v"])  # 何をする行？：空DFで正常終了（後段はスキップ）
 
     logger.info(f"reading bars ndjson: {p}")  # 何をする行？：実際に読み込むbarsファイルのフルパスをログに出して原因切り分けを容易にする
 
     rows = []
+    pos: dict[tuple[str, object], int] = {}  # 何をする行？：(銘柄, t) → rows の位置。再送は捨て、訂正（"u"）は同じ行を上書きする
+    n_dup = n_upd = 0
     with open(p, "rb") as f:
         for line in f:
             if not line.strip():
@@ -135,26 +169,54 @@ def _read_bars_ndjson(p: Path, symbols: list[str]) -> pd.DataFrame:
                 m = orjson.loads(line)
             except Exception:
                 continue
-            # 何をする行？：JSON1件が辞書かを確認した上で、IEXの"T"か"type"のどちらかを取り、bar（b/ bar）だけを通す。
+            # 何をする行？：JSON1件が辞書かを確認した上で、IEXの"T"か"type"のどちらかを取り、bar（b/ bar / 訂正の u）だけを通す。
             tmark = (m.get("T") or m.get("type"))
-            if not isinstance(m, dict) or tmark not in ("b", "bar"): 
+            if not isinstance(m, dict) or tmark not in ("b", "bar", "u"):
                 continue
 
             s = str(m.get("S") or "").upper()
             if symbols and s not in symbols:
                 continue
-            rows.append({
+            row = {
                 "symbol": s,
-                "et": _parse_ts(m.get("t")),
+                "et": None,
                 "o": float(m.get("o", 0.0)),
                 "h": float(m.get("h", 0.0)),
                 "l": float(m.get("l", 0.0)),
                 "c": float(m.get("c", 0.0)),
                 "v": float(m.get("v", 0.0)),
-            })
+                "ws_recv_ns": m.get("rt"),     # 何をする行？：WS受信時刻（遅れトレース用。古いファイルには無い）
+                "persisted_ns": m.get("pt"),   # 何をする行？：保存時刻（同上）
+            }
+            key = (s, m.get("t"))
+            i = pos.get(key)
+            if i is not None:
+                prev = rows[i]
+                if all(prev[k] == row[k] for k in ("o", "h", "l", "c", "v")):
+                    n_dup += 1        # 同じ値の再送：最初の行（受信・保存時刻も最初のもの）を残す
+                    continue
+                row["et"] = prev["et"]
+                rows[i] = row         # 訂正：後勝ちで上書き
+                n_upd += 1
+                continue
+            row["et"] = m.get("t")    # 何をする行？：生の t のまま溜め、最後に配列でまとめて ET に直す（1本ずつの変換は遅い）
+            pos[key] = len(rows)
+            rows.append(row)
+    if n_dup or n_upd:
+        logger.info(f"bars ndjson: dropped {n_dup} duplicate(s), applied {n_upd} correction(s)")
+        incr("bars_duplicate_dropped", n_dup)
+        incr("bars_corrected", n_upd)
     df = pd.DataFrame(rows)
     if df.empty:
         return df
+    from rh_pdc_daytrade.store.ndjson import parse_t_ns, to_et  # 何をする関数？：t（ns/us/ms/s の数値・ISO文字列）を配列で一括変換
+    df["et"] = to_et(parse_t_ns(df["et"].tolist()))
+    for col in ("ws_recv_ns", "persisted_ns"):
+        if df[col].isna().all():
+            df = df.drop(columns=[col])  # 何をする行？：トレースが無いファイルでは列ごと持たない
+        else:
+            df[col] = pd.array(df[col].tolist(), dtype="Int64")  # ns エポックは float にすると丸まるので整数（欠損可）で
+    df = compact_frame(df)  # 何をする行？：symbol は category、価格は float32、出来高は uint32 に（指標計算側で float64 に上げる）
     return df.sort_values(["symbol", "et"], kind="mergesort").reset_index(drop=True)
 
 def _compute_vwap(df: pd.DataFrame) -> pd.DataFrame:
@@ -162,12 +224,13 @@ def _compute_vwap(df: pd.DataFrame) -> pd.DataFrame:
     if df.empty:
         df["vwap"] = []
         return df
-    g = df.groupby("symbol", as_index=False, sort=False)
-    df["pv"] = df["c"] * df["v"]
+    df["pv"] = df["c"].astype("float64") * df["v"].astype("float64")  # 累積は float64 で（保存時に float32 へ）
+    df["v64"] = df["v"].astype("float64")
+    g = df.groupby("symbol", as_index=False, sort=False, observed=True)
     df["cum_pv"] = g["pv"].cumsum()
-    df["cum_v"] = g["v"].cumsum()
+    df["cum_v"] = g["v64"].cumsum()
     df["vwap"] = df["cum_pv"] / df["cum_v"]
-    return df.drop(columns=["pv", "cum_pv", "cum_v"])
+    return df.drop(columns=["pv", "v64", "cum_pv", "cum_v"])
 
 def _compute_avwap(df: pd.DataFrame, anchor: str = "09:30:00") -> pd.DataFrame:
     """
@@ -177,57 +240,181 @@ def _compute_avwap(df: pd.DataFrame, anchor: str = "09:30:00") -> pd.DataFrame:
     if df.empty:
         df["avwap"] = []
         return df
-    anc_t = time.fromisoformat(anchor)
-    after_anchor = df["et"].dt.time >= anc_t
-    df["pv_a"] = df["c"] * df["v"] * after_anchor
-    df["v_a"] = df["v"] * after_anchor
-    g = df.groupby("symbol", as_index=False, sort=False)
+    after_anchor = et_time_of_day_ns(df["et"]) >= time_to_ns(anchor)  # 何をする行？：.dt.time（行ごとのPythonオブジェクト）を使わず整数比較
+    df["pv_a"] = df["c"].astype("float64") * df["v"].astype("float64") * after_anchor
+    df["v_a"] = df["v"].astype("float64") * after_anchor
+    g = df.groupby("symbol", as_index=False, sort=False, observed=True)
     df["cum_pv_a"] = g["pv_a"].cumsum()
     df["cum_v_a"] = g["v_a"].cumsum()
     df["avwap"] = df["cum_pv_a"] / df["cum_v_a"]
     return df.drop(columns=["pv_a", "v_a", "cum_pv_a", "cum_v_a"])
 
-def _compute_orb_5m(df: pd.DataFrame) -> pd.DataFrame:
+def _compute_rvol(df: pd.DataFrame, profile) -> pd.DataFrame:
     """
-    何をする関数？：**9:30–9:35（ET）の5本**で ORB 高値/安値を計算し、銘柄ごとの1行サマリを返します。  :contentReference[oaicite:9]{index=9}
-    戻り値：symbol, orb_high, orb_low
+    何をする関数？：時刻別の出来高プロファイル（indicators.volprofile）で、各バーの RVOL を 'rvol' 列に追加します。
+    RVOL = 寄り（09:30 ET）からそのバーまでのレギュラー時間の累積出来高 ÷ ふだんのその時刻までの累積（寄り前・表に無い銘柄は NaN）。
+    profile が None なら何もしません（列も足さない）。
+    """
+    if profile is None:
+        return df
+    if df.empty:
+        df["rvol"] = []
+        return df
+    from rh_pdc_daytrade.indicators.volprofile import session_minute, SESSION_MINUTES  # 関数内だけで使うためここでインポート
+    minute = session_minute(df["et"])
+    df["v_r"] = df["v"].astype("float64") * ((minute >= 0) & (minute < SESSION_MINUTES))
+    cum_v_r = df.groupby("symbol", as_index=False, sort=False, observed=True)["v_r"].cumsum()
+    df["rvol"] = profile.rvol_array(df["symbol"].astype(str).to_numpy(), minute, cum_v_r.to_numpy())
+    return df.drop(columns=["v_r"])
+
+def _extra_indicators(cfg: dict) -> list[str]:
+    """何をする関数？：config の indicators.extra（ema9, atr14, hod, hh20 …）を返します（無ければ空＝従来どおりの列だけ）。"""
+    return [str(x) for x in ((cfg.get("indicators", {}) or {}).get("extra") or [])]
+
+def _compute_extra(df: pd.DataFrame, names: list[str]) -> pd.DataFrame:
+    """
+    何をする関数？：EMA・Wilder ATR・当日高値/安値・直近 N 本の高値/安値（indicators.streaming のバッチ版）を列として追加します。
+    塊ごとの処理（_run_chunked）ではストリーミング版で同じ値を付けます。
+    """
+    if not names:
+        return df
+    from rh_pdc_daytrade.indicators.streaming import batch_indicators  # 関数内だけで使うためここでインポート
+    return df.join(batch_indicators(df, names))
+
+def _compute_orb(df: pd.DataFrame, minutes: int = 5) -> pd.DataFrame:
+    """
+    何をする関数？：**9:30 から minutes 分（ET、config の strategy.orb_minutes。既定5＝9:30–9:35）**で ORB 高値/安値を計算し、
+    銘柄ごとの1行サマリを返します。  :contentReference[oaicite:9]{index=9}
+    戻り値：symbol, orb_high, orb_low（窓を並べて比べるときは indicators.variants.orb_windows）
     """
     if df.empty:
         return pd.DataFrame(columns=["symbol", "orb_high", "orb_low"])
-    t = df["et"].dt.time
-    m = (t >= time(9, 30)) & (t < time(9, 35))
+    m = orb_window_mask(df["et"], minutes=minutes)  # 何をする行？：9:30 から N 分を整数比較の配列マスクで判定
     base = df.loc[m, ["symbol", "h", "l"]]
     if base.empty:
         return pd.DataFrame(columns=["symbol", "orb_high", "orb_low"])
-    agg = base.groupby("symbol").agg(orb_high=("h", "max"), orb_low=("l", "min")).reset_index()
+    agg = base.groupby("symbol", observed=True).agg(orb_high=("h", "max"), orb_low=("l", "min")).reset_index()
     return agg
 
-def _save_outputs(df_1m: pd.DataFrame, summary: pd.DataFrame) -> tuple[Path, Path]:
+@timer("stage_seconds", stage="save_outputs")
+def _save_outputs(df_1m: pd.DataFrame, summary: pd.DataFrame, extra: list[str] | tuple = ()) -> tuple[Path, Path]:
     """
     何をする関数？：
       - 計算した 1分バー（VWAP/AVWAP付き）と、銘柄ごとの ORB/VWAP/AVWAP の**当日スナップショット**を保存します。
       - 保存先：data/bars/bars_1m_YYYYMMDD.parquet / indicators_YYYYMMDD.parquet（CSVも同名で保存）。  :contentReference[oaicite:10]{index=10}
     """
+    computed_ns = now_ns()  # 何をする行？：指標を計算し終えた時刻（保存の前。バー→発注の遅れトレース：utils/latency.py）
     et_date = df_1m["et"].dt.date.min().strftime("%Y%m%d")  # 何をする行？：保存ファイルの日付を“実際に読み込んだバーのET日付”に合わせる
     out_dir = Path("data") / "bars"
     out_dir.mkdir(parents=True, exist_ok=True)
 
     # 1分バー
     p1 = out_dir / f"bars_1m_{et_date}.parquet"
-    write_parquet(df_1m, p1)
+    write_parquet(df_1m, p1, compact=True)  # 何をする行？：コンパクト列型（utils.io.BAR_DTYPES）で保存
 
     # スナップショット（銘柄×1行：最新の vwap/avwap と ORB）
     latest = (df_1m.sort_values(["symbol", "et"])
-                    .groupby("symbol")
-                    .tail(1)[["symbol", "vwap", "avwap"]])
+                    .groupby("symbol", observed=True)
+                    .tail(1)[["symbol", "vwap", "avwap", *[c for c in ("rvol", *extra) if c in df_1m.columns]]])
     snap = latest.merge(summary, on="symbol", how="left")
+    snap["computed_ns"] = computed_ns
     p2 = out_dir / f"indicators_{et_date}.parquet"
-    write_parquet(snap, p2)
+    write_parquet(snap, p2, compact=True)
     # 人が見る用に CSV も保存
     write_csv(df_1m, out_dir / f"bars_1m_{et_date}.csv")
     write_csv(snap,  out_dir / f"indicators_{et_date}.csv")
     return p1, p2
 
+def _chunk_rows(p: Path) -> int:
+    """
+    何をする関数？：
+      - 塊ごとの処理（bounded memory）にするときの1塊の行数を返します（0 = 従来どおり1日分をまとめて処理）。
+      - 環境変数 BARS_CHUNK_ROWS（行数）を優先し、無ければ NDJSON が BARS_CHUNK_AUTO_MB（既定 512MB）を超えたら 200,000 行。
+    """
+    rows = os.environ.get("BARS_CHUNK_ROWS", "").strip()
+    if rows.isdigit():
+        return int(rows)
+    auto_mb = os.environ.get("BARS_CHUNK_AUTO_MB", "512").strip()
+    try:
+        if p.exists() and auto_mb.isdigit() and p.stat().st_size > int(auto_mb) * 1024 * 1024:
+            return 200_000
+    except OSError:
+        pass
+    return 0
+
+def _load_profile():
+    """何をする関数？：時刻別の出来高プロファイル（scripts/build_volume_profile.py が夜に作る）を読みます。無ければ None（rvol 列は付かない）。"""
+    from rh_pdc_daytrade.indicators.volprofile import load_profile  # 関数内だけで使うためここでインポート
+    prof = load_profile()
+    if prof is None:
+        logger.info("volume profile not found; rvol column skipped")
+    return prof
+
+def _run_chunked(p: Path, cfg: dict, chunk_rows: int, out_dir: Path | None = None) -> tuple[Path, Path] | None:
+    """
+    何をする関数？：
+      - NDJSON を chunk_rows 行ずつ読み（store.ndjson）、VWAP/AVWAP/ORB の状態を塊をまたいで引き継ぎながら計算し
+        （indicators.chunked）、確定した行から bars_1m_YYYYMMDD.parquet / .csv へ追記します。
+      - 出力ファイル・列・型は _save_outputs と同じです（1分バーは (銘柄, t) 順の塊が時刻順に並ぶ。symbol は category）。
+        遅れトレース列（ws_recv_ns / persisted_ns）は、NDJSON の最初と最後のバーのどちらにも rt/pt が無ければ持ちません
+        （_read_bars_ndjson が全部欠損の列を落とすのと同じ。1日分を読まずに先頭と末尾だけで決める）。
+      - p が無いときは _read_bars_ndjson と同じ規則（_resolve_ndjson_path）で最新の bars に切り替えます。
+      - 1日分を DataFrame に載せないので、ピークのメモリはファイルの大きさに依らず、塊の大きさと保留分（最新から数分ぶん）で決まります。
+    戻り値：(bars_1m の Path, indicators の Path)。バーが1本も無ければ None。
+    """
+    from rh_pdc_daytrade.store.ndjson import iter_bar_batches     # 関数内だけで使うためここでインポート
+    from rh_pdc_daytrade.indicators.chunked import ChunkedIndicators
+    from rh_pdc_daytrade.utils.io import ParquetAppender
+
+    p = _resolve_ndjson_path(p)
+    if p is None:
+        return None
+    edges = _edge_messages(p) or ()
+    no_trace = [col for col, key in (("ws_recv_ns", "rt"), ("persisted_ns", "pt"))
+                if all(m.get(key) is None for m in edges)]  # 何をする行？：トレースが無いファイルでは列ごと持たない
+    strat = cfg.get("strategy", {}) or {}
+    ci = ChunkedIndicators(anchor=strat.get("avwap_anchor", "09:30:00"), orb_minutes=int(strat.get("orb_minutes", 5)),
+                           settle_minutes=int(os.environ.get("BARS_SETTLE_MINUTES", "15") or 15),
+                           profile=_load_profile(), extra=_extra_indicators(cfg))
+    out_dir = out_dir or Path("data") / "bars"
+    out_dir.mkdir(parents=True, exist_ok=True)
+    w, p_csv, et_date = None, None, None
+
+    def _emit(part: pd.DataFrame) -> None:
+        nonlocal w, p_csv, et_date
+        if part.empty:
+            return
+        part = part.drop(columns=no_trace, errors="ignore")
+        if w is None:
+            et_date = part["et"].dt.date.min().strftime("%Y%m%d")  # 何をする行？：最初に確定した（＝最も早い）バーのET日付
+            w = ParquetAppender(out_dir / f"bars_1m_{et_date}.parquet")
+            p_csv = out_dir / f"bars_1m_{et_date}.csv"
+            p_csv.unlink(missing_ok=True)
+        w.append(part)
+        part.to_csv(p_csv, mode="a", header=not p_csv.exists(), index=False, encoding="utf-8")
+
+    logger.info(f"reading bars ndjson in chunks of {chunk_rows} rows: {p}")
+    with timer("stage_seconds", stage="chunked_indicators"):
+        for chunk in iter_bar_batches(p, batch_rows=chunk_rows):
+            _emit(ci.push(chunk))
+        _emit(ci.finish())
+    if w is None:
+        return None
+    p1 = w.close()
+    st = ci.stats()
+    incr("bars_loaded", st["rows_in"])
+    incr("bars_duplicate_dropped", st["dups"])
+    incr("bars_corrected", st["updates"])
+    logger.info("chunked: rows_in={} rows_out={} dups={} corrections={} late={}",
+                st["rows_in"], st["rows_out"], st["dups"], st["updates"], st["late"])
+
+    snap = ci.summary()
+    snap["computed_ns"] = now_ns()  # 何をする行？：_save_outputs と同じく、指標を計算し終えた時刻
+    p2 = out_dir / f"indicators_{et_date}.parquet"
+    write_parquet(snap, p2, compact=True)
+    write_csv(snap, out_dir / f"indicators_{et_date}.csv")
+    return p1, p2
+
 def main() -> int:
     """
     何をする関数？：
@@ -239,6 +426,7 @@ def main() -> int:
     load_dotenv_if_exists()
     logfile = configure_logging()
     cfg = load_config()
+    init_run_metrics("compute_indicators")  # 何をする行？：終了時に段ごとの時間を data/metrics/ へ保存
     logger.info("compute_indicators: start (logfile={})", logfile)
 
     stream_dir = os.environ.get("STREAM_DIR") or os.path.join("data", "stream")
@@ -343,17 +531,49 @@ def main() -> int:
     # ここでは NDJSON 内のシンボルで自動的に絞られるため、空でもOK。
     ndjson_path = _bars_ndjson_path("bars")
     # symbols は空にして「ファイル内の全銘柄」を対象に（将来は cfg のA/Bに合わせて渡せます）
-    df = _read_bars_ndjson(ndjson_path, symbols=[])
+    src_path, src_kind = _pick_bars_input(ndjson_path)  # 何をする行？：既定は NDJSON。BARS_READ_BINARY=1 かつ .bin が NDJSON を全部含むときだけ .bin
+    if src_kind == "ndjson":
+        src_path = _resolve_ndjson_path(src_path)  # 何をする行？：当日分が無ければ最新の bars へ（塊ごとでも1日分でも同じ規則）
+        if src_path is None:
+            logger.info("bars loaded: rows=0 symbols=0")
+            return 0
+    chunk_rows = 0 if src_kind == "bin" else _chunk_rows(src_path)
+    if chunk_rows > 0:
+        # 何をするブロック？：巨大な NDJSON は塊ごとに処理し、確定した行から追記保存する（メモリを一定に保つ）
+        res = _run_chunked(src_path, cfg, chunk_rows)
+        if res is None:
+            logger.info("bars loaded: rows=0 (chunked)")
+            return 0
+        logger.info("indicators saved: {} , {}", *res)
+        return 0
+    if src_kind == "bin":
+        from rh_pdc_daytrade.store.barstream import read_bars_bin  # 何をする関数？：memmapでパース無しに1日分を読む
+        logger.info(f"reading bars binary: {src_path} (no ws_recv_ns/persisted_ns trace columns)")
+        with timer("stage_seconds", stage="read_bars_bin"):
+            df = read_bars_bin(src_path)
+    else:
+        with timer("stage_seconds", stage="read_bars_ndjson"):
+            df = _read_bars_ndjson(src_path, symbols=[])
+    incr("bars_loaded", len(df))
     logger.info(f"bars loaded: rows={len(df)} symbols={(0 if df.empty else df['symbol'].nunique())}")  # 何をする行？：読み込んだ行数と銘柄数を表示して“受信不足”をすぐ判定できるようにする
 
 
     if df.empty:
         return 0  # 市場時間外は bars が0でも正常（Runbookの想定）  :contentReference[oaicite:12]{index=12}
 
-    df = _compute_vwap(df)
-    df = _compute_avwap(df, anchor=cfg.get("strategy", {}).get("avwap_anchor", "09:30:00"))
-    orb = _compute_orb_5m(df)
-    p1, p2 = _save_outputs(df, orb)
+    with timer("stage_seconds", stage="vwap"):
+        df = _compute_vwap(df)
+    with timer("stage_seconds", stage="avwap"):
+        df = _compute_avwap(df, anchor=cfg.get("strategy", {}).get("avwap_anchor", "09:30:00"))
+    with timer("stage_seconds", stage="rvol"):
+        df = _compute_rvol(df, _load_profile())
+    extra = _extra_indicators(cfg)
+    if extra:
+        with timer("stage_seconds", stage="extra_indicators"):
+            df = _compute_extra(df, extra)
+    with timer("stage_seconds", stage="orb"):
+        orb = _compute_orb(df, minutes=int(cfg.get("strategy", {}).get("orb_minutes", 5)))
+    p1, p2 = _save_outputs(df, orb, extra=extra)
     logger.info("indicators saved: {} , {}", p1, p2)
     return 0
 
@@ -1,8 +1,9 @@
-# 紙の約定ログ（data/logs/executions.csv）から当日分を集計し、kpi_daily.csv に upsert します。
-# 役割：ランブックの「ログ→日次KPI」フローの最小実装（当日ぶんを1行で更新）。  :contentReference[oaicite:3]{index=3}
+# 紙の約定ログ（data/logs/executions/ の月次ストア）から当日分を集計し、KPIストア（kpi.sqlite）に upsert します。
+# 役割：ランブックの「ログ→日次KPI」フロー（当日ぶんを1行で更新し、累積R/DD・年初来ロールアップも増分で更新）。  :contentReference[oaicite:3]{index=3}
 
 from __future__ import annotations
 from pathlib import Path                # 入出力パスの扱い
+import argparse                         # --export-csv の受け取り
 import pandas as pd                     # CSVの読込と集計に使う
 from loguru import logger               # ログ（data/logs/bot.log へ集約）
 
@@ -11,16 +12,18 @@ from rh_pdc_daytrade.utils.logutil import configure_logging        # 何をす
 from rh_pdc_daytrade.utils.configutil import load_config           # 何をする関数？：config.yaml を読む（将来の閾値参照）  :contentReference[oaicite:6]{index=6}
 from rh_pdc_daytrade.utils.timeutil import get_et_tz              # 何をする関数？：ETタイムゾーンで“きょう”を決める  :contentReference[oaicite:7]{index=7}
 from datetime import datetime                                     # 当日ET日付の決定に使う
+from rh_pdc_daytrade.store.executions import store_dir, read_executions, read_strategy  # 何をする関数？：月次ストアから当日分だけ読む
+from rh_pdc_daytrade.store.kpi import upsert_day, setup_day_stats, rollup, append_daily_csv, export_daily_csv  # 何をする関数？：KPIの増分upsertと期間ロールアップ
 
 def _paths() -> tuple[Path, Path]:
     """
     何をする関数？：
-      - 約定ログCSV（executions.csv）と、出力KPI（kpi_daily.csv）のパスを返します。
+      - 約定ログの月次ストア置き場（data/logs/executions/）と、出力KPI（kpi_daily.csv）のパスを返します。
       - 置き場所はランブック準拠（data/logs/）。  :contentReference[oaicite:8]{index=8}
     """
     logs = Path("data") / "logs"
     logs.mkdir(parents=True, exist_ok=True)
-    return (logs / "executions.csv", logs / "kpi_daily.csv")
+    return (store_dir(logs / "executions"), logs / "kpi_daily.csv")
 
 def _today_et_str() -> str:
     """何をする関数？：ETの“きょう”を YYYYMMDD 文字列で返します。"""
@@ -29,17 +32,13 @@ def _today_et_str() -> str:
 def _read_today_executions(p_exec: Path) -> pd.DataFrame:
     """
     何をする関数？：
-      - executions.csv があれば読み、当日（ET）の行だけを返します。
+      - 月次ストアから当日（ET）の行だけを date 索引で読み出します（過去の履歴は読みません）。
       - 列が足りない場合（qty等）はここで追加し、以降の集計が止まらないようにします。  
     """
-    if not p_exec.exists():
-        logger.info("daily_kpi: executions.csv が見つかりません（初回/未約定の可能性）")
-        return pd.DataFrame(columns=[
-            "date","timestamp_et","symbol","setup","entry_type","qty","entry_price","tp_price","sl_price","notes"
-        ])
-    df = pd.read_csv(p_exec)
     today = _today_et_str()
-    df = df[df["date"].astype(str) == today].copy()
+    df = read_executions(today, root=p_exec)
+    if df.empty:
+        logger.info("daily_kpi: {} の約定ログがありません（初回/未約定の可能性）", today)
     # 無い列は追加（0/空）しておく
     for col, default in (("qty", 0), ("entry_price", None), ("tp_price", None), ("sl_price", None)):
         if col not in df.columns:
@@ -101,63 +100,55 @@ def _compute_kpi_today(df: pd.DataFrame) -> dict:
     }
 
 
-def _upsert_kpi_row(row: dict, p_kpi: Path) -> Path:
+def _upsert_kpi_row(row: dict, setup_rows: list[dict], p_kpi: Path) -> Path:
     """
     何をする関数？：
-      - 既存の kpi_daily.csv を読み（date列は**文字列**で統一）、
-        同じ日付の行を一度削除 → 今回の1行を追加 → 日付で昇順ソートして保存します。
-      - 空DataFrameとのconcatで将来のWarningが出ないよう、空のときはconcatを使わずにそのまま代入します。  :contentReference[oaicite:1]{index=1}
+      - 当日の1行とセットアップ別集計を KPIストア（data/logs/kpi.sqlite）に upsert します（既存行は読み直しません）。
+        ストア導入前の kpi_daily.csv の履歴は、ストアを初めて開いたときに一度だけ取り込まれます（store.kpi.connect）。
+      - 人が見る用の kpi_daily.csv には当日行を1行だけ追記します（同じ日の再実行や旧形式のCSVのときだけ全量を書き出し直す）。
     """
-    cols = ["date","trades","setup_A","setup_B","avg_entry_price","avg_tp_pct","avg_sl_pct","avg_qty","total_risk_usd"]
-
-    if p_kpi.exists():
-        df = pd.read_csv(p_kpi, dtype={"date": str})  # 何をする行？：dateを必ず文字列として読む
-        # 無い列は追加してから並びを固定（後方互換のため）
-        for c in cols:
-            if c not in df.columns:
-                df[c] = None
-        df = df[cols]
-        # 同日行を除外（文字列比較で安全）
-        df = df[df["date"].astype(str) != str(row["date"])].copy()
-    else:
-        df = pd.DataFrame(columns=cols)
-
-    # 追加する1行をDataFrame化（列を揃え、dateは文字列で統一）
-    new_row = {c: row.get(c, None) for c in cols}
-    new_row["date"] = str(new_row["date"])
-    df_new = pd.DataFrame([new_row], columns=cols)
-
-    # 空のときはconcatを避けて将来の仕様変更に備える
-    if df.empty:
-        out_df = df_new
-    else:
-        out_df = pd.concat([df, df_new], ignore_index=True)
-
-    # 8桁YYYYMMDDの文字列として並び替え（辞書順＝日付順）
-    out_df["date"] = out_df["date"].astype(str)
-    out_df = out_df.sort_values("date")
-
-    out_df.to_csv(p_kpi, index=False)
+    stored = upsert_day(row, setup_rows, root=p_kpi.parent)
+    how = append_daily_csv(stored, p_kpi, root=p_kpi.parent)
+    logger.info("daily_kpi: kpi_daily.csv {}", "1行追記" if how == "append" else "全量を書き出し直し")
     return p_kpi
 
+def _log_ytd(today: str, p_kpi: Path) -> None:
+    """何をする関数？：年初来のロールアップ（セットアップ別勝率・平均R・最大DD・累積リスク）をログに1ブロックで出します。"""
+    ru = rollup(today[:4] + "0101", today, root=p_kpi.parent)
+    logger.info("daily_kpi: YTD days={} total_R={:.2f} maxDD_R={:.2f} risk_usd={:.0f}",
+                ru["days"], ru["total_R"], ru["max_drawdown_R"], ru["risk_usd"])
+    for rec in ru["by_setup"].to_dict(orient="records"):
+        logger.info("daily_kpi: YTD setup={} trades={} closed={} win_rate={} avg_R={}",
+                    rec.get("setup"), rec.get("trades"), rec.get("closed_trades"),
+                    rec.get("win_rate"), rec.get("avg_R"))
 
 
 def main() -> int:
     """
     何をする関数？：
-      - .env → ログ → config を読み、当日の executions.csv を集計して kpi_daily.csv に upsert します。
+      - .env → ログ → config を読み、当日の約定ログを集計して KPIストアに upsert し、kpi_daily.csv を書き出します。
       - 入力なし（0件）でも正常終了（運用フロー上、signalsが無い日はあり得ます）。  :contentReference[oaicite:12]{index=12}
     使い方：
       poetry run python scripts/daily_kpi.py
+      poetry run python scripts/daily_kpi.py --export-csv   # KPIストアの全期間を kpi_daily.csv に書き出すだけ
     """
+    ap = argparse.ArgumentParser(description="Aggregate today's executions into the KPI store.")
+    ap.add_argument("--export-csv", action="store_true", help="集計はせず、KPIストアの全期間を kpi_daily.csv に書き出す")
+    args = ap.parse_args()
+
     load_dotenv_if_exists()
     logfile = configure_logging()
     load_config()  # いまは閾値未使用でも、将来の拡張に備えて読み込んでおく  :contentReference[oaicite:13]{index=13}
 
     p_exec, p_kpi = _paths()
+    if args.export_csv:
+        logger.info("daily_kpi: exported => {}", export_daily_csv(p_kpi, root=p_kpi.parent))
+        return 0
     df_today = _read_today_executions(p_exec)
     row = _compute_kpi_today(df_today)
-    out = _upsert_kpi_row(row, p_kpi)
+    setup_rows = setup_day_stats(row["date"], df_today, read_strategy(row["date"], root=p_exec))  # 何をする行？：実現R（EXIT記録済み分）も当日分だけで集計
+    out = _upsert_kpi_row(row, setup_rows, p_kpi)
+    _log_ytd(row["date"], p_kpi)
     logger.info("daily_kpi: {} のKPIを更新しました（logfile={}）", row["date"], logfile)
     logger.info("daily_kpi: output => {}", out)
     return 0
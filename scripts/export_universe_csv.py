@@ -124,11 +124,9 @@ def _fetch_russell2000_from_ishares() -> list[str]:
 
 def _latest_eod_file(eod_dir: str) -> Path | None:
     # 何をする関数か：EOD_DIR から最新の eod_features_*.parquet / .csv を見つける
-    d = Path(eod_dir)
-    cands = list(d.glob("eod_features_*.parquet")) + list(d.glob("eod_features_*.csv"))
-    if not cands:
-        return None
-    return max(cands, key=lambda p: p.stat().st_mtime)
+    #   data/eod/latest.json（nightly_screen が書くマニフェスト）を優先し、無ければ glob して最終更新が最新のもの
+    from rh_pdc_daytrade.store.refdata import latest_eod_features_path  # 関数内だけで使うためここでインポート
+    return latest_eod_features_path(eod_dir)
 
 
 def _load_eod_df(path: Path):
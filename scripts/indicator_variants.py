@@ -0,0 +1,90 @@
+# 保存済みの 1分足（bars_1m_YYYYMMDD.parquet）から、ORB の窓と AVWAP のアンカーを何通りも1回で計算して
+# 横長の表（銘柄 × orb_high_{w} / orb_low_{w} / avwap_{キー} / anchor_{キー}）に保存する研究用スクリプトです。
+# 目的：窓（1/5/15/30 分）やアンカー（09:30・プレマーケット高値・PDC を横切った時刻・任意の時刻）を取り替えて比べるときに、
+#       組み合わせごとに compute_indicators を回し直さない（indicators.variants）。
+# 使い方：
+#   poetry run python scripts/indicator_variants.py --date 20250909
+#   poetry run python scripts/indicator_variants.py --dir data/archive/bars --date 20250909 --windows 1 5 15 30 60 \
+#       --anchors 09:30 premarket_high pdc_cross 10:00 --bars
+
+from __future__ import annotations
+from pathlib import Path        # 入出力パス
+from datetime import date
+import argparse                 # 日付・窓・アンカーの指定
+import pandas as pd
+from loguru import logger
+
+from rh_pdc_daytrade.utils.envutil import load_dotenv_if_exists  # 何をする関数？：.envを先に読む
+from rh_pdc_daytrade.utils.logutil import configure_logging       # 何をする関数？：ログ初期化（冪等）
+from rh_pdc_daytrade.utils.configutil import load_config          # 何をする関数？：strategy.orb_minutes / avwap_anchor の既定
+from rh_pdc_daytrade.utils.io import read_parquet, write_parquet, write_csv
+from rh_pdc_daytrade.indicators.variants import variant_snapshot, avwap_anchors, DEFAULT_WINDOWS, DEFAULT_ANCHORS
+
+def _previous_close(bars_dir: Path, day: date) -> pd.Series | None:
+    """
+    何をする関数？：PDC（前営業日の終値）を {銘柄: 値} で返します。
+      前営業日の bars_1m（同じフォルダ）のレギュラー時間の最後の終値を優先し、無ければ最新の EOD 特徴量の pdc を使います。
+    """
+    from rh_pdc_daytrade.utils.market_calendar import get_calendar      # 関数内だけで使うためここでインポート
+    from rh_pdc_daytrade.utils.timeutil import et_minute_of_day
+    from rh_pdc_daytrade.store.refdata import latest_eod_features
+    prev = bars_dir / f"bars_1m_{get_calendar().previous_session(day):%Y%m%d}.parquet"
+    if prev.exists():
+        df = read_parquet(prev, columns=["symbol", "et", "c"], compact=False)
+        df = df[et_minute_of_day(df["et"]) < 16 * 60].sort_values("et", kind="mergesort")
+        last = df.groupby(df["symbol"].astype(str), observed=True).tail(1)
+        return pd.Series(last["c"].to_numpy(), index=last["symbol"].astype(str).to_numpy())
+    eod = latest_eod_features()
+    if eod is not None and not eod.empty and "pdc" in eod.columns:
+        return eod.set_index(eod["symbol"].astype(str))["pdc"]
+    return None
+
+def main() -> int:
+    """
+    何をする関数？：
+      - 1日ぶんの 1分足を読み、全窓の ORB と全アンカーの AVWAP（最新値とアンカー時刻）を銘柄ごとの表にして保存します。
+      - --bars を付けると、各バーの AVWAP（avwap_{キー} 列）を足した 1分足も保存します。
+    """
+    ap = argparse.ArgumentParser(description="Compute ORB for many windows and AVWAP for many anchors in one pass.")
+    ap.add_argument("--date", required=True, help="ET 日付 YYYYMMDD")
+    ap.add_argument("--dir", default="data/bars", help="bars_1m_YYYYMMDD.parquet のあるフォルダ")
+    ap.add_argument("--windows", type=int, nargs="+", default=None,
+                    help="ORB の窓（分）。既定 1 5 15 30 と strategy.orb_minutes")
+    ap.add_argument("--anchors", nargs="+", default=None,
+                    help="AVWAP のアンカー（HH:MM / premarket_high / pdc_cross / 'YYYY-mm-dd HH:MM'）。既定 strategy.avwap_anchor と premarket_high, pdc_cross")
+    ap.add_argument("--out", default=None, help="保存先フォルダ（既定 data/research）")
+    ap.add_argument("--bars", action="store_true", help="各バーの AVWAP を足した 1分足も保存する")
+    args = ap.parse_args()
+
+    load_dotenv_if_exists()
+    configure_logging()
+    strat = load_config().get("strategy", {}) or {}
+    windows = args.windows or sorted({*DEFAULT_WINDOWS, int(strat.get("orb_minutes", 5))})
+    anchors = args.anchors or list(dict.fromkeys([str(strat.get("avwap_anchor", "09:30"))[:5], *DEFAULT_ANCHORS[1:]]))
+    bars_dir = Path(args.dir)
+    p = bars_dir / f"bars_1m_{args.date}.parquet"
+    if not p.exists():
+        logger.warning("indicator_variants: not found: {}", p)
+        return 1
+    df = read_parquet(p, columns=["symbol", "et", "o", "h", "l", "c", "v"], compact=False)
+    pdc = _previous_close(bars_dir, date(int(args.date[:4]), int(args.date[4:6]), int(args.date[6:])))
+    if pdc is None and any(str(a).lower() in ("pdc_cross", "pdc") for a in anchors):
+        logger.warning("indicator_variants: no previous close found; pdc_cross anchor dropped")
+        anchors = [a for a in anchors if str(a).lower() not in ("pdc_cross", "pdc")]
+
+    snap = variant_snapshot(df, windows=windows, anchors=anchors, pdc=pdc)
+    out_dir = Path(args.out or Path("data") / "research")
+    out_dir.mkdir(parents=True, exist_ok=True)
+    p_snap = out_dir / f"indicator_variants_{args.date}.parquet"
+    write_parquet(snap, p_snap)
+    write_csv(snap, p_snap.with_suffix(".csv"))
+    logger.info("indicator_variants: {} symbols, windows={} anchors={} -> {}", len(snap), windows, anchors, p_snap)
+    if args.bars:
+        wide, _ = avwap_anchors(df, anchors, pdc=pdc)
+        p_bars = out_dir / f"bars_1m_variants_{args.date}.parquet"
+        write_parquet(pd.concat([df, wide], axis=1), p_bars)
+        logger.info("indicator_variants: per-bar AVWAP -> {}", p_bars)
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,47 @@
+# KPIストア（data/logs/kpi.sqlite）から、任意期間（既定：年初来）のロールアップを表示するスクリプトです。
+# 日次行を合計するだけなので、約定ログを読み直さずに即座に出ます。
+
+from __future__ import annotations
+from pathlib import Path   # KPIストアの場所
+from datetime import datetime
+import argparse            # 期間指定の受け取り
+
+from rh_pdc_daytrade.utils.timeutil import get_et_tz   # 何をする関数？：ETの“きょう”を決める
+from rh_pdc_daytrade.store.kpi import rollup, R_BIN_COLUMNS, R_BIN_EDGES  # 何をする関数？：期間ロールアップ
+
+def _bin_labels() -> list[str]:
+    """何をする関数？：R分布ビンの見出し（例：'<-1', '-1..0', ...）を作ります。"""
+    e = R_BIN_EDGES
+    return [f"<{e[0]:g}"] + [f"{a:g}..{b:g}" for a, b in zip(e[:-1], e[1:])] + [f">={e[-1]:g}"]
+
+def main() -> int:
+    """
+    何をする関数？：
+      - --start/--end（YYYYMMDD）の期間でロールアップを計算し、標準出力に表示します。
+    使い方：
+      poetry run python scripts/kpi_report.py                 # 年初来
+      poetry run python scripts/kpi_report.py --start 20250101 --end 20250630
+    """
+    today = datetime.now(get_et_tz()).strftime("%Y%m%d")
+    ap = argparse.ArgumentParser(description="Print KPI rollups from the KPI store.")
+    ap.add_argument("--start", default=today[:4] + "0101", help="開始日 YYYYMMDD（既定：年初）")
+    ap.add_argument("--end", default=today, help="終了日 YYYYMMDD（既定：きょう）")
+    ap.add_argument("--logs-dir", default=str(Path("data") / "logs"), help="kpi.sqlite の置き場所")
+    args = ap.parse_args()
+
+    ru = rollup(args.start, args.end, root=args.logs_dir)
+    print(f"period {args.start}..{args.end}  days={ru['days']}  total_R={ru['total_R']:.2f}  "
+          f"max_drawdown_R={ru['max_drawdown_R']:.2f}  risk_usd={ru['risk_usd']:.0f}")
+    by = ru["by_setup"]
+    if by.empty:
+        print("(no trades)")
+        return 0
+    labels = _bin_labels()
+    for rec in by.to_dict(orient="records"):
+        dist = " ".join(f"{lab}:{int(rec[c] or 0)}" for lab, c in zip(labels, R_BIN_COLUMNS))
+        print(f"setup={rec['setup'] or '-'} trades={int(rec['trades'] or 0)} closed={int(rec['closed_trades'] or 0)} "
+              f"win_rate={rec['win_rate']} avg_R={rec['avg_R']} std_R={rec['std_R']} risk_usd={rec['risk_usd']:.0f} | R {dist}")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,72 @@
+# バー→発注の“区間ごとの遅れ”を、1セッション（ET日付）ぶん分位点で集計するレポートです。
+# 入力：約定ログの月次ストア（executions の bar_t_ns … order_ns 列）。発注まで進まなかったシグナルも見たいときは
+#       --source signals で data/signals/（sent/・failed/ を含む）のシグナルJSONの "trace" を読みます。
+# 区間の定義は utils/latency.py の HOPS（bar_close→受信→保存→指標→シグナル→発注）です。
+
+from __future__ import annotations
+from pathlib import Path                # 入出力パス
+from datetime import datetime           # 既定の対象日（ETのきょう）
+import argparse                         # 対象日・入力元の指定
+import orjson
+import pandas as pd
+from loguru import logger
+
+from rh_pdc_daytrade.utils.envutil import load_dotenv_if_exists   # 何をする関数？：.envを先に読む
+from rh_pdc_daytrade.utils.logutil import configure_logging        # 何をする関数？：ログ初期化（冪等）
+from rh_pdc_daytrade.utils.timeutil import get_et_tz              # 何をする関数？：ETの“きょう”を決める
+from rh_pdc_daytrade.utils.latency import STAMPS, hop_latencies_ms, percentile_table, trace_columns
+from rh_pdc_daytrade.store.executions import store_dir, read_executions  # 何をする関数？：月次ストアから当日分だけ読む
+
+def _from_signals(date: str, base: Path) -> pd.DataFrame:
+    """何をする関数？：data/signals/**/{date}__*.json の "trace" を *_ns 列の表にします（trace の無い古いJSONは飛ばす）。"""
+    rows = []
+    for p in sorted(base.rglob(f"{date}__*.json")):
+        try:
+            sig = orjson.loads(p.read_bytes())
+        except Exception:
+            continue
+        if isinstance(sig, dict) and isinstance(sig.get("trace"), dict):
+            rows.append({"symbol": sig.get("symbol"), "setup": sig.get("setup"), **trace_columns(sig["trace"])})
+    return pd.DataFrame(rows, columns=["symbol", "setup", *[f"{k}_ns" for k in STAMPS]])
+
+def main() -> int:
+    """
+    何をする関数？：
+      - 対象日の遅れトレースを読み、区間ごとの件数・p50/p90/p95/p99/最大（ms）を表示します（--out で JSON 保存）。
+    使い方：
+      poetry run python scripts/latency_report.py                 # ETのきょう（約定ログ）
+      poetry run python scripts/latency_report.py --date 20250909 --source signals
+    """
+    ap = argparse.ArgumentParser(description="Per-hop bar-to-order latency percentiles for one session.")
+    ap.add_argument("--date", default=None, help="対象日 YYYYMMDD（既定：ETのきょう）")
+    ap.add_argument("--source", choices=["executions", "signals"], default="executions", help="トレースの読み元")
+    ap.add_argument("--out", default=None, help="結果JSONの保存先")
+    args = ap.parse_args()
+
+    load_dotenv_if_exists()
+    logfile = configure_logging()
+    date = args.date or datetime.now(get_et_tz()).strftime("%Y%m%d")
+
+    if args.source == "executions":
+        df = read_executions(date, root=store_dir(Path("data") / "logs" / "executions"))
+    else:
+        df = _from_signals(date, Path("data") / "signals")
+    traced = df[[c for c in df.columns if c.endswith("_ns")]].notna().any(axis=1) if not df.empty else pd.Series([], dtype=bool)
+    df = df[traced]
+    if df.empty:
+        logger.info("latency_report: no traced rows for {} in {} (logfile={})", date, args.source, logfile)
+        return 0
+
+    table = percentile_table(hop_latencies_ms(df))
+    with pd.option_context("display.float_format", "{:,.1f}".format, "display.width", 160):
+        print(f"date={date} source={args.source} rows={len(df)}")
+        print(table.to_string(index=False))
+    logger.info("latency_report: {} rows for {} ({})", len(df), date, args.source)
+    if args.out:
+        Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+        doc = {"date": date, "source": args.source, "rows": int(len(df)), "hops": table.to_dict(orient="records")}
+        Path(args.out).write_bytes(orjson.dumps(doc, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY))
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,90 @@
+# ベンチマーク用の合成データセット（場中1分バー＋日足＋EOD特徴量）を作って保存するスクリプトです。
+# make_stub_bars.py（数銘柄の直線バー）の代わりに、数千銘柄×多日数の“それっぽい”セッションを providers.synthetic で作ります。
+# 出力（--out 既定 data/synth）：
+#   stream/bars_YYYYMMDD.ndjson   … --format ndjson（WS保存と同じ形）
+#   stream/bars_YYYYMMDD.bin      … --format bin（固定長バイナリ＋.symbols.txt）
+#   bars/date=YYYY-MM-DD/bars.parquet … --format parquet（コンパクト列型・日付パーティション）
+#   daily.parquet                 … 日足（symbol, t[ms], o,h,l,c,v：Polygon aggs と同じ列）
+#   eod/eod_features_YYYYMMDD.parquet … 最終日の EOD 特徴量（nightly_screen と同じ列）
+#   events.parquet                … 注入したイベント（gap / ORB / AVWAP押し目の分）
+
+from __future__ import annotations
+from pathlib import Path        # 出力先
+from datetime import date       # 開始日
+import argparse                 # 規模・形式の指定
+import time                     # 所要時間の表示
+import pandas as pd
+from loguru import logger
+
+from rh_pdc_daytrade.utils.envutil import load_dotenv_if_exists  # 何をする関数？：.envを先に読む
+from rh_pdc_daytrade.utils.logutil import configure_logging       # 何をする関数？：ログ初期化（冪等）
+from rh_pdc_daytrade.utils.io import write_parquet                # 何をする関数？：Parquet の標準保存口
+from rh_pdc_daytrade.providers.synthetic import (
+    SyntheticMarket,            # 何をするクラス？：日足履歴と場中セッションを順に合成する
+    write_ndjson,               # 何をする関数？：1日ぶんを NDJSON に
+    write_binary,               # 何をする関数？：1日ぶんを固定長バイナリに
+    write_parquet_partition,    # 何をする関数？：1日ぶんを日付パーティションの Parquet に
+    eod_features,               # 何をする関数？：日足から EOD 特徴量
+)
+
+def main() -> int:
+    """
+    何をする関数？：
+      - 指定の規模で合成データを作り、選んだ形式で保存します。乱数は --seed で固定できます。
+    使い方：
+      poetry run python scripts/make_synthetic_data.py --symbols 3000 --days 5 --format ndjson bin parquet
+    """
+    ap = argparse.ArgumentParser(description="Generate a synthetic intraday + daily dataset for benchmarks.")
+    ap.add_argument("--symbols", type=int, default=500, help="銘柄数")
+    ap.add_argument("--days", type=int, default=1, help="場中セッションの営業日数")
+    ap.add_argument("--history-days", type=int, default=260, help="場中の前に作る日足の営業日数（EMA50/52週高の材料）")
+    ap.add_argument("--start", default="2025-09-08", help="最初の場中セッションの日付（YYYY-MM-DD）")
+    ap.add_argument("--minutes", type=int, default=390, help="1セッションの分数")
+    ap.add_argument("--format", nargs="+", default=["ndjson"], choices=["ndjson", "bin", "parquet"], help="場中バーの出力形式")
+    ap.add_argument("--gap-rate", type=float, default=0.05, help="大きな寄りギャップ（±3–15%%）の発生率")
+    ap.add_argument("--jump-rate", type=float, default=0.02, help="場中ジャンプの発生率（銘柄・日あたり）")
+    ap.add_argument("--orb-rate", type=float, default=0.10, help="ORBブレイクを仕込む銘柄の割合")
+    ap.add_argument("--avwap-rate", type=float, default=0.10, help="AVWAP押し目を仕込む銘柄の割合")
+    ap.add_argument("--seed", type=int, default=7, help="乱数シード")
+    ap.add_argument("--out", default=str(Path("data") / "synth"), help="出力フォルダ")
+    args = ap.parse_args()
+
+    load_dotenv_if_exists()
+    logfile = configure_logging()
+    out = Path(args.out)
+    start = date.fromisoformat(args.start)
+
+    t0 = time.perf_counter()
+    mk = SyntheticMarket(n_symbols=args.symbols, seed=args.seed, minutes=args.minutes,
+                         jump_rate=args.jump_rate, gap_rate=args.gap_rate,
+                         orb_rate=args.orb_rate, avwap_rate=args.avwap_rate)
+    if args.history_days > 0:
+        mk.history(args.history_days, end=start)
+
+    events = []
+    last_day = None
+    for day in mk.sessions(start, days=args.days):
+        tag = day.session_date.strftime("%Y%m%d")
+        if "ndjson" in args.format:
+            write_ndjson(day, out / "stream" / f"bars_{tag}.ndjson")
+        if "bin" in args.format:
+            write_binary(day, out / "stream" / f"bars_{tag}.bin")
+        if "parquet" in args.format:
+            write_parquet_partition(day, out / "bars")
+        events.append(pd.DataFrame({"date": tag, "symbol": day.symbols, **day.events}))
+        logger.info("synthetic: {} written ({} symbols x {} min, orb={} avwap={})", tag, len(day.symbols), args.minutes,
+                    int((day.events["orb_minute"] >= 0).sum()), int((day.events["avwap_minute"] >= 0).sum()))
+        last_day = day
+
+    daily = mk.daily_frame()
+    write_parquet(daily, out / "daily.parquet")
+    if events:
+        write_parquet(pd.concat(events, ignore_index=True), out / "events.parquet")
+    if last_day is not None:
+        feats = eod_features(daily)
+        write_parquet(feats, out / "eod" / f"eod_features_{last_day.session_date.strftime('%Y%m%d')}.parquet")
+    logger.info("make_synthetic_data: done in {:.1f}s -> {} (logfile={})", time.perf_counter() - t0, out, logfile)
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,53 @@
+# 旧形式の約定ログ CSV（data/logs/executions.csv / strategy.csv）を、月次ストア（data/logs/executions/*.sqlite）へ
+# 一度だけ移すためのワンショットツールです。移し終えた CSV は *.migrated にリネームして二重移行を防ぎます。
+
+from __future__ import annotations
+from pathlib import Path   # 入出力パスの扱い
+import argparse            # コマンドライン引数の受け取りに使う
+from loguru import logger  # 共通ログ
+
+from rh_pdc_daytrade.utils.envutil import load_dotenv_if_exists   # 何をする関数？：.envを先に読む
+from rh_pdc_daytrade.utils.logutil import configure_logging        # 何をする関数？：ログ初期化（冪等）
+from rh_pdc_daytrade.store.executions import migrate_csv, store_dir  # 何をする関数？：CSV → 月次ストアへの移行
+
+def _migrate_one(csv_path: Path, table: str, root: Path, keep: bool) -> int:
+    """
+    何をする関数？：
+      - 1つの CSV を指定表へ移し、keep=False なら元ファイルを *.migrated にリネームします。
+      - ファイルが無ければ 0 を返して何もしません。
+    """
+    if not csv_path.exists():
+        logger.info("migrate: {} not found; skip", csv_path)
+        return 0
+    n = migrate_csv(csv_path, table, root=root)
+    logger.info("migrate: {} -> {} ({} rows)", csv_path, table, n)
+    if not keep:
+        csv_path.replace(csv_path.with_suffix(csv_path.suffix + ".migrated"))
+    return n
+
+def main() -> int:
+    """
+    何をする関数？：
+      - executions.csv → executions 表、strategy.csv → strategy 表 へ移します（date の月ごとに振り分け）。
+    使い方：
+      poetry run python scripts/migrate_exec_logs.py
+      poetry run python scripts/migrate_exec_logs.py --keep   # 元CSVを残す
+    """
+    ap = argparse.ArgumentParser(description="Migrate legacy executions/strategy CSV logs into the monthly store.")
+    ap.add_argument("--logs-dir", default=str(Path("data") / "logs"), help="旧CSVの置き場所")
+    ap.add_argument("--store-dir", default=None, help="月次ストアの置き場所（既定 <logs-dir>/executions）")
+    ap.add_argument("--keep", action="store_true", help="移行後も元CSVをリネームせずに残す")
+    args = ap.parse_args()
+
+    load_dotenv_if_exists()
+    logfile = configure_logging()
+    logs = Path(args.logs_dir)
+    root = store_dir(args.store_dir or (logs / "executions"))
+
+    n_exec = _migrate_one(logs / "executions.csv", "executions", root, args.keep)
+    n_strat = _migrate_one(logs / "strategy.csv", "strategy", root, args.keep)
+    logger.info("migrate_exec_logs: done executions={} strategy={} store={} (logfile={})", n_exec, n_strat, root, logfile)
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -25,6 +25,8 @@ from rh_pdc_daytrade.screening.eod_screen import (
 )
 from rh_pdc_daytrade.utils.io import write_parquet, write_csv  # 何をする関数？：EOD特徴量のParquet/CSV保存用（標準の保存口）。  :contentReference[oaicite:2]{index=2}
 from rh_pdc_daytrade.utils.timeutil import get_et_tz               # ET時刻の安定取得（tzdataフォールバック）  :contentReference[oaicite:8]{index=8}
+from rh_pdc_daytrade.store.refdata import update_manifest         # 何をする関数？：data/eod/latest.json（最新ファイルの目録）を更新
+from rh_pdc_daytrade.utils.metrics import timer, init_run_metrics   # 何をする関数？：段ごとの時間を記録（実行ごとに data/metrics/ へ）
 
 # 役割: JSONをUTF-8で安全に書き出す（UnicodeEncodeError対策／インデント付き）
 def _write_json_utf8(path, obj):
@@ -114,6 +116,7 @@ def write_watchlists_stub(symbols: list[str], out_dir: Path) -> tuple[Path, Path
     b_path = out_dir / "watchlist_B.json"
     _write_json_utf8(a_path, payload)  # 役割: A用ウォッチリストをUTF-8安全に保存（整形付き）
     _write_json_utf8(b_path, payload)  # 役割: B用ウォッチリストをUTF-8安全に保存（整形付き）
+    update_manifest(out_dir, watchlists={"A": a_path.name, "B": b_path.name})  # 役割: 場中の読み手がマニフェストで引けるようにする
 
     return a_path, b_path
 
@@ -163,6 +166,7 @@ def write_watchlists_ranked(topA, topB, out_dir: Path) -> tuple[Path, Path]:
     b_path = out_dir / "watchlist_B.json"
     _write_json_utf8(a_path, payloadA)  # 役割: A（順位付き）をUTF-8安全に保存（整形付き）
     _write_json_utf8(b_path, payloadB)  # 役割: B（順位付き）をUTF-8安全に保存（整形付き）
+    update_manifest(out_dir, watchlists={"A": a_path.name, "B": b_path.name})  # 役割: 場中の読み手がマニフェストで引けるようにする
     return a_path, b_path
 
 
@@ -210,8 +214,28 @@ def save_eod_features(df: pd.DataFrame, out_dir: Path) -> tuple[Path, Path]:
     p_csv  = out_dir / f"eod_features_{et_date}.csv"
     write_parquet(df, p_parq)  # 何をする関数？：Parquetで高速・省容量に保存（標準形式）。  :contentReference[oaicite:4]{index=4}
     write_csv(df, p_csv)       # 何をする関数？：人が確認しやすいCSVも同時に保存。
+    update_manifest(out_dir, eod_features={"parquet": p_parq.name, "csv": p_csv.name, "date": et_date})  # 何をする行？：最新EODの場所を記録（読み手の glob 走査を不要にする）
     return p_parq, p_csv
 
+def add_volume_profile_features(df: pd.DataFrame, cfg: dict) -> pd.DataFrame:
+    """
+    何をする関数？：
+      - 時刻別の出来高プロファイル（indicators.volprofile）を 1分足アーカイブから差分で作り直し（新しい日だけ読む）、
+        rvol_prev / or_vol_share を EOD 特徴量に足します（compute_scores_basic の rvol_score 用）。
+      - 1分足が無い・作れないときも止めずに、列を NaN で足して続けます。
+    """
+    from rh_pdc_daytrade.indicators.volprofile import update_profile, default_sources, profile_features  # 関数内だけで使うためここでインポート
+    vp = cfg.get("volume_profile", {}) or {}
+    prof = None
+    try:
+        with timer("stage_seconds", stage="volume_profile"):
+            prof = update_profile(default_sources(), days=int(vp.get("days", 20)), min_days=int(vp.get("min_days", 5)),
+                                  min_coverage=float(vp.get("min_coverage", 0.5)))
+    except Exception as e:
+        logger.warning("volume profile update failed: {} ; rvol_prev left empty", e)
+    orb_minutes = int((cfg.get("strategy", {}) or {}).get("orb_minutes", 5))
+    return profile_features(df, prof, orb_minutes=orb_minutes)
+
 def main() -> int:
     """
     何をする関数？：
@@ -224,6 +248,7 @@ def main() -> int:
     # 1) 環境変数とログの準備（全スクリプトの冒頭で呼ぶ運用）  :contentReference[oaicite:10]{index=10}
     load_dotenv_if_exists()
     logfile = configure_logging()
+    init_run_metrics("nightly_screen")  # 何をする行？：終了時に段ごとの時間（銘柄ごとのEOD取得を含む）を保存
     logger.info("nightly_screen: start (logfile={})", logfile)
 
     # 2) 設定と銘柄グループの取得（まずは quick_test を使って動作確認）  :contentReference[oaicite:11]{index=11}
@@ -253,6 +278,7 @@ def main() -> int:
                 b = syms[:top_n]
                 _write_json_utf8(out_dir / "watchlist_A.json", {"symbols": a})
                 _write_json_utf8(out_dir / "watchlist_B.json", {"symbols": b})
+                update_manifest(out_dir, watchlists={"A": "watchlist_A.json", "B": "watchlist_B.json"})
                 src = "csv" if is_csv else "txt"
                 logger.info(
                     f"ranked watchlists written (manual override:{src}): "
@@ -269,6 +295,7 @@ def main() -> int:
         logger.warning("POLYGON_API_KEY is empty. Using stub EOD dataset to produce ranked watchlists.")
         df = build_df_stub(syms)
         df = apply_hard_filters(df, cfg)
+        df = add_volume_profile_features(df, cfg)
         df = compute_scores_basic(df, cfg)
         p_parq, p_csv = save_eod_features(df, out_dir)
         logger.info("eod snapshot saved (stub dataset): {} , {}", p_parq, p_csv)
@@ -294,7 +321,8 @@ def main() -> int:
 
     else:
         try:
-            df = fetch_eod_dataset(syms, api_key=polygon_key)
+            with timer("stage_seconds", stage="fetch_eod"):
+                df = fetch_eod_dataset(syms, api_key=polygon_key)
             if df.empty:
                 logger.warning("polygon returned empty dataset; falling back to stub.")
                 source_label = "stub"  # 何をする行？：実際はスタブで続行したことを最終ログに反映する。
@@ -307,8 +335,11 @@ def main() -> int:
 
 
 
-    df = apply_hard_filters(df, cfg)                 # 何をする関数？：価格/出来高/ATR%/トレンド/フロートで合否を付ける
-    df = compute_scores_basic(df, cfg)               # 何をする関数？：“基本8割”の線形和で A/B スコアを出す
+    with timer("stage_seconds", stage="hard_filters"):
+        df = apply_hard_filters(df, cfg)                 # 何をする関数？：価格/出来高/ATR%/トレンド/フロートで合否を付ける
+    df = add_volume_profile_features(df, cfg)            # 何をする関数？：時刻別出来高プロファイルを差分更新し、前日の相対出来高を足す
+    with timer("stage_seconds", stage="scores"):
+        df = compute_scores_basic(df, cfg)               # 何をする関数？：“基本8割”の線形和で A/B スコアを出す
     p_parq, p_csv = save_eod_features(df, out_dir)  # 何をする関数？：EOD特徴量のスナップショットを保存。
     logger.info("eod snapshot saved ({} dataset): {} , {}", source_label, p_parq, p_csv)  # 役割: EOD保存のログに最終データソース(polygon/stub)を明示
 
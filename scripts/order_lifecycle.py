@@ -0,0 +1,136 @@
+# 注文ライフサイクルの常駐スクリプトです（紙トレ実装）。
+# 目的：signals/sent/ の当日注文をメモリに保持し、orders.cancel_unfilled_by（10:30）で未約定を全取消、
+#       orders.force_close_by（15:55）で全決済フックを“ちょうどその時刻”に実行します。
+#       cancel_unfilled.py / close_positions.py の定時起動に代わる本線で、両スクリプトは安全網として残します。
+
+from __future__ import annotations
+from pathlib import Path                  # signals/ 配下のフォルダ操作
+from datetime import datetime             # 当日ET日付の決定
+import asyncio                            # 締切タイマーと監視ループ
+import os                                 # ORDER_SCAN_SECONDS の参照
+from loguru import logger                 # 共通ログ（data/logs/bot.log に集約）
+
+from rh_pdc_daytrade.utils.envutil import load_dotenv_if_exists  # 何をする関数？：.envを先に読む
+from rh_pdc_daytrade.utils.logutil import configure_logging       # 何をする関数？：ログ初期化（冪等）
+from rh_pdc_daytrade.utils.configutil import ConfigWatcher        # 何をするクラス？：config.yaml の変更を拾って締切を差し替える
+from rh_pdc_daytrade.utils.timeutil import get_et_tz              # 何をする関数？：ETタイムゾーン（フォールバック付）
+from rh_pdc_daytrade.utils.market_calendar import get_calendar   # 何をする関数？：休場日なら何もしない判定
+from rh_pdc_daytrade.orders.scheduler import (
+    OrderLifecycleScheduler,   # 何をするクラス？：締切ちょうどに取消/クローズを発火させる
+    OpenOrder,                 # 何をする入れ物？：メモリ上の未約定注文
+    load_open_order,           # 何をする関数？：sent/*.json → OpenOrder
+)
+
+def _dirs() -> tuple[Path, Path]:
+    """
+    何をする関数？：
+      - signals/sent/（未約定相当）と signals/cancelled/（取消済み）を用意して返します。
+    """
+    base = Path("data") / "signals"
+    sent = base / "sent"
+    cancelled = base / "cancelled"
+    sent.mkdir(parents=True, exist_ok=True)
+    cancelled.mkdir(parents=True, exist_ok=True)
+    return sent, cancelled
+
+def _today_files(sent_dir: Path) -> list[Path]:
+    """何をする関数？：本日ETの日付で始まる sent/*.json を古い順に列挙します（登録順を保つため）。"""
+    today = datetime.now(get_et_tz()).strftime("%Y%m%d")
+    return sorted([p for p in sent_dir.glob(f"{today}*.json")], key=lambda p: p.stat().st_mtime)
+
+def _cancel_file(order: OpenOrder, cancelled_dir: Path) -> Path | None:
+    """
+    何をする関数？：
+      - 1件の注文JSONを cancelled/ へ“移動”します（紙トレの取消）。
+      - すでに別経路（cron の安全網など）で移動済みなら何もしません。
+    """
+    p = order.path
+    if not p.exists():
+        logger.info("lifecycle: already moved {}", p.name)
+        return None
+    dest = cancelled_dir / p.name
+    i = 1
+    while dest.exists():  # 同名回避
+        dest = cancelled_dir / f"{p.stem}_{i}{p.suffix}"
+        i += 1
+    p.replace(dest)
+    logger.info("cancelled (paper): {}", order.symbol)
+    return dest
+
+def _force_close_positions_stub(orders: list[OpenOrder]) -> None:
+    """
+    何をする関数？：
+      - 紙トレのため実ポジションは無い想定。将来Webull SDKの“全決済API”に差し替える場所です。
+    """
+    logger.info("force close (paper): no live positions; this is the hook for Webull SDK ({} open orders)", len(orders))
+
+async def _watch_sent(sch: OrderLifecycleScheduler, sent_dir: Path, interval_s: float,
+                      watcher: ConfigWatcher | None = None) -> None:
+    """
+    何をする関数？：
+      - place_orders.py が後から送った注文を拾うため、sent/ を interval_s 秒ごとに見て新規分だけ add します。
+      - 締切の発火自体はタイマー側が行うので、この間隔は締切精度に影響しません。
+      - watcher があれば同じ間隔で config.yaml の変更も見ます（変わった締切は購読側で sch.reschedule される）。
+    """
+    seen: set[str] = set()
+    while not sch.finished:
+        if watcher is not None:
+            watcher.poll()
+        for p in _today_files(sent_dir):
+            if p.name not in seen:
+                seen.add(p.name)
+                sch.add(load_open_order(p))
+        await asyncio.sleep(interval_s)
+
+async def _run(sch: OrderLifecycleScheduler, sent_dir: Path, interval_s: float,
+               cfg_watcher: ConfigWatcher | None = None) -> None:
+    """何をする関数？：締切タイマーと sent/ 監視を並走させ、クローズ締切の発火で両方を終えます。"""
+    watcher = asyncio.create_task(_watch_sent(sch, sent_dir, interval_s, cfg_watcher))
+    try:
+        await sch.run()
+    finally:
+        watcher.cancel()
+        try:
+            await watcher
+        except asyncio.CancelledError:
+            pass
+
+def main() -> int:
+    """
+    何をする関数？：
+      - .env→ログ→config を読み、当日の sent/*.json を保持したまま締切タイマーを起動します。
+      - 取消/クローズの締切からの遅れは data/logs/order_actions.csv に記録します。
+      - 実行中に config.yaml の orders.* を書き換えると、まだ発火していない締切を差し替えます（再起動不要）。
+      - 休場日は何もせず終了し、短縮取引日はクローズ締切を引けに合わせて前倒しします（orders.scheduler.deadline_on）。
+    使い方：
+      poetry run python scripts/order_lifecycle.py
+    """
+    load_dotenv_if_exists()
+    logfile = configure_logging()
+    cfg_watcher = ConfigWatcher()  # 何をする行？：検証済みの設定スナップショットと、その変更の見張り
+
+    sent_dir, cancelled_dir = _dirs()
+    interval_s = float(os.getenv("ORDER_SCAN_SECONDS", "5") or 5)
+    sch = OrderLifecycleScheduler.from_settings(
+        cfg_watcher.current,
+        on_cancel=lambda o: _cancel_file(o, cancelled_dir),
+        on_close=_force_close_positions_stub,
+        action_log=Path("data") / "logs" / "order_actions.csv",
+    )
+    if not get_calendar().is_session(sch.session_date):
+        logger.info("order_lifecycle: {} is not a trading session; nothing to schedule (logfile={})",
+                    sch.session_date, logfile)
+        return 0
+    logger.info("order_lifecycle: start cancel_by={} close_by={} (logfile={})",
+                sch.cancel_deadline.strftime("%H:%M:%S"), sch.close_deadline.strftime("%H:%M:%S"), logfile)
+
+    cfg_watcher.subscribe(lambda new, old: sch.reschedule(new.orders.cancel_unfilled_by, new.orders.force_close_by))
+    asyncio.run(_run(sch, sent_dir, interval_s, cfg_watcher))
+
+    for rec in sch.records:
+        logger.info("order_lifecycle: {} lateness={:.1f}ms orders={}", rec.action, rec.lateness_ms, rec.orders)
+    logger.info("order_lifecycle: done (logfile={})", logfile)
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -12,6 +12,9 @@ from rh_pdc_daytrade.utils.envutil import load_dotenv_if_exists  # 何をする
 from rh_pdc_daytrade.utils.logutil import configure_logging       # 何をする関数？：ログ初期化（冪等）  :contentReference[oaicite:5]{index=5}
 from rh_pdc_daytrade.utils.configutil import load_config          # 何をする関数？：config.yamlを読む（RUN_MODE等）  :contentReference[oaicite:6]{index=6}
 from rh_pdc_daytrade.utils.timeutil import get_et_tz             # 何をする関数？：ETのtzinfoを得る（フォールバック付）  :contentReference[oaicite:7]{index=7}
+from rh_pdc_daytrade.store.executions import append_execution, append_strategy_entry  # 何をする関数？：月次ストアへ追記のみで記録
+from rh_pdc_daytrade.utils.metrics import timer, incr, init_run_metrics  # 何をする関数？：発注1件ごとの時間・件数を記録
+from rh_pdc_daytrade.utils.latency import trace_columns, now_ns  # 何をする関数？：シグナルの遅れトレースを executions の *_ns 列へ
 
 def _dirs() -> tuple[Path, Path, Path]:
     """
@@ -26,116 +29,32 @@ def _dirs() -> tuple[Path, Path, Path]:
     failed.mkdir(parents=True, exist_ok=True)
     return base, sent, failed
 
-def _exec_log_path() -> Path:
+def _signal_row(sig: dict) -> dict:
     """
     何をする関数？：
-      - 約定ログCSV（data/logs/executions.csv）のパスを返し、
-        1) 無ければフォルダ作成＋ヘッダー行を書きます。
-        2) 既にあっても列が古い場合（qtyが無い等）は、安全に“列を増やして”ヘッダーを更新します。  
+      - シグナルJSONから、約定ログ／明細ログ共通の列（symbol/setup/entry_type/qty/価格/notes）を取り出します。
     """
-    import csv  # この関数内だけで使うため関数内インポートにします
-    p = Path("data") / "logs" / "executions.csv"
-    p.parent.mkdir(parents=True, exist_ok=True)
-
-    new_cols = [
-        "date", "timestamp_et", "symbol", "setup",
-        "entry_type", "qty", "entry_price", "tp_price", "sl_price", "notes"
-    ]
-
-    if not p.exists():
-        with open(p, "w", encoding="utf-8", newline="") as f:
-            csv.writer(f).writerow(new_cols)
-        return p
-
-    # 既存ファイルがある場合はヘッダーを確認し、足りない列を補って並びも揃え直します（後方互換のため）。
-    with open(p, "r", encoding="utf-8", newline="") as f:
-        rows = list(csv.reader(f))
-
-    if not rows:
-        with open(p, "w", encoding="utf-8", newline="") as f:
-            csv.writer(f).writerow(new_cols)
-        return p
-
-    old_cols = rows[0]
-    if old_cols == new_cols:
-        return p
-
-    # マッピングを作り、無い列は空欄で埋めて新しい並びに書き換えます（安全に“列追加”）。  :contentReference[oaicite:4]{index=4}
-    index_of = {name: (old_cols.index(name) if name in old_cols else None) for name in new_cols}
-    tmp = p.with_suffix(".csv.tmp")
-    with open(tmp, "w", encoding="utf-8", newline="") as f:
-        w = csv.writer(f)
-        w.writerow(new_cols)
-        for row in rows[1:]:
-            out = []
-            for name in new_cols:
-                idx = index_of[name]
-                out.append(row[idx] if (idx is not None and idx < len(row)) else "")
-            w.writerow(out)
-    tmp.replace(p)
-    return p
-
-def _append_strategy_entry(sig: dict) -> Path:
-    """
-    何をする関数？：
-      - 紙トレの“エントリー明細”を data/logs/strategy.csv に1行追記します（EXIT/スリッページ等は将来拡張）。  :contentReference[oaicite:4]{index=4}
-    """
-    import csv  # この関数内だけで使うため関数内インポートにします
-    p = _strategy_log_path()
-    ts = datetime.now(get_et_tz())
     entry = sig.get("entry", {}) or {}
     br = sig.get("bracket", {}) or {}
-    qty = sig.get("qty", "")
-    with open(p, "a", encoding="utf-8", newline="") as f:
-        w = csv.writer(f)
-        w.writerow([
-            ts.strftime("%Y%m%d"),
-            ts.strftime("%H:%M:%S"),
-            sig.get("symbol", ""),
-            sig.get("setup", ""),
-            sig.get("entryType", ""),
-            entry.get("price") or entry.get("limit") or entry.get("stop") or "",
-            qty,
-            br.get("takeProfitPrice", ""),
-            br.get("stopLossPrice", ""),
-            sig.get("notes", ""),
-            "", "", "", "", ""  # exit_time/exit_price/R/slippage/spread は今は空（将来更新）  :contentReference[oaicite:5]{index=5}
-        ])
-    return p
+    return {
+        "symbol": sig.get("symbol", ""),
+        "setup": sig.get("setup", ""),
+        "entry_type": sig.get("entryType", ""),
+        "qty": sig.get("qty", ""),
+        "entry_price": entry.get("price") or entry.get("limit") or entry.get("stop") or "",
+        "tp_price": br.get("takeProfitPrice", ""),
+        "sl_price": br.get("stopLossPrice", ""),
+        "notes": sig.get("notes", ""),
+        **trace_columns(sig.get("trace")),  # bar_t_ns … order_ns（無いシグナルは NULL）
+    }
 
-def _strategy_log_path() -> Path:
+def _append_strategy_entry(sig: dict) -> Path:
     """
     何をする関数？：
-      - トレード明細ログCSV（data/logs/strategy.csv）のパスを返し、無ければヘッダーを作ります。
-      - 列はRunbook準拠（ENTRY中心・EXIT等は将来拡張）。  :contentReference[oaicite:2]{index=2}
+      - 紙トレの“エントリー明細”を月次ストア（strategy 表）に1行追記します。
+      - exit_time/exit_price/R/slippage/spread は今は空で、EXIT記録時に update_strategy_exit で埋めます。
     """
-    import csv  # この関数内だけで使うため関数内インポートにします
-    p = Path("data") / "logs" / "strategy.csv"
-    p.parent.mkdir(parents=True, exist_ok=True)
-    cols = [
-        "date", "entry_time_et", "symbol", "setup",
-        "entry_type", "entry_price", "qty",
-        "tp_price", "sl_price", "notes",
-        "exit_time_et", "exit_price", "R", "slippage_pct", "spread_pct"
-    ]
-    if not p.exists():
-        with open(p, "w", encoding="utf-8", newline="") as f:
-            csv.writer(f).writerow(cols)
-    else:
-        # 既存に列不足があれば“列を増やして”ヘッダーを揃えます（後方互換）。  :contentReference[oaicite:3]{index=3}
-        with open(p, "r", encoding="utf-8", newline="") as f:
-            rows = list(csv.reader(f))
-        if not rows or rows[0] != cols:
-            index_of = {name: (rows[0].index(name) if rows and name in rows[0] else None) for name in cols}
-            tmp = p.with_suffix(".csv.tmp")
-            with open(tmp, "w", encoding="utf-8", newline="") as f:
-                w = csv.writer(f); w.writerow(cols)
-                for r in rows[1:] if rows else []:
-                    out = [(r[index_of[c]] if (index_of[c] is not None and index_of[c] < len(r)) else "") for c in cols]
-                    w.writerow(out)
-            tmp.replace(p)
-    return p
-
+    return append_strategy_entry(_signal_row(sig), ts=datetime.now(get_et_tz()))
 
 def _list_signal_files(base: Path) -> list[Path]:
     """
@@ -155,48 +74,30 @@ def _load_signal(p: Path) -> dict | None:
         logger.error("signal load error: {} ({})", p, e)
         return None
 
-def _append_execution_csv(sig: dict) -> Path:
+def _append_execution(sig: dict) -> Path:
     """
     何をする関数？：
-      - 紙トレの発注内容を data/logs/executions.csv に1行追記します（ET時刻で記録）。
-      - きょうからは数量 qty も保存します（KPIや振り返りの材料）。  :contentReference[oaicite:5]{index=5}
+      - 紙トレの発注内容を月次ストア（data/logs/executions/executions_YYYYMM.sqlite）に1行追記します（ET時刻で記録）。
+      - 追記は INSERT のみで、過去の行は読みません（履歴が増えても1件あたりの時間は一定）。
     """
-    import csv  # この関数内だけで使うため関数内インポートにします
-    p = _exec_log_path()
-    ts = datetime.now(get_et_tz())
-    entry = sig.get("entry", {}) or {}
-    br = sig.get("bracket", {}) or {}
-    qty = sig.get("qty", "")
-    with open(p, "a", encoding="utf-8", newline="") as f:
-        w = csv.writer(f)
-        w.writerow([
-            ts.strftime("%Y%m%d"),
-            ts.strftime("%H:%M:%S"),
-            sig.get("symbol", ""),
-            sig.get("setup", ""),
-            sig.get("entryType", ""),
-            qty,
-            entry.get("price") or entry.get("limit") or entry.get("stop") or "",
-            br.get("takeProfitPrice", ""),
-            br.get("stopLossPrice", ""),
-            sig.get("notes", ""),
-        ])
-    return p
+    return append_execution(_signal_row(sig), ts=datetime.now(get_et_tz()))
 
 
 def _log_paper(sig: dict) -> bool:
     """
     何をする関数？：
       - 紙トレとして、発注内容（銘柄/価格/数量/ブラケット等）をログに出し、
-        executions.csv と strategy.csv の両方に追記します（Runbook準拠）。  :contentReference[oaicite:6]{index=6}
+        約定ログ（executions）と明細ログ（strategy）の両方に追記します（Runbook準拠）。  :contentReference[oaicite:6]{index=6}
     """
     sym = sig.get("symbol")
     setup = sig.get("setup")
     entry = sig.get("entry", {})
     br = sig.get("bracket", {})
+    if isinstance(sig.get("trace"), dict):
+        sig["trace"]["order"] = now_ns()  # 何をする行？：発注（紙トレ記録）した時刻
     logger.info("PAPER ORDER {} {} @ {} | bracket: TP={} SL={} notes={}",
                 setup, sym, entry, br.get("takeProfitPrice"), br.get("stopLossPrice"), sig.get("notes"))
-    p1 = _append_execution_csv(sig)      # 何をする行？：約定ログ（KPI入力）に追記。  :contentReference[oaicite:7]{index=7}
+    p1 = _append_execution(sig)      # 何をする行？：約定ログ（KPI入力）に追記。  :contentReference[oaicite:7]{index=7}
     p2 = _append_strategy_entry(sig)     # 何をする行？：明細ログ（将来のR/スリッページ集計）に追記。  :contentReference[oaicite:8]{index=8}
     logger.info("paper execution logged: {} ; strategy entry logged: {}", p1, p2)
     return True
@@ -232,6 +133,7 @@ def main() -> int:
     load_dotenv_if_exists()
     logfile = configure_logging()
     cfg = load_config()
+    init_run_metrics("place_orders")  # 何をする行？：終了時に発注の時間・件数を data/metrics/ へ保存
     mode = (cfg.get("runtime") or {}).get("mode", os.getenv("RUN_MODE", "paper")).lower()
 
     base, sent, failed = _dirs()
@@ -250,8 +152,10 @@ def main() -> int:
             continue
 
         # いまは“紙トレ”のみ。liveは後でWebull SDKに差し替え。
-        ok = _log_paper(sig)
+        with timer("order_seconds", mode=mode):
+            ok = _log_paper(sig)
         _move_after(f, sent, failed, ok=ok)
+        incr("orders", 1, mode=mode, ok=str(bool(ok)).lower())
         if ok:
             placed += 1
 
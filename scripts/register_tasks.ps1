@@ -66,7 +66,7 @@ function Register-WebullTask {
   param(
     [Parameter(Mandatory)][string]$Name,
     [Parameter(Mandatory)][datetime]$AtLocal,
-    [Parameter(Mandatory)][ValidateSet('nightly','session','indicators','signals','orders','cancel','close','kpi')][string]$Phase,
+    [Parameter(Mandatory)][ValidateSet('nightly','session','indicators','signals','orders','cancel','close','lifecycle','kpi')][string]$Phase,
     [int]$WsSec = 90
   )
   <#
@@ -126,10 +126,11 @@ function Unregister-WebullTask {
 function Get-TaskNames {
   <#
     何をする関数なのか？
-      - 運用で使うタスク名の配列を返す（Nightly / Session / Cancel / Close / KPI）。
+      - 運用で使うタスク名の配列を返す（Nightly / Session / Lifecycle / Cancel / Close / KPI）。
+      - Cancel / Close は Lifecycle（締切ちょうどに発火する常駐）の安全網として残す。
       - Signals / Orders / Indicators は手動や連携タスクで起動する前提のため、このセットからは除外。
   #>
-  @('WEBULL_Nightly','WEBULL_Session','WEBULL_Cancel','WEBULL_Close','WEBULL_KPI')
+  @('WEBULL_Nightly','WEBULL_Session','WEBULL_Lifecycle','WEBULL_Cancel','WEBULL_Close','WEBULL_KPI')
 }
 
 function Install-All {
@@ -137,7 +138,7 @@ function Install-All {
   param([int]$WsSec = 90)
   <#
     何をする関数なのか？
-      - ETの所定時刻を**ローカルに換算**し、5つのタスク（Nightly/Session/Cancel/Close/KPI）を**毎日実行**で登録する。
+      - ETの所定時刻を**ローカルに換算**し、6つのタスク（Nightly/Session/Lifecycle/Cancel/Close/KPI）を**毎日実行**で登録する。
       - 起動コマンドは **run_all.ps1 -Phase ...** に統一。
   #>
 
@@ -146,12 +147,14 @@ function Install-All {
   $baseET     = Get-TodayET                         # 何をする行？：ET基準日の 00:00
   $tNightlyET = $baseET.AddHours(3).AddMinutes(10)  # 03:10 ET（EOD → Watchlist）
   $tSessionET = $baseET.AddHours(9).AddMinutes(29)  # 09:29 ET（WS受信）
+  $tLifeET    = $baseET.AddHours(9).AddMinutes(25)  # 09:25 ET（注文ライフサイクル常駐：10:30取消/15:55クローズを締切ちょうどに発火）
   $tCancelET  = $baseET.AddHours(10).AddMinutes(30) # 10:30 ET（取消）
   $tCloseET   = $baseET.AddHours(15).AddMinutes(55) # 15:55 ET（強制クローズ）
   $tKpiET     = $baseET.AddHours(16).AddMinutes(10) # 16:10 ET（KPI集計）
 
   $tNightlyLocal = Convert-ETToLocal $tNightlyET
   $tSessionLocal = Convert-ETToLocal $tSessionET
+  $tLifeLocal    = Convert-ETToLocal $tLifeET
   $tCancelLocal  = Convert-ETToLocal $tCancelET
   $tCloseLocal   = Convert-ETToLocal $tCloseET
   $tKpiLocal     = Convert-ETToLocal $tKpiET
@@ -159,6 +162,7 @@ function Install-All {
   # 何をする行？：ここで実際に“登録”を実行（Approved Verb の Register-WebullTask を使用）
   if ($PSCmdlet.ShouldProcess("Scheduled Task '$($Script:TaskPath)WEBULL_Nightly' at $tNightlyLocal (local)", "Register/Update")) { Register-WebullTask -Name 'WEBULL_Nightly' -AtLocal $tNightlyLocal -Phase 'nightly' -WsSec $WsSec }  # 夜間処理
   if ($PSCmdlet.ShouldProcess("Scheduled Task '$($Script:TaskPath)WEBULL_Session' at $tSessionLocal (local)", "Register/Update")) { Register-WebullTask -Name 'WEBULL_Session' -AtLocal $tSessionLocal -Phase 'session' -WsSec $WsSec }  # WS 受信
+  if ($PSCmdlet.ShouldProcess("Scheduled Task '$($Script:TaskPath)WEBULL_Lifecycle' at $tLifeLocal (local)", "Register/Update")) { Register-WebullTask -Name 'WEBULL_Lifecycle' -AtLocal $tLifeLocal -Phase 'lifecycle' -WsSec $WsSec }  # 注文ライフサイクル
   if ($PSCmdlet.ShouldProcess("Scheduled Task '$($Script:TaskPath)WEBULL_Cancel' at $tCancelLocal (local)", "Register/Update"))   { Register-WebullTask -Name 'WEBULL_Cancel'  -AtLocal $tCancelLocal  -Phase 'cancel'  -WsSec $WsSec }    # 取消
   if ($PSCmdlet.ShouldProcess("Scheduled Task '$($Script:TaskPath)WEBULL_Close' at $tCloseLocal (local)", "Register/Update"))     { Register-WebullTask -Name 'WEBULL_Close'   -AtLocal $tCloseLocal   -Phase 'close'   -WsSec $WsSec }    # 強制クローズ
   if ($PSCmdlet.ShouldProcess("Scheduled Task '$($Script:TaskPath)WEBULL_KPI' at $tKpiLocal (local)", "Register/Update"))         { Register-WebullTask -Name 'WEBULL_KPI'     -AtLocal $tKpiLocal     -Phase 'kpi'     -WsSec $WsSec }    # KPI 集計
@@ -169,7 +173,7 @@ function Uninstall-All {
   param()                                                           # 何をする行？：引数なしでも Advanced Function にする
   <#
     何をする関数なのか？
-      - 5つのタスク（Nightly/Session/Cancel/Close/KPI）を**まとめて削除**する。
+      - 6つのタスク（Nightly/Session/Lifecycle/Cancel/Close/KPI）を**まとめて削除**する。
   #>
   foreach ($n in Get-TaskNames) {
     if ($PSCmdlet.ShouldProcess("Scheduled Task '$($Script:TaskPath)$n'", "Unregister")) { Unregister-WebullTask -Name $n }  # 何をする行？：-WhatIf 指定時は実行せず内容のみ表示、通常はそのまま削除を実行
@@ -182,7 +186,7 @@ function Get-WebullTasks {
       - WEBULL_* タスクの「状態」「次回実行」「Start in」「実行コマンド」を**一覧表示**する。
       - 実登録の実態を OS 側から確認する（点検用）。
   #>
-  $names = @('WEBULL_Nightly','WEBULL_Session','WEBULL_Indicators','WEBULL_Signals','WEBULL_Orders','WEBULL_Cancel','WEBULL_Close','WEBULL_KPI')
+  $names = @('WEBULL_Nightly','WEBULL_Session','WEBULL_Lifecycle','WEBULL_Indicators','WEBULL_Signals','WEBULL_Orders','WEBULL_Cancel','WEBULL_Close','WEBULL_KPI')
   foreach ($n in $names) {
     Write-Output "==== $n ===="  # 何をする行？：一覧の見出しを“標準出力”に流す（画面表示でき、パイプ/リダイレクトも可能にする）
     schtasks /Query /TN "$($Script:TaskPath)$n" /V /FO LIST
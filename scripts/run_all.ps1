@@ -8,13 +8,14 @@
        powershell.exe -File E:\BOT_WEBULL\run_all.ps1 -Phase orders
        powershell.exe -File E:\BOT_WEBULL\run_all.ps1 -Phase cancel
        powershell.exe -File E:\BOT_WEBULL\run_all.ps1 -Phase close
+       powershell.exe -File E:\BOT_WEBULL\run_all.ps1 -Phase lifecycle
        powershell.exe -File E:\BOT_WEBULL\run_all.ps1 -Phase kpi
    - タスクスケジューラでは Action に上記を設定し、Start in は必ず E:\BOT_WEBULL にする
 #>
 
 param(
   [Parameter(Mandatory = $true)]
-  [ValidateSet('nightly','session','indicators','signals','orders','cancel','close','kpi')]
+  [ValidateSet('nightly','session','indicators','signals','orders','cancel','close','lifecycle','kpi')]
   [string]$Phase
 )
 
@@ -50,6 +51,7 @@ function Invoke-Phase {
     'orders'      { Invoke-Py 'scripts\place_orders.py' ; break }
     'cancel'      { Invoke-Py 'scripts\cancel_unfilled.py' ; break }
     'close'       { Invoke-Py 'scripts\close_positions.py' ; break }
+    'lifecycle'   { Invoke-Py 'scripts\order_lifecycle.py' ; break }
     'kpi'         { Invoke-Py 'scripts\daily_kpi.py' ; break }
     default       { throw "Unknown phase: $Name" }
   }
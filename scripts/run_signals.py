@@ -8,14 +8,20 @@ from datetime import datetime, time                # 生成時刻（ET）を記
 import os                                    # 環境変数（RUN_MODE等）
 import math                                  # 価格丸め
 import orjson                                # JSON高速出力
+import numpy as np                           # バッチ数量計算の入力配列
 import pandas as pd                          # 1分バー/指標の読み込み
 from loguru import logger                    # 共通ログ
 
 from rh_pdc_daytrade.utils.envutil import load_dotenv_if_exists   # 何をする関数？：.envを先に読む  :contentReference[oaicite:5]{index=5}
 from rh_pdc_daytrade.utils.logutil import configure_logging        # 何をする関数？：ログ初期化
-from rh_pdc_daytrade.utils.configutil import load_config           # 何をする関数？：config.yaml を読む  :contentReference[oaicite:6]{index=6}
+from rh_pdc_daytrade.utils.configutil import load_settings, Settings, BracketConfig, RiskConfig  # 何をする関数？：config.yaml の検証済みスナップショット（mtime でメモ化）
 from rh_pdc_daytrade.utils.timeutil import get_et_tz               # 何をする関数？：ETのtzinfoを取得（フォールバック付）  :contentReference[oaicite:7]{index=7}
-from rh_pdc_daytrade.risk.sizing import calc_qty_from_risk  # 何をする関数？：リスク％から数量を計算する。  :contentReference[oaicite:3]{index=3}
+from rh_pdc_daytrade.utils.timeutil import time_window_mask        # 何をする関数？：ET時刻の窓判定を配列で一括計算
+from rh_pdc_daytrade.utils.io import read_parquet                   # 何をする関数？：Parquetをコンパクト列型（category/float32/uint32）で読む
+from rh_pdc_daytrade.utils.metrics import timer, incr, init_run_metrics  # 何をする関数？：段ごとの時間・件数を記録（実行ごとに data/metrics/ へ）
+from rh_pdc_daytrade.utils.latency import bar_trace, now_ns  # 何をする関数？：バー→発注の遅れトレース（各シグナルに "trace" を持たせる）
+from rh_pdc_daytrade.store.refdata import watchlist_set, scan_symbols  # 何をする関数？：前夜のウォッチリスト集合・場中スキャナが足した銘柄（プロセス内キャッシュ）
+from rh_pdc_daytrade.risk.sizing import size_batch  # 何をする関数？：シグナル全件の数量をポートフォリオ制約込みで一括計算する。  :contentReference[oaicite:3]{index=3}
 
 def _today_str() -> str:
     """何をする関数？：ET日付の文字列 YYYYMMDD を返します。"""
@@ -34,61 +40,100 @@ def _read_inputs() -> tuple[pd.DataFrame, pd.DataFrame]:
       - 片方でも無ければ空で返して“止めません”（運用フローの前提）。  :contentReference[oaicite:8]{index=8}
     """
     p_bars, p_ind = _paths_for_today()
-    df_bars = pd.read_parquet(p_bars) if p_bars.exists() else pd.DataFrame()
-    df_ind  = pd.read_parquet(p_ind)  if p_ind.exists()  else pd.DataFrame()
+    df_bars = read_parquet(p_bars) if p_bars.exists() else pd.DataFrame()
+    df_ind  = read_parquet(p_ind)  if p_ind.exists()  else pd.DataFrame()
     return df_bars, df_ind
 
 def _price_round(x: float) -> float:
     """何をする関数？：小型株の価格丸め（2桁）を行います（ざっくり）。"""
     return round(float(x), 2)
 
-def _mk_bracket(entry: float, cfg: dict) -> dict:
+def _mk_bracket(entry: float, b: BracketConfig) -> dict:
     """
     何をする関数？：
-      - config.yaml の bracket設定（TP/SL/半利確→建値）から、価格を具体化して返します。  :contentReference[oaicite:9]{index=9}
+      - config.yaml の bracket設定（TP/SL/半利確→建値、検証済み）から、価格を具体化して返します。  :contentReference[oaicite:9]{index=9}
     """
-    b = (cfg.get("bracket") or {})
-    tps = b.get("take_profit_pct", [0.05, 0.10])
-    slp = float(b.get("stop_loss_pct", 0.025))
-    be  = bool(b.get("move_to_breakeven_after_first_tp", True))
-    tp_price = _price_round(entry * (1 + float(tps[0])))
-    sl_price = _price_round(entry * (1 - slp))
-    return {"takeProfitPrice": tp_price, "stopLossPrice": sl_price, "moveToBreakevenOnTP": be}
-
-def _active_watchlist(cfg: dict) -> set[str] | None:
+    tp_price = _price_round(entry * (1 + b.take_profit_pct[0]))
+    sl_price = _price_round(entry * (1 - b.stop_loss_pct))
+    return {"takeProfitPrice": tp_price, "stopLossPrice": sl_price, "moveToBreakevenOnTP": b.move_to_breakeven_after_first_tp}
+
+def _active_watchlist(st: Settings) -> set[str] | None:
     """
     何をする関数？：
       - config.strategy.active_setup（A/B）に対応する data/eod/watchlist_{A|B}.json を開き、
         "symbols" の文字列リストを set で返します。ファイルが無ければ None（= 全件許可）。  :contentReference[oaicite:1]{index=1}
+      - EOD_DIR があればその下を見ます（store.refdata.watchlist_set）。
+      - 場中スキャナ（ws_run の scanner）がきょう足した銘柄も許可に加えます（寄り前に出てきたギャッパー）。
     """
-    from pathlib import Path           # この関数内だけで使うため関数内importにします
-    import orjson                      # 同上（遅延インポートで起動を止めない）
-    setup = str((cfg.get("strategy") or {}).get("active_setup", "A")).strip().upper()
-    p = Path("data") / "eod" / f"watchlist_{setup}.json"
-    if not p.exists():
-        return None
-    try:
-        data = orjson.loads(p.read_bytes())
-        syms = [s for s in data.get("symbols", []) if isinstance(s, str)]
-        return set(syms) if syms else None
-    except Exception:
-        return None
+    # 何をする行？：(パス, mtime) でキャッシュ済み。_gen_A/_gen_B から何度呼んでも読み込みは版が変わったときだけ
+    allowed = watchlist_set(st.strategy.active_setup)
+    extra = scan_symbols()
+    return allowed | frozenset(extra) if allowed is not None and extra else allowed
+
+def _open_risk_today(out_dir: Path) -> float:
+    """
+    何をする関数？：
+      - きょうすでに出したシグナル（out_dir と out_dir/sent/ の {YYYYMMDD}__*.json）の合計リスク Σ qty×(entry−SL) を USD で返します。
+      - 実行のたびに daily_stop_R×1R を使い切れないよう、_size_signals の open_risk_usd に渡します（壊れたファイルは数えない）。
+    """
+    total = 0.0
+    for d in (out_dir, out_dir / "sent"):
+        if not d.exists():
+            continue
+        for p in d.glob(f"{_today_str()}__*.json"):
+            try:
+                js = orjson.loads(p.read_bytes())
+                entry = js.get("entry") or {}
+                ep = float(entry.get("price") or entry.get("limit") or 0.0)
+                sl = float((js.get("bracket") or {}).get("stopLossPrice") or 0.0)
+                total += max(int(js.get("qty") or 0), 0) * max(ep - sl, 0.0)
+            except Exception:
+                continue
+    return total
 
-def _compute_qty(entry_price: float, sl_price: float, cfg: dict) -> int:
+def _size_signals(signals: list[dict], risk: RiskConfig, open_risk_usd: float = 0.0) -> list[dict]:
     """
     何をする関数？：
-      - config.risk.account_size_usd と risk_per_trade_pct を使って数量（整数）を返します。
-      - 口座×リスク％ ÷ (entry−SL) で計算し、負やゼロは 0 にします。  :contentReference[oaicite:4]{index=4}
+      - 生成済みシグナル全件の数量を、risk.sizing.size_batch で**1回の配列演算**にまとめて決めます（risk は検証済みの config.risk）。
+      - 1件ごとの数量（口座×リスク％ ÷ (entry−SL)、round_lot/max_qty）に加え、バッチ全体に
+        合計リスク ≦ daily_stop_R×1R − open_risk_usd（きょう出し済みのリスク）、銘柄ごとの想定元本上限、買付余力 を
+        並び順（=検出順）優先でかけます。  :contentReference[oaicite:4]{index=4}
+      - 数量が 0 になったシグナルは出力しません（発注しても意味がないため）。
     使い方：
-      qty = _compute_qty(10.16, 9.91, cfg)
+      signals = _size_signals(signals, st.risk, open_risk_usd=_open_risk_today(out_dir))
     """
-    risk_cfg = cfg.get("risk") or {}
-    account = float(risk_cfg.get("account_size_usd", 10_000.0))    # 無指定なら $10k を仮定
-    r_pct   = float(risk_cfg.get("risk_per_trade_pct", 0.005))     # 0.5%/trade が既定  :contentReference[oaicite:5]{index=5}
+    if not signals:
+        return signals
+    entries = np.array([float(s["entry"].get("price") or s["entry"].get("limit") or 0.0) for s in signals])
+    stops   = np.array([float(s["bracket"].get("stopLossPrice") or 0.0) for s in signals])
     try:
-        return int(calc_qty_from_risk(entry_price, sl_price, account, r_pct))
-    except Exception:
-        return 0
+        qty = size_batch(
+            entries, stops, risk.account_size_usd, risk.risk_per_trade_pct,   # 0.5%/trade が既定  :contentReference[oaicite:5]{index=5}
+            round_lot=risk.round_lot,
+            max_qty=risk.max_qty,
+            symbols=[s["symbol"] for s in signals],
+            daily_stop_R=risk.daily_stop_R,
+            open_risk_usd=open_risk_usd,
+            max_notional_per_symbol=risk.max_notional_per_symbol_usd,
+            buying_power=risk.buying_power_usd,
+        )
+    except Exception as e:
+        logger.error("sizing failed: {} ; all qty=0", e)
+        qty = np.zeros(len(signals), dtype=np.int64)
+    out: list[dict] = []
+    for sig, q in zip(signals, qty.tolist()):
+        sig["qty"] = int(q)
+        if q > 0:
+            out.append(sig)
+        else:
+            logger.info("skip zero-qty signal (risk/notional/buying-power cap): {} {}", sig["setup"], sig["symbol"])
+    return out
+
+def _indicator_ns(df_ind: pd.DataFrame) -> int | None:
+    """何をする関数？：indicators スナップショットの“計算し終えた時刻”（computed_ns）を返します（古いファイルで列が無ければ None）。"""
+    if "computed_ns" not in df_ind.columns or df_ind["computed_ns"].isna().all():
+        return None
+    return int(df_ind["computed_ns"].max())
 
 def _already_exists(out_dir: Path, setup: str, symbol: str, entry_price: float) -> bool:
     """
@@ -108,7 +153,7 @@ def _already_exists(out_dir: Path, setup: str, symbol: str, entry_price: float)
             continue
     return False
 
-def _gen_A(df_bars: pd.DataFrame, df_ind: pd.DataFrame, cfg: dict) -> list[dict]:
+def _gen_A(df_bars: pd.DataFrame, df_ind: pd.DataFrame, st: Settings) -> list[dict]:
     """
     何をする関数？：
       - A：**ORB(5m)高値ブレイク＋VWAP上キープ**を「9:30–10:30 ET の全バー」を順に見て、
@@ -116,22 +161,23 @@ def _gen_A(df_bars: pd.DataFrame, df_ind: pd.DataFrame, cfg: dict) -> list[dict]
       具体条件：
         前足Close < ORB高値 かつ 今足Close ≥ ORB高値 かつ 今足Close ≥ 今足VWAP
     """
-    allowed = _active_watchlist(cfg)  # 何をする行？：前夜のwatchlist（A/B）に載っている銘柄だけ許可。無ければ全件許可。  :contentReference[oaicite:1]{index=1}
+    allowed = _active_watchlist(st)  # 何をする行？：前夜のwatchlist（A/B）に載っている銘柄だけ許可。無ければ全件許可。  :contentReference[oaicite:1]{index=1}
 
     if df_bars.empty or df_ind.empty:
         return []
     ind = df_ind.set_index("symbol")
+    ind_ns = _indicator_ns(df_ind)
     out: list[dict] = []
     win_s, win_e = time(9, 30), time(10, 30)  # 勝負時間  :contentReference[oaicite:3]{index=3}
+    df_win = df_bars[time_window_mask(df_bars["et"], win_s, win_e)]  # 何をする行？：勝負時間の絞り込みは全銘柄まとめて1回だけ
 
-    for sym, g in df_bars.groupby("symbol", sort=False):
+    for sym, g in df_win.groupby("symbol", sort=False, observed=True):
         if allowed and sym not in allowed:  # 何をする行？：ウォッチ外はスキップ（同日A/B混在を防ぐ運用ガード）。  :contentReference[oaicite:5]{index=5}
             continue
 
         if sym not in ind.index:
             continue
-        # 勝負時間に絞る
-        g = g[(g["et"].dt.time >= win_s) & (g["et"].dt.time < win_e)].reset_index(drop=True)
+        g = g.reset_index(drop=True)  # 勝負時間には絞り込み済み
         if len(g) < 2:
             continue
 
@@ -144,42 +190,44 @@ def _gen_A(df_bars: pd.DataFrame, df_ind: pd.DataFrame, cfg: dict) -> list[dict]
             if (prev_c < orb_hi) and (now_c >= orb_hi) and (now_c >= now_vw):
                 stop  = _price_round(orb_hi * 1.002)        # PDH+0.2%（Stop）  :contentReference[oaicite:4]{index=4}
                 limit = _price_round(stop   * 1.003)        # +0.3%（Limit）
-                br = _mk_bracket(limit, cfg)                # ブラケットは設定から  :contentReference[oaicite:5]{index=5}
-                qty = _compute_qty(limit, br["stopLossPrice"], cfg)  # 何をする行？：リスク％から数量を出す。  :contentReference[oaicite:6]{index=6}
+                br = _mk_bracket(limit, st.bracket)                # ブラケットは設定から  :contentReference[oaicite:5]{index=5}
 
                 out.append({
                     "date": _today_str(),
                     "symbol": sym,
                     "setup": "A",
                     "entryType": "stop_limit",
-                    "qty": qty,
+                    "qty": 0,  # 何をする行？：数量は全シグナルそろってから _size_signals で一括決定
                     "entry": {"stop": stop, "limit": limit, "price": limit},
                     "bracket": br,
                     "notes": "A: ORB breakout + VWAP above (first hit in window)",
+                    "trace": bar_trace(g.iloc[i], ind_ns),  # 何をする行？：このバーの時刻・受信・保存・指標の時刻を引き継ぐ
                 })
                 break  # その銘柄は1回だけ
     return out
 
 
-def _gen_B(df_bars: pd.DataFrame, df_ind: pd.DataFrame, cfg: dict) -> list[dict]:
+def _gen_B(df_bars: pd.DataFrame, df_ind: pd.DataFrame, st: Settings) -> list[dict]:
     """
     何をする関数？：
       - B：**AVWAP(9:30)±0.3%付近の反発**を「9:30–10:30 ET の全バー」から初回だけ拾い、Limitで出力。  :contentReference[oaicite:6]{index=6}
       具体条件：
         前足Close < 前足AVWAP かつ 今足Close ≥ 今足AVWAP かつ 乖離 ≤ 0.3%
     """
-    allowed = _active_watchlist(cfg)  # 何をする行？：前夜のwatchlist（A/B）に載っている銘柄だけ許可。無ければ全件許可。  :contentReference[oaicite:3]{index=3}
+    allowed = _active_watchlist(st)  # 何をする行？：前夜のwatchlist（A/B）に載っている銘柄だけ許可。無ければ全件許可。  :contentReference[oaicite:3]{index=3}
 
     if df_bars.empty or df_ind.empty:
         return []
+    ind_ns = _indicator_ns(df_ind)
     out: list[dict] = []
     win_s, win_e = time(9, 30), time(10, 30)  # 勝負時間  :contentReference[oaicite:7]{index=7}
+    df_win = df_bars[time_window_mask(df_bars["et"], win_s, win_e)]  # 何をする行？：勝負時間の絞り込みは全銘柄まとめて1回だけ
 
-    for sym, g in df_bars.groupby("symbol", sort=False):
+    for sym, g in df_win.groupby("symbol", sort=False, observed=True):
         if allowed and sym not in allowed:  # 何をする行？：ウォッチ外はスキップ（同日A/B混在を防ぐ運用ガード）。  :contentReference[oaicite:5]{index=5}
             continue
 
-        g = g[(g["et"].dt.time >= win_s) & (g["et"].dt.time < win_e)].reset_index(drop=True)
+        g = g.reset_index(drop=True)  # 勝負時間には絞り込み済み
         if len(g) < 2:
             continue
         for i in range(1, len(g)):
@@ -193,39 +241,51 @@ def _gen_B(df_bars: pd.DataFrame, df_ind: pd.DataFrame, cfg: dict) -> list[dict]
             crossed = (prev_c < prev_av) and (now_c >= now_av)
             if crossed and near:
                 price = _price_round(now_av)
-                br = _mk_bracket(price, cfg)                # ブラケットは設定から  :contentReference[oaicite:8]{index=8}
-                qty = _compute_qty(price, br["stopLossPrice"], cfg)  # 何をする行？：リスク％から数量を出す。  :contentReference[oaicite:8]{index=8}
+                br = _mk_bracket(price, st.bracket)                # ブラケットは設定から  :contentReference[oaicite:8]{index=8}
 
                 out.append({
                     "date": _today_str(),
                     "symbol": sym,
                     "setup": "B",
                     "entryType": "limit",
-                    "qty": qty,
+                    "qty": 0,  # 何をする行？：数量は全シグナルそろってから _size_signals で一括決定
                     "entry": {"price": price},
                     "bracket": br,
                     "notes": "B: AVWAP(9:30) pullback bounce (first hit in window)",
+                    "trace": bar_trace(g.iloc[i], ind_ns),  # 何をする行？：このバーの時刻・受信・保存・指標の時刻を引き継ぐ
                 })
                 break  # その銘柄は1回だけ
     return out
 
 
+def _drop_duplicates(signals: list[dict], out_dir: Path) -> list[dict]:
+    """
+    何をする関数？：
+      - きょう書き出し済みと同じシグナル（_already_exists）を落とします。
+      - 数量を決める前に呼び、書かれないシグナルがリスク・想定元本・買付余力の枠を使わないようにします。
+    """
+    out: list[dict] = []
+    for sig in signals:
+        entry_price = float(sig["entry"].get("price") or sig["entry"].get("limit") or 0.0)
+        if entry_price and _already_exists(out_dir, sig["setup"], sig["symbol"], entry_price):
+            logger.info("skip duplicate signal: {} {}", sig["setup"], sig["symbol"])
+            continue
+        out.append(sig)
+    return out
+
 def _write_signals(signals: list[dict], out_dir: Path) -> list[Path]:
     """
     何をする関数？：
-      - シグナルを 1ファイル=1JSON で書き出します（重複は簡易スキップ）。  :contentReference[oaicite:14]{index=14}
+      - シグナルを 1ファイル=1JSON で書き出します（重複は先に _drop_duplicates で落としておく）。  :contentReference[oaicite:14]{index=14}
     """
     out_dir.mkdir(parents=True, exist_ok=True)
     paths: list[Path] = []
     for sig in signals:
         sym = sig["symbol"]
         setup = sig["setup"]
-        entry_price = float(sig["entry"].get("price") or sig["entry"].get("limit") or 0.0)
-        if entry_price and _already_exists(out_dir, setup, sym, entry_price):
-            logger.info("skip duplicate signal: {} {}", setup, sym)
-            continue
         ts = datetime.now(get_et_tz()).strftime("%H%M%S")
         p = out_dir / f"{_today_str()}__{setup}_{sym}_{ts}.json"
+        sig.setdefault("trace", {})["signal"] = now_ns()  # 何をする行？：シグナルを書き出した時刻
         p.write_bytes(orjson.dumps(sig, option=orjson.OPT_INDENT_2))
         paths.append(p)
     return paths
@@ -240,16 +300,17 @@ def main() -> int:
     """
     load_dotenv_if_exists()
     logfile = configure_logging()
-    cfg = load_config()
+    st = load_settings()  # 何をする行？：検証済みの凍結スナップショット（不正な値なら ConfigError で起動時に止まる）
+    init_run_metrics("run_signals")  # 何をする行？：終了時に段ごとの時間を data/metrics/ へ保存
 
     # --- A/B の決定（環境変数で一時上書き可） ----------------------------
-    setup_cfg = ((cfg.get("strategy") or {}).get("active_setup", "A")).upper()
+    setup_cfg = st.strategy.active_setup
     env_setup = (os.environ.get("ACTIVE_SETUP") or "").strip().upper()
     if env_setup in {"A", "B"} and env_setup != setup_cfg:
         logger.info("override setup: {} -> {} (ACTIVE_SETUP)", setup_cfg, env_setup)
         setup = env_setup
-        # _active_watchlist() 側でも同じセットアップを見るよう、cfgにも反映
-        cfg.setdefault("strategy", {})["active_setup"] = setup
+        # _active_watchlist() 側でも同じセットアップを見るよう、スナップショットを差し替える（元は凍結のまま）
+        st = st.with_setup(setup)
     else:
         setup = setup_cfg
 
@@ -268,8 +329,8 @@ def main() -> int:
 
     if have_today:
         bars_path, indicators_path = str(p_bars_today), str(p_ind_today)
-        df_bars = pd.read_parquet(bars_path)
-        df_ind  = pd.read_parquet(indicators_path)
+        df_bars = read_parquet(bars_path)
+        df_ind  = read_parquet(indicators_path)
         logger.info(
             "signals inputs loaded: rows={} symbols={} (bars='{}', ind='{}')",
             len(df_bars), df_bars["symbol"].nunique() if not df_bars.empty else 0,
@@ -303,8 +364,8 @@ def main() -> int:
             "inputs not found for today -> fallback to latest: {} , {}",
             os.path.basename(bars_path), os.path.basename(indicators_path),
         )
-        df_bars = pd.read_parquet(bars_path)
-        df_ind  = pd.read_parquet(indicators_path)
+        df_bars = read_parquet(bars_path)
+        df_ind  = read_parquet(indicators_path)
         logger.info(
             "signals inputs loaded: rows={} symbols={} (bars='{}', ind='{}')",
             len(df_bars), df_bars["symbol"].nunique() if not df_bars.empty else 0,
@@ -313,12 +374,19 @@ def main() -> int:
 
     # --- シグナル生成 ------------------------------------------------------
     out_dir = Path("data") / "signals"
-    if setup == "A":
-        signals = _gen_A(df_bars, df_ind, cfg)
-    else:
-        signals = _gen_B(df_bars, df_ind, cfg)
-
-    paths = _write_signals(signals, out_dir)
+    with timer("stage_seconds", stage=f"gen_{setup}"):
+        if setup == "A":
+            signals = _gen_A(df_bars, df_ind, st)
+        else:
+            signals = _gen_B(df_bars, df_ind, st)
+
+    signals = _drop_duplicates(signals, out_dir)  # 何をする行？：書かれない重複は、数量の枠を使う前に落とす
+    with timer("stage_seconds", stage="size_signals"):
+        # 何をする行？：数量をバッチでまとめて決める（ポートフォリオ制約込み。きょう出し済みのリスクは枠から差し引く）
+        signals = _size_signals(signals, st.risk, open_risk_usd=_open_risk_today(out_dir))
+    with timer("stage_seconds", stage="write_signals"):
+        paths = _write_signals(signals, out_dir)
+    incr("signals_emitted", len(paths), setup=setup)
 
     # 各シグナルの内容をINFOに
     for _sig in signals:
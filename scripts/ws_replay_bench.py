@@ -0,0 +1,120 @@
+# ローカルのリプレイサーバ（providers/alpaca_replay.py）に Alpaca プロバイダ（alpaca_iex_ws._stream_once）を接続し、
+# 持続スループット・送信→保存の遅れ・取りこぼし／遅着を測る負荷試験ハーネスです。
+# 本番キー・場中は不要。保存先は一時フォルダ（STREAM_DIR）に切り替えるので、当日の data/stream は汚しません。
+
+from __future__ import annotations
+from pathlib import Path        # 入出力パス
+import argparse                 # 引数（データ源・速度・しきい値）
+import asyncio                  # サーバとプロバイダを同じイベントループで走らせる
+import os                       # ALPACA_WS_URL / STREAM_DIR の差し替え
+import tempfile                 # 一時保存先
+import time                     # 保存時刻（perf_counter_ns）
+import orjson
+from loguru import logger
+
+from rh_pdc_daytrade.utils.envutil import load_dotenv_if_exists  # 何をする関数？：.envを先に読む
+from rh_pdc_daytrade.utils.logutil import configure_logging       # 何をする関数？：ログ初期化（冪等）
+from rh_pdc_daytrade.providers.alpaca_replay import ReplayServer, load_ndjson_bars, synthetic_bars
+
+def _percentile(xs: list[float], q: float) -> float:
+    """何をする関数？：ソート済みでなくてもよい配列の q 分位（0–100）を返します（空なら NaN）。"""
+    if not xs:
+        return float("nan")
+    s = sorted(xs)
+    k = min(len(s) - 1, max(0, int(round(q / 100.0 * (len(s) - 1)))))
+    return s[k]
+
+async def _run(srv: ReplayServer, symbols: list[str], feed: str, timeout_s: float) -> dict[tuple[str, int], int]:
+    """
+    何をする関数？：
+      - サーバを起動し、プロバイダの受信ループを同じイベントループで走らせます。
+      - プロバイダの保存口（append_ndjson）を包んで、1本ごとの“保存し終えた時刻”を記録します。
+    戻り値：{(symbol, t秒): 保存時刻ns}
+    """
+    import websockets  # この関数内だけで使う（切断例外の型）
+    from rh_pdc_daytrade.providers import alpaca_iex_ws as ws_mod
+
+    persisted: dict[tuple[str, int], int] = {}
+    orig_append = ws_mod.append_ndjson
+
+    def _append_timed(channel: str, obj: dict) -> None:
+        orig_append(channel, obj)
+        persisted[(str(obj.get("S")), int(obj.get("t") or 0) // 1_000_000_000)] = time.perf_counter_ns()
+
+    await srv.start()
+    os.environ["ALPACA_WS_URL"] = srv.url
+    ws_mod.append_ndjson = _append_timed  # 何をする行？：このハーネス内だけ保存口を計測付きに差し替える
+    try:
+        task = asyncio.create_task(ws_mod._stream_once(symbols, "replay", "replay", feed=feed))
+        try:
+            await asyncio.wait_for(task, timeout=timeout_s)
+        except (websockets.ConnectionClosed, asyncio.TimeoutError):
+            pass  # サーバ側がリプレイ終了で切断する（正常）／時間切れ
+        except Exception as e:
+            logger.warning("ws_replay_bench: provider stopped: {}", e)
+    finally:
+        ws_mod.append_ndjson = orig_append
+        await srv.stop()
+    return persisted
+
+def main() -> int:
+    """
+    何をする関数？：
+      - NDJSON（--ndjson）か合成データ（--symbols/--minutes）をリプレイし、結果を表示（--out で JSON 保存）します。
+    使い方：
+      poetry run python scripts/ws_replay_bench.py --symbols 30 --minutes 390 --speed 0
+      poetry run python scripts/ws_replay_bench.py --ndjson data/stream/bars_20250909.ndjson --speed 60
+    """
+    ap = argparse.ArgumentParser(description="Replay bars through a local Alpaca-compatible WS and measure the provider.")
+    ap.add_argument("--ndjson", default=None, help="リプレイする bars_*.ndjson（省略時は合成データ）")
+    ap.add_argument("--symbols", type=int, default=30, help="合成データの銘柄数")
+    ap.add_argument("--minutes", type=int, default=390, help="合成データの分数")
+    ap.add_argument("--speed", type=float, default=0.0, help="再生速度（1=実時間, 60=60倍速, 0=最大速度）")
+    ap.add_argument("--late-ms", type=float, default=1000.0, help="この遅れを超えた保存を“遅着”として数える")
+    ap.add_argument("--timeout", type=float, default=3600.0, help="全体の打ち切り秒数")
+    ap.add_argument("--out", default=None, help="結果JSONの保存先")
+    args = ap.parse_args()
+
+    load_dotenv_if_exists()
+    logfile = configure_logging()
+
+    if args.ndjson:
+        bars = load_ndjson_bars(args.ndjson)
+        source = str(args.ndjson)
+    else:
+        bars = synthetic_bars([f"S{i:03d}" for i in range(args.symbols)], minutes=args.minutes)
+        source = f"synthetic:{args.symbols}x{args.minutes}"
+    symbols = sorted({b["S"] for b in bars})
+    if not bars:
+        logger.warning("ws_replay_bench: no bars to replay ({})", source)
+        return 0
+
+    with tempfile.TemporaryDirectory() as td:
+        os.environ["STREAM_DIR"] = td  # 何をする行？：当日の data/stream を汚さないよう一時フォルダへ保存させる
+        srv = ReplayServer(bars, speed=args.speed, port=0)
+        t0 = time.perf_counter_ns()
+        persisted = asyncio.run(_run(srv, symbols, "iex", args.timeout))
+        wall_s = (time.perf_counter_ns() - t0) / 1e9
+
+    lat_ms = [(persisted[k] - sent) / 1e6 for k, sent in srv.sent.items() if k in persisted]
+    dropped = sum(1 for k in srv.sent if k not in persisted)
+    late = sum(1 for x in lat_ms if x > args.late_ms)
+    span_s = ((max(persisted.values()) - min(srv.sent.values())) / 1e9) if persisted and srv.sent else float("nan")
+    res = {
+        "source": source, "speed": args.speed, "symbols": len(symbols),
+        "sent": len(srv.sent), "frames": srv.frames, "persisted": len(persisted),
+        "dropped": dropped, "late": late, "late_ms": args.late_ms,
+        "throughput_bars_per_s": (len(persisted) / span_s) if span_s and span_s > 0 else None,
+        "latency_ms": {"p50": _percentile(lat_ms, 50), "p95": _percentile(lat_ms, 95),
+                       "p99": _percentile(lat_ms, 99), "max": max(lat_ms) if lat_ms else None},
+        "wall_s": wall_s,
+    }
+    logger.info("ws_replay_bench: {} (logfile={})", res, logfile)
+    print(orjson.dumps(res, option=orjson.OPT_INDENT_2).decode())
+    if args.out:
+        Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.out).write_bytes(orjson.dumps(res, option=orjson.OPT_INDENT_2))
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
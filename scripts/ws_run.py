@@ -3,7 +3,6 @@
 
 from __future__ import annotations
 from pathlib import Path  # パス操作（watchlistの場所を扱う）
-import json               # サブスクライブ送信用のペイロード生成に使用
 try:
     import yaml           # symbols.yml からユニバースを読む（無ければ手動/JSONのみで動く）
 except Exception:
@@ -14,39 +13,29 @@ from threading import Thread  # 何をする行？：WSを別スレッドで実
 
 from rh_pdc_daytrade.utils.envutil import load_dotenv_if_exists   # .env 自動読込（最初に呼ぶ）  :contentReference[oaicite:5]{index=5}
 from rh_pdc_daytrade.utils.logutil import configure_logging        # ログ初期化（冪等）  :contentReference[oaicite:6]{index=6}
-from rh_pdc_daytrade.utils.configutil import load_config, load_symbols  # 設定/銘柄の共通ローダ  :contentReference[oaicite:7]{index=7}
+from rh_pdc_daytrade.utils.configutil import load_config  # 設定/銘柄の共通ローダ  :contentReference[oaicite:7]{index=7}
+from rh_pdc_daytrade.utils.metrics import init_run_metrics, serve_prometheus  # 何をする関数？：実行メトリクスの保存と Prometheus 公開
 
 def _watchlist_path(setup: str) -> Path:
     """
     何をする関数？：
       - 戦略A/Bに応じて、既定のウォッチリスト（data/eod/watchlist_A/B.json）のパスを返します。  :contentReference[oaicite:9]{index=9}
+      - data/eod/latest.json（マニフェスト）があればそれに従います（store/refdata に委譲）。
     """
-    s = "A" if str(setup).upper() != "B" else "B"
-    return Path("data") / "eod" / f"watchlist_{s}.json"
+    from rh_pdc_daytrade.store.refdata import watchlist_path  # 関数内だけで使うためここでインポート
+    return watchlist_path(setup)
 
 def _read_watchlist_symbols(p: Path) -> list[str]:
     """
     何をする関数？：
-      - watchlist_X.json から symbols配列を読み込み、重複除去＋大文字統一して返します。
+      - watchlist_X.json から symbols配列を読み込み、重複除去＋大文字統一して返します（同じ版なら再読込しない）。
       - 無ければ空配列を返し、上位へフォールバックさせます（“止めない”ため）。  :contentReference[oaicite:10]{index=10}
     """
+    from rh_pdc_daytrade.store.refdata import read_watchlist  # 関数内だけで使うためここでインポート
     if not p.exists():
         logger.warning("watchlist not found: {}", p)
         return []
-    import orjson  # 関数内でしか使わないためここでインポート（高速JSON読込）
-    try:
-        payload = orjson.loads(p.read_bytes())
-        raw = payload.get("symbols") or []
-    except Exception as e:
-        logger.error("watchlist parse error: {} ({})", p, e)
-        return []
-    result, seen = [], set()
-    for s in raw:
-        sym = str(s).strip().upper()
-        if sym and sym not in seen:
-            seen.add(sym)
-            result.append(sym)
-    return result
+    return list(read_watchlist(p))
 
 def _load_session_symbols(cfg: dict) -> list[str]:
     """
@@ -55,51 +44,34 @@ def _load_session_symbols(cfg: dict) -> list[str]:
       - ファイル無し・空・壊れのときは symbols.yml の quick_test → 最後に固定4銘柄へ“安全フォールバック”。
       - どのファイルを使ったか／何銘柄読めたかをログに出し、原因調査を簡単にします。  :contentReference[oaicite:2]{index=2}
     """
-    from pathlib import Path            # 関数内だけで使うのでここに書く（ルール準拠）
-    import orjson                       # 同上（遅延インポートで起動失敗を防ぐ）
+    from rh_pdc_daytrade.store.refdata import symbol_list, watchlist_path, watchlist_symbols  # 関数内だけで使うためここでインポート（mtime が変わるまで読み直さないキャッシュ）
 
     # 0) 何をするブロック？：
-    #    環境変数 WATCHLIST_FILE / MANUAL_WATCHLIST が指す手動TXTを“最優先”で読む。
+    #    環境変数 WATCHLIST_FILE / MANUAL_WATCHLIST が指す手動TXT/CSVを“最優先”で読む。
     #    空行・#コメントをスキップし、重複を除いた配列が得られたら即returnする。
     manual = os.environ.get("WATCHLIST_FILE") or os.environ.get("MANUAL_WATCHLIST")
     if manual:
         _mf = Path(manual)
         if _mf.exists():
-            try:
-                _syms, _seen = [], set()
-                for line in _mf.read_text(encoding="utf-8").splitlines():
-                    s = line.strip().upper()
-                    if not s or s.startswith("#"):
-                        continue
-                    if s not in _seen:
-                        _seen.add(s); _syms.append(s)
-                if _syms:
-                    logger.info("ws_run: using manual watchlist {} ({} symbols)", _mf, len(_syms))
-                    return _syms
-                else:
-                    logger.warning("ws_run: manual watchlist {} has no symbols; fallback", _mf)
-            except Exception as e:
-                logger.warning("ws_run: manual watchlist read failed ({}); fallback", e)
+            _syms = list(symbol_list(_mf))
+            if _syms:
+                logger.info("ws_run: using manual watchlist {} ({} symbols)", _mf, len(_syms))
+                return _syms
+            logger.warning("ws_run: manual watchlist {} has no symbols or unreadable; fallback", _mf)
         else:
             logger.warning("ws_run: manual watchlist not found: {}", _mf)
 
     # A/Bの余計な空白や小文字を吸収（"A "→"A" など）。  :contentReference[oaicite:3]{index=3}
     setup = str((cfg.get("strategy") or {}).get("active_setup", "A")).strip().upper()
-    wl_path = Path("data") / "eod" / f"watchlist_{setup}.json"
+    wl_path = watchlist_path(setup)
 
-    # 1) 前夜のwatchlistを読む
+    # 1) 前夜のwatchlistを読む（壊れ・空は空タプルで返る）
     if wl_path.exists():
-        try:
-            data = orjson.loads(wl_path.read_bytes())
-            raw = data.get('symbols') if isinstance(data, dict) else []
-            syms = [str(s).strip().upper() for s in raw if isinstance(s, str) and str(s).strip()]
-            if syms:
-                logger.info('ws_run: using {} ({} symbols) for setup={}', wl_path, len(syms), setup)
-                return syms
-            else:
-                logger.warning('ws_run: {} has no 'symbols' or empty; fallback to symbols.yml', wl_path)
-        except Exception as e:
-            logger.warning('ws_run: failed to parse {} ({}) ; fallback to symbols.yml', wl_path, e)
+        syms = list(watchlist_symbols(setup))
+        if syms:
+            logger.info('ws_run: using {} ({} symbols) for setup={}', wl_path, len(syms), setup)
+            return syms
+        logger.warning("ws_run: {} has no 'symbols', empty or unparsable; fallback to symbols.yml", wl_path)
 
     # 2) symbols.yml の quick_test へフォールバック（運用手順の既定）。  :contentReference[oaicite:4]{index=4}
     try:
@@ -116,6 +88,42 @@ def _load_session_symbols(cfg: dict) -> list[str]:
     logger.info("ws_run: using defaults {} (no watchlist/symbols.yml available)", defaults)
     return defaults
 
+def _build_scan_link(cfg: dict, syms: list[str]):
+    """
+    何をする関数？：
+      - config.scanner.enabled（または環境変数 SCANNER_ENABLED=1）のとき、前夜の EOD 特徴量（pdc/pdh/avg_volume20）を参照値にした
+        場中スキャナと、注目銘柄（ウォッチリスト＋上位、max_focus まで）をつないだ ScanLink を返します。
+      - 無効のとき・EOD 特徴量が無いときは None（従来どおりウォッチリストだけを購読）。
+      - 採点に使う bars の購読は scanner.scope（空なら EOD 特徴量の銘柄を平均出来高の多い順）を scanner.scope_max 銘柄までにします。
+      - 時刻別の出来高プロファイル（indicators.volprofile）があれば、RVOL の分母を“その銘柄のふだんのその時刻までの割合”にします。
+    """
+    from rh_pdc_daytrade.store.refdata import latest_eod_features          # 関数内だけで使うためここでインポート
+    from rh_pdc_daytrade.screening.intraday_scan import IntradayScanner, FocusSet
+    from rh_pdc_daytrade.providers.alpaca_iex_ws import ScanLink
+    from rh_pdc_daytrade.indicators.volprofile import load_profile
+    sc = cfg.get("scanner") or {}
+    env = os.getenv("SCANNER_ENABLED", "").strip().lower()
+    if not (env in ("1", "true", "yes", "on") or (not env and bool(sc.get("enabled", False)))):
+        return None
+    eod = latest_eod_features()
+    if eod is None or eod.empty:
+        logger.warning("ws_run: scanner enabled but no EOD features found; scanner off")
+        return None
+    prof = load_profile()  # 何をする行？：無ければ None（スキャナは場中の経過割合で代用）
+    scanner = IntradayScanner.from_config(cfg, eod, expected_frac=prof.frac if prof is not None else None)
+    focus = FocusSet(syms, limit=int(sc.get("max_focus", 30)))
+    scope = [str(x).upper() for x in (sc.get("scope") or [])]
+    if not scope and "avg_volume20" in eod.columns:
+        # 何をする行？：scope が空なら、採点できる銘柄を前夜の平均出来高の多い順に（scope_max で切るので上位だけが残る）
+        adv = eod.assign(symbol=eod["symbol"].astype(str).str.upper()).sort_values("avg_volume20", ascending=False)
+        uni = set(scanner.universe)
+        scope = [x for x in adv["symbol"].tolist() if x in uni]
+    link = ScanLink(scanner, focus, scope=scope, channels=list(sc.get("channels") or ["updatedBars"]),
+                    interval_s=float(sc.get("resubscribe_sec", 60)), scope_max=sc.get("scope_max", 30))
+    logger.info("ws_run: scanner on (universe={} top_k={} max_focus={} bars={} volume_profile={})",
+                len(scanner.universe), scanner.ranking.k, focus.limit, len(link.subscribe_message()["bars"]),
+                0 if prof is None else len(prof))
+    return link
 
 def main() -> int:
     """
@@ -129,9 +137,16 @@ def main() -> int:
     load_dotenv_if_exists()                 # まず .env を適用（APIキー・FEEDなど）  :contentReference[oaicite:14]{index=14}
     logfile = configure_logging()           # data/logs/bot.log に出力  :contentReference[oaicite:15]{index=15}
     cfg = load_config()                     # configs/config.yaml を読み込み  :contentReference[oaicite:16]{index=16}
+    init_run_metrics("ws_run")              # 何をする行？：終了時に受信件数・保存時間を data/metrics/ へ保存
+    _mport = os.getenv("METRICS_PORT", "").strip()
+    if _mport.isdigit():
+        try:
+            serve_prometheus(int(_mport))   # 何をする行？：常駐中の受信状況を http://127.0.0.1:PORT/metrics で見られるようにする
+            logger.info("ws_run: prometheus metrics on http://127.0.0.1:{}/metrics", _mport)
+        except OSError as e:
+            logger.warning("ws_run: metrics port {} unavailable ({})", _mport, e)
     syms = _load_session_symbols(cfg)  # 何をする行？：前夜のwatchlist（A/B）から当日の購読銘柄を決める。無ければ安全Fallback。  :contentReference[oaicite:5]{index=5}
     # 何をする行？：IEXは最大30銘柄までなので、必要なら安全にトリミングします。  :contentReference[oaicite:2]{index=2}
-    import os  # この関数内でしか使わないため関数内importにします
     feed = os.getenv("ALPACA_FEED", "").lower() or str((cfg.get("runtime") or {}).get("provider_realtime", "")).lower()
     if "iex" in feed and len(syms) > 30:
         logger.warning("ws_run: iex feed allows up to 30 symbols; trimming from {} to 30", len(syms))
@@ -163,13 +178,11 @@ def main() -> int:
         except Exception as e:
             logger.warning(f"failed to remove legacy ws lock: {legacy_lock} ({e})")
 
-    
-    from rh_pdc_daytrade.providers.alpaca_iex_ws import connect_and_stream  # 何をする行？：STREAM_DIR設定後にimportして、単一実行ロックと保存先を同じ環境変数で解決させる
-
+    scan = _build_scan_link(cfg, syms)  # 何をする行？：場中スキャナ（有効なときだけ）。注目銘柄は接続したまま入れ替える
     logger.info("ws_run start: feed={} symbols={} run_seconds={} (logfile={})", feed, syms, run_seconds, logfile)  # 何をする行？：確定した秒数を開始ログに出す
     def _runner():  # 何をする関数？：WS接続ループの起動ラッパー（STREAM_DIR設定後にimportさせる）
-        from rh_pdc_daytrade.providers.alpaca_iex_ws import connect_and_stream  # 何をする行？：環境が整った後に限定してimport
-        connect_and_stream(syms, feed=feed, run_seconds=run_seconds)  # 何をする行？：WS本体を起動
+        from rh_pdc_daytrade.providers.alpaca_iex_ws import connect_and_stream  # 何をする行？：STREAM_DIR設定後にimportして、単一実行ロックと保存先を同じ環境変数で解決させる
+        connect_and_stream(syms, feed=feed, run_seconds=run_seconds, scan=scan)  # 何をする行？：WS本体を起動
 
     t = Thread(target=_runner, daemon=True)  # 何をする行？：WSをデーモンスレッドで実行
     t.start(); t.join(run_seconds)           # 何をする行？：規定秒だけ待機してメイン処理を確実に返す
@@ -0,0 +1,3 @@
+# 場中の指標計算（1分バーの格子・VWAP/AVWAP/ORB など）をまとめる名前空間です。
+# ここでは import を行わず、各モジュール（grid など）を直接読み込む前提にします。
+__all__ = []  # 公開対象は各サブモジュール側で宣言します
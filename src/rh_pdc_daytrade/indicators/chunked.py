@@ -0,0 +1,195 @@
+# 1日分のバーを“塊”ごとに流し込み、VWAP / AVWAP / ORB を塊をまたいで引き継ぎながら計算するモジュールです。
+# ねらい：
+#  - compute_indicators は1日分を1つの DataFrame に載せて groupby の累積和を取るので、全銘柄の SIP の1日だと
+#    メモリが足りない。ここでは銘柄ごとの累積（Σ価格×出来高, Σ出来高 …）と ORB の高値/安値だけを持ち越し、
+#    塊ごとに計算しては書き出して手放します（ピークのメモリは塊の大きさと保留分で決まり、ファイルの大きさに依らない）。
+#  - 再送・訂正（updatedBars）・少し遅れて届いたバーのために、最新のバー時刻から settle_minutes 分以内の行は
+#    “保留”にして次の塊と一緒に畳みます（(銘柄, t) ごとに 同じ値の再送は最初の行、値が違えば最後の行を採用：store.barindex と同じ規則）。
+#    保留を抜けた（確定した）行だけを (銘柄, t) の順に計算して返すので、確定済みの行を後から書き換えることはありません。
+#    確定より前の時刻のバーが後から来たら、遅すぎるものとして数えて捨てます（late）。
+# 定義は compute_indicators と同じ：VWAP は終値×出来高の当日累積、AVWAP はアンカー時刻（ET）以降の累積、ORB は寄りから N 分の高値/安値。
+# profile（indicators.volprofile）を渡すと、寄りからの累積出来高 ÷ ふだんのその時刻までの累積 を 'rvol' 列として付けます。
+# extra（ema9, atr14, hod, hh20 … indicators.streaming）を渡すと、確定行を銘柄ごとの1本ずつの状態に流してその列も付けます。
+
+from __future__ import annotations
+from datetime import time as _dtime
+import numpy as np
+import pandas as pd
+
+from rh_pdc_daytrade.utils.timeutil import et_time_of_day_ns, time_to_ns, orb_window_mask  # 時刻判定を配列で一括計算
+from rh_pdc_daytrade.utils.io import compact_frame  # 確定行を 1分バーのコンパクト列型で返すため
+from rh_pdc_daytrade.indicators.volprofile import VolumeProfile, session_minute, SESSION_MINUTES  # 時刻別出来高プロファイル（RVOL 用）
+from rh_pdc_daytrade.indicators.streaming import StreamingIndicatorSet  # EMA/ATR/HOD などを塊をまたいで引き継ぐ
+
+_NS_PER_MIN = 60_000_000_000
+_STATE_COLS = ["cum_pv", "cum_v", "cum_pv_a", "cum_v_a", "cum_v_r", "vwap", "avwap", "rvol"]
+OUT_COLUMNS = ["symbol", "et", "o", "h", "l", "c", "v", "ws_recv_ns", "persisted_ns", "vwap", "avwap", "rvol"]
+
+class ChunkedIndicators:
+    """
+    何をするクラス？：
+      - push(塊) で到着順のバーを受け取り、確定した行（vwap/avwap 付き、(銘柄, t) 順）を返します。finish() で残りを全部確定します。
+      - summary() は銘柄ごとの最新 vwap/avwap と ORB 高値/安値（compute_indicators の indicators と同じ列）です。
+    使い方：
+      ci = ChunkedIndicators(anchor="09:30:00", orb_minutes=5)
+      for chunk in iter_bar_batches(p, 200_000):
+          done = ci.push(chunk)      # → 書き出して手放す
+      done = ci.finish()
+      snap = ci.summary()
+    """
+
+    def __init__(self, anchor: str | _dtime = "09:30:00", orb_minutes: int = 5, settle_minutes: int = 15,
+                 profile: VolumeProfile | None = None, extra=()):
+        self.anchor_ns = time_to_ns(anchor)
+        self.profile = profile
+        self._ind = StreamingIndicatorSet(extra) if extra else None
+        self._out_cols = [c for c in OUT_COLUMNS if c != "rvol" or profile is not None] + (self._ind.names if self._ind else [])
+        self.orb_minutes = int(orb_minutes)
+        self.settle_ns = max(0, int(settle_minutes)) * _NS_PER_MIN
+        self._pending: pd.DataFrame | None = None
+        self._head = np.iinfo(np.int64).min  # これまでに見た最新のバー時刻（UTC ns）
+        self._cut = np.iinfo(np.int64).min   # これより前の時刻は確定済み
+        self._state = pd.DataFrame(columns=_STATE_COLS, dtype="float64")
+        self._orb = pd.DataFrame(columns=["orb_high", "orb_low"], dtype="float64")
+        self.rows_in = self.rows_out = 0
+        self.dups = self.updates = self.late = 0
+
+    @property
+    def pending_rows(self) -> int:
+        """何をする関数？：まだ確定していない（保留中の）行数。"""
+        return 0 if self._pending is None else len(self._pending)
+
+    # ---- 取り込み（重複・訂正を畳む） ------------------------------------------------------------
+
+    def _fold(self, df: pd.DataFrame) -> pd.DataFrame:
+        # 何をする関数？：(銘柄, t) ごとに1行へ畳み、(銘柄, t) 順に並べて返す（到着順は df の行順）。
+        codes, _ = pd.factorize(df["symbol"], sort=True)
+        t = df["et"].to_numpy(dtype="datetime64[ns]").view(np.int64)
+        order = np.lexsort((np.arange(len(df)), t, codes))
+        cs, ts = codes[order], t[order]
+        start = np.ones(len(order), dtype=bool)
+        start[1:] = (cs[1:] != cs[:-1]) | (ts[1:] != ts[:-1])
+        if start.all():
+            return df.iloc[order].reset_index(drop=True)
+        first = np.flatnonzero(start)
+        last = np.append(first[1:], len(order)) - 1
+        vals = df[["o", "h", "l", "c", "v"]].to_numpy(dtype=np.float64)
+        fi, li = order[first], order[last]
+        same = (vals[fi] == vals[li]).all(axis=1)
+        multi = last > first
+        self.dups += int((last - first)[same].sum())
+        self.updates += int((multi & ~same).sum())
+        return df.iloc[np.where(same, fi, li)].reset_index(drop=True)
+
+    def push(self, chunk: pd.DataFrame) -> pd.DataFrame:
+        """
+        何をする関数？：
+          - 到着順の塊を取り込み、保留分と一緒に畳んでから、確定した行を計算して返します（無ければ空）。
+        """
+        if chunk is None or chunk.empty:
+            return self._empty()
+        self.rows_in += len(chunk)
+        t = chunk["et"].to_numpy(dtype="datetime64[ns]").view(np.int64)
+        late = t < self._cut
+        if late.any():
+            self.late += int(late.sum())
+            chunk, t = chunk[~late], t[~late]
+        if chunk.empty:
+            return self._empty()
+        self._head = max(self._head, int(t.max()))
+        df = chunk if self._pending is None else pd.concat([self._pending, chunk], ignore_index=True)
+        df = self._fold(df)
+        self._cut = max(self._cut, self._head - self.settle_ns)
+        ready = df["et"].to_numpy(dtype="datetime64[ns]").view(np.int64) < self._cut
+        self._pending = df[~ready].reset_index(drop=True)
+        return self._settle(df[ready])
+
+    def finish(self) -> pd.DataFrame:
+        """何をする関数？：保留中の行をすべて確定させて返します（ストリームの終わりで1回呼ぶ）。"""
+        df, self._pending = self._pending, None
+        self._cut = self._head + 1
+        if df is None or df.empty:
+            return self._empty()
+        return self._settle(df)
+
+    # ---- 確定行の計算（持ち越し状態を足して累積） ----------------------------------------------------
+
+    def _empty(self) -> pd.DataFrame:
+        return pd.DataFrame(columns=self._out_cols)
+
+    def _settle(self, df: pd.DataFrame) -> pd.DataFrame:
+        # 何をする関数？：(銘柄, t) 順の確定行に、銘柄ごとの持ち越し累積を足して vwap/avwap を付け、状態を進める。
+        if df.empty:
+            return self._empty()
+        df = df.drop(columns=["u"], errors="ignore").reset_index(drop=True)
+        df = compact_frame(df.assign(symbol=df["symbol"].astype(str)))  # 保存と同じ float32/uint32 に落としてから計算（バッチ版と同じ値）
+        c = df["c"].astype("float64").to_numpy()
+        v = df["v"].astype("float64").to_numpy()
+        after = et_time_of_day_ns(df["et"]) >= self.anchor_ns
+        minute = session_minute(df["et"])
+        sym = df["symbol"].astype(str)
+        parts = pd.DataFrame({"pv": c * v, "v": v, "pv_a": c * v * after, "v_a": v * after,
+                              "v_r": v * ((minute >= 0) & (minute < SESSION_MINUTES))})
+        cum = parts.groupby(sym.to_numpy(), sort=False).cumsum()
+        base = (self._state.reindex(sym.to_numpy())[["cum_pv", "cum_v", "cum_pv_a", "cum_v_a", "cum_v_r"]]
+                .fillna(0.0).to_numpy())
+        cum_pv = cum["pv"].to_numpy() + base[:, 0]
+        cum_v = cum["v"].to_numpy() + base[:, 1]
+        cum_pv_a = cum["pv_a"].to_numpy() + base[:, 2]
+        cum_v_a = cum["v_a"].to_numpy() + base[:, 3]
+        cum_v_r = cum["v_r"].to_numpy() + base[:, 4]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            df["vwap"] = cum_pv / cum_v
+            df["avwap"] = cum_pv_a / cum_v_a
+        rvol = (self.profile.rvol_array(sym.to_numpy(), minute, cum_v_r) if self.profile is not None
+                else np.full(len(df), np.nan))
+        if self.profile is not None:
+            df["rvol"] = rvol
+        if self._ind is not None:
+            t_ns = df["et"].to_numpy(dtype="datetime64[ns]").view(np.int64)
+            vals = self._ind.update_many(sym.tolist(), t_ns, df["h"].astype("float64").to_numpy(),
+                                         df["l"].astype("float64").to_numpy(), c)
+            for name, arr in vals.items():
+                df[name] = arr
+
+        # 状態：銘柄ごとの最後の行の累積と vwap/avwap を持ち越す
+        last = np.append(sym.to_numpy()[1:] != sym.to_numpy()[:-1], True)
+        upd = pd.DataFrame({"cum_pv": cum_pv[last], "cum_v": cum_v[last], "cum_pv_a": cum_pv_a[last],
+                            "cum_v_a": cum_v_a[last], "cum_v_r": cum_v_r[last], "vwap": df["vwap"].to_numpy()[last],
+                            "avwap": df["avwap"].to_numpy()[last], "rvol": rvol[last]}, index=sym.to_numpy()[last])
+        self._state = upd.combine_first(self._state) if len(self._state) else upd
+
+        # ORB：窓の中の行だけを銘柄ごとに集め、これまでの高値/安値と合わせる
+        m = orb_window_mask(df["et"], minutes=self.orb_minutes)
+        if m.any():
+            agg = (df.loc[m, ["h", "l"]].astype("float64").groupby(sym[m].to_numpy())
+                     .agg(orb_high=("h", "max"), orb_low=("l", "min")))
+            if len(self._orb):
+                old = self._orb.reindex(agg.index)
+                agg["orb_high"] = np.fmax(agg["orb_high"], old["orb_high"])
+                agg["orb_low"] = np.fmin(agg["orb_low"], old["orb_low"])
+                agg = agg.combine_first(self._orb)
+            self._orb = agg
+
+        self.rows_out += len(df)
+        df = compact_frame(df)
+        return df[[c for c in self._out_cols if c in df.columns]]
+
+    def summary(self) -> pd.DataFrame:
+        """
+        何をする関数？：銘柄ごとの最新 vwap/avwap と ORB 高値/安値（symbol, vwap, avwap, orb_high, orb_low）を返します。
+        profile があれば最新の rvol、extra があればその最新値も付けます（compute_indicators のスナップショットと同じ列）。
+        """
+        cols = ["vwap", "avwap"] + (["rvol"] if self.profile is not None else [])
+        snap = self._state[cols]
+        if self._ind is not None:
+            snap = snap.join(pd.DataFrame.from_dict(self._ind.snapshot(), orient="index", columns=self._ind.names), how="left")
+            cols += self._ind.names
+        snap = snap.join(self._orb, how="left")
+        snap = snap.rename_axis("symbol").reset_index().sort_values("symbol", kind="mergesort").reset_index(drop=True)
+        return snap[["symbol", *cols, "orb_high", "orb_low"]]
+
+    def stats(self) -> dict:
+        """何をする関数？：取り込み・確定・保留・重複・訂正・遅すぎた行の件数（ログ・ベンチ用）。"""
+        return {"rows_in": self.rows_in, "rows_out": self.rows_out, "pending": self.pending_rows,
+                "dups": self.dups, "updates": self.updates, "late": self.late}
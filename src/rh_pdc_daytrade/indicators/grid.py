@@ -0,0 +1,213 @@
+# 1日の場中バーを「銘柄 × 場中の分（既定 09:30 からの 390 分）」の密な NumPy 配列で持つ格子ストアです。
+# ねらい：
+#  - いまの指標計算は縦長 DataFrame を ["symbol","et"] で並べ替え、groupby で累積和を取っている（並べ替えと確保が毎回走る）。
+#  - ここでは o/h/l/c/v を [symbol_id, minute] の2次元配列（欠損は NaN）に先に確保しておき、
+#    ストリームからの1本の挿入は添字計算だけの O(1)、VWAP/AVWAP/ORB/HOD は全銘柄まとめて axis=1 の累積演算で出します。
+#  - 同じ分の列を縦に見れば、全銘柄の横断スキャン（ランキング等）もそのまま書けます。
+# 使っている所：scripts/bars_ring_tap.py --grid / --snapshot（共有メモリのリングから受けたバーを格子に入れ、全銘柄のスナップショットを作る）。
+
+from __future__ import annotations
+from datetime import date, datetime, time as _dtime
+import numpy as np
+
+from rh_pdc_daytrade.utils.timeutil import get_et_tz, time_to_ns  # ET の寄り時刻を ns に直すため
+
+_NS_PER_MIN = 60_000_000_000
+FIELDS = ("o", "h", "l", "c", "v")
+
+class MinuteGrid:
+    """
+    何をするクラス？：
+      - 1セッション分の 1分バーを [銘柄, 分] の配列で保持し、挿入と全銘柄一括の指標計算を提供します。
+      - 銘柄の行は先に max_symbols 行ぶん確保し、足りなくなったら倍に広げます（挿入のたびには確保しない）。
+    使い方：
+      g = MinuteGrid(date(2025, 9, 9))
+      g.insert("AAPL", t_ns, o, h, l, c, v)   # ストリームから1本ずつ
+      vw = g.vwap()                           # shape=(銘柄数, 390)
+    """
+
+    def __init__(self, session_date: date, symbols: list[str] | None = None,
+                 open_time: str | _dtime = "09:30", minutes: int = 390, max_symbols: int = 64):
+        self.session_date = session_date
+        self.open_time = open_time if isinstance(open_time, _dtime) else _dtime.fromisoformat(str(open_time))
+        self.minutes = int(minutes)
+        start = datetime.combine(session_date, self.open_time, tzinfo=get_et_tz())
+        self.open_ns = int(start.timestamp()) * 1_000_000_000 + start.microsecond * 1_000
+        self.symbols: list[str] = []
+        self._ids: dict[str, int] = {}
+        cap = max(int(max_symbols), len(symbols or []), 1)
+        self._arr = {f: np.full((cap, self.minutes), np.nan) for f in FIELDS}
+        for s in symbols or []:
+            self.symbol_id(s)
+
+    # ---- 形・銘柄 -------------------------------------------------------------------------------
+
+    def __len__(self) -> int:
+        return len(self.symbols)
+
+    def __getattr__(self, name: str) -> np.ndarray:
+        # 何をする関数？：g.o / g.h / g.l / g.c / g.v で、使っている銘柄行だけの配列ビューを返す（コピーしない）。
+        if name in FIELDS:
+            return self.__dict__["_arr"][name][: len(self.__dict__["symbols"])]
+        raise AttributeError(name)
+
+    def symbol_id(self, symbol: str) -> int:
+        """何をする関数？：銘柄の行番号を返します（初見なら採番し、容量が足りなければ倍に広げます）。"""
+        s = str(symbol or "").upper()
+        sid = self._ids.get(s)
+        if sid is not None:
+            return sid
+        sid = len(self.symbols)
+        cap = self._arr["c"].shape[0]
+        if sid >= cap:
+            for f in FIELDS:
+                grown = np.full((cap * 2, self.minutes), np.nan)
+                grown[:cap] = self._arr[f]
+                self._arr[f] = grown
+        self.symbols.append(s)
+        self._ids[s] = sid
+        return sid
+
+    def minute_index(self, t_ns):
+        """何をする関数？：UTCのnsエポック（スカラー/配列）を、寄りからの分番号に直します（場外は範囲外の値のまま）。"""
+        return (np.asarray(t_ns, dtype=np.int64) - self.open_ns) // _NS_PER_MIN
+
+    # ---- 挿入 -----------------------------------------------------------------------------------
+
+    def insert(self, symbol: str, t_ns: int, o: float, h: float, l: float, c: float, v: float) -> bool:
+        """
+        何をする関数？：
+          - 1本を [銘柄, 分] のマスに書きます（同じ分に再送が来たら上書き）。場外の時刻なら何もせず False。
+        """
+        m = (int(t_ns) - self.open_ns) // _NS_PER_MIN
+        if m < 0 or m >= self.minutes:
+            return False
+        i = self.symbol_id(symbol)
+        a = self._arr
+        a["o"][i, m] = o
+        a["h"][i, m] = h
+        a["l"][i, m] = l
+        a["c"][i, m] = c
+        a["v"][i, m] = v
+        return True
+
+    def insert_bar(self, bar: dict) -> bool:
+        """何をする関数？：standardize_bar の dict（S/t/o/h/l/c/v）をそのまま挿入します。"""
+        return self.insert(bar.get("S"), bar.get("t") or 0, bar.get("o"), bar.get("h"),
+                           bar.get("l"), bar.get("c"), bar.get("v"))
+
+    def insert_many(self, symbols, t_ns, o, h, l, c, v) -> int:
+        """
+        何をする関数？：
+          - 配列でまとめて挿入します（NDJSON/バイナリ/共有メモリのリングから読んだ塊をそのまま渡す用）。
+          - symbols は str/bytes の配列。戻り値は場中に入って書き込んだ本数。
+        """
+        sym = np.asarray(symbols)
+        uniq, inv = np.unique(sym, return_inverse=True)
+        ids = np.array([self.symbol_id(u.decode("ascii", "replace") if isinstance(u, bytes) else u) for u in uniq],
+                       dtype=np.int64)[inv]
+        m = self.minute_index(t_ns)
+        ok = (m >= 0) & (m < self.minutes)
+        ids, m = ids[ok], m[ok]
+        for f, vals in zip(FIELDS, (o, h, l, c, v)):
+            self._arr[f][ids, m] = np.asarray(vals, dtype=np.float64)[ok]
+        return int(ok.sum())
+
+    def insert_ring(self, recs: np.ndarray) -> int:
+        """何をする関数？：store.barring の BarRingReader.poll() の結果（RING_DTYPE）をまとめて挿入します。"""
+        return self.insert_many(recs["S"], recs["t"], recs["o"], recs["h"], recs["l"], recs["c"], recs["v"])
+
+    @classmethod
+    def from_frame(cls, df, open_time: str | _dtime = "09:30", minutes: int = 390) -> "MinuteGrid":
+        """
+        何をする関数？：
+          - compute_indicators の縦長 DataFrame（symbol, et, o,h,l,c,v）から格子を作ります（日付は最初の行のET日付）。
+        """
+        import pandas as pd  # この関数内だけで使うためここでインポート
+        et = pd.DatetimeIndex(df["et"])
+        if et.tz is None:
+            et = et.tz_localize(get_et_tz())
+        g = cls(et[0].date(), open_time=open_time, minutes=minutes, max_symbols=max(1, df["symbol"].nunique()))
+        g.insert_many(df["symbol"].astype(str).to_numpy(), et.as_unit("ns").asi8,
+                      df["o"], df["h"], df["l"], df["c"], df["v"])
+        return g
+
+    # ---- 全銘柄一括の指標（axis=1 の累積演算） ----------------------------------------------------
+
+    def _col(self, t: str | _dtime) -> int:
+        # 何をする関数？：ETの時刻（"09:35" など）を格子の列番号に直す（範囲外は 0..minutes に丸める）。
+        k = (time_to_ns(t) - time_to_ns(self.open_time)) // _NS_PER_MIN
+        return int(min(max(k, 0), self.minutes))
+
+    def vwap(self, start: int = 0) -> np.ndarray:
+        """
+        何をする関数？：
+          - 列 start 以降の累積 VWAP（終値×出来高で近似、compute_indicators と同じ定義）を返します。
+          - 欠損の分は直前の値を引き継ぎ、start より前と出来高がまだ0の分は NaN。
+        """
+        c, v = self.c, self.v
+        pv = np.where(np.isnan(c) | np.isnan(v), 0.0, c * v)
+        vv = np.where(np.isnan(v), 0.0, v)
+        pv[:, :start] = 0.0
+        vv[:, :start] = 0.0
+        cum_pv = np.cumsum(pv, axis=1)
+        cum_v = np.cumsum(vv, axis=1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(cum_v > 0, cum_pv / cum_v, np.nan)
+
+    def avwap(self, anchor: str | _dtime = "09:30:00") -> np.ndarray:
+        """何をする関数？：アンカー時刻（ET）以降の累積 AVWAP を返します（アンカーより前は NaN）。"""
+        return self.vwap(start=self._col(anchor))
+
+    def orb(self, minutes: int = 5) -> tuple[np.ndarray, np.ndarray]:
+        """何をする関数？：寄りから minutes 分の高値/安値（銘柄ごと, shape=(銘柄数,)）を返します。バーが無ければ NaN。"""
+        k = int(min(max(int(minutes), 1), self.minutes))
+        import warnings  # 全欠損の行（寄り直後にバーが無い銘柄）の RuntimeWarning を黙らせるためだけに使う
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)
+            return np.nanmax(self.h[:, :k], axis=1), np.nanmin(self.l[:, :k], axis=1)
+
+    def hod(self) -> np.ndarray:
+        """何をする関数？：各分時点までの当日高値（running max、欠損は無視）を返します。"""
+        return np.fmax.accumulate(self.h, axis=1)
+
+    def lod(self) -> np.ndarray:
+        """何をする関数？：各分時点までの当日安値（running min、欠損は無視）を返します。"""
+        return np.fmin.accumulate(self.l, axis=1)
+
+    def last_minute(self) -> np.ndarray:
+        """何をする関数？：銘柄ごとに最後にバーが入った列番号を返します（1本も無ければ -1）。"""
+        has = ~np.isnan(self.c)
+        last = self.minutes - 1 - np.argmax(has[:, ::-1], axis=1)
+        return np.where(has.any(axis=1), last, -1)
+
+    def snapshot(self, orb_minutes: int = 5, anchor: str | _dtime = "09:30:00"):
+        """
+        何をする関数？：
+          - 銘柄ごとの最新 vwap/avwap と ORB 高値/安値、HOD を1行ずつにまとめた DataFrame を返します
+            （compute_indicators の indicators_YYYYMMDD と同じ列に HOD を足した形）。
+        """
+        import pandas as pd  # この関数内だけで使うためここでインポート
+        last = self.last_minute()
+        rows = np.arange(len(self))
+        col = np.maximum(last, 0)
+        vw, av, hd = self.vwap(), self.avwap(anchor), self.hod()
+        hi, lo = self.orb(orb_minutes)
+        has = last >= 0
+        return pd.DataFrame({
+            "symbol": self.symbols,
+            "vwap": np.where(has, vw[rows, col], np.nan),
+            "avwap": np.where(has, av[rows, col], np.nan),
+            "orb_high": hi, "orb_low": lo,
+            "hod": np.where(has, hd[rows, col], np.nan),
+        })
+
+    def to_frame(self):
+        """何をする関数？：埋まっているマスだけを縦長 DataFrame（symbol, et, o,h,l,c,v）に戻します（保存・既存処理向け）。"""
+        import pandas as pd  # この関数内だけで使うためここでインポート
+        i, m = np.nonzero(~np.isnan(self.c))
+        et = pd.to_datetime(self.open_ns + m.astype(np.int64) * _NS_PER_MIN, unit="ns", utc=True).tz_convert(get_et_tz())
+        out = {"symbol": np.asarray(self.symbols, dtype=object)[i], "et": et}
+        for f in FIELDS:
+            out[f] = getattr(self, f)[i, m]
+        return pd.DataFrame(out)
@@ -0,0 +1,433 @@
+# 1本ずつ届くバーで指標を“その場で”更新するストリーミング版の指標です（バッチ版は compute_indicators / grid）。
+# VWAP/AVWAP のほか、EMA・Wilder ATR・当日高値/安値・直近 N 本の高値/安値も、1本ずつの形とベクトル化したバッチの形を持ちます。
+# ねらい：
+#  - 受信のたびに1日分を並べ替えて累積和を取り直さず、銘柄ごとの累積（Σ価格×出来高, Σ出来高）だけを足していく。
+#  - updatedBars の訂正や、遅れて届いた同じ分のバーは、その分の“前回の寄与”を引いてから新しい値を足す
+#    （retract → re-apply）。累積 VWAP は足し算の順序に依らないので、順番が前後しても最終値はバッチ版と一致します。
+# 定義は compute_indicators と同じ：VWAP は終値×出来高の当日累積、AVWAP はアンカー時刻（ET）以降の累積。
+
+from __future__ import annotations
+from collections import deque
+from datetime import datetime, time as _dtime, timedelta
+import math
+import re
+import numpy as np
+import pandas as pd
+
+from rh_pdc_daytrade.utils.timeutil import get_et_tz  # ET の日付境界とアンカー時刻
+
+class _VwapState:
+    # 何をするクラス？：1銘柄・1セッション分の累積と、分ごとの寄与（訂正時に引き戻すため）。
+    __slots__ = ("day", "cum_pv", "cum_v", "contrib")
+
+    def __init__(self, day: int):
+        self.day = day
+        self.cum_pv = 0.0
+        self.cum_v = 0.0
+        self.contrib: dict[int, tuple[float, float]] = {}
+
+class StreamingVwap:
+    """
+    何をするクラス？：
+      - 銘柄ごとの当日累積 VWAP（anchor を渡せば その時刻以降の AVWAP）を、バー1本あたり O(1) で更新します。
+      - 同じ (銘柄, t) がもう一度来たら、前回の寄与を引いてから新しい値を足します（訂正・再送のどちらでも正しい値になる）。
+      - ET 日付が変わった銘柄は累積を自動でリセットします。
+    使い方：
+      vw = StreamingVwap()                      # 当日 VWAP
+      av = StreamingVwap(anchor="09:30:00")     # AVWAP(9:30)
+      vw.update_bar(standardize_bar(msg))       # → その銘柄のいまの VWAP
+    """
+
+    def __init__(self, anchor: str | _dtime | None = None):
+        self.anchor = None if anchor is None else (anchor if isinstance(anchor, _dtime) else _dtime.fromisoformat(str(anchor)))
+        self._st: dict[str, _VwapState] = {}
+        self._bounds = (0, -1, 0, 0)   # いま見ている ET 日付の (開始ns, 終了ns, 日番号, アンカーns)
+        self.corrections = 0
+
+    def _session(self, t_ns: int) -> tuple[int, int]:
+        # 何をする関数？：t_ns の ET 日付（日番号）とその日のアンカー時刻（UTC ns）。同じ日のうちは整数比較だけで返す。
+        lo, hi, day, anchor = self._bounds
+        if lo <= t_ns < hi:
+            return day, anchor
+        tz = get_et_tz()
+        d = datetime.fromtimestamp(t_ns // 1_000_000_000, tz=tz).date()
+        start = datetime.combine(d, _dtime(0, 0), tzinfo=tz)
+        end = datetime.combine(d + timedelta(days=1), _dtime(0, 0), tzinfo=tz)
+        lo = int(start.timestamp()) * 1_000_000_000
+        hi = int(end.timestamp()) * 1_000_000_000
+        anchor = lo
+        if self.anchor is not None:
+            a = datetime.combine(d, self.anchor, tzinfo=tz)  # 夏時間の切替日でも壁時計どおりのアンカーにする
+            anchor = int(a.timestamp()) * 1_000_000_000 + a.microsecond * 1_000
+        self._bounds = (lo, hi, d.toordinal(), anchor)
+        return d.toordinal(), anchor
+
+    def update(self, symbol: str, t_ns: int, c: float, v: float) -> float:
+        """
+        何をする関数？：
+          - 1本（終値 c・出来高 v）を反映し、その銘柄のいまの VWAP を返します（出来高がまだ0なら NaN）。
+          - 既に反映済みの t なら、前回の寄与と差し替えます。
+        """
+        t_ns = int(t_ns)
+        day, anchor = self._session(t_ns)
+        st = self._st.get(symbol)
+        if st is None or st.day != day:
+            st = self._st[symbol] = _VwapState(day)
+        if t_ns >= anchor:
+            c, v = float(c or 0.0), float(v or 0.0)
+            pv, vv = c * v, v
+        else:
+            pv = vv = 0.0  # アンカーより前は寄与0（訂正が来ても同じ扱いにするため、寄与として覚えておく）
+        old = st.contrib.get(t_ns)
+        if old is not None:
+            st.cum_pv -= old[0]
+            st.cum_v -= old[1]
+            self.corrections += 1
+        st.contrib[t_ns] = (pv, vv)
+        st.cum_pv += pv
+        st.cum_v += vv
+        return st.cum_pv / st.cum_v if st.cum_v > 0 else math.nan
+
+    def update_bar(self, bar: dict) -> float:
+        """何をする関数？：standardize_bar の dict（S/t/c/v）で update します。"""
+        return self.update(str(bar.get("S") or "").upper(), int(bar.get("t") or 0), bar.get("c"), bar.get("v"))
+
+    def retract(self, symbol: str, t_ns: int) -> bool:
+        """何をする関数？：(銘柄, t) の寄与を取り消します（無ければ False）。バーを丸ごと無効にしたいとき用。"""
+        st = self._st.get(symbol)
+        old = st.contrib.pop(int(t_ns), None) if st is not None else None
+        if old is None:
+            return False
+        st.cum_pv -= old[0]
+        st.cum_v -= old[1]
+        return True
+
+    def value(self, symbol: str) -> float:
+        """何をする関数？：銘柄のいまの VWAP（未見・出来高0なら NaN）。"""
+        st = self._st.get(symbol)
+        return st.cum_pv / st.cum_v if st is not None and st.cum_v > 0 else math.nan
+
+    def snapshot(self) -> dict[str, float]:
+        """何をする関数？：全銘柄のいまの VWAP を {銘柄: 値} で返します。"""
+        return {s: self.value(s) for s in self._st}
+
+# ---- EMA / Wilder ATR / HOD・LOD / 直近 N 本の高値・安値 ------------------------------------------------------
+# どれも「1本ずつの update（O(1)）」と「配列まとめての batch（ベクトル化）」の2つの形を持ち、同じ入力なら同じ値を返します
+# （scripts/check_streaming_indicators.py で突き合わせ）。revise(x) は“直前の update の入力を差し替える”もので、
+# updatedBars がその分のうちに同じ分の訂正を送ってきたときに、状態を1本ぶん戻してから入れ直します。
+
+class Ema:
+    """
+    何をするクラス？：指数移動平均（α = 2/(period+1)、最初の値で初期化。pandas の ewm(span=period, adjust=False) と同じ）。
+    使い方：e = Ema(9); e.update(c)  /  Ema.batch(closes, 9)
+    """
+    __slots__ = ("period", "alpha", "value", "n", "_prev")
+
+    def __init__(self, period: int):
+        self.period = int(period)
+        self.alpha = 2.0 / (self.period + 1)
+        self.value = math.nan
+        self.n = 0
+        self._prev = (math.nan, 0)
+
+    def update(self, x: float) -> float:
+        """何をする関数？：1つ取り込み、いまの EMA を返します。"""
+        self._prev = (self.value, self.n)
+        x = float(x)
+        self.value = x if self.n == 0 else self.value + self.alpha * (x - self.value)
+        self.n += 1
+        return self.value
+
+    def revise(self, x: float) -> float:
+        """何をする関数？：直前の update の入力を x に差し替えます。"""
+        self.value, self.n = self._prev
+        return self.update(x)
+
+    @staticmethod
+    def batch(x, period: int) -> np.ndarray:
+        """何をする関数？：配列まとめての EMA。"""
+        return pd.Series(np.asarray(x, dtype=np.float64)).ewm(span=int(period), adjust=False).mean().to_numpy()
+
+class WilderAtr:
+    """
+    何をするクラス？：Wilder の ATR（TR = max(h−l, |h−前終値|, |l−前終値|)、最初の1本は h−l）。
+      最初の period 本の TR の単純平均で初期化し、以後 ATR = ATR + (TR − ATR)/period。period 本に満たないうちは NaN。
+    使い方：a = WilderAtr(14); a.update(h, l, c)  /  WilderAtr.batch(h, l, c, 14)
+    """
+    __slots__ = ("period", "value", "n", "prev_close", "_seed", "_prev")
+
+    def __init__(self, period: int):
+        self.period = int(period)
+        self.value = math.nan
+        self.n = 0
+        self.prev_close = math.nan
+        self._seed = 0.0
+        self._prev = (math.nan, 0, math.nan, 0.0)
+
+    def update(self, h: float, l: float, c: float) -> float:
+        """何をする関数？：1本取り込み、いまの ATR を返します。"""
+        self._prev = (self.value, self.n, self.prev_close, self._seed)
+        h, l, pc = float(h), float(l), self.prev_close
+        tr = h - l if math.isnan(pc) else max(h - l, abs(h - pc), abs(l - pc))
+        self.n += 1
+        if self.n < self.period:
+            self._seed += tr
+        elif self.n == self.period:
+            self.value = (self._seed + tr) / self.period
+        else:
+            self.value += (tr - self.value) / self.period
+        self.prev_close = float(c)
+        return self.value
+
+    def revise(self, h: float, l: float, c: float) -> float:
+        """何をする関数？：直前の update の入力を差し替えます。"""
+        self.value, self.n, self.prev_close, self._seed = self._prev
+        return self.update(h, l, c)
+
+    @staticmethod
+    def true_range(h, l, c) -> np.ndarray:
+        """何をする関数？：TR の配列（最初の1本は h−l）。"""
+        h, l, c = (np.asarray(a, dtype=np.float64) for a in (h, l, c))
+        pc = np.r_[np.nan, c[:-1]]
+        return np.fmax(h - l, np.fmax(np.abs(h - pc), np.abs(l - pc)))   # 何をする行？：前終値が無い（NaN）ところは h−l が残る
+
+    @staticmethod
+    def batch(h, l, c, period: int) -> np.ndarray:
+        """何をする関数？：配列まとめての ATR。"""
+        return _wilder_seeded(pd.Series(WilderAtr.true_range(h, l, c)), np.arange(len(h)), int(period)).to_numpy()
+
+def _wilder_seeded(tr: pd.Series, pos: np.ndarray, period: int, by=None) -> pd.Series:
+    # 何をする関数？：TR の列を Wilder の平滑にかける（pos は系列内の何本目か、by はグループ。period 本目を単純平均で初期化）。
+    seed = (tr.rolling(period).mean() if by is None
+            else tr.groupby(by, sort=False).rolling(period).mean().reset_index(level=0, drop=True))
+    x = tr.where(pos >= period, np.nan).where(pos != period - 1, seed)
+    ew = dict(alpha=1.0 / period, adjust=False)
+    return (x.ewm(**ew).mean() if by is None
+            else x.groupby(by, sort=False).ewm(**ew).mean().reset_index(level=0, drop=True))
+
+class RunningMax:
+    """何をするクラス？：これまでの最大（当日高値 HOD など）。batch は np.fmax.accumulate。"""
+    __slots__ = ("value", "_prev")
+    _op, _acc = staticmethod(max), np.fmax
+
+    def __init__(self):
+        self.value = math.nan
+        self._prev = math.nan
+
+    def update(self, x: float) -> float:
+        """何をする関数？：1つ取り込み、これまでの最大を返します。"""
+        self._prev = self.value
+        x = float(x)
+        self.value = x if math.isnan(self.value) else self._op(self.value, x)
+        return self.value
+
+    def revise(self, x: float) -> float:
+        """何をする関数？：直前の update の入力を差し替えます。"""
+        self.value = self._prev
+        return self.update(x)
+
+    @classmethod
+    def batch(cls, x) -> np.ndarray:
+        """何をする関数？：配列まとめての累積最大。"""
+        return cls._acc.accumulate(np.asarray(x, dtype=np.float64))
+
+class RunningMin(RunningMax):
+    """何をするクラス？：これまでの最小（当日安値 LOD など）。"""
+    __slots__ = ()
+    _op, _acc = staticmethod(min), np.fmin
+
+class RollingMax:
+    """
+    何をするクラス？：直近 window 本の最大（“単調な deque”：値が下がる順に候補だけを残すので、1本あたり償却 O(1)）。
+      window 本に満たないうちは、そこまでの最大。batch は pandas の rolling(window, min_periods=1).max() と同じ。
+    """
+    __slots__ = ("window", "i", "_dq", "_undo")
+    _better = staticmethod(lambda old, new: old <= new)   # 新しい値がこれ以上なら古い候補は二度と最大にならない
+
+    def __init__(self, window: int):
+        self.window = max(1, int(window))
+        self.i = 0
+        self._dq: deque[tuple[int, float]] = deque()
+        self._undo: tuple[list, tuple | None] = ([], None)
+
+    @property
+    def value(self) -> float:
+        return self._dq[0][1] if self._dq else math.nan
+
+    def update(self, x: float) -> float:
+        """何をする関数？：1つ取り込み、直近 window 本の最大を返します。"""
+        x, dq = float(x), self._dq
+        popped = []
+        while dq and self._better(dq[-1][1], x):
+            popped.append(dq.pop())
+        dq.append((self.i, x))
+        evicted = dq.popleft() if dq[0][0] <= self.i - self.window else None
+        self._undo = (popped, evicted)
+        self.i += 1
+        return dq[0][1]
+
+    def revise(self, x: float) -> float:
+        """何をする関数？：直前の update の入力を差し替えます（捨てた候補を戻してから入れ直す）。"""
+        popped, evicted = self._undo
+        dq = self._dq
+        if evicted is not None:
+            dq.appendleft(evicted)
+        dq.pop()
+        dq.extend(reversed(popped))
+        self.i -= 1
+        return self.update(x)
+
+    @classmethod
+    def batch(cls, x, window: int) -> np.ndarray:
+        """何をする関数？：配列まとめての直近 window 本の最大。"""
+        r = pd.Series(np.asarray(x, dtype=np.float64)).rolling(max(1, int(window)), min_periods=1)
+        return (r.max() if cls is RollingMax else r.min()).to_numpy()
+
+class RollingMin(RollingMax):
+    """何をするクラス？：直近 window 本の最小（値が上がる順に候補を残す deque）。"""
+    __slots__ = ()
+    _better = staticmethod(lambda old, new: old >= new)
+
+# ---- 銘柄ごと・日ごとにまとめて持つ入口 --------------------------------------------------------------------
+
+_SPEC = re.compile(r"^(ema|atr|hh|ll)(\d+)$|^(hod|lod)$")
+
+def parse_indicator(name: str) -> tuple[str, int]:
+    """
+    何をする関数？：指標名を (種類, 本数) に分けます。
+      ema{N}（終値の EMA）, atr{N}（Wilder ATR）, hod / lod（当日高値/安値）, hh{N} / ll{N}（直近 N 本の高値/安値）
+    """
+    m = _SPEC.match(str(name).strip().lower())
+    if m is None:
+        raise ValueError(f"unknown streaming indicator: {name!r} (ema9, atr14, hod, lod, hh20, ll20 ...)")
+    return (m.group(3), 0) if m.group(3) else (m.group(1), int(m.group(2)))
+
+def _make(kind: str, n: int):
+    # 何をする関数？：種類と本数から1系列ぶんの指標オブジェクトを作る。
+    return {"ema": lambda: Ema(n), "atr": lambda: WilderAtr(n), "hod": RunningMax, "lod": RunningMin,
+            "hh": lambda: RollingMax(n), "ll": lambda: RollingMin(n)}[kind]()
+
+class _SymIndicators:
+    # 何をするクラス？：1銘柄・1セッション分の指標オブジェクトと、最後に取り込んだバー時刻。
+    __slots__ = ("day", "last_t", "objs")
+
+    def __init__(self, day: int, objs: list):
+        self.day = day
+        self.last_t = -1
+        self.objs = objs
+
+class StreamingIndicatorSet:
+    """
+    何をするクラス？：
+      - 銘柄ごとに names の指標（ema9, atr14, hod, hh20 …）をバー1本あたり O(1) で更新します。ET 日付が変わった銘柄はリセット。
+      - 同じ (銘柄, t) がもう一度来たら（updatedBars の訂正・再送）、直前の1本を差し替えます（revise）。
+        それより古い時刻のバーは入れ直せないので数えて捨てます（late）。
+      - batch_indicators(df, names) と同じ値になります（scripts/check_streaming_indicators.py）。
+    使い方：
+      ind = StreamingIndicatorSet(["ema9", "ema20", "atr14", "hod", "hh20"])
+      vals = ind.update_bar(standardize_bar(msg))   # → {"ema9": ..., "atr14": ..., ...}
+    """
+
+    def __init__(self, names):
+        self.names = [str(n).strip().lower() for n in names]
+        self._specs = [parse_indicator(n) for n in self.names]
+        self._st: dict[str, _SymIndicators] = {}
+        self._bounds = (0, -1, 0)   # いま見ている ET 日付の (開始ns, 終了ns, 日番号)
+        self.revisions = self.late = 0
+
+    def _day(self, t_ns: int) -> int:
+        # 何をする関数？：t_ns の ET 日付の日番号（同じ日のうちは整数比較だけ）。
+        lo, hi, day = self._bounds
+        if lo <= t_ns < hi:
+            return day
+        tz = get_et_tz()
+        d = datetime.fromtimestamp(t_ns // 1_000_000_000, tz=tz).date()
+        lo = int(datetime.combine(d, _dtime(0, 0), tzinfo=tz).timestamp()) * 1_000_000_000
+        hi = int(datetime.combine(d + timedelta(days=1), _dtime(0, 0), tzinfo=tz).timestamp()) * 1_000_000_000
+        self._bounds = (lo, hi, d.toordinal())
+        return d.toordinal()
+
+    def update(self, symbol: str, t_ns: int, h: float, l: float, c: float) -> dict[str, float]:
+        """何をする関数？：1本（高値 h・安値 l・終値 c）を反映し、その銘柄のいまの値を {指標名: 値} で返します。"""
+        t_ns = int(t_ns)
+        day = self._day(t_ns)
+        st = self._st.get(symbol)
+        if st is None or st.day != day:
+            st = self._st[symbol] = _SymIndicators(day, [_make(k, n) for k, n in self._specs])
+        if t_ns < st.last_t:
+            self.late += 1
+            return self.value(symbol)
+        fix = t_ns == st.last_t
+        self.revisions += fix
+        st.last_t = t_ns
+        out = {}
+        for name, (kind, _), obj in zip(self.names, self._specs, st.objs):
+            if kind == "atr":
+                out[name] = obj.revise(h, l, c) if fix else obj.update(h, l, c)
+            else:
+                x = h if kind in ("hod", "hh") else l if kind in ("lod", "ll") else c
+                out[name] = obj.revise(x) if fix else obj.update(x)
+        return out
+
+    def update_bar(self, bar: dict) -> dict[str, float]:
+        """何をする関数？：standardize_bar の dict（S/t/h/l/c）で update します。"""
+        return self.update(str(bar.get("S") or "").upper(), int(bar.get("t") or 0), bar.get("h"), bar.get("l"), bar.get("c"))
+
+    def update_many(self, symbols, t_ns, h, l, c) -> dict[str, np.ndarray]:
+        """何をする関数？：配列で順に update し、各行の値を {指標名: 配列} で返します（塊ごとの処理用）。"""
+        out = {n: np.empty(len(t_ns)) for n in self.names}
+        cols = [out[n] for n in self.names]
+        for i, (s, t, hh, ll, cc) in enumerate(zip(symbols, np.asarray(t_ns).tolist(), np.asarray(h).tolist(),
+                                                   np.asarray(l).tolist(), np.asarray(c).tolist())):
+            for col, v in zip(cols, self.update(s, t, hh, ll, cc).values()):
+                col[i] = v
+        return out
+
+    def value(self, symbol: str) -> dict[str, float]:
+        """何をする関数？：銘柄のいまの値（未見なら NaN）。"""
+        st = self._st.get(symbol)
+        if st is None:
+            return {n: math.nan for n in self.names}
+        return {n: float(o.value) for n, o in zip(self.names, st.objs)}
+
+    def snapshot(self) -> dict[str, dict[str, float]]:
+        """何をする関数？：全銘柄のいまの値を {銘柄: {指標名: 値}} で返します。"""
+        return {s: self.value(s) for s in self._st}
+
+def batch_indicators(df: pd.DataFrame, names) -> pd.DataFrame:
+    """
+    何をする関数？：
+      - 縦長の 1分足（symbol, et, h, l, c）に対して、names の指標を (銘柄, ET 日付) ごとにベクトル化して計算します。
+      - StreamingIndicatorSet に (銘柄, t) 順で流したときと同じ値です。
+    戻り値：df と同じ index・列が names の DataFrame
+    """
+    names = [str(n).strip().lower() for n in names]
+    specs = [parse_indicator(n) for n in names]
+    if df.empty:
+        return pd.DataFrame({n: pd.Series(dtype="float64") for n in names}, index=df.index)
+    from rh_pdc_daytrade.utils.timeutil import et_trading_date  # 関数内だけで使うためここでインポート
+    codes = pd.factorize(df["symbol"].astype(str), sort=True)[0].astype(np.int64)
+    t = pd.DatetimeIndex(df["et"]).as_unit("ns").asi8
+    order = np.lexsort((t, codes))
+    days = np.asarray(et_trading_date(df["et"])).astype(np.int64)
+    by = pd.factorize(codes[order] * 1_000_000 + days[order])[0]   # 何をする行？：(銘柄, ET 日付) のグループ番号（並べ替え済みなので連続）
+    s = {k: pd.Series(df[k].to_numpy(dtype=np.float64)[order]) for k in ("h", "l", "c")}
+    g = {k: v.groupby(by, sort=False) for k, v in s.items()}
+    pos = s["c"].groupby(by, sort=False).cumcount().to_numpy()
+    out: dict[str, np.ndarray] = {}
+    for name, (kind, n) in zip(names, specs):
+        if kind == "ema":
+            r = g["c"].ewm(span=n, adjust=False).mean().reset_index(level=0, drop=True)
+        elif kind == "atr":
+            pc = g["c"].shift(1)
+            tr = np.fmax(s["h"] - s["l"], np.fmax((s["h"] - pc).abs(), (s["l"] - pc).abs()))
+            r = _wilder_seeded(tr, pos, n, by=by)
+        elif kind in ("hod", "lod"):
+            r = g["h"].cummax() if kind == "hod" else g["l"].cummin()
+        else:
+            roll = g["h" if kind == "hh" else "l"].rolling(n, min_periods=1)
+            r = (roll.max() if kind == "hh" else roll.min()).reset_index(level=0, drop=True)
+        vals = np.empty(len(df))
+        vals[order] = r.sort_index().to_numpy()   # 何をする行？：並べ替えた順 → 入力の行順へ戻す
+        out[name] = vals
+    return pd.DataFrame(out, index=df.index)
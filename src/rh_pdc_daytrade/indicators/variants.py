@@ -0,0 +1,221 @@
+# ORB の窓（1/5/15/30 分 …）と AVWAP のアンカー（09:30・プレマーケット高値の時刻・PDC を横切った時刻・任意の時刻）を
+# “何通りでも1回の走査で”計算する研究用の指標モジュールです（本番の1通りは compute_indicators / chunked）。
+# ねらい：
+#  - 窓やアンカーを変えて比べるたびに groupby の累積を取り直さない。
+#    ORB：寄りから最長の窓までの行だけを (銘柄, 分) 順に並べ、銘柄ごとの累積最大/最小を1回取り、
+#         各窓の値は“その窓の最後の行”を searchsorted で引くだけ。
+#    AVWAP：銘柄ごとの累積（Σ価格×出来高, Σ出来高）を1回だけ取り、アンカーごとに“アンカーより前の合計”（bincount）を引く。
+#  - 結果は 窓／アンカー をキーにした横長の表（orb_high_5, orb_low_15, avwap_0930, avwap_pmh …）。
+# 定義は compute_indicators と同じ：AVWAP は終値×出来高のアンカー時刻以降の累積、ORB は寄りから N 分（[寄り, 寄り+N分)）の高値/安値。
+# 入力は1セッションぶんの 1分足（symbol, et, h, l, c, v）を想定します。
+
+from __future__ import annotations
+from datetime import date, datetime, time as _dtime
+from typing import Any, Iterable, Mapping
+import numpy as np
+import pandas as pd
+
+from rh_pdc_daytrade.utils.timeutil import get_et_tz, et_time_of_day_ns, time_to_ns  # ET の時刻判定を配列で一括計算
+
+_NS_PER_MIN = 60_000_000_000
+DEFAULT_WINDOWS = (1, 5, 15, 30)
+DEFAULT_ANCHORS = ("09:30", "premarket_high", "pdc_cross")
+_PREMARKET_OPEN = "04:00"
+
+def _sorted_view(df: pd.DataFrame) -> dict:
+    # 何をする関数？：(銘柄, t) 順の並べ替え添字と、その順の配列（codes, t, h, l, c, v）をまとめて返す。
+    codes, uniq = pd.factorize(df["symbol"].astype(str), sort=True)
+    t = pd.DatetimeIndex(df["et"]).as_unit("ns").asi8
+    order = np.lexsort((t, codes))
+    return {"order": order, "codes": codes[order], "symbols": np.asarray(uniq, dtype=object), "t": t[order],
+            "tod": et_time_of_day_ns(df["et"])[order],
+            **{k: df[k].to_numpy(dtype=np.float64)[order] for k in ("h", "l", "c", "v")}}
+
+def _session_date(df: pd.DataFrame) -> date:
+    # 何をする関数？：入力の ET 日付（最初のバーの日付。compute_indicators の保存日付と同じ決め方）。
+    et = pd.DatetimeIndex(df["et"])
+    et = et.tz_localize(get_et_tz()) if et.tz is None else et.tz_convert(get_et_tz())
+    return et.min().date()
+
+def _first_per_code(codes: np.ndarray, idx: np.ndarray, n: int, values: np.ndarray) -> np.ndarray:
+    # 何をする関数？：idx（昇順の行番号）のうち銘柄ごとの最初の行の values を、銘柄番号の配列（無ければ -1）にして返す。
+    out = np.full(n, -1, dtype=np.int64)
+    if len(idx):
+        c, first = np.unique(codes[idx], return_index=True)
+        out[c] = values[idx[first]]
+    return out
+
+# ---- ORB（複数の窓） --------------------------------------------------------------------------------------
+
+def orb_windows(df: pd.DataFrame, windows: Iterable[int] = DEFAULT_WINDOWS,
+                open_time: str | _dtime = "09:30") -> pd.DataFrame:
+    """
+    何をする関数？：
+      - 寄りから w 分の ORB 高値/安値を、windows のすべての w について1回の走査で計算します。
+    戻り値：index=symbol、列 orb_high_{w}, orb_low_{w}（窓の中にバーが無い銘柄は NaN）
+    使い方：
+      orb = orb_windows(df_1m, [1, 5, 15, 30]); orb["orb_high_15"]
+    """
+    ws = sorted({int(w) for w in windows if int(w) > 0})
+    if df.empty or not ws:
+        return pd.DataFrame(columns=[f"orb_{s}_{w}" for w in ws for s in ("high", "low")]).rename_axis("symbol")
+    sv = _sorted_view(df)
+    n = len(sv["symbols"])
+    mod = (sv["tod"] - time_to_ns(open_time)) // _NS_PER_MIN
+    sel = np.flatnonzero((mod >= 0) & (mod < ws[-1]))
+    cols: dict[str, np.ndarray] = {}
+    if len(sel):
+        codes, m = sv["codes"][sel], mod[sel]
+        g = pd.DataFrame({"h": sv["h"][sel], "l": sv["l"][sel]}).groupby(codes, sort=False)
+        run_h = g["h"].cummax().to_numpy()
+        run_l = g["l"].cummin().to_numpy()
+        key = codes.astype(np.int64) * ws[-1] + m          # (銘柄, 分) の昇順（並べ替え済みなので単調）
+        ids = np.arange(n, dtype=np.int64)
+    for w in ws:
+        hi = np.full(n, np.nan)
+        lo = np.full(n, np.nan)
+        if len(sel):
+            pos = np.searchsorted(key, ids * ws[-1] + w, side="left") - 1   # 何をする行？：窓 [0, w) の最後の行
+            ok = pos >= 0
+            ok[ok] = codes[pos[ok]] == ids[ok]
+            hi[ok], lo[ok] = run_h[pos[ok]], run_l[pos[ok]]
+        cols[f"orb_high_{w}"], cols[f"orb_low_{w}"] = hi, lo
+    return pd.DataFrame(cols, index=pd.Index(sv["symbols"], name="symbol"))
+
+# ---- AVWAP（複数のアンカー） --------------------------------------------------------------------------------
+
+def anchor_key(spec: Any, i: int = 0) -> str:
+    """
+    何をする関数？：アンカー指定から列名のキーを作ります（"09:30" → "0930"、"premarket_high" → "pmh"、
+    "pdc_cross" → "pdc"、時刻つきの日時 → その ET の "HHMM"、銘柄ごとの指定 → "custom{i}"）。
+    """
+    if isinstance(spec, str):
+        s = spec.strip().lower()
+        if s in ("premarket_high", "pmh"):
+            return "pmh"
+        if s in ("pdc_cross", "pdc"):
+            return "pdc"
+        try:
+            return _dtime.fromisoformat(s).strftime("%H%M")
+        except ValueError:
+            return pd.Timestamp(s).strftime("%H%M")
+    if isinstance(spec, _dtime):
+        return spec.strftime("%H%M")
+    if isinstance(spec, (datetime, pd.Timestamp)):
+        ts = pd.Timestamp(spec)
+        return (ts.tz_convert(get_et_tz()) if ts.tz is not None else ts).strftime("%H%M")
+    return f"custom{i}"
+
+def _ts_ns(x: Any, tz) -> int:
+    # 何をする関数？：日時（tz 無しは ET の壁時計とみなす）を UTC ns に直す。
+    ts = pd.Timestamp(x)
+    ts = ts.tz_localize(tz) if ts.tz is None else ts
+    return int(ts.as_unit("ns").value)
+
+def _anchor_ns(spec: Any, sv: dict, day: date, pdc: np.ndarray | None) -> np.ndarray:
+    # 何をする関数？：1つのアンカー指定を、銘柄ごとのアンカー時刻（UTC ns、決まらない銘柄は -1）に直す。
+    tz = get_et_tz()
+    n = len(sv["symbols"])
+    if isinstance(spec, str):
+        s = spec.strip().lower()
+        if s in ("premarket_high", "pmh"):
+            # プレマーケット（04:00–寄り）で高値が最も高いバーの時刻（同値なら早い方）
+            pre = np.flatnonzero((sv["tod"] >= time_to_ns(_PREMARKET_OPEN)) & (sv["tod"] < time_to_ns("09:30")))
+            pre = pre[np.lexsort((sv["t"][pre], -sv["h"][pre], sv["codes"][pre]))] if len(pre) else pre
+            return _first_per_code(sv["codes"], pre, n, sv["t"])
+        if s in ("pdc_cross", "pdc"):
+            # 寄り以降で、バーの値幅が PDC をまたいだ（l ≤ PDC ≤ h）か、終値が前のバーと逆側に出た最初のバーの時刻
+            if pdc is None:
+                raise ValueError("anchor 'pdc_cross' needs pdc (symbol -> previous close)")
+            p = pdc[sv["codes"]]
+            side = np.sign(sv["c"] - p)
+            prev = np.r_[np.nan, side[:-1]]
+            prev[np.r_[True, sv["codes"][1:] != sv["codes"][:-1]]] = np.nan   # 何をする行？：銘柄の境目は“前のバー無し”
+            cross = ((sv["l"] <= p) & (p <= sv["h"])) | (side * prev < 0)
+            idx = np.flatnonzero(cross & (sv["tod"] >= time_to_ns("09:30")))
+            return _first_per_code(sv["codes"], idx, n, sv["t"])
+        try:
+            spec = _dtime.fromisoformat(s)
+        except ValueError:
+            return np.full(n, _ts_ns(spec, tz), dtype=np.int64)
+    if isinstance(spec, _dtime):
+        return np.full(n, _ts_ns(datetime.combine(day, spec), tz), dtype=np.int64)   # 夏時間の切替日も壁時計どおり
+    if isinstance(spec, (datetime, pd.Timestamp)):
+        return np.full(n, _ts_ns(spec, tz), dtype=np.int64)
+    if isinstance(spec, Mapping) or hasattr(spec, "to_dict"):
+        m = spec.to_dict() if hasattr(spec, "to_dict") else dict(spec)
+        return np.array([_ts_ns(m[s], tz) if m.get(s) is not None else -1 for s in sv["symbols"]], dtype=np.int64)
+    raise ValueError(f"unknown AVWAP anchor: {spec!r}")
+
+def _pdc_array(pdc, symbols: np.ndarray) -> np.ndarray | None:
+    # 何をする関数？：{銘柄: PDC}（dict / Series / symbol,pdc 列の DataFrame）を銘柄番号順の配列に直す（無い銘柄は NaN）。
+    if pdc is None:
+        return None
+    if isinstance(pdc, pd.DataFrame):
+        pdc = pdc.set_index(pdc["symbol"].astype(str).str.upper())["pdc"]
+    m = pd.Series(pdc, dtype="float64")
+    m.index = m.index.astype(str).str.upper()
+    return m.reindex(pd.Index(symbols).astype(str).str.upper()).to_numpy(dtype=np.float64)
+
+def _anchor_items(anchors) -> list[tuple[str, Any]]:
+    # 何をする関数？：アンカー指定（並び or {キー: 指定}）を (キー, 指定) の並びにそろえる。
+    if isinstance(anchors, Mapping):
+        return [(str(k), v) for k, v in anchors.items()]
+    if isinstance(anchors, (str, _dtime, datetime)):
+        anchors = [anchors]
+    return [(anchor_key(a, i), a) for i, a in enumerate(anchors)]
+
+def avwap_anchors(df: pd.DataFrame, anchors=DEFAULT_ANCHORS, pdc=None) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    何をする関数？：
+      - anchors のすべてのアンカーについて、各バーの AVWAP を1回の累積で計算します。
+      - アンカー指定：ET の時刻（"09:30" / time）、"premarket_high"（プレマーケット高値のバーの時刻）、
+        "pdc_cross"（寄り以降に PDC をまたいだ最初のバー。pdc が必要）、日時（全銘柄共通）、{銘柄: 日時}（銘柄ごと）。
+        {キー: 指定} で渡せば列名のキーを自分で決められます。
+    戻り値：(各バーの表：df と同じ index・列 avwap_{キー},  銘柄ごとのアンカー時刻：index=symbol・列 anchor_{キー}（ET、無ければ NaT）)
+    使い方：
+      bars, when = avwap_anchors(df_1m, ["09:30", "premarket_high", "pdc_cross", "2025-09-09 10:15"], pdc=eod[["symbol", "pdc"]])
+    """
+    items = _anchor_items(anchors)
+    if df.empty:
+        return (pd.DataFrame({f"avwap_{k}": pd.Series(dtype="float64") for k, _ in items}, index=df.index),
+                pd.DataFrame(columns=[f"anchor_{k}" for k, _ in items]).rename_axis("symbol"))
+    sv = _sorted_view(df)
+    n = len(sv["symbols"])
+    day = _session_date(df)
+    pdc_arr = _pdc_array(pdc, sv["symbols"])
+    pv = sv["c"] * sv["v"]
+    g = pd.DataFrame({"pv": pv, "v": sv["v"]}).groupby(sv["codes"], sort=False).cumsum()   # 何をする行？：累積は全アンカーで共通の1回だけ
+    cum_pv, cum_v = g["pv"].to_numpy(), g["v"].to_numpy()
+    bars: dict[str, np.ndarray] = {}
+    when: dict[str, pd.DatetimeIndex] = {}
+    for key, spec in items:
+        a = _anchor_ns(spec, sv, day, pdc_arr)
+        a_row = a[sv["codes"]]
+        before = (sv["t"] < a_row) | (a_row < 0)
+        base_pv = np.bincount(sv["codes"], weights=pv * before, minlength=n)[sv["codes"]]   # 何をする行？：アンカーより前の合計を引く
+        base_v = np.bincount(sv["codes"], weights=sv["v"] * before, minlength=n)[sv["codes"]]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            val = np.where(before, np.nan, (cum_pv - base_pv) / (cum_v - base_v))
+        out = np.empty(len(val))
+        out[sv["order"]] = val   # 何をする行？：入力の行順に戻す
+        bars[f"avwap_{key}"] = out
+        when[f"anchor_{key}"] = pd.to_datetime(np.where(a >= 0, a, np.iinfo(np.int64).min), unit="ns", utc=True).tz_convert(get_et_tz())
+    return (pd.DataFrame(bars, index=df.index),
+            pd.DataFrame(when, index=pd.Index(sv["symbols"], name="symbol")))
+
+def variant_snapshot(df: pd.DataFrame, windows: Iterable[int] = DEFAULT_WINDOWS, anchors=DEFAULT_ANCHORS,
+                     pdc=None, open_time: str | _dtime = "09:30") -> pd.DataFrame:
+    """
+    何をする関数？：
+      - 銘柄ごとに1行の横長の表：ORB の全窓（orb_high_{w}, orb_low_{w}）と、全アンカーの最新 AVWAP（avwap_{キー}）と
+        アンカー時刻（anchor_{キー}）を返します（研究で窓・アンカーを並べて比べる用）。
+    """
+    bars, when = avwap_anchors(df, anchors, pdc=pdc)
+    orb = orb_windows(df, windows, open_time=open_time)
+    if df.empty:
+        return orb.join(when, how="outer").reset_index()
+    order = np.lexsort((pd.DatetimeIndex(df["et"]).as_unit("ns").asi8, df["symbol"].astype(str).to_numpy()))
+    last = (bars.iloc[order].assign(symbol=df["symbol"].astype(str).to_numpy()[order])
+                .groupby("symbol", sort=True).tail(1).set_index("symbol"))   # 何をする行？：各銘柄の最後のバー時点の値（スナップショットと同じ）
+    return orb.join(last, how="outer").join(when, how="left").rename_axis("symbol").reset_index()
@@ -0,0 +1,304 @@
+# 時刻別の出来高プロファイル（銘柄 × 寄りからの分 の“累積出来高の中央値”）と、それを使う RVOL です。
+# ねらい：
+#  - RVOL（相対出来高）は「いまの累積出来高 ÷ ふだんのこの時刻までの累積出来高」。毎回過去 N 日の 1分足を読み直さず、
+#    夜に1回だけ中央値の表を作って小さな配列ファイル（.npz：symbols, cum[銘柄, 390] float32）に置き、
+#    場中・指標計算では 辞書で行番号 → 配列の添字 の O(1) で引きます。
+#  - 作り直しは“差分だけ”：日ごとの累積カーブを状態ファイル（volprofile_state.npz）に直近 N 日ぶん持ち、
+#    1分足アーカイブ（bars_1m_YYYYMMDD.parquet）のうち まだ入れていない日・中身が変わった日（mtime/サイズ）だけを読みます。
+# 定義：寄り 09:30 ET からの分 0–389 のレギュラー時間だけ（寄り前・引け後は数えない）。その日にバーの無い銘柄は、その日の値を持たない
+#       （0 として中央値を下げない）。min_days 日に満たない銘柄は表に載せません。
+#       途中までしか無い日は中央値を下げて RVOL を水増しするので入れません：市場カレンダーで引けを過ぎた通常日だけを使い
+#       （当日の場中・休場日・半日立会いは除く）、さらに銘柄×日ごとにバーのある分が min_coverage（割合）に満たないもの
+#       （短い ws_run の取得・途中から始めた取得など）はその日の値を持たせません。
+
+from __future__ import annotations
+from pathlib import Path
+import os
+import numpy as np
+import pandas as pd
+import orjson
+from loguru import logger
+
+from rh_pdc_daytrade.utils.timeutil import et_minute_of_day  # ET の分（09:30 → 570）を配列で一括計算
+
+SESSION_MINUTES = 390
+_OPEN_MINUTE = 9 * 60 + 30
+
+def profile_path(path: str | os.PathLike[str] | None = None) -> Path:
+    """何をする関数？：プロファイルの置き場（引数 → 環境変数 VOLUME_PROFILE_PATH → data/profile/volprofile.npz）を返します。"""
+    return Path(path or os.environ.get("VOLUME_PROFILE_PATH") or Path("data") / "profile" / "volprofile.npz")
+
+def default_sources() -> list[Path]:
+    """何をする関数？：1分足の置き場（当日分の data/bars と、バックフィルのアーカイブ BARS_ARCHIVE_DIR／data/archive/bars）を返します。"""
+    return [Path("data") / "bars", Path(os.environ.get("BARS_ARCHIVE_DIR") or Path("data") / "archive" / "bars")]
+
+def session_minute(values) -> np.ndarray:
+    """何をする関数？：各要素（et 列 / UTC ns）の“寄りからの分”（09:30 → 0、寄り前は負）を int32 配列で返します。"""
+    return et_minute_of_day(values).astype(np.int32) - _OPEN_MINUTE
+
+class VolumeProfile:
+    """
+    何をするクラス？：
+      - 銘柄ごとの「寄りから m 分目の終わりまでの累積出来高」の中央値（直近 N 日）を持ち、RVOL を O(1) で返します。
+      - 表に無い銘柄の frac（1日のうち m 分目までに出る割合）は、全銘柄の中央値の形で代わりに答えます。
+    使い方：
+      prof = load_profile()                        # 無ければ None
+      prof.rvol("AAPL", minute=14, cum_volume=2.1e6)
+      prof.rvol_array(df["symbol"], session_minute(df["et"]), cum_v)   # 配列でまとめて
+    """
+
+    def __init__(self, symbols, cum: np.ndarray, ndays: np.ndarray | None = None,
+                 last_day_volume: np.ndarray | None = None, meta: dict | None = None):
+        self.symbols = [str(s) for s in symbols]
+        self.cum = np.asarray(cum, dtype=np.float32).reshape(len(self.symbols), SESSION_MINUTES)
+        n = len(self.symbols)
+        self.ndays = np.zeros(n, dtype=np.int16) if ndays is None else np.asarray(ndays, dtype=np.int16)
+        self.last_day_volume = (np.full(n, np.nan, dtype=np.float32) if last_day_volume is None
+                                else np.asarray(last_day_volume, dtype=np.float32))
+        self.meta = dict(meta or {})
+        self._row = {s: i for i, s in enumerate(self.symbols)}
+        self._index = pd.Index(self.symbols)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            shape = self.cum / self.cum[:, -1:]
+        self._shape = (np.nanmedian(shape, axis=0) if n else np.linspace(1.0 / SESSION_MINUTES, 1.0, SESSION_MINUTES))
+
+    def __len__(self) -> int:
+        return len(self.symbols)
+
+    def __contains__(self, symbol: str) -> bool:
+        return symbol in self._row
+
+    def expected(self, symbol: str, minute: int) -> float:
+        """何をする関数？：m 分目の終わりまでの“ふだんの”累積出来高（表に無い銘柄は NaN）。m は 0–389 に丸めます。"""
+        r = self._row.get(symbol)
+        if r is None:
+            return float("nan")
+        return float(self.cum[r, min(max(int(minute), 0), SESSION_MINUTES - 1)])
+
+    def rvol(self, symbol: str, minute: int, cum_volume: float) -> float:
+        """何をする関数？：寄りから m 分目までの累積出来高 cum_volume の RVOL（表に無い・ふだん0なら NaN。寄り前も NaN）。"""
+        if minute < 0:
+            return float("nan")
+        e = self.expected(symbol, minute)
+        return float(cum_volume) / e if e > 0 else float("nan")
+
+    def frac(self, symbol: str, minute: int) -> float:
+        """何をする関数？：1日の出来高のうち m 分目の終わりまでに出る割合（寄り前は最初の1分ぶん）。場中スキャナの expected_frac 用。"""
+        m = min(max(int(minute), 0), SESSION_MINUTES - 1)
+        r = self._row.get(symbol)
+        if r is not None and self.cum[r, -1] > 0:
+            return float(self.cum[r, m] / self.cum[r, -1])
+        return float(self._shape[m])
+
+    def expected_array(self, symbols, minutes) -> np.ndarray:
+        """何をする関数？：expected の配列版（symbols と minutes は同じ長さ）。表に無い銘柄・寄り前は NaN。"""
+        minutes = np.asarray(minutes, dtype=np.int64)
+        rows = self._index.get_indexer(pd.Index(np.asarray(symbols, dtype=object)).astype(str))
+        out = np.full(len(minutes), np.nan, dtype=np.float64)
+        ok = (rows >= 0) & (minutes >= 0)
+        if ok.any():
+            out[ok] = self.cum[rows[ok], np.minimum(minutes[ok], SESSION_MINUTES - 1)]
+        return out
+
+    def rvol_array(self, symbols, minutes, cum_volume) -> np.ndarray:
+        """何をする関数？：rvol の配列版（cum_volume は寄りからの累積出来高）。"""
+        e = self.expected_array(symbols, minutes)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(e > 0, np.asarray(cum_volume, dtype=np.float64) / e, np.nan)
+
+    def day_volume(self, symbol: str) -> float:
+        """何をする関数？：ふだんの1日（レギュラー時間）の出来高の中央値。"""
+        return self.expected(symbol, SESSION_MINUTES - 1)
+
+    def save(self, path: str | os.PathLike[str]) -> Path:
+        """何をする関数？：.npz（非圧縮）に一時ファイル経由で保存します。"""
+        p = Path(path)
+        p.parent.mkdir(parents=True, exist_ok=True)
+        tmp = p.with_name(p.name + ".tmp")
+        with open(tmp, "wb") as f:
+            np.savez(f, symbols=np.asarray(self.symbols, dtype=str), cum=self.cum, ndays=self.ndays,
+                     last_day_volume=self.last_day_volume, meta=np.asarray(orjson.dumps(self.meta).decode()))
+        os.replace(tmp, p)
+        return p
+
+    @classmethod
+    def load(cls, path: str | os.PathLike[str]) -> "VolumeProfile":
+        """何をする関数？：save した .npz を読みます。"""
+        with np.load(path, allow_pickle=False) as z:
+            return cls(z["symbols"].tolist(), z["cum"], z["ndays"], z["last_day_volume"], orjson.loads(str(z["meta"])))
+
+def load_profile(path: str | os.PathLike[str] | None = None) -> VolumeProfile | None:
+    """何をする関数？：プロファイルを読みます（同じ版ならプロセス内で使い回し。無い・壊れていれば None）。"""
+    from rh_pdc_daytrade.store.refdata import cached  # 関数内だけで使うためここでインポート
+    return cached("volprofile", profile_path(path), VolumeProfile.load, None)
+
+# ---- 1日ぶんの累積カーブと、差分での作り直し ----------------------------------------------------------
+
+def day_curves(df: pd.DataFrame) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    何をする関数？：1日ぶんの 1分足（symbol, et, v）から、銘柄ごとの寄りからの累積出来高 [銘柄, 390] と、バーのある分の割合を作ります。
+    戻り値：(銘柄の配列（昇順）, float32 [銘柄, 390], float32 [銘柄]（0–1）)。レギュラー時間のバーが無い銘柄は入りません。
+    """
+    mod = session_minute(df["et"])
+    m = (mod >= 0) & (mod < SESSION_MINUTES)
+    if not m.any():
+        return (np.asarray([], dtype=str), np.zeros((0, SESSION_MINUTES), dtype=np.float32),
+                np.zeros(0, dtype=np.float32))
+    codes, uniq = pd.factorize(df["symbol"].astype(str).to_numpy()[m], sort=True)
+    flat = codes.astype(np.int64) * SESSION_MINUTES + mod[m]
+    size = len(uniq) * SESSION_MINUTES
+    vol = np.bincount(flat, weights=df["v"].to_numpy(dtype=np.float64)[m], minlength=size)
+    cov = (np.bincount(flat, minlength=size).reshape(len(uniq), SESSION_MINUTES) > 0).mean(axis=1)  # 何をする行？：同じ分の重複は1分と数える
+    return (np.asarray(uniq, dtype=str), np.cumsum(vol.reshape(len(uniq), SESSION_MINUTES), axis=1).astype(np.float32),
+            cov.astype(np.float32))
+
+def complete_sessions(days, asof_ns: int | None = None) -> tuple[list[str], dict[str, list[str]]]:
+    """
+    何をする関数？：
+      - YYYYMMDD の並びのうち、プロファイルに使える日（市場カレンダーで通常の営業日・半日立会いでない・asof_ns の時点で引けを過ぎた）だけを返します。
+      - 除いた日は理由ごと（not_session / early_close / incomplete）に返します（ログ用）。
+    """
+    import time                                                    # 関数内だけで使うためここでインポート
+    from datetime import date
+    from rh_pdc_daytrade.utils.market_calendar import get_calendar
+    cal = get_calendar()
+    now = time.time_ns() if asof_ns is None else int(asof_ns)
+    ok: list[str] = []
+    skipped: dict[str, list[str]] = {"not_session": [], "early_close": [], "incomplete": []}
+    for d in days:
+        try:
+            ses = cal.session(date(int(d[:4]), int(d[4:6]), int(d[6:])))
+        except ValueError:
+            ses = None   # 何をする行？：カレンダーの範囲外・日付として読めないものは営業日ではない扱い
+        if ses is None:
+            skipped["not_session"].append(d)
+        elif ses.early_close:
+            skipped["early_close"].append(d)
+        elif ses.close_ns > now:
+            skipped["incomplete"].append(d)
+        else:
+            ok.append(d)
+    return ok, skipped
+
+def _scan_days(sources) -> dict[str, list[Path]]:
+    # 何をする関数？：各フォルダの bars_1m_YYYYMMDD.parquet を日付ごとに集める（同じ日が複数の場所にあれば全部）。
+    days: dict[str, list[Path]] = {}
+    for root in sources:
+        root = Path(root)
+        if not root.is_dir():
+            continue
+        for p in root.glob("bars_1m_*.parquet"):
+            d = p.stem.rsplit("_", 1)[-1]
+            if len(d) == 8 and d.isdigit():
+                days.setdefault(d, []).append(p)
+    return days
+
+def _stamp(paths: list[Path]) -> list:
+    return sorted([str(p), p.stat().st_mtime_ns, p.stat().st_size] for p in paths)
+
+def _read_day(paths: list[Path]) -> pd.DataFrame:
+    # 何をする関数？：1日ぶんのファイルを読み、同じ (銘柄, 分) は後のファイル（mtime の新しい方）を採る。
+    from rh_pdc_daytrade.utils.io import read_parquet  # 関数内だけで使うためここでインポート
+    frames = [read_parquet(p, columns=["symbol", "et", "v"], compact=False)
+              for p in sorted(paths, key=lambda q: q.stat().st_mtime_ns)]
+    df = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+    df["symbol"] = df["symbol"].astype(str)
+    return df.drop_duplicates(["symbol", "et"], keep="last") if len(frames) > 1 else df
+
+def update_profile(sources, days: int = 20, min_days: int = 5, out: str | os.PathLike[str] | None = None,
+                   rebuild: bool = False, min_coverage: float = 0.5, asof_ns: int | None = None) -> VolumeProfile | None:
+    """
+    何をする関数？：
+      - sources（bars_1m_YYYYMMDD.parquet のあるフォルダの並び）の、引けを過ぎた通常の営業日（complete_sessions）の直近 days 日から、
+        プロファイルを作り直して保存します。当日の場中の出力・休場日・半日立会いの日は数えません。
+      - 銘柄×日ごとにバーのある分の割合が min_coverage に満たないものは、その日の値を持たせません（途中までのカーブで中央値を下げない）。
+      - 状態ファイル（プロファイルと同じ場所の volprofile_state.npz）に入っている日で、ファイルの mtime/サイズが同じものは読み直しません。
+      - rebuild=True なら状態を捨てて全部読み直します。
+    戻り値：新しい VolumeProfile（対象の日が1日も無ければ None）
+    """
+    out_p = profile_path(out)
+    state_p = out_p.with_name(out_p.stem + "_state.npz")
+    found = _scan_days(sources)
+    usable, skipped = complete_sessions(sorted(found), asof_ns=asof_ns)
+    for why, ds in skipped.items():
+        if ds:
+            logger.info("volprofile: skipped {} day(s) ({}): {}", len(ds), why, ", ".join(ds[-5:]))
+    want = usable[-max(1, int(days)):]
+    if not want:
+        logger.warning("volprofile: no complete sessions of bars_1m_*.parquet in {}", [str(s) for s in sources])
+        return None
+
+    curves: dict[str, tuple[np.ndarray, np.ndarray]] = {}
+    stamps: dict[str, list] = {}
+    if state_p.exists() and not rebuild:
+        try:
+            with np.load(state_p, allow_pickle=False) as z:
+                old = orjson.loads(str(z["stamps"]))
+                for d in want:
+                    # 何をする行？：分の割合（cov_）を持たない古い形式の状態は、その日だけ読み直す
+                    if d in old and old[d] == _stamp(found[d]) and f"cov_{d}" in z.files:
+                        curves[d] = (z[f"sym_{d}"], z[f"cum_{d}"], z[f"cov_{d}"])
+                        stamps[d] = old[d]
+        except Exception as e:
+            logger.warning("volprofile: state unreadable ({}); rebuilding", e)
+            curves, stamps = {}, {}
+    fresh = [d for d in want if d not in curves]
+    for d in fresh:
+        curves[d] = day_curves(_read_day(found[d]))
+        stamps[d] = _stamp(found[d])
+
+    # 状態を保存（直近 days 日ぶんだけ）
+    state_p.parent.mkdir(parents=True, exist_ok=True)
+    arrays = {"stamps": np.asarray(orjson.dumps(stamps).decode())}
+    for d in want:
+        arrays[f"sym_{d}"], arrays[f"cum_{d}"], arrays[f"cov_{d}"] = curves[d]
+    tmp = state_p.with_name(state_p.name + ".tmp")
+    with open(tmp, "wb") as f:
+        np.savez(f, **arrays)
+    os.replace(tmp, state_p)
+
+    # 銘柄の和集合に並べ、日 × 銘柄 × 分 の中央値（その日に居ない・分の割合が足りない銘柄は NaN で数えない）
+    universe = np.unique(np.concatenate([curves[d][0] for d in want]))
+    idx = pd.Index(universe)
+    cube = np.full((len(want), len(universe), SESSION_MINUTES), np.nan, dtype=np.float32)
+    thin = 0
+    for k, d in enumerate(want):
+        sym, cum, cov = curves[d]
+        ok = cov >= float(min_coverage)
+        thin += int((~ok).sum())
+        if ok.any():
+            cube[k, idx.get_indexer(sym[ok])] = cum[ok]
+    ndays = (~np.isnan(cube[:, :, -1])).sum(axis=0)
+    keep = ndays >= max(1, int(min_days))
+    med = np.nanmedian(cube[:, keep], axis=0).astype(np.float32) if keep.any() else np.zeros((0, SESSION_MINUTES), np.float32)
+    prof = VolumeProfile(universe[keep], med, ndays[keep], cube[-1, keep, -1],
+                         meta={"days": want, "window": int(days), "min_days": int(min_days),
+                               "min_coverage": float(min_coverage)})
+    prof.save(out_p)
+    logger.info("volprofile: {} symbols from {} days ({} read, {} reused, {} symbol-days under coverage {:.0%}) -> {}",
+                len(prof), len(want), len(fresh), len(want) - len(fresh), thin, float(min_coverage), out_p)
+    return prof
+
+def profile_features(df: pd.DataFrame, profile: VolumeProfile | None, orb_minutes: int = 5) -> pd.DataFrame:
+    """
+    何をする関数？：
+      - EOD特徴量（symbol 列）に、プロファイルからの夜間特徴量を足します（compute_scores_basic の rvol_score 用）。
+        rvol_prev   = 最新の日のレギュラー時間の出来高 ÷ ふだんの1日の出来高（中央値）
+        or_vol_share = 寄りから orb_minutes 分までに出る出来高の割合（ふだん）
+      - プロファイルが無い・表に無い銘柄は NaN です。
+    """
+    out = df.copy()
+    if profile is None or not len(profile) or "symbol" not in out.columns:
+        out["rvol_prev"] = np.nan
+        out["or_vol_share"] = np.nan
+        return out
+    sym = out["symbol"].astype(str).to_numpy()
+    n = len(sym)
+    day = profile.expected_array(sym, np.full(n, SESSION_MINUTES - 1))
+    orb = profile.expected_array(sym, np.full(n, max(0, int(orb_minutes) - 1)))
+    rows = profile._index.get_indexer(pd.Index(sym))
+    last = np.where(rows >= 0, profile.last_day_volume[np.maximum(rows, 0)], np.nan)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        out["rvol_prev"] = np.where(day > 0, last / day, np.nan)
+        out["or_vol_share"] = np.where(day > 0, orb / day, np.nan)
+    return out
@@ -0,0 +1,3 @@
+# 注文ライフサイクル（未約定取消・強制クローズ）の共通ロジックをまとめる名前空間です。
+# ここでは import を行わず、各モジュール（scheduler など）を直接読み込む前提にします。
+__all__ = []  # 公開対象は各サブモジュール側で宣言します
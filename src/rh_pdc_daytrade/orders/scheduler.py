@@ -0,0 +1,322 @@
+# 未約定取消（orders.cancel_unfilled_by）と強制クローズ（orders.force_close_by）を
+# asyncio のタイマーで「ちょうどその時刻」に発火させるスケジューラです。
+# ねらい：cron 的なポーリング（cancel_unfilled.py / close_positions.py）だと起動間隔ぶん遅れるため、
+#         開いている注文をメモリに保持し、締切時刻に直接アクションを実行して、締切からの遅れ(ms)を記録します。
+
+from __future__ import annotations
+import asyncio                                   # 締切までの待機（タイマー）
+import csv                                       # 発火遅延ログ（追記のみ）
+from dataclasses import dataclass                # 注文・実行記録の入れ物
+from datetime import date, datetime, time        # ET締切の組み立て
+from pathlib import Path                         # signals/sent/*.json と遅延ログの場所
+from typing import TYPE_CHECKING, Callable, Iterable
+import orjson                                    # シグナルJSONの高速読込
+from loguru import logger                        # 共通ログ
+
+from rh_pdc_daytrade.utils.timeutil import get_et_tz  # ETのtzinfo（フォールバック付）
+from rh_pdc_daytrade.utils.market_calendar import get_calendar  # 休場日・短縮取引日（締切の前倒し）
+
+if TYPE_CHECKING:
+    from rh_pdc_daytrade.utils.configutil import Settings
+
+ACTION_LOG_COLUMNS = [
+    "date", "action", "deadline_et", "fired_at_et", "lateness_ms", "duration_ms", "orders",
+]
+
+@dataclass
+class OpenOrder:
+    """何をする入れ物？：メモリ上に保持する「未約定の注文」1件（キーは signals/sent/ 内のファイル名）。"""
+    key: str
+    path: Path
+    symbol: str
+    setup: str
+    registered_at: datetime
+
+@dataclass
+class ActionRecord:
+    """何をする入れ物？：締切アクション1回分の実行記録（締切・発火・完了の各ET時刻と対象件数）。"""
+    action: str
+    deadline: datetime
+    fired_at: datetime
+    done_at: datetime
+    orders: int
+
+    @property
+    def lateness_ms(self) -> float:
+        """何をする関数？：締切から実際に発火するまでの遅れ（ミリ秒、負なら早すぎ）を返します。"""
+        return (self.fired_at - self.deadline).total_seconds() * 1000.0
+
+    @property
+    def duration_ms(self) -> float:
+        """何をする関数？：発火からアクション完了までにかかった時間（ミリ秒）を返します。"""
+        return (self.done_at - self.fired_at).total_seconds() * 1000.0
+
+def parse_deadline(cfg: dict, key: str, default: str) -> time:
+    """
+    何をする関数？：
+      - config.yaml の orders.<key>（例：cancel_unfilled_by="10:30:00"）を time に変換して返します。
+      - 未設定や壊れた値のときは default を使います（止めない運用）。
+    """
+    t_str = ((cfg.get("orders") or {}).get(key) or default)
+    try:
+        return time.fromisoformat(str(t_str))
+    except ValueError:
+        logger.warning("orders.{} is invalid ({}); fallback to {}", key, t_str, default)
+        return time.fromisoformat(default)
+
+def deadline_on(session_date: date, t: time) -> datetime:
+    """
+    何をする関数？：
+      - ETの日付と時刻から、aware な締切 datetime（ET）を作ります。
+      - 取引カレンダーの短縮取引日（13:00 引け）は、引け以降になる締切を“通常日の引けまでの残り時間”で前倒しします
+        （force_close_by 15:55 → 12:55）。カレンダーの範囲外の日付はそのままです。
+    """
+    cal = get_calendar()
+    if cal.first <= session_date <= cal.last:
+        return cal.session_deadline(session_date, t)
+    return datetime.combine(session_date, t, tzinfo=get_et_tz())
+
+def load_open_order(p: Path) -> OpenOrder:
+    """
+    何をする関数？：
+      - signals/sent/ のJSON 1件を OpenOrder にします。中身が壊れていてもファイル名で保持します（止めない運用）。
+    """
+    try:
+        payload = orjson.loads(p.read_bytes())
+    except Exception:
+        payload = {}
+    if not isinstance(payload, dict):
+        payload = {}
+    return OpenOrder(
+        key=p.name,
+        path=p,
+        symbol=str(payload.get("symbol", p.stem)),
+        setup=str(payload.get("setup", "")),
+        registered_at=datetime.now(get_et_tz()),
+    )
+
+async def sleep_until(deadline: datetime, coarse_s: float = 30.0) -> None:
+    """
+    何をする関数？：
+      - 締切（aware datetime）まで待ちます。長い待機は coarse_s 秒ごとに区切って“壁時計”を測り直すので、
+        PCのスリープ復帰や時刻補正があっても締切を大きく外しません。最後の1区切りは残り時間ちょうどだけ眠ります。
+    """
+    while True:
+        remaining = (deadline - datetime.now(deadline.tzinfo)).total_seconds()
+        if remaining <= 0:
+            return
+        await asyncio.sleep(min(remaining, coarse_s))
+
+def _append_action_log(rec: ActionRecord, p: Path) -> Path:
+    """
+    何をする関数？：
+      - 締切アクションの実行記録を CSV に1行追記します（新規作成時だけヘッダーを書き、過去行は読みません）。
+    """
+    p.parent.mkdir(parents=True, exist_ok=True)
+    new_file = not p.exists()
+    with open(p, "a", encoding="utf-8", newline="") as f:
+        w = csv.writer(f)
+        if new_file:
+            w.writerow(ACTION_LOG_COLUMNS)
+        w.writerow([
+            rec.deadline.strftime("%Y%m%d"),
+            rec.action,
+            rec.deadline.isoformat(),
+            rec.fired_at.isoformat(),
+            f"{rec.lateness_ms:.3f}",
+            f"{rec.duration_ms:.3f}",
+            rec.orders,
+        ])
+    return p
+
+class OrderLifecycleScheduler:
+    """
+    何をするクラス？：
+      - 開いている注文（OpenOrder）をメモリに保持し、
+          1) cancel_by 到達で on_cancel(order) を全件に実行（未約定の全取消）
+          2) close_by 到達で残りを on_cancel → on_close(残件) を実行（持ち越し禁止の全決済）
+        をそれぞれ1回だけ、締切ちょうどに発火させます。
+      - 締切を過ぎてから add() された注文は、その場で取消します（締切後の新規注文を残さない）。
+    使い方：
+      sch = OrderLifecycleScheduler.from_config(cfg, on_cancel=..., on_close=...)
+      sch.add_many(load_open_order(p) for p in sent_files)
+      records = asyncio.run(sch.run())
+    """
+
+    def __init__(self,
+                 cancel_by: time,
+                 close_by: time,
+                 on_cancel: Callable[[OpenOrder], None],
+                 on_close: Callable[[list[OpenOrder]], None] | None = None,
+                 session_date: date | None = None,
+                 action_log: Path | None = None):
+        d = session_date or datetime.now(get_et_tz()).date()
+        self.session_date = d
+        self.cancel_deadline = deadline_on(d, cancel_by)
+        self.close_deadline = deadline_on(d, close_by)
+        self._on_cancel = on_cancel
+        self._on_close = on_close
+        self._action_log = action_log
+        self._orders: dict[str, OpenOrder] = {}
+        self._cancel_fired = False
+        self._close_fired = False
+        self._wake: asyncio.Event | None = None   # reschedule() でタイマーを張り直すための合図（run() の中で作る）
+        self.records: list[ActionRecord] = []
+
+    @classmethod
+    def from_config(cls, cfg: dict,
+                    on_cancel: Callable[[OpenOrder], None],
+                    on_close: Callable[[list[OpenOrder]], None] | None = None,
+                    **kwargs) -> "OrderLifecycleScheduler":
+        """何をする関数？：config.yaml の orders.cancel_unfilled_by / force_close_by から締切を決めて作ります。"""
+        return cls(
+            cancel_by=parse_deadline(cfg, "cancel_unfilled_by", "10:30:00"),
+            close_by=parse_deadline(cfg, "force_close_by", "15:55:00"),
+            on_cancel=on_cancel,
+            on_close=on_close,
+            **kwargs,
+        )
+
+    @classmethod
+    def from_settings(cls, st: "Settings",
+                      on_cancel: Callable[[OpenOrder], None],
+                      on_close: Callable[[list[OpenOrder]], None] | None = None,
+                      **kwargs) -> "OrderLifecycleScheduler":
+        """何をする関数？：検証済みの設定スナップショット（configutil.load_settings）の orders から締切を決めて作ります。"""
+        return cls(cancel_by=st.orders.cancel_unfilled_by, close_by=st.orders.force_close_by,
+                   on_cancel=on_cancel, on_close=on_close, **kwargs)
+
+    def reschedule(self, cancel_by: time, close_by: time) -> bool:
+        """
+        何をする関数？：
+          - 設定の再読込（ConfigWatcher）で締切が変わったとき、まだ発火していない締切だけを差し替えます。
+          - run() 中なら待機中のタイマーを起こして新しい締切で待ち直させます（過ぎていればすぐ発火）。
+          - run() と同じイベントループのスレッドから呼んでください。
+        戻り値：どちらかの締切が変わったら True
+        """
+        changed = False
+        if not self._cancel_fired:
+            new = deadline_on(self.session_date, cancel_by)
+            changed |= new != self.cancel_deadline
+            self.cancel_deadline = new
+        if not self._close_fired:
+            new = deadline_on(self.session_date, close_by)
+            changed |= new != self.close_deadline
+            self.close_deadline = new
+        if changed:
+            logger.info("lifecycle: rescheduled cancel_by={} close_by={}",
+                        self.cancel_deadline.strftime("%H:%M:%S"), self.close_deadline.strftime("%H:%M:%S"))
+            if self._wake is not None:
+                self._wake.set()
+        return changed
+
+    # ---- 注文の出し入れ --------------------------------------------------------------------------
+    @property
+    def open_orders(self) -> list[OpenOrder]:
+        """何をする関数？：いま保持している未約定注文の一覧（登録順）を返します。"""
+        return list(self._orders.values())
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._orders
+
+    def add(self, order: OpenOrder) -> bool:
+        """
+        何をする関数？：
+          - 注文を保持します。すでに取消締切を過ぎていれば保持せず、その場で on_cancel を実行します。
+        戻り値：保持した場合 True（即時取消・重複は False）
+        """
+        if order.key in self._orders:
+            return False
+        if self._cancel_fired or self._close_fired:
+            logger.info("lifecycle: {} arrived after deadline; cancel now", order.symbol)
+            self._safe_cancel(order)
+            return False
+        self._orders[order.key] = order
+        return True
+
+    def add_many(self, orders: Iterable[OpenOrder]) -> int:
+        """何をする関数？：複数の注文をまとめて add() し、保持できた件数を返します。"""
+        return sum(1 for o in orders if self.add(o))
+
+    def discard(self, key: str) -> OpenOrder | None:
+        """何をする関数？：約定などで管理対象から外れた注文を取り除きます（無ければ None）。"""
+        return self._orders.pop(key, None)
+
+    # ---- 締切アクション --------------------------------------------------------------------------
+    def _safe_cancel(self, order: OpenOrder) -> None:
+        # 1件の失敗で全体を止めない（残りの取消を優先）
+        try:
+            self._on_cancel(order)
+        except Exception as e:
+            logger.error("lifecycle: cancel failed {} ({})", order.key, e)
+
+    def _record(self, action: str, deadline: datetime, fired_at: datetime, n: int) -> ActionRecord:
+        rec = ActionRecord(action=action, deadline=deadline, fired_at=fired_at,
+                           done_at=datetime.now(get_et_tz()), orders=n)
+        self.records.append(rec)
+        logger.info("lifecycle: {} fired lateness={:.1f}ms duration={:.1f}ms orders={}",
+                    action, rec.lateness_ms, rec.duration_ms, n)
+        if self._action_log is not None:
+            _append_action_log(rec, self._action_log)
+        return rec
+
+    def fire_cancel(self) -> ActionRecord:
+        """何をする関数？：取消締切のアクション（保持中の全注文を on_cancel）を今すぐ実行します。"""
+        fired_at = datetime.now(get_et_tz())
+        self._cancel_fired = True
+        targets = list(self._orders.values())
+        self._orders.clear()
+        for o in targets:
+            self._safe_cancel(o)
+        return self._record("cancel_unfilled", self.cancel_deadline, fired_at, len(targets))
+
+    def fire_close(self) -> ActionRecord:
+        """何をする関数？：強制クローズのアクション（残りを取消 → on_close）を今すぐ実行します。"""
+        fired_at = datetime.now(get_et_tz())
+        self._close_fired = True
+        targets = list(self._orders.values())
+        self._orders.clear()
+        for o in targets:
+            self._safe_cancel(o)
+        if self._on_close is not None:
+            try:
+                self._on_close(targets)
+            except Exception as e:
+                logger.error("lifecycle: close hook failed ({})", e)
+        return self._record("force_close", self.close_deadline, fired_at, len(targets))
+
+    async def run(self) -> list[ActionRecord]:
+        """
+        何をする関数？：
+          - 取消締切・クローズ締切のタイマーを張り、両方が発火し終わるまで待ちます。
+          - 起動時点で締切を過ぎていれば即時に発火します（遅れは lateness_ms にそのまま残ります）。
+        戻り値：実行記録（ActionRecord）のリスト
+        """
+        self._wake = asyncio.Event()
+
+        async def _at(deadline: Callable[[], datetime], fire: Callable[[], ActionRecord]) -> None:
+            # 締切まで眠る。途中で reschedule() されたら起きて、新しい締切で待ち直す。
+            while True:
+                wake = asyncio.ensure_future(self._wake.wait())
+                sleep = asyncio.ensure_future(sleep_until(deadline()))
+                done, _ = await asyncio.wait({wake, sleep}, return_when=asyncio.FIRST_COMPLETED)
+                wake.cancel()
+                sleep.cancel()
+                if sleep in done:
+                    break
+                await asyncio.sleep(0)   # 両方のタイマーが合図を見てから消す
+                self._wake.clear()
+            fire()
+
+        jobs = []
+        if not self._cancel_fired:
+            jobs.append(_at(lambda: self.cancel_deadline, self.fire_cancel))
+        if not self._close_fired:
+            jobs.append(_at(lambda: self.close_deadline, self.fire_close))
+        await asyncio.gather(*jobs)
+        return self.records
+
+    @property
+    def finished(self) -> bool:
+        """何をする関数？：クローズ締切まで処理し終えたかを返します（監視ループの終了判定用）。"""
+        return self._close_fired
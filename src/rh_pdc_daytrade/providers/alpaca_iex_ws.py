@@ -1,12 +1,15 @@
 # Alpaca Market Data (feed=iex) の WebSocket に接続し、bars を data/stream に NDJSON で保存する最小プロバイダです。
 # 目的：Phase-1（無料枠）のリアルタイム層として bars を安定取得して“止めずに保存する”箱を用意する。  :contentReference[oaicite:6]{index=6}
 # 仕様メモ：IEX Bar は {"T":"b","S":"AAPL","t":..., "o":..., "h":..., "l":..., "c":..., "v":...} 形式（資料の想定）。  :contentReference[oaicite:7]{index=7}
+#           updatedBars（遅れて届いた約定で確定済みバーを直す訂正）は同じ形で T="u"。
+#           (銘柄, t) の索引（store.barindex）で、再送は捨て、訂正は "u": 1 の印を付けて追記します（読み手は後勝ち）。
 
 from __future__ import annotations
 import asyncio                      # 非同期WSループ
 from pathlib import Path            # 保存先のパス操作
 from datetime import datetime, timezone       # ET日付でファイル名を付ける
 import os                           # APIキー・FEEDの参照
+import time                         # 受信→保存の所要時間（perf_counter_ns）とバーの遅れ（time_ns）
 import json                         # 認証/購読メッセージ送信用（テキスト）
 import orjson                       # 受信データの高速書き込み（バイナリ）
 import websockets                   # WebSocketクライアント（^12系）
@@ -14,18 +17,31 @@ from loguru import logger           # ログ（共通ポリシー）
 from pandas import to_datetime  # 何をする行？：ISO文字列の時刻を“UTCのnsエポック整数”へ変換するために使う。:contentReference[oaicite:2]{index=2}
 
 from rh_pdc_daytrade.utils.timeutil import get_et_tz  # ET日付の安定取得（tzdata+フォールバック）  :contentReference[oaicite:8]{index=8}
+from rh_pdc_daytrade.utils.logutil import log_every  # 何をする関数？：バーごとに出うる警告を key ごとに間引く
+from rh_pdc_daytrade.utils.metrics import incr, observe, set_gauge  # 何をする関数？：受信件数・保存時間・遅れの記録（Prometheus 公開にも使う）
+from rh_pdc_daytrade.store.barindex import BarIndex, DUP, UPDATE  # 何をする関数？：(銘柄, t) の索引で再送を捨て、訂正を見分ける
 
 def ws_url(feed: str = "iex") -> str:
-    """何をする関数？：feed名（iex/sip/delayed_sip）から Alpaca WS エンドポイントURLを返します。"""
+    """
+    何をする関数？：feed名（iex/sip/delayed_sip）から Alpaca WS エンドポイントURLを返します。
+    環境変数 ALPACA_WS_URL があればそれを優先します（ローカルのリプレイサーバで負荷試験するときの差し替え口）。
+    """
+    override = os.environ.get("ALPACA_WS_URL", "").strip()
+    if override:
+        return override
     f = (feed or "iex").lower()
     if f not in {"iex", "sip", "delayed_sip"}:
         f = "iex"
     return f"wss://stream.data.alpaca.markets/v2/{f}"
 
 def stream_dir() -> Path:
-    """何をする関数？：標準の保存先 data/stream を返し、無ければ作ります（Runbook準拠）。"""  # :contentReference[oaicite:9]{index=9}
+    """
+    何をする関数？：標準の保存先 data/stream を返し、無ければ作ります（Runbook準拠）。  :contentReference[oaicite:9]{index=9}
+    環境変数 STREAM_DIR があればそちらを使います（ws_run / compute_indicators と同じ場所を指すため）。
+    """
+    env = os.environ.get("STREAM_DIR", "").strip()
     root = Path(__file__).resolve().parents[4]
-    d = root / "data" / "stream"
+    d = Path(env) if env else (root / "data" / "stream")
     d.mkdir(parents=True, exist_ok=True)
     return d
 
@@ -41,6 +57,74 @@ def append_ndjson(channel: str, obj: dict) -> None:
         f.write(orjson.dumps(obj))
         f.write(b"\n")
 
+_BIN_WRITER = None  # 当日の固定長バイナリ書き込み口（STREAM_BINARY=1 のときだけ使う）
+
+def _binary_enabled() -> bool:
+    """何をする関数？：環境変数 STREAM_BINARY が有効（1/true/yes/on）なら、NDJSON に加えて固定長バイナリも書きます。"""
+    return os.environ.get("STREAM_BINARY", "0").lower() in ("1", "true", "yes", "on")
+
+def append_bar_binary(rec: dict) -> None:
+    """
+    何をする関数？：
+      - standardize_bar 済みの1本を data/stream/bars_YYYYMMDD.bin に固定長で追記します（ET日付が変われば新ファイル）。
+      - 読み手は store.barstream.open_bars で memmap するだけなので、NDJSON の再パースが要りません。
+    """
+    global _BIN_WRITER
+    from rh_pdc_daytrade.store.barstream import BarStreamWriter  # 関数内だけで使うためここでインポート
+    p = _ndjson_path("bars").with_suffix(".bin")
+    if _BIN_WRITER is None or _BIN_WRITER.path != p:
+        if _BIN_WRITER is not None:
+            _BIN_WRITER.close()
+        _BIN_WRITER = BarStreamWriter(p)
+    _BIN_WRITER.append(rec)
+
+_BAR_INDEX = None       # 当日の (銘柄, t) 索引（再送の除去と訂正の判定）
+_BAR_INDEX_PATH = None  # 索引がどの日付の NDJSON に対応しているか
+
+def bar_index() -> BarIndex:
+    """
+    何をする関数？：
+      - 当日（ET日付）の BarIndex を返します。日付が変わったら作り直し、同じ日の NDJSON が既にあれば
+        それで索引を埋めます（WS を再起動しても、保存済みのバーの再送を捨てられるように）。
+    """
+    global _BAR_INDEX, _BAR_INDEX_PATH
+    p = _ndjson_path("bars")
+    if _BAR_INDEX is None or _BAR_INDEX_PATH != p:
+        _BAR_INDEX = BarIndex.from_ndjson(p)
+        _BAR_INDEX_PATH = p
+        if len(_BAR_INDEX):
+            logger.info("bar index seeded from {} ({} bars)", p, len(_BAR_INDEX))
+    return _BAR_INDEX
+
+_RING = None  # 共有メモリのバー配信口（BARS_SHM=1 のときだけ使う）
+
+def _ring_enabled() -> bool:
+    """何をする関数？：環境変数 BARS_SHM が有効（1/true/yes/on）なら、受信バーを共有メモリのリングにも流します。"""
+    return os.environ.get("BARS_SHM", "0").lower() in ("1", "true", "yes", "on")
+
+def publish_bar_ring(rec: dict) -> None:
+    """
+    何をする関数？：
+      - standardize_bar 済みの1本を共有メモリのリング（store.barring）に publish します。
+      - 指標・シグナル・監視の別プロセスは BarRingReader で同じバーをディスクを経由せずに受け取れます。
+    """
+    global _RING
+    if _RING is None:
+        from rh_pdc_daytrade.store.barring import BarRingWriter  # 関数内だけで使うためここでインポート
+        _RING = BarRingWriter()
+        logger.info("bar ring created: {} (capacity={})", _RING.name, _RING.capacity)
+    _RING.publish(rec)
+
+def _close_ring() -> None:
+    """何をする関数？：リングを閉じて共有メモリ名を消します（WS終了時の後始末）。"""
+    global _RING
+    if _RING is not None:
+        try:
+            _RING.close()
+        except Exception:
+            logger.warning("bar ring close failed: {}", _RING.name)
+        _RING = None
+
 def _coerce_ts_to_ns(ts) -> int:
     """何をする関数？：IEXの't'が文字列ISO or 数値(秒/ms/us/ns)でも受け取り、nsのUNIX時間(int)に統一して返す"""
     try:
@@ -70,14 +154,17 @@ def _coerce_ts_to_ns(ts) -> int:
             return int(dt_utc.timestamp() * 1_000_000_000)
 
     except Exception:
-        logger.warning("timestamp parse failed: {}", ts)  # 何かあっても落とさない
+        log_every("ws.ts_parse", 10, "WARNING", "timestamp parse failed: {}", ts)  # 何かあっても落とさない（同じ警告は10秒に1回）
 
     # 最終フォールバック（現在UTC）
     return int(datetime.now(timezone.utc).timestamp() * 1_000_000_000)
 
-def standardize_bar(msg: dict) -> dict:
-    """何をする関数？：IEXのBarメッセージを標準キーに整えます（T/S/t/o/h/l/c/v をそのまま使用）。"""  # :contentReference[oaicite:10]{index=10}
-    return {
+def standardize_bar(msg: dict, recv_ns: int | None = None) -> dict:
+    """
+    何をする関数？：IEXのBarメッセージを標準キーに整えます（T/S/t/o/h/l/c/v をそのまま使用）。  :contentReference[oaicite:10]{index=10}
+      - recv_ns（フレーム受信時刻、UTC ns）を渡すと rt として残します（バー→発注の遅れトレース用：utils/latency.py）。
+    """
+    rec = {
         "type": "bar",
         "S": msg.get("S"),  # シンボル
         "t": _coerce_ts_to_ns(msg.get("t")),  # 目的：NDJSON内のtを常にns整数で保存（compute側のint変換エラーを防ぐ）
@@ -87,13 +174,107 @@ def standardize_bar(msg: dict) -> dict:
         "c": msg.get("c"),
         "v": msg.get("v"),
     }
+    if recv_ns is not None:
+        rec["rt"] = int(recv_ns)
+    return rec
 
 def build_subscribe(symbols: list[str]) -> dict:
-    """何をする関数？：bars購読のサブスクJSONを作ります（まずはbarsのみ）。"""
-    return {"action": "subscribe", "bars": symbols}
+    """何をする関数？：bars と updatedBars（確定済みバーの訂正）の購読JSONを作ります。"""
+    return {"action": "subscribe", "bars": symbols, "updatedBars": symbols}
+
+class ScanLink:
+    """
+    何をするクラス？：
+      - 場中スキャナ（screening.intraday_scan）と WS 接続の間をつなぎます。
+        bars は scope（銘柄リスト。注目銘柄と合わせて scope_max まで）で受けてスキャナに流し、保存・訂正の購読
+        （channels、既定 updatedBars）は注目銘柄（FocusSet：ウォッチリスト＋上位 K）だけにします。
+        scope に "*"（全銘柄）を入れられるのは、購読できる銘柄数に上限の無いプランだけです（IEX の無料プランは 30 銘柄まで）。
+      - interval_s ごとに上位 K を見直し、注目銘柄の差分だけを subscribe / unsubscribe で送ります（接続し直さない）。
+        見直しのたびに data/stream/scan_YYYYMMDD.json（{"symbols": 足した銘柄, "rows": 上位の内訳}）を置き換えます。
+    使い方：
+      link = ScanLink(IntradayScanner.from_config(cfg, eod_df), FocusSet(watchlist, limit=30))
+      connect_and_stream(watchlist, feed="iex", scan=link)
+    """
+
+    def __init__(self, scanner, focus, scope: list[str] | None = None, channels: list[str] | None = None,
+                 interval_s: float = 60.0, scope_max: int | None = 30):
+        self.scanner = scanner
+        self.focus = focus
+        self.scope = list(scope or [])
+        self.scope_max = int(scope_max) if scope_max else None
+        self.channels = list(channels or ["updatedBars"])
+        self.interval_s = float(interval_s)
+        self._next = 0.0
+        self.resubscribes = 0
+
+    def subscribe_message(self) -> dict:
+        """何をする関数？：接続直後の購読JSON（bars は注目銘柄＋scope を scope_max まで、channels は注目銘柄）。"""
+        if "*" in self.scope:
+            bars = ["*"]
+        else:
+            bars = list(dict.fromkeys(self.focus.current + self.scope))
+            if self.scope_max is not None:
+                bars = bars[:max(self.scope_max, len(self.focus.current))]  # 何をする行？：注目銘柄は必ず残し、残りの枠だけ scope で埋める
+        msg = {"action": "subscribe", "bars": bars}
+        for ch in self.channels:
+            msg[ch] = list(self.focus.current)
+        return msg
+
+    def due(self, now: float | None = None) -> bool:
+        """何をする関数？：上位の見直しの時刻になったか（monotonic 秒）。"""
+        now = time.monotonic() if now is None else now
+        if now < self._next:
+            return False
+        self._next = now + self.interval_s
+        return True
 
-async def _stream_once(symbols: list[str], key: str, secret: str, feed: str = "iex") -> None:
-    """何をする関数？：WSへ接続→認証→購読→受信ループ→NDJSON保存を1回の接続で実行します。"""
+    def rebalance(self) -> list[dict]:
+        """何をする関数？：上位 K から注目銘柄を決め直し、送るべき unsubscribe / subscribe の JSON を返します（変化なしなら空）。"""
+        add, remove = self.focus.update(self.scanner.top_symbols())
+        msgs = []
+        if remove:
+            msgs.append({"action": "unsubscribe", **{ch: remove for ch in self.channels}})
+        if add:
+            msgs.append({"action": "subscribe", **{ch: add for ch in self.channels}})
+        if msgs:
+            self.resubscribes += 1
+            incr("ws_scan_resubscribe_total")
+            logger.info("scanner: focus +{} -{} (dynamic={})", add, remove, self.focus.dynamic)
+        self._write_scan()
+        return msgs
+
+    def _write_scan(self) -> None:
+        # 何をする関数？：いまの注目銘柄（スキャナが足した分）と上位の内訳を scan_YYYYMMDD.json に置き換えで書く。
+        p = _ndjson_path("scan").with_suffix(".json")
+        tmp = p.with_suffix(".json.tmp")
+        doc = {"updated": datetime.now(get_et_tz()).isoformat(timespec="seconds"),
+               "symbols": self.focus.dynamic, "rows": self.scanner.top()}
+        tmp.write_bytes(orjson.dumps(doc, option=orjson.OPT_SERIALIZE_NUMPY))
+        os.replace(tmp, p)
+
+async def _subscription_error(ws) -> dict | None:
+    """
+    何をする関数？：購読を送った直後の返事を読み、"subscription" が来たら None、"error" が来たらそのメッセージを返します。
+    """
+    while True:
+        frame = await ws.recv()
+        logger.info("alpaca subscription reply: {}", frame)
+        try:
+            pl = json.loads(frame)
+        except Exception:
+            continue
+        for m in (pl if isinstance(pl, list) else [pl]):
+            if m.get("T") == "error":
+                return m
+            if m.get("T") == "subscription":
+                return None
+
+async def _stream_once(symbols: list[str], key: str, secret: str, feed: str = "iex", scan: ScanLink | None = None) -> None:
+    """
+    何をする関数？：WSへ接続→認証→購読→受信ループ→NDJSON保存を1回の接続で実行します。
+      - scan を渡すと、bars は広いユニバースで受けてスキャナに流し、保存するのは注目銘柄のバーだけにします
+        （注目銘柄は受信ループの中で購読の差分を送って入れ替えます）。
+    """
     url = ws_url(feed)
     async with websockets.connect(url, ping_interval=20, ping_timeout=20, close_timeout=5) as ws:
         # 認証（"authenticated" を受信するまで待つ）
@@ -117,39 +298,77 @@ async def _stream_once(symbols: list[str], key: str, secret: str, feed: str = "i
             if authenticated:
                 break
 
-        # 購読（barsのみ：まずはbarsを安定保存する最小構成）
-        await ws.send(json.dumps(build_subscribe(symbols)))
-        sub_resp = await ws.recv()
-        logger.info("alpaca subscription reply: {}", sub_resp)
-
+        # 購読（bars＋その訂正の updatedBars）。拒否されたら（銘柄数の上限など）スキャナを外してウォッチリストだけで購読し直す
+        await ws.send(json.dumps(scan.subscribe_message() if scan is not None else build_subscribe(symbols)))
+        err = await _subscription_error(ws)
+        if err is not None and scan is not None:
+            logger.error("alpaca scanner subscription rejected: {} ; falling back to watchlist only", err)
+            incr("ws_scan_subscribe_rejected_total")
+            scan = None
+            await ws.send(json.dumps(build_subscribe(symbols)))
+            err = await _subscription_error(ws)
+        if err is not None:
+            logger.error("alpaca subscription rejected: {}", err)
+            return
 
         # 受信ループ：配列または単発メッセージの両方に対応
         while True:
             raw = await ws.recv()
+            recv_ns = time.time_ns()  # 何をする行？：フレーム受信時刻（このフレームの全バーに rt として付ける）
             try:
                 payload = json.loads(raw)
             except Exception:
-                logger.warning("non-JSON frame skipped")
+                log_every("ws.non_json", 10, "WARNING", "non-JSON frame skipped")
                 continue
 
             msgs = payload if isinstance(payload, list) else [payload]
+            incr("ws_frames_total")
+            index = bar_index()
             for m in msgs:
                 typ = m.get("T")
-                if typ == "b":  # bar
-                    rec = standardize_bar(m)
+                if typ in ("b", "u"):  # bar / updatedBar（訂正）
+                    t0 = time.perf_counter_ns()
+                    rec = standardize_bar(m, recv_ns=recv_ns)
+                    if scan is not None:
+                        scan.scanner.update_bar(rec)  # 何をする行？：ユニバースの全バーで順位を更新（O(log K)）
+                        if str(rec.get("S") or "").upper() not in scan.focus:
+                            incr("ws_bars_scan_only_total")  # 何をする行？：注目銘柄以外は順位付けだけに使い、保存しない
+                            continue
+                    kind, _prev = index.offer_bar(rec)
+                    if kind == DUP:
+                        incr("ws_bars_duplicate_total")  # 何をする行？：再接続などで届いた同じ値の再送は保存しない
+                        continue
+                    if kind == UPDATE:
+                        rec["u"] = 1  # 何をする行？：訂正の印（読み手は (銘柄, t) の後勝ちで上書きする）
+                        incr("ws_bars_corrected_total")
+                    rec["pt"] = time.time_ns()  # 何をする行？：保存時刻（書き込む直前に打刻）
                     append_ndjson("bars", rec)
-                elif typ in {"success", "error"}:
-                    # 成功/エラーの管理系はログに残して継続
+                    if _binary_enabled():
+                        append_bar_binary(rec)  # 何をする行？：memmap 読み用の固定長バイナリにも同じバーを書く
+                    if _ring_enabled():
+                        publish_bar_ring(rec)   # 何をする行？：別プロセスの読み手へ共有メモリで即時配信
+                    observe("ws_bar_persist_seconds", (time.perf_counter_ns() - t0) / 1e9)
+                    incr("ws_bars_total")
+                    if rec.get("t"):
+                        set_gauge("ws_last_bar_age_seconds", (time.time_ns() - int(rec["t"])) / 1e9)  # バー開始時刻からの経過
+                elif typ == "error":
+                    logger.error("alpaca control error: {}", m)  # 何をする行？：入れ替えの購読が拒否された等。接続は続ける
+                elif typ in {"success", "subscription"}:
+                    # 成功の管理系はログに残して継続
                     logger.info("alpaca control: {}", m)
                 else:
-                    # 今はbars以外は無視（将来 trades/quotes を追加）
+                    # 今は bars / updatedBars 以外は無視（将来 trades/quotes を追加）
                     continue
+            if scan is not None and scan.due():
+                for sub in scan.rebalance():
+                    await ws.send(json.dumps(sub))  # 何をする行？：注目銘柄の入れ替えを同じ接続のまま送る
 
-def connect_and_stream(symbols: list[str], feed: str = "iex", run_seconds: int | None = None) -> int:
+def connect_and_stream(symbols: list[str], feed: str = "iex", run_seconds: int | None = None, scan: ScanLink | None = None) -> int:
     """
     何をする関数？：
       - APIキー（ALPACA_KEY_ID/ALPACA_SECRET_KEY）と feed を使って IEX WS に接続し、barsを保存します。
       - キー未設定のときは警告して 0 を返し、処理を終えます（“止めない”運用方針）。  :contentReference[oaicite:11]{index=11}
+      - scan（ScanLink）を渡すと、場中スキャナで注目銘柄を入れ替えながら受信します。
     使い方：
       connect_and_stream(["AAPL","TSLA"], feed="iex")
     戻り値：0=正常終了
@@ -175,7 +394,7 @@ def connect_and_stream(symbols: list[str], feed: str = "iex", run_seconds: int |
     
     async def runner():
         # run_seconds が指定されていればその時間でキャンセル（テスト用）
-        task = asyncio.create_task(_stream_once(symbols, key, secret, feed=feed))
+        task = asyncio.create_task(_stream_once(symbols, key, secret, feed=feed, scan=scan))
         # 目的：テスト用の自動停止を外し、場中までWS接続を維持する（barsが溜まるようにする）
         await task  # run_seconds による強制キャンセルは無効化
 
@@ -187,5 +406,6 @@ def connect_and_stream(symbols: list[str], feed: str = "iex", run_seconds: int |
             lock_path.unlink(missing_ok=True)
         except Exception:
             logger.warning("lock release failed: {}", lock_path)
+        _close_ring()
     return 0
 
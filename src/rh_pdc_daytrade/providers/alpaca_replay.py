@@ -0,0 +1,215 @@
+# Alpaca Market Data の WebSocket を“ローカルで真似る”リプレイサーバです（負荷試験・オフ時間の動作確認用）。
+# 目的：本番キーや場中でなくても alpaca_iex_ws._stream_once を実際のプロトコル（connected→auth→subscribe→bars）で動かし、
+#       記録済みの bars_*.ndjson（または合成データ）を 1倍速／N倍速／最大速度で流して、取りこぼしや遅れを測れるようにする。
+# 使い方：ALPACA_WS_URL=ws://127.0.0.1:8765 を設定すると、プロバイダの接続先がこのサーバに向きます。
+
+from __future__ import annotations
+from pathlib import Path            # NDJSON の読み込み
+from datetime import date, datetime, timezone
+import asyncio                      # サーバ本体とリプレイの待ち時間
+import json                         # 送受信メッセージ（テキスト）
+import time                         # 送信時刻（perf_counter_ns）の記録
+import orjson                       # NDJSON の高速読込
+import websockets                   # WebSocket サーバ
+from loguru import logger
+
+from rh_pdc_daytrade.utils.timeutil import get_et_tz  # 合成データの寄り時刻（ET）
+
+def load_ndjson_bars(path: str | Path) -> list[dict]:
+    """
+    何をする関数？：
+      - 保存済みの bars_YYYYMMDD.ndjson を読み、バー（type=bar / T=b）だけを t の昇順で返します。
+      - t は ns 整数にそろっている前提（standardize_bar の出力）です。
+      - 同じ (銘柄, t) は1本にします（再送は捨て、訂正 "u": 1 は後勝ち。store.barindex と同じ規則）。
+    """
+    from rh_pdc_daytrade.store.barindex import BarIndex, NEW, DUP  # この関数内だけで使うためここでインポート
+    out: list[dict] = []
+    idx, pos = BarIndex(), {}
+    with open(path, "rb") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                m = orjson.loads(line)
+            except Exception:
+                continue
+            if not isinstance(m, dict) or (m.get("T") or m.get("type")) not in ("b", "bar"):
+                continue
+            b = {"S": str(m.get("S") or "").upper(), "t": int(m.get("t") or 0),
+                 "o": m.get("o"), "h": m.get("h"), "l": m.get("l"), "c": m.get("c"), "v": m.get("v")}
+            kind, _ = idx.offer_bar(b)
+            if kind == NEW:
+                pos[(b["S"], b["t"])] = len(out)
+                out.append(b)
+            elif kind != DUP:
+                out[pos[(b["S"], b["t"])]] = b
+    out.sort(key=lambda r: r["t"])
+    return out
+
+def synthetic_bars(symbols: list[str], minutes: int = 390, session_date: date | None = None, seed: int = 7) -> list[dict]:
+    """
+    何をする関数？：
+      - 合成マーケット（providers.synthetic）で1日ぶんを作り、リプレイ用のバー dict（t の昇順）に並べます。
+      - 手元に NDJSON が無いときの負荷試験用です。
+    """
+    from rh_pdc_daytrade.providers.synthetic import SyntheticMarket  # この関数内だけで使うためここでインポート
+    from rh_pdc_daytrade.utils.market_calendar import get_calendar   # 同上
+    d = session_date or datetime.now(get_et_tz()).date()
+    cal = get_calendar()
+    if not cal.is_session(d):
+        d = cal.previous_session(d)  # 週末・祝日なら直前の営業日にそろえる
+    day = next(SyntheticMarket(symbols=symbols, seed=seed, minutes=minutes).sessions(d, days=1))
+    o, h, l, c, v = (a.tolist() for a in (day.o, day.h, day.l, day.c, day.v))
+    return [{"S": s, "t": int(t), "o": o[i][j], "h": h[i][j], "l": l[i][j], "c": c[i][j], "v": v[i][j]}
+            for j, t in enumerate(day.t_ns) for i, s in enumerate(day.symbols)]
+
+def _iso(t_ns: int) -> str:
+    # 何をする関数？：ns エポックを Alpaca と同じ RFC3339（…Z）文字列にする。
+    return datetime.fromtimestamp(t_ns // 1_000_000_000, tz=timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+class ReplayServer:
+    """
+    何をするクラス？：
+      - Alpaca の WS プロトコル（connected → auth → subscribe → bars）を話すローカルサーバです。
+      - 購読された銘柄のバーを、同じ時刻のものは1フレーム（配列）にまとめて、speed 倍速で送ります（speed<=0 は待ち無し）。
+      - バー dict に "T": "u" を入れておくと、その1本は updatedBars（訂正）として送ります（訂正・再送の試験用）。
+      - 送った各バーの送信時刻を sent[(S, t秒)] に記録するので、受け手側の記録と突き合わせて遅れ・取りこぼしを出せます。
+      - リプレイ中に届いた subscribe / unsubscribe も反映し（bars は次のフレームから）、受けた順に control に残します。
+    使い方：
+      srv = await ReplayServer(load_ndjson_bars(p), speed=10, port=0).start()
+      ...  # ALPACA_WS_URL=srv.url で接続し、srv.done を待つ
+      await srv.stop()
+    """
+
+    def __init__(self, bars: list[dict], speed: float = 1.0, host: str = "127.0.0.1", port: int = 8765,
+                 key: str | None = None, secret: str | None = None, linger_s: float = 1.0):
+        self.bars = bars
+        self.speed = float(speed)
+        self.host, self.port = host, int(port)
+        self.key, self.secret = key, secret
+        self.linger_s = float(linger_s)
+        self.sent: dict[tuple[str, int], int] = {}
+        self.subs: dict[str, set[str]] = {}
+        self.control: list[dict] = []
+        self.frames = 0
+        self.done = asyncio.Event()
+        self._server = None
+
+    @property
+    def url(self) -> str:
+        return f"ws://{self.host}:{self.port}"
+
+    async def _recv_json(self, ws) -> list[dict]:
+        # 何をする関数？：1フレーム受け取り、dict の配列にそろえる（単発/配列どちらでも）。
+        raw = await ws.recv()
+        try:
+            pl = json.loads(raw)
+        except Exception:
+            return []
+        return pl if isinstance(pl, list) else [pl]
+
+    async def _handler(self, ws, *_):
+        # 何をする関数？：1接続ぶんの会話（connected → auth → subscribe → リプレイ → 切断）。
+        await ws.send(json.dumps([{"T": "success", "msg": "connected"}]))
+        for m in await self._recv_json(ws):
+            if m.get("action") != "auth":
+                continue
+            if self.key is not None and (m.get("key") != self.key or m.get("secret") != self.secret):
+                await ws.send(json.dumps([{"T": "error", "code": 402, "msg": "auth failed"}]))
+                return
+        await ws.send(json.dumps([{"T": "success", "msg": "authenticated"}]))
+
+        self.subs = {}
+        for m in await self._recv_json(ws):
+            self._apply_control(m)
+        await ws.send(json.dumps([self._subscription()]))
+        logger.info("replay: subscribed {} symbols; replaying {} bars at speed={}",
+                    len(self.subs.get("bars", ())), len(self.bars), self.speed)
+
+        ctl = asyncio.create_task(self._control_loop(ws))
+        try:
+            await self._replay(ws, self.bars)
+            await asyncio.sleep(self.linger_s)  # 何をする行？：最後のフレームを受け手が書き終えるまで少し待ってから切る
+        finally:
+            ctl.cancel()
+        self.done.set()
+        await ws.close()
+
+    def _apply_control(self, m: dict) -> None:
+        # 何をする関数？：subscribe / unsubscribe の1メッセージを、チャンネルごとの購読集合に反映する。
+        act = m.get("action")
+        if act not in ("subscribe", "unsubscribe"):
+            return
+        self.control.append(m)
+        for ch, syms in m.items():
+            if ch == "action" or not isinstance(syms, list):
+                continue
+            cur = self.subs.setdefault(ch, set())
+            names = {str(s).upper() for s in syms}
+            if act == "subscribe":
+                cur |= names
+            else:
+                cur -= names
+
+    def _subscription(self) -> dict:
+        # 何をする関数？：いまの購読状態の返事（Alpaca の "subscription" メッセージと同じ形）。
+        return {"T": "subscription", "trades": [], "quotes": [],
+                **{ch: sorted(v) for ch, v in self.subs.items()}}
+
+    async def _control_loop(self, ws) -> None:
+        # 何をする関数？：リプレイ中に届く購読の変更を受けて反映し、そのつど subscription を返す。
+        try:
+            while True:
+                for m in await self._recv_json(ws):
+                    self._apply_control(m)
+                    await ws.send(json.dumps([self._subscription()]))
+        except (asyncio.CancelledError, websockets.ConnectionClosed):
+            pass
+
+    async def _replay(self, ws, bars: list[dict]) -> None:
+        # 何をする関数？：同じ t のバーを1フレームにまとめ、t の差 / speed だけ待ちながら送る。
+        if not bars:
+            return
+        t_first = bars[0]["t"]
+        wall0 = time.perf_counter_ns()
+        i = 0
+        while i < len(bars):
+            t = bars[i]["t"]
+            j = i
+            while j < len(bars) and bars[j]["t"] == t:
+                j += 1
+            if self.speed > 0:
+                due = wall0 + int((t - t_first) / self.speed)
+                wait = (due - time.perf_counter_ns()) / 1e9
+                if wait > 0:
+                    await asyncio.sleep(wait)
+            subs = self.subs.get("bars", set())
+            sel = bars[i:j] if "*" in subs else [b for b in bars[i:j] if b["S"] in subs]
+            if not sel:
+                i = j
+                continue
+            iso = _iso(t)
+            frame = [{"T": b.get("T", "b"), "S": b["S"], "t": iso, "o": b["o"], "h": b["h"], "l": b["l"], "c": b["c"], "v": b["v"]}
+                     for b in sel]
+            payload = json.dumps(frame)
+            now = time.perf_counter_ns()
+            for b in sel:
+                self.sent[(b["S"], t // 1_000_000_000)] = now
+            await ws.send(payload)
+            self.frames += 1
+            if self.speed <= 0 and self.frames % 64 == 0:
+                await asyncio.sleep(0)  # 最大速度でも受け手側のタスクに順番を回す
+            i = j
+
+    async def start(self) -> "ReplayServer":
+        """何をする関数？：サーバを起動します（port=0 なら空きポートを自動で取り、self.port に反映）。"""
+        self._server = await websockets.serve(self._handler, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self) -> None:
+        """何をする関数？：サーバを止めます。"""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
@@ -0,0 +1,158 @@
+# Polygon REST の 1分足（/v2/aggs/ticker/{銘柄}/range/1/minute/{from}/{to}）を“ローカルで真似る”代役サーバです。
+# 目的：本番キーや通信なしで scripts/backfill_bars.py を実際の HTTP（ページ送り・429 の再試行を含む）で動かして確かめる。
+#  - record_dir に保存した応答（polygon_rest.fetch_aggs_1m(record_dir=...) が record_name の名前で書いたもの）があればそれを返し、
+#  - 無ければ synthetic=True のとき合成マーケット（providers.synthetic）で作った1分足を、本物と同じ形（results / next_url）で返します。
+# 使い方：POLYGON_BASE_URL=http://127.0.0.1:8766 を設定すると、プロバイダの接続先がこのサーバに向きます。
+
+from __future__ import annotations
+from pathlib import Path            # 記録済み応答の置き場
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+import re                           # パスの解釈・記録名の安全化
+import threading                    # サーバを裏で動かす
+import zlib                         # 銘柄ごとの乱数シード（実行ごとに変わらない）
+import orjson
+from loguru import logger
+
+_AGGS_1M = re.compile(r"^/v2/aggs/ticker/([^/]+)/range/1/minute/([^/]+)/([^/]+)$")
+
+def record_name(url: str, params: dict | None = None) -> str:
+    """
+    何をする関数？：
+      - 応答1ページを保存・検索するときのファイル名を、URL のパスと cursor（続きのページの目印）から作ります。
+      - 例：/v2/aggs/ticker/AAPL/range/1/minute/2024-01-02/2024-01-31 → v2_aggs_ticker_AAPL_range_1_minute_2024-01-02_2024-01-31.json
+    """
+    parts = urlsplit(url)
+    q = {k: v[0] for k, v in parse_qs(parts.query).items()}
+    q.update({k: str(v) for k, v in (params or {}).items()})
+    name = parts.path.strip("/").replace("/", "_")
+    if q.get("cursor"):
+        name += "__" + q["cursor"]
+    return re.sub(r"[^A-Za-z0-9._-]", "-", name) + ".json"
+
+def _synthetic_results(symbol: str, start: str, end: str) -> list[dict]:
+    # 何をする関数？：start〜end の営業日ぶんの合成1分足を、Polygon aggs の results（t=ms, o,h,l,c,v,vw,n）の形で作る。
+    from rh_pdc_daytrade.providers.synthetic import SyntheticMarket  # この関数内だけで使うためここでインポート
+    from rh_pdc_daytrade.utils.market_calendar import get_calendar   # 同上
+    days = get_calendar().sessions_in_range(date.fromisoformat(start), date.fromisoformat(end))
+    if not days:
+        return []
+    mk = SyntheticMarket(symbols=[symbol], seed=zlib.crc32(symbol.encode()))
+    out: list[dict] = []
+    for day in mk.sessions(days[0], days=len(days)):
+        for j, t in enumerate(day.t_ns.tolist()):
+            v = int(day.v[0, j])
+            out.append({"t": t // 1_000_000, "o": float(day.o[0, j]), "h": float(day.h[0, j]),
+                        "l": float(day.l[0, j]), "c": float(day.c[0, j]), "v": v,
+                        "vw": float(day.c[0, j]), "n": max(1, v // 100)})
+    return out
+
+class PolygonStandIn:
+    """
+    何をするクラス？：
+      - 1分足の aggs エンドポイントだけを持つ HTTP サーバを裏のスレッドで動かします。
+      - page_limit 本ごとに next_url（cursor=位置）で区切り、fail_every 回に1回 429 を返せます（再試行の確認用）。
+    使い方：
+      with PolygonStandIn(record_dir="data/polygon_rec", synthetic=True) as srv:
+          os.environ["POLYGON_BASE_URL"] = srv.url
+          ...
+    """
+
+    def __init__(self, record_dir: str | Path | None = None, synthetic: bool = True, host: str = "127.0.0.1",
+                 port: int = 0, page_limit: int = 50_000, fail_every: int = 0):
+        self.record_dir = Path(record_dir) if record_dir else None
+        self.synthetic = bool(synthetic)
+        self.page_limit = max(1, int(page_limit))
+        self.fail_every = max(0, int(fail_every))
+        self.requests = self.throttled = self.not_found = 0
+        self._lock = threading.Lock()
+        self._cache: dict[tuple[str, str, str], list[dict]] = {}
+        self._httpd = ThreadingHTTPServer((host, int(port)), self._handler_class())
+        self._thread: threading.Thread | None = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _handler_class(self):
+        srv = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            # 何をする行？：メソッド名は http.server の決まった名前（do_GET）
+            def do_GET(self):  # noqa: N802
+                code, body = srv._respond(self.path)
+                data = orjson.dumps(body)
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *_):  # 何をする行？：1リクエストごとの標準エラー出力を止める
+                pass
+
+        return _Handler
+
+    def _respond(self, raw_path: str) -> tuple[int, dict]:
+        # 何をする関数？：1リクエストぶんの (HTTP ステータス, JSON) を作る。
+        with self._lock:
+            self.requests += 1
+            n = self.requests
+        if self.fail_every and n % self.fail_every == 0:
+            with self._lock:
+                self.throttled += 1
+            return 429, {"status": "ERROR", "error": "too many requests (stand-in)"}
+        parts = urlsplit(raw_path)
+        q = {k: v[0] for k, v in parse_qs(parts.query).items()}
+        if self.record_dir is not None:
+            p = self.record_dir / record_name(raw_path)
+            if p.exists():
+                js = orjson.loads(p.read_bytes())
+                if js.get("next_url"):  # 何をする行？：続きのページも自分に取りに来させる
+                    nu = urlsplit(js["next_url"])
+                    js["next_url"] = f"{self.url}{nu.path}" + (f"?{nu.query}" if nu.query else "")
+                return 200, js
+        m = _AGGS_1M.match(parts.path)
+        if m is None or not self.synthetic:
+            with self._lock:
+                self.not_found += 1
+            return 404, {"status": "NOT_FOUND", "request_id": str(n)}
+        key = (m.group(1).upper(), m.group(2), m.group(3))
+        with self._lock:
+            rows = self._cache.get(key)
+        if rows is None:
+            rows = _synthetic_results(*key)
+            with self._lock:
+                self._cache[key] = rows
+        off = int(q.get("cursor") or 0)
+        limit = min(self.page_limit, int(q.get("limit") or self.page_limit))
+        page = rows[off:off + limit]
+        body = {"ticker": key[0], "status": "OK", "adjusted": True, "queryCount": len(page),
+                "resultsCount": len(page), "request_id": str(n), "results": page}
+        if off + limit < len(rows):
+            body["next_url"] = f"{self.url}{parts.path}?cursor={off + limit}&limit={limit}"
+        return 200, body
+
+    def start(self) -> "PolygonStandIn":
+        """何をする関数？：サーバを裏のスレッドで起動します。"""
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="polygon-standin", daemon=True)
+        self._thread.start()
+        logger.info("polygon stand-in: listening on {} (record_dir={}, synthetic={})", self.url, self.record_dir, self.synthetic)
+        return self
+
+    def stop(self) -> None:
+        """何をする関数？：サーバを止めます。"""
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        logger.info("polygon stand-in: stopped (requests={} throttled={} not_found={})",
+                    self.requests, self.throttled, self.not_found)
+
+    def __enter__(self) -> "PolygonStandIn":
+        return self.start()
+
+    def __exit__(self, *_exc) -> None:
+        self.stop()
@@ -4,8 +4,10 @@
 # 根拠：Runbookの providers/polygon_rest.py という責務分担と、スクリーナPDFの“基本8割”指標。  
 
 from __future__ import annotations
-from datetime import date, timedelta
+from pathlib import Path  # 応答の記録先
 from typing import Iterable, Dict, Any
+import os  # 接続先の上書き（POLYGON_BASE_URL）
+import orjson  # 応答の記録
 import requests  # REST呼び出し
 import pandas as pd  # 日足の集計・指標計算
 import numpy as np   # 数値計算（ATRなど）
@@ -14,11 +16,15 @@ from tenacity import retry, wait_exponential, stop_after_attempt  # 一時的な
 
 # ---- 内部ヘルパ：HTTP -------------------------------------------------------------------------
 
-def _daterange_for(days: int = 400) -> tuple[str, str]:
-    # 何をする関数？：過去N日ぶんの日付レンジ（ISO文字列）を作ります（営業日じゃない日も含め広めに）。
-    start = (date.today() - timedelta(days=days)).isoformat()
-    end = date.today().isoformat()
-    return start, end
+def _daterange_for(days: int = 260) -> tuple[str, str]:
+    # 何をする関数？：直近N営業日ぶんを覆う日付レンジ（ISO文字列）を作ります（取引カレンダーで祝日・週末を除いて数える）。
+    #               260営業日＝52週高（252本）＋α。ETのきょうが営業日なら、きょうも範囲に入れます（引け後の夜間実行用）。
+    from rh_pdc_daytrade.utils.market_calendar import get_calendar  # 関数内だけで使うためここでインポート
+    return get_calendar().daterange_last_n(int(days))
+
+def _base_url() -> str:
+    # 何をする関数？：REST の接続先を返します（POLYGON_BASE_URL があればそちら。ローカルの代役サーバ providers.polygon_replay 用）。
+    return (os.environ.get("POLYGON_BASE_URL") or "https://api.polygon.io").strip().rstrip("/")
 
 def _session(api_key: str) -> requests.Session:
     # 何をする関数？：Polygon用の共通セッション（ヘッダ付き）を作ります。
@@ -33,10 +39,10 @@ def _get_json(s: requests.Session, url: str, params: Dict[str, Any]) -> Dict[str
     r.raise_for_status()
     return r.json()
 
-def _fetch_aggs_1d(s: requests.Session, symbol: str, days: int = 400) -> pd.DataFrame:
-    # 何をする関数？：1日足（1/day）をまとめて取得し、DataFrame化します。
+def _fetch_aggs_1d(s: requests.Session, symbol: str, days: int = 260) -> pd.DataFrame:
+    # 何をする関数？：1日足（1/day）を直近 days 営業日ぶんまとめて取得し、DataFrame化します。
     start, end = _daterange_for(days)
-    url = f"https://api.polygon.io/v2/aggs/ticker/{symbol}/range/1/day/{start}/{end}"
+    url = f"{_base_url()}/v2/aggs/ticker/{symbol}/range/1/day/{start}/{end}"
     js = _get_json(s, url, {"adjusted": "true", "sort": "asc", "limit": 500})
     results = js.get("results") or []
     if not results:
@@ -49,6 +55,34 @@ def _fetch_aggs_1d(s: requests.Session, symbol: str, days: int = 400) -> pd.Data
     df = df.dropna()
     return df
 
+def fetch_aggs_1m(s: requests.Session, symbol: str, start: str, end: str,
+                  record_dir: str | Path | None = None) -> pd.DataFrame:
+    """
+    何をする関数？：
+      - 1分足（1/minute, 時間外を含む）を start〜end（YYYY-MM-DD, 両端含む）で取得し、symbol, t(ms), o,h,l,c,v の DataFrame にします。
+      - 1回の応答は最大 50,000 本なので、next_url が返る限り続きのページを取りに行きます。
+      - record_dir を渡すと、各ページの応答をそのまま保存します（providers.polygon_replay が同じ名前で返せるように）。
+    """
+    url = f"{_base_url()}/v2/aggs/ticker/{symbol}/range/1/minute/{start}/{end}"
+    params: Dict[str, Any] = {"adjusted": "true", "sort": "asc", "limit": 50000}
+    frames = []
+    while url:
+        js = _get_json(s, url, params)
+        if record_dir is not None:
+            from rh_pdc_daytrade.providers.polygon_replay import record_name  # 関数内だけで使うためここでインポート
+            rd = Path(record_dir)
+            rd.mkdir(parents=True, exist_ok=True)
+            (rd / record_name(url, params)).write_bytes(orjson.dumps(js))
+        results = js.get("results") or []
+        if results:
+            frames.append(pd.DataFrame(results))
+        url, params = js.get("next_url"), {}  # 何をする行？：next_url には続きの条件（cursor 等）が全部入っている
+    if not frames:
+        return pd.DataFrame(columns=["symbol", "t", "o", "h", "l", "c", "v"])
+    df = pd.concat(frames, ignore_index=True)[["t", "o", "h", "l", "c", "v"]].dropna()
+    df.insert(0, "symbol", symbol)
+    return df
+
 # ---- 指標計算（“基本8割”に必要な列） ------------------------------------------------------------
 
 def _features_from_aggs(symbol: str, daily: pd.DataFrame) -> Dict[str, Any]:
@@ -128,7 +162,7 @@ def _features_from_aggs(symbol: str, daily: pd.DataFrame) -> Dict[str, Any]:
         "float": est_float,
     }
 
-def fetch_eod_dataset(symbols: Iterable[str], api_key: str, days: int = 400) -> pd.DataFrame:
+def fetch_eod_dataset(symbols: Iterable[str], api_key: str, days: int = 260) -> pd.DataFrame:
     """
     何をする関数？：
       - 複数銘柄の1日足をPolygonから取得し、“基本8割”用の特徴量を計算して DataFrame で返します。
@@ -136,18 +170,25 @@ def fetch_eod_dataset(symbols: Iterable[str], api_key: str, days: int = 400) ->
     使い方：
       df = fetch_eod_dataset(["AAPL","TSLA"], api_key)
     """
+    from rh_pdc_daytrade.utils.metrics import timer, incr  # 関数内だけで使うためここでインポート
+    from rh_pdc_daytrade.utils.logutil import log_first_n  # 関数内だけで使うためここでインポート
     sess = _session(api_key)
     rows = []
     for sym in symbols:
         try:
-            daily = _fetch_aggs_1d(sess, sym, days=days)
-            feat = _features_from_aggs(sym, daily)
+            with timer("eod_fetch_seconds", step="fetch"):
+                daily = _fetch_aggs_1d(sess, sym, days=days)
+            with timer("eod_fetch_seconds", step="features"):
+                feat = _features_from_aggs(sym, daily)
             if feat:
                 rows.append(feat)
+                incr("eod_symbols", 1, result="ok")
             else:
-                logger.warning("polygon: insufficient data for {}", sym)
+                log_first_n("polygon.insufficient", 20, "WARNING", "polygon: insufficient data for {}", sym)  # 件数は eod_symbols{result=insufficient}
+                incr("eod_symbols", 1, result="insufficient")
         except Exception as e:
             logger.error("polygon: failed {} ({})", sym, e)
+            incr("eod_symbols", 1, result="error")
     if not rows:
         return pd.DataFrame()
     return pd.DataFrame(rows)
@@ -0,0 +1,258 @@
+# ベンチマーク・負荷試験用の“それっぽい”合成マーケットデータを、数千銘柄×多日数でも配列演算だけで作るモジュールです。
+# ねらい：
+#  - make_stub_bars.py の直線バーでは、指標・シグナル・スクリーナの“実際の負荷と分岐”を再現できない。
+#  - ここでは GBM＋ジャンプの価格、U字型の場中出来高、寄りのギャップ、ORBブレイクと AVWAP押し目の“仕込み”を、
+#    発生率を指定して注入します。出力は NDJSON / 固定長バイナリ / 日付パーティションの Parquet と、
+#    EODスクリーナ用の日足（Polygon の aggs と同じ列）です。
+#  - 乱数は seed で固定できるので、どのベンチでも同じデータセットを再現できます。
+
+from __future__ import annotations
+from dataclasses import dataclass, field
+from datetime import date, datetime, time as _dtime
+from pathlib import Path
+from typing import Iterator
+import numpy as np
+import pandas as pd
+
+from rh_pdc_daytrade.utils.timeutil import get_et_tz  # 寄り時刻（ET）→ ns エポック
+from rh_pdc_daytrade.utils.market_calendar import get_calendar  # 営業日の列（祝日を除く）
+
+_NS_PER_MIN = 60_000_000_000
+
+@dataclass
+class DaySession:
+    """
+    何を表す入れ物？：
+      - 1営業日ぶんの場中1分バー（[銘柄, 分] の配列）と、注入したイベントの位置です。
+      - orb_minute / avwap_minute は“仕込んだ分”（無い銘柄は -1）、gap は寄りの対数ギャップです。
+    """
+    session_date: date
+    symbols: list[str]
+    t_ns: np.ndarray                       # shape=(分,)
+    o: np.ndarray                          # shape=(銘柄, 分)
+    h: np.ndarray
+    l: np.ndarray
+    c: np.ndarray
+    v: np.ndarray                          # int64
+    events: dict[str, np.ndarray] = field(default_factory=dict)
+
+    def to_frame(self) -> pd.DataFrame:
+        """何をする関数？：compute_indicators と同じ縦長（symbol, et, o,h,l,c,v）のコンパクト列型 DataFrame に直します。"""
+        from rh_pdc_daytrade.utils.io import compact_frame  # 関数内だけで使うためここでインポート
+        n, m = self.c.shape
+        et = pd.to_datetime(np.tile(self.t_ns, n), unit="ns", utc=True).tz_convert(get_et_tz())
+        df = pd.DataFrame({
+            "symbol": pd.Categorical.from_codes(np.repeat(np.arange(n, dtype=np.int32), m), categories=self.symbols),
+            "et": et,
+            "o": self.o.ravel(), "h": self.h.ravel(), "l": self.l.ravel(), "c": self.c.ravel(), "v": self.v.ravel(),
+        })
+        return compact_frame(df)
+
+    def daily(self) -> pd.DataFrame:
+        """何をする関数？：この日の日足（symbol, t[ms], o,h,l,c,v）を返します（Polygon aggs と同じ列名）。"""
+        return pd.DataFrame({
+            "symbol": self.symbols,
+            "t": _day_ms(self.session_date),
+            "o": self.o[:, 0], "h": self.h.max(axis=1), "l": self.l.min(axis=1),
+            "c": self.c[:, -1], "v": self.v.sum(axis=1).astype(np.float64),
+        })
+
+def _day_ms(d: date) -> int:
+    # 何をする関数？：日足の t（Polygon と同じく、その日の 00:00 ET を ms エポックで）を作る。
+    return int(datetime.combine(d, _dtime(0, 0), tzinfo=get_et_tz()).timestamp()) * 1000
+
+def trading_days(start: date, days: int) -> list[date]:
+    """何をする関数？：start 以降（start を含む）の営業日を days 日ぶん返します（取引カレンダーで祝日も除く）。"""
+    return get_calendar().sessions_from(start, int(days))
+
+def _trading_days_before(end: date, days: int) -> list[date]:
+    # 何をする関数？：end より前の営業日を days 日ぶん、古い順に返す。
+    return get_calendar().last_n_sessions(int(days), end)
+
+class SyntheticMarket:
+    """
+    何をするクラス？：
+      - 銘柄ごとの価格水準・ボラティリティ・平均出来高を決め、日足の履歴と場中セッションを順に生成します。
+      - 前日終値などの状態を持ち回るので、history → sessions の順に呼ぶと日足と場中がつながります。
+    使い方：
+      mk = SyntheticMarket(n_symbols=3000, seed=7)
+      hist = mk.history(60, end=date(2025, 9, 8))          # スクリーナ用の過去日足
+      for day in mk.sessions(date(2025, 9, 9), days=5):    # 場中1分バー
+          ...
+      daily = mk.daily_frame()                             # 履歴＋場中から集計した日足
+    """
+
+    def __init__(self, n_symbols: int = 500, seed: int = 7, minutes: int = 390,
+                 symbols: list[str] | None = None,
+                 jump_rate: float = 0.02, gap_rate: float = 0.05,
+                 orb_rate: float = 0.10, avwap_rate: float = 0.10):
+        self.symbols = list(symbols) if symbols else [f"S{i:04d}" for i in range(int(n_symbols))]
+        self.minutes = int(minutes)
+        self.jump_rate, self.gap_rate = float(jump_rate), float(gap_rate)
+        self.orb_rate, self.avwap_rate = float(orb_rate), float(avwap_rate)
+        self.rng = np.random.default_rng(seed)
+        n = len(self.symbols)
+        # 価格 $2–$60（対数一様）、日次ボラ 2–7%、平均出来高 30万–800万株（対数一様）
+        self.last_close = np.exp(self.rng.uniform(np.log(2.0), np.log(60.0), n))
+        self.sigma_d = self.rng.uniform(0.02, 0.07, n)
+        self.drift_d = self.rng.normal(0.0005, 0.002, n)
+        self.adv = np.exp(self.rng.uniform(np.log(3e5), np.log(8e6), n))
+        x = np.linspace(-1.0, 1.0, self.minutes)
+        prof = 1.0 + 2.5 * x * x                  # U字（寄りと引けに厚く、昼に薄い）
+        self.volume_profile = prof / prof.sum()
+        self._daily: list[pd.DataFrame] = []
+
+    # ---- 日足の履歴 --------------------------------------------------------------------------------
+
+    def history(self, days: int, end: date) -> pd.DataFrame:
+        """
+        何をする関数？：
+          - end より前の days 営業日ぶんの日足を GBM で作ります（EMA50/ATR14/52週高の材料）。
+        戻り値：symbol, t[ms], o,h,l,c,v の縦長 DataFrame（daily_frame にも積まれます）
+        """
+        n = len(self.symbols)
+        ds = _trading_days_before(end, int(days))
+        rets = self.drift_d[:, None] + self.sigma_d[:, None] * self.rng.standard_normal((n, len(ds)))
+        # 最後の日の終値が現在の last_close になるよう、後ろから積み上げる
+        logc = np.log(self.last_close)[:, None] - (np.cumsum(rets[:, ::-1], axis=1)[:, ::-1] - rets)
+        c = np.exp(logc)
+        o = np.concatenate([c[:, :1] * np.exp(-rets[:, :1]), c[:, :-1]], axis=1) * np.exp(
+            self.rng.normal(0, 0.005, c.shape))
+        spread = np.abs(self.rng.normal(0, 0.5, c.shape)) * self.sigma_d[:, None]
+        h = np.maximum(o, c) * (1 + spread)
+        l = np.minimum(o, c) * (1 - np.abs(self.rng.normal(0, 0.5, c.shape)) * self.sigma_d[:, None])
+        v = self.adv[:, None] * np.exp(self.rng.normal(0, 0.4, c.shape))
+        df = pd.DataFrame({
+            "symbol": np.repeat(self.symbols, len(ds)),
+            "t": np.tile([_day_ms(d) for d in ds], n),
+            "o": o.ravel(), "h": h.ravel(), "l": l.ravel(), "c": c.ravel(), "v": np.round(v).ravel(),
+        })
+        self._daily.append(df)
+        return df
+
+    # ---- 場中セッション ----------------------------------------------------------------------------
+
+    def sessions(self, start: date, days: int = 1) -> Iterator[DaySession]:
+        """何をする関数？：start 以降の days 営業日ぶんの DaySession を順に作って返します（1日ずつ、メモリは1日分）。"""
+        for d in trading_days(start, int(days)):
+            day = self._session(d)
+            self._daily.append(day.daily())
+            yield day
+
+    def _session(self, d: date) -> DaySession:
+        # 何をする関数？：1日ぶんの [銘柄, 分] 配列を作り、ギャップ/ジャンプ/ORB/AVWAP押し目を注入する。
+        rng, n, m = self.rng, len(self.symbols), self.minutes
+        cols = np.arange(m)
+
+        # 寄りのギャップ（大半は小さく、gap_rate の確率で ±3–15%）
+        gap = rng.normal(0, 0.005, n)
+        big = rng.random(n) < self.gap_rate
+        gap[big] = rng.choice([-1.0, 1.0], big.sum()) * rng.uniform(0.03, 0.15, big.sum())
+        open0 = self.last_close * np.exp(gap)
+
+        # 分足の対数リターン（GBM）＋ジャンプ
+        sig_m = self.sigma_d / np.sqrt(m)
+        r = (self.drift_d / m)[:, None] + sig_m[:, None] * rng.standard_normal((n, m))
+        jumps = rng.random((n, m)) < (self.jump_rate / m)
+        r[jumps] += rng.normal(0, 0.03, jumps.sum())
+        r[:, 0] = 0.0                                           # 最初の足の終値＝寄り値から
+        c = open0[:, None] * np.exp(np.cumsum(r, axis=1))
+        hn = np.abs(rng.normal(0, 0.4, (n, m))) * sig_m[:, None]
+        ln = np.abs(rng.normal(0, 0.4, (n, m))) * sig_m[:, None]
+
+        # U字の出来高
+        v = (self.adv[:, None] * self.volume_profile[None, :]) * np.exp(rng.normal(0, 0.5, (n, m)))
+
+        # ORB ブレイクの注入：5本目以降は ORB 高値の下に抑え、k 本目で上抜けさせる
+        o_tmp = np.concatenate([open0[:, None], c[:, :-1]], axis=1)
+        orb_hi = (np.maximum(o_tmp, c) * (1 + hn))[:, :5].max(axis=1)
+        sel_orb = (rng.random(n) < self.orb_rate) & (m > 6)     # 短いセッション（6本以下）では仕込まない
+        k_orb = np.where(sel_orb, rng.integers(6, max(7, min(61, m)), n), -1)
+        if sel_orb.any():
+            before = sel_orb[:, None] & (cols >= 5) & (cols < k_orb[:, None])
+            c = np.where(before, np.minimum(c, (orb_hi * 0.998)[:, None]), c)
+            rows = np.nonzero(sel_orb)[0]
+            factor = np.ones(n)
+            factor[rows] = orb_hi[rows] * 1.004 / c[rows, k_orb[rows]]
+            after = sel_orb[:, None] & (cols >= k_orb[:, None])
+            c = np.where(after, c * factor[:, None], c)
+            v[rows, k_orb[rows]] *= 4.0
+
+        # AVWAP 押し目の注入（ORB と重ならない銘柄）：k−1 本目で AVWAP の少し下、k 本目で少し上に戻す
+        sel_av = (~sel_orb) & (rng.random(n) < self.avwap_rate) & (m > 15)
+        k_av = np.where(sel_av, rng.integers(15, max(16, min(91, m)), n), -1)
+        if sel_av.any():
+            rows = np.nonzero(sel_av)[0]
+            vw = np.cumsum(c * v, axis=1) / np.cumsum(v, axis=1)
+            ref = vw[rows, k_av[rows] - 1]
+            c[rows, k_av[rows] - 1] = ref * 0.997
+            factor = np.ones(n)
+            factor[rows] = ref * 1.001 / c[rows, k_av[rows]]
+            after = sel_av[:, None] & (cols >= k_av[:, None])
+            c = np.where(after, c * factor[:, None], c)
+
+        o = np.concatenate([open0[:, None], c[:, :-1]], axis=1)
+        h = np.maximum(o, c) * (1 + hn)
+        l = np.minimum(o, c) * (1 - ln)
+        self.last_close = c[:, -1].copy()
+
+        t0 = int(datetime.combine(d, _dtime(9, 30), tzinfo=get_et_tz()).timestamp()) * 1_000_000_000
+        return DaySession(
+            session_date=d, symbols=self.symbols,
+            t_ns=t0 + cols.astype(np.int64) * _NS_PER_MIN,
+            o=np.round(o, 4), h=np.round(h, 4), l=np.round(l, 4), c=np.round(c, 4),
+            v=np.maximum(np.round(v), 1).astype(np.int64),
+            events={"gap": gap, "orb_minute": k_orb, "avwap_minute": k_av},
+        )
+
+    def daily_frame(self) -> pd.DataFrame:
+        """何をする関数？：これまでに作った日足（履歴＋場中の集計）を symbol, t の順に並べて返します。"""
+        if not self._daily:
+            return pd.DataFrame(columns=["symbol", "t", "o", "h", "l", "c", "v"])
+        return pd.concat(self._daily, ignore_index=True).sort_values(["symbol", "t"], kind="mergesort").reset_index(drop=True)
+
+# ---- 書き出し ------------------------------------------------------------------------------------
+
+def write_ndjson(day: DaySession, path: str | Path) -> Path:
+    """
+    何をする関数？：
+      - 1日ぶんを bars_YYYYMMDD.ndjson と同じ形（standardize_bar の出力、t の昇順）で書き出します。
+    """
+    import orjson  # この関数内だけで使うためここでインポート
+    p = Path(path)
+    p.parent.mkdir(parents=True, exist_ok=True)
+    n, m = day.c.shape
+    o, h, l, c, v = (a.tolist() for a in (day.o, day.h, day.l, day.c, day.v))
+    with open(p, "wb") as f:
+        for j in range(m):
+            t = int(day.t_ns[j])
+            f.write(b"".join(
+                orjson.dumps({"type": "bar", "S": day.symbols[i], "t": t,
+                              "o": o[i][j], "h": h[i][j], "l": l[i][j], "c": c[i][j], "v": v[i][j]}) + b"\n"
+                for i in range(n)))
+    return p
+
+def write_binary(day: DaySession, path: str | Path) -> Path:
+    """何をする関数？：1日ぶんを固定長バイナリ（store.barstream の形式、t の昇順）で書き出します。"""
+    from rh_pdc_daytrade.store.barstream import write_bars  # 関数内だけで使うためここでインポート
+    n, m = day.c.shape
+    order = lambda a: a.T.ravel()  # 分ごとに全銘柄を並べる（ストリームと同じ順）
+    return write_bars(path, day.symbols, np.tile(np.arange(n), m), np.repeat(day.t_ns, n),
+                      order(day.o), order(day.h), order(day.l), order(day.c), order(day.v))
+
+def write_parquet_partition(day: DaySession, root: str | Path) -> Path:
+    """何をする関数？：1日ぶんを root/date=YYYY-MM-DD/bars.parquet にコンパクト列型で書き出します（日付パーティション）。"""
+    from rh_pdc_daytrade.utils.io import write_parquet  # 関数内だけで使うためここでインポート
+    p = Path(root) / f"date={day.session_date.isoformat()}" / "bars.parquet"
+    return write_parquet(day.to_frame(), p, compact=True)
+
+def eod_features(daily: pd.DataFrame) -> pd.DataFrame:
+    """
+    何をする関数？：
+      - 合成日足から、nightly_screen と同じ EOD 特徴量（polygon_rest._features_from_aggs）を銘柄ごとに作ります。
+      - そのまま apply_hard_filters → compute_scores_basic に渡せます。
+    """
+    from rh_pdc_daytrade.providers.polygon_rest import _features_from_aggs  # 本番と同じ計算を使う
+    rows = [_features_from_aggs(sym, g[["o", "h", "l", "c", "v", "t"]].reset_index(drop=True))
+            for sym, g in daily.groupby("symbol", sort=False)]
+    return pd.DataFrame([r for r in rows if r])
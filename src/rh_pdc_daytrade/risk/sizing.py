@@ -33,3 +33,105 @@ def calc_qty_from_risk(entry_price: float,
     if max_qty is not None:
         q = min(q, int(max_qty))
     return max(int(q), 0)
+
+# ---- バッチ版（寄り付きに数百銘柄のシグナルが出ても1回の配列演算で数量を決める） ----------------------------
+
+def calc_qty_batch(entry_prices,
+                   stop_loss_prices,
+                   account_size: float,
+                   risk_pct: float,
+                   round_lot: int = 1,
+                   max_qty: int | None = None):
+    """
+    何をする関数？：
+      - calc_qty_from_risk の配列版です。entry/SL の NumPy 配列から、各シグナルの株数（int64配列）をまとめて返します。
+      - 1株あたりリスク（entry−SL）が 0 以下・NaN の要素は 0 株にします（スカラー版と同じ安全側）。
+    使い方：
+      q = calc_qty_batch(np.array([10.15, 5.2]), np.array([9.90, 5.0]), 10000.0, 0.005)
+    """
+    import numpy as np  # 関数内だけで使うのでここでインポート
+    e = np.asarray(entry_prices, dtype=np.float64)
+    s = np.asarray(stop_loss_prices, dtype=np.float64)
+    risk_amt = max(float(account_size), 0.0) * max(float(risk_pct), 0.0)
+    per_share = e - s
+    ok = np.isfinite(per_share) & (per_share > 0) & (risk_amt > 0)
+    q = np.zeros(e.shape, dtype=np.int64)
+    q[ok] = np.floor(risk_amt / per_share[ok]).astype(np.int64)
+    return _cap_qty(q, round_lot, max_qty)
+
+def _cap_qty(q, round_lot: int = 1, max_qty: int | None = None):
+    # 何をする関数？：round_lot 単位への切り下げと max_qty 上限をまとめてかけます（負は0）。
+    import numpy as np
+    q = np.maximum(np.asarray(q, dtype=np.int64), 0)
+    if round_lot > 1:
+        q = (q // round_lot) * round_lot
+    if max_qty is not None:
+        q = np.minimum(q, int(max_qty))
+    return q
+
+def _trim_to_budget(q, unit_cost, budget: float, groups=None):
+    """
+    何をする関数？：
+      - 配列の並び順を優先度とみなし、累積コスト（q×unit_cost）が budget を超えないように先頭から詰めます。
+      - はみ出した最初の要素は入るだけの株数に減らし、それ以降は 0 にします（cumsum 1回で判定）。
+      - groups を渡すと、同じグループ（例：銘柄）ごとに別々の budget として詰めます。
+    """
+    import numpy as np
+    q = np.asarray(q, dtype=np.int64)
+    c = np.asarray(unit_cost, dtype=np.float64)
+    cost = np.where(q > 0, q * c, 0.0)
+    if groups is None:
+        cum = np.cumsum(cost)
+    else:
+        _, inv = np.unique(np.asarray(groups), return_inverse=True)
+        order = np.argsort(inv, kind="stable")
+        cs = np.cumsum(cost[order])
+        starts = np.r_[0, np.flatnonzero(np.diff(inv[order])) + 1]
+        base = np.repeat(np.r_[0.0, cs[starts[1:] - 1]], np.diff(np.r_[starts, len(order)]))
+        cum = np.empty_like(cs)
+        cum[order] = cs - base
+    before = cum - cost
+    room = np.maximum(float(budget) - before, 0.0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        fit = np.where(c > 0, np.floor(room / c), 0).astype(np.int64)
+    return np.where(cum <= budget, q, np.minimum(q, fit))
+
+def size_batch(entry_prices,
+               stop_loss_prices,
+               account_size: float,
+               risk_pct: float,
+               round_lot: int = 1,
+               max_qty: int | None = None,
+               symbols=None,
+               daily_stop_R: float | None = None,
+               open_risk_usd: float = 0.0,
+               max_notional_per_symbol: float | None = None,
+               buying_power: float | None = None):
+    """
+    何をする関数？：
+      - シグナルのバッチ（配列の並び＝優先順）に対して、1) リスク％からの株数、2) round_lot / max_qty、
+        3) ポートフォリオ制約（合計リスク ≦ daily_stop_R × 1R − 既存の open_risk_usd、銘柄ごとの想定元本上限、買付余力）
+        を一括でかけた株数（int64配列）を返します。
+      - 1R = account_size × risk_pct（config.risk の定義と同じ）。制約は None なら無効です。
+    使い方：
+      q = size_batch(entries, stops, 10000.0, 0.005, symbols=syms, daily_stop_R=3, buying_power=10000.0)
+    """
+    import numpy as np
+    e = np.asarray(entry_prices, dtype=np.float64)
+    s = np.asarray(stop_loss_prices, dtype=np.float64)
+    q = calc_qty_batch(e, s, account_size, risk_pct, round_lot, max_qty)
+    if q.size == 0:
+        return q
+
+    # 銘柄ごとの想定元本上限（同じ銘柄が複数あれば優先順に合算して詰める）
+    if max_notional_per_symbol is not None:
+        q = _trim_to_budget(q, e, float(max_notional_per_symbol), groups=symbols)
+    # 合計リスク上限（日次ストップ：daily_stop_R × 1R から既存のリスクを差し引いた残り）
+    if daily_stop_R is not None:
+        one_r = max(float(account_size), 0.0) * max(float(risk_pct), 0.0)
+        budget = max(float(daily_stop_R) * one_r - max(float(open_risk_usd), 0.0), 0.0)
+        q = _trim_to_budget(q, np.clip(e - s, 0.0, None), budget)
+    # 買付余力（合計の想定元本）
+    if buying_power is not None:
+        q = _trim_to_budget(q, e, max(float(buying_power), 0.0))
+    return _cap_qty(q, round_lot, max_qty)
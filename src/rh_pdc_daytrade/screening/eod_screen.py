@@ -67,7 +67,8 @@ def compute_scores_basic(df: pd.DataFrame, cfg: dict) -> pd.DataFrame:
     使い方：
       df = compute_scores_basic(df, cfg); df.nlargest(20, "score_A")
     期待する列（無い場合は NaN 補完）：
-      close, pdh, is_inside_day, is_nr7, avg_dollar_vol20, atr14, ema20, ema50, float, high_52w, pivot_p
+      close, pdh, is_inside_day, is_nr7, avg_dollar_vol20, atr14, ema20, ema50, float, high_52w, pivot_p,
+      rvol_prev（indicators.volprofile.profile_features：直近の日の出来高 ÷ ふだんの1日。重み scoring.weights.rvol、既定 0）
     """
     w = (cfg.get("scoring", {}) or {}).get("weights", {}) or {}
     w_pdh = float(w.get("pdh", 0.30))
@@ -76,10 +77,11 @@ def compute_scores_basic(df: pd.DataFrame, cfg: dict) -> pd.DataFrame:
     w_trd = float(w.get("trend", 0.15))
     w_cmp = float(w.get("compression", 0.10))
     w_flt = float(w.get("float", 0.10))
+    w_rvl = float(w.get("rvol", 0.0))
 
     df = _ensure_columns(df, [
         "close", "pdh", "is_inside_day", "is_nr7", "avg_dollar_vol20",
-        "atr14", "ema20", "ema50", "float", "high_52w", "pivot_p"
+        "atr14", "ema20", "ema50", "float", "high_52w", "pivot_p", "rvol_prev"
     ])
 
     # ---- 個別スコアの定義（PDFに準拠） ---------------------------------------------------------  :contentReference[oaicite:8]{index=8}
@@ -114,6 +116,9 @@ def compute_scores_basic(df: pd.DataFrame, cfg: dict) -> pd.DataFrame:
     df.loc[(fl >= 10_000_000) & (fl <= 60_000_000), "float_score"] = 1.0
     df.loc[(fl > 60_000_000) & (fl <= 120_000_000), "float_score"] = 0.6
 
+    # 前日の相対出来高：ふだん並み(1.0)=0.5、2倍以上=1.0（プロファイルに無い銘柄は ふだん並み と同じ 0.5）
+    df["rvol_score"] = np.clip(df["rvol_prev"].astype("float64") / 2.0, 0.0, 1.0).fillna(0.5)
+
     # ---- 基本スコア（A用） ----------------------------------------------------------------------
     df["score"] = (
         w_pdh * df["pdh_score"] +
@@ -121,7 +126,8 @@ def compute_scores_basic(df: pd.DataFrame, cfg: dict) -> pd.DataFrame:
         w_dol * df["dollar_vol_score"] +
         w_trd * df["trend_score"] +
         w_cmp * df["compression_score"] +
-        w_flt * df["float_score"]
+        w_flt * df["float_score"] +
+        w_rvl * df["rvol_score"]
     )
     df["score_A"] = df["score"]  # A=基本
 
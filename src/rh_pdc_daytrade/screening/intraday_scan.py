@@ -0,0 +1,344 @@
+# 場中（寄り前を含む）の広いユニバースを、1本のバーごとに採点して上位 K 銘柄を保つスキャナです。
+# ねらい：
+#  - ウォッチリストは前夜の nightly_screen で固定され、WS は 30 銘柄までなので、寄り前に出てきたギャッパーを取り逃がす。
+#  - ここでは銘柄ごとに ギャップ%（前日終値比）・相対出来高（RVOL）・PDH/ORB 高値までの距離 をその場で更新し、
+#    上位 K の“添字付き最小ヒープ”（TopK）に入れ直します。1本あたりの順位付けは O(log K)（全銘柄の並べ替えはしない）。
+#  - FocusSet は「固定のウォッチリスト＋上位 K」を購読の上限（IEX は 30）に収め、前回との差分（足す/外す）だけを返します。
+#    alpaca_iex_ws はこの差分で subscribe / unsubscribe を送り、接続し直しません。
+# 近似：K の中の銘柄の点が下がっても、外の銘柄が次にバーを受けて上回るまでは K に残ります（毎分バーが来るので1分以内に入れ替わる）。
+
+from __future__ import annotations
+from datetime import datetime, time as _dtime, timedelta
+from typing import Callable, Iterable
+import math
+
+from rh_pdc_daytrade.utils.timeutil import get_et_tz  # ET の寄り時刻（夏時間の切替日でも壁時計どおり）
+
+_NS_PER_MIN = 60_000_000_000
+SESSION_MINUTES = 390
+
+# ---- 上位 K（添字付き最小ヒープ） ---------------------------------------------------------------------
+
+class TopK:
+    """
+    何をするクラス？：
+      - (銘柄 → 点数) の上位 K を最小ヒープで持ちます。根が K 位（いちばん低い点）。
+      - 銘柄の位置を辞書で覚えているので、K の中の銘柄の点の更新・取り除きも O(log K) です。
+    使い方：
+      top = TopK(10)
+      top.offer("AAPL", 3.2)     # 入った/入れ替わったら True
+      top.ranked()               # [(銘柄, 点数), ...] 点数の高い順
+    """
+
+    __slots__ = ("k", "_heap", "_pos", "evicted")
+
+    def __init__(self, k: int):
+        self.k = max(1, int(k))
+        self._heap: list[list] = []         # [点数, 銘柄]
+        self._pos: dict[str, int] = {}      # 銘柄 → ヒープ上の位置
+        self.evicted: str | None = None     # 直前の offer で押し出された銘柄（無ければ None）
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._pos
+
+    @property
+    def min_score(self) -> float:
+        """何をする関数？：K 位の点数（まだ K 件に満たなければ -inf）。"""
+        return self._heap[0][0] if len(self._heap) >= self.k else -math.inf
+
+    def _swap(self, i: int, j: int) -> None:
+        h = self._heap
+        h[i], h[j] = h[j], h[i]
+        self._pos[h[i][1]] = i
+        self._pos[h[j][1]] = j
+
+    def _up(self, i: int) -> None:
+        h = self._heap
+        while i > 0:
+            p = (i - 1) >> 1
+            if h[i][0] >= h[p][0]:
+                break
+            self._swap(i, p)
+            i = p
+
+    def _down(self, i: int) -> None:
+        h, n = self._heap, len(self._heap)
+        while True:
+            l = 2 * i + 1
+            if l >= n:
+                break
+            c = l + 1 if l + 1 < n and h[l + 1][0] < h[l][0] else l
+            if h[c][0] >= h[i][0]:
+                break
+            self._swap(i, c)
+            i = c
+
+    def offer(self, key: str, score: float) -> bool:
+        """
+        何をする関数？：
+          - key の点数を score にします。K の中なら位置を直し、外なら K 位より高いときだけ K 位と入れ替えます。
+          - 顔ぶれが変わったら True（押し出された銘柄は self.evicted）。
+        """
+        self.evicted = None
+        i = self._pos.get(key)
+        if i is not None:
+            old = self._heap[i][0]
+            self._heap[i][0] = score
+            self._up(i) if score < old else self._down(i)
+            return False
+        if len(self._heap) < self.k:
+            self._heap.append([score, key])
+            self._pos[key] = len(self._heap) - 1
+            self._up(len(self._heap) - 1)
+            return True
+        if score <= self._heap[0][0]:
+            return False
+        self.evicted = self._heap[0][1]
+        del self._pos[self.evicted]
+        self._heap[0] = [score, key]
+        self._pos[key] = 0
+        self._down(0)
+        return True
+
+    def discard(self, key: str) -> bool:
+        """何をする関数？：key を K から外します（条件を外れた銘柄用。居なければ False）。"""
+        i = self._pos.pop(key, None)
+        if i is None:
+            return False
+        last = self._heap.pop()
+        if i < len(self._heap):
+            old = self._heap[i][0]
+            self._heap[i] = last
+            self._pos[last[1]] = i
+            self._up(i) if last[0] < old else self._down(i)
+        return True
+
+    def ranked(self) -> list[tuple[str, float]]:
+        """何をする関数？：K の中身を点数の高い順に返します（K log K。表示・購読の見直しのときだけ呼ぶ）。"""
+        return [(k, s) for s, k in sorted(self._heap, key=lambda x: (-x[0], x[1]))]
+
+# ---- 銘柄ごとの場中の状態 --------------------------------------------------------------------------------
+
+class _SymState:
+    # 何をするクラス？：1銘柄・1セッション分の最新値と累積（当日出来高・ORB 高値/安値）。
+    __slots__ = ("day", "c", "cum_v", "last_t", "last_v", "orb_h", "orb_l", "minute")
+
+    def __init__(self, day: int):
+        self.day = day
+        self.c = math.nan
+        self.cum_v = 0.0
+        self.last_t = -1
+        self.last_v = 0.0
+        self.orb_h = -math.inf
+        self.orb_l = math.inf
+        self.minute = -1
+
+class IntradayScanner:
+    """
+    何をするクラス？：
+      - update_bar(バー) のたびに、その銘柄の ギャップ%・RVOL・PDH/ORB までの距離 と点数を計算し、TopK に入れ直します。
+      - 参照値（pdc, pdh, avg_volume20）は前夜の EOD 特徴量から渡します。参照値の無い銘柄は採点しません。
+      - 点数 = w_gap×|ギャップ%| + w_rvol×min(RVOL, rvol_cap) − w_pdh×min(|PDH までの距離%|, 10)
+        （ORB が確定した後は ORB 高値の上なら w_orb を足す）。min_price 未満・min_rvol 未満は K から外します。
+      - RVOL の分母は avg_volume20 × expected_frac(銘柄, 寄りからの分)。既定は場中の経過割合（寄り前は1分ぶん）です。
+    使い方：
+      sc = IntradayScanner(eod_df, top_k=20, orb_minutes=5)
+      sc.update_bar(standardize_bar(msg))
+      sc.top()        # [{"symbol", "score", "gap_pct", "rvol", "dist_pdh_pct", "dist_orb_pct", "c"}, ...]
+    """
+
+    def __init__(self, ref: Iterable[dict] | None = None, top_k: int = 20, orb_minutes: int = 5,
+                 weights: dict | None = None, min_price: float = 1.0, min_rvol: float = 0.0, rvol_cap: float = 20.0,
+                 open_time: str | _dtime = "09:30", expected_frac: Callable[[str, int], float] | None = None):
+        self.ranking = TopK(top_k)
+        self.orb_minutes = int(orb_minutes)
+        w = weights or {}
+        self.w_gap = float(w.get("gap", 1.0))
+        self.w_rvol = float(w.get("rvol", 1.0))
+        self.w_pdh = float(w.get("pdh", 0.25))
+        self.w_orb = float(w.get("orb", 1.0))
+        self.min_price, self.min_rvol, self.rvol_cap = float(min_price), float(min_rvol), float(rvol_cap)
+        self.open_time = open_time if isinstance(open_time, _dtime) else _dtime.fromisoformat(str(open_time))
+        self.expected_frac = expected_frac or _linear_frac
+        self._ref: dict[str, tuple[float, float, float]] = {}
+        self._st: dict[str, _SymState] = {}
+        self._bounds = (0, -1, 0, 0)   # いま見ている ET 日付の (開始ns, 終了ns, 日番号, 寄りns)
+        self.updates = 0
+        self.changes = 0
+        if ref is not None:
+            self.set_reference(ref)
+
+    @classmethod
+    def from_config(cls, cfg: dict, ref: Iterable[dict] | None = None, **kw) -> "IntradayScanner":
+        """何をする関数？：config.yaml の scanner / strategy 節から作ります（無い値は既定）。"""
+        sc = cfg.get("scanner") or {}
+        st = cfg.get("strategy") or {}
+        return cls(ref, top_k=int(sc.get("top_k", 20)), orb_minutes=int(st.get("orb_minutes", 5)),
+                   weights=dict(sc.get("weights") or {}), min_price=float(sc.get("min_price", 1.0)),
+                   min_rvol=float(sc.get("min_rvol", 0.0)), rvol_cap=float(sc.get("rvol_cap", 20.0)), **kw)
+
+    def set_reference(self, ref: Iterable[dict]) -> int:
+        """
+        何をする関数？：前夜の参照値（symbol, pdc, pdh, avg_volume20 を持つ dict の並び or DataFrame）を入れ替えます。
+        戻り値：採点できる銘柄数
+        """
+        if hasattr(ref, "to_dict"):
+            ref = ref.to_dict("records")
+        out = {}
+        for r in ref:
+            s = str(r.get("symbol") or "").upper()
+            pdc, pdh, adv = (_num(r.get(k)) for k in ("pdc", "pdh", "avg_volume20"))
+            if s and pdc > 0:
+                out[s] = (pdc, pdh if pdh > 0 else math.nan, adv if adv > 0 else math.nan)
+        self._ref = out
+        return len(out)
+
+    @property
+    def universe(self) -> list[str]:
+        """何をする関数？：参照値のある（採点できる）銘柄。"""
+        return list(self._ref)
+
+    def _clock(self, t_ns: int) -> tuple[int, int]:
+        # 何をする関数？：t_ns の ET 日番号と寄りからの分（寄り前は負）。同じ日のうちは整数計算だけで返す。
+        lo, hi, day, open_ns = self._bounds
+        if not (lo <= t_ns < hi):
+            tz = get_et_tz()
+            d = datetime.fromtimestamp(t_ns // 1_000_000_000, tz=tz).date()
+            lo = int(datetime.combine(d, _dtime(0, 0), tzinfo=tz).timestamp()) * 1_000_000_000
+            hi = int(datetime.combine(d + timedelta(days=1), _dtime(0, 0), tzinfo=tz).timestamp()) * 1_000_000_000
+            op = datetime.combine(d, self.open_time, tzinfo=tz)
+            open_ns = int(op.timestamp()) * 1_000_000_000
+            day = d.toordinal()
+            self._bounds = (lo, hi, day, open_ns)
+        return day, (t_ns - open_ns) // _NS_PER_MIN
+
+    def update(self, symbol: str, t_ns: int, h: float, l: float, c: float, v: float) -> float | None:
+        """
+        何をする関数？：
+          - 1本を反映して、その銘柄の点数を返します（参照値が無い・条件外なら None で、K からも外します）。
+          - 同じ t がもう一度来たら（updatedBars の訂正）、その分の出来高を差し替えます。それより古い分の訂正は順位には使いません。
+        """
+        ref = self._ref.get(symbol)
+        if ref is None:
+            return None
+        t_ns = int(t_ns)
+        day, minute = self._clock(t_ns)
+        st = self._st.get(symbol)
+        if st is None or st.day != day:
+            st = self._st[symbol] = _SymState(day)
+        v = _num(v)
+        if t_ns == st.last_t:
+            st.cum_v += v - st.last_v
+        elif t_ns > st.last_t:
+            st.cum_v += v
+            st.c = _num(c)
+            st.minute = minute
+        else:
+            return self._score(symbol, st, ref)  # 何をする行？：古い分の訂正は点数を変えない
+        st.last_t, st.last_v = t_ns, v
+        if 0 <= minute < self.orb_minutes:
+            st.orb_h = max(st.orb_h, _num(h))
+            st.orb_l = min(st.orb_l, _num(l))
+        self.updates += 1
+        return self._score(symbol, st, ref)
+
+    def update_bar(self, bar: dict) -> float | None:
+        """何をする関数？：standardize_bar の dict（S/t/h/l/c/v）で update します。"""
+        return self.update(str(bar.get("S") or "").upper(), int(bar.get("t") or 0),
+                           bar.get("h"), bar.get("l"), bar.get("c"), bar.get("v"))
+
+    def _metrics(self, symbol: str, st: _SymState, ref: tuple[float, float, float]) -> dict:
+        # 何をする関数？：ギャップ%・RVOL・PDH/ORB までの距離% を計算する（点数と表示で共通）。
+        pdc, pdh, adv = ref
+        c = st.c
+        frac = self.expected_frac(symbol, st.minute)
+        rvol = st.cum_v / (adv * frac) if adv > 0 and frac > 0 else math.nan
+        orb_ready = st.minute >= self.orb_minutes and st.orb_h > -math.inf
+        return {"symbol": symbol, "c": c, "gap_pct": (c - pdc) / pdc * 100.0, "rvol": rvol,
+                "dist_pdh_pct": (c - pdh) / pdh * 100.0 if pdh > 0 else math.nan,
+                "dist_orb_pct": (c - st.orb_h) / st.orb_h * 100.0 if orb_ready and st.orb_h > 0 else math.nan,
+                "minute": st.minute}
+
+    def _score(self, symbol: str, st: _SymState, ref: tuple[float, float, float]) -> float | None:
+        m = self._metrics(symbol, st, ref)
+        c, rvol = m["c"], m["rvol"]
+        ok_rvol = rvol >= self.min_rvol if not math.isnan(rvol) else self.min_rvol <= 0
+        if not (c >= self.min_price) or not ok_rvol:
+            if self.ranking.discard(symbol):
+                self.changes += 1
+            return None
+        score = self.w_gap * abs(m["gap_pct"])
+        if not math.isnan(rvol):
+            score += self.w_rvol * min(rvol, self.rvol_cap)
+        if not math.isnan(m["dist_pdh_pct"]):
+            score -= self.w_pdh * min(abs(m["dist_pdh_pct"]), 10.0)
+        if not math.isnan(m["dist_orb_pct"]) and m["dist_orb_pct"] >= 0:
+            score += self.w_orb
+        if self.ranking.offer(symbol, score):
+            self.changes += 1
+        return score
+
+    def top_symbols(self) -> list[str]:
+        """何をする関数？：上位 K の銘柄（点数の高い順）。"""
+        return [k for k, _ in self.ranking.ranked()]
+
+    def top(self) -> list[dict]:
+        """何をする関数？：上位 K の銘柄の点数と内訳（ギャップ%・RVOL・PDH/ORB までの距離%・最新値）を高い順に返します。"""
+        out = []
+        for s, score in self.ranking.ranked():
+            m = self._metrics(s, self._st[s], self._ref[s])
+            m["score"] = score
+            out.append(m)
+        return out
+
+def _num(x) -> float:
+    # 何をする関数？：None・文字列・NaN を含む値を float にする（読めなければ NaN）。
+    try:
+        return float(x)
+    except (TypeError, ValueError):
+        return math.nan
+
+def _linear_frac(_symbol: str, minute: int) -> float:
+    # 何をする関数？：寄りからの経過割合（寄り前は1分ぶん、引け後は1）。時刻別の出来高プロファイルが無いときの既定。
+    return min(max(minute + 1, 1), SESSION_MINUTES) / SESSION_MINUTES
+
+# ---- 購読の差分 ----------------------------------------------------------------------------------------
+
+class FocusSet:
+    """
+    何をするクラス？：
+      - 固定の銘柄（前夜のウォッチリスト）＋スキャナの上位を、購読の上限 limit に収めた“注目銘柄”として持ち、
+        新しい順位を渡されるたびに 足す銘柄 / 外す銘柄 の差分だけを返します（固定の銘柄は外しません）。
+    使い方：
+      fs = FocusSet(watchlist, limit=30)
+      add, remove = fs.update(scanner.top_symbols())
+    """
+
+    def __init__(self, fixed: Iterable[str], limit: int = 30):
+        self.fixed = list(dict.fromkeys(str(s).upper() for s in fixed))[: max(1, int(limit))]
+        self.limit = max(len(self.fixed), int(limit))
+        self.current: list[str] = list(self.fixed)
+        self._set = set(self.current)
+
+    def __contains__(self, symbol: str) -> bool:
+        return symbol in self._set
+
+    @property
+    def dynamic(self) -> list[str]:
+        """何をする関数？：固定以外の（スキャナが足した）銘柄。"""
+        return self.current[len(self.fixed):]
+
+    def update(self, ranked: Iterable[str]) -> tuple[list[str], list[str]]:
+        """何をする関数？：順位（高い順）から新しい注目銘柄を決め、(足す, 外す) を返します（どちらも空なら変化なし）。"""
+        room = self.limit - len(self.fixed)
+        fixed = set(self.fixed)
+        picks = [s for s in ranked if s not in fixed][:room]
+        target = self.fixed + picks
+        tset = set(target)
+        add = [s for s in target if s not in self._set]
+        remove = [s for s in self.current if s not in tset]
+        self.current, self._set = target, tset
+        return add, remove
@@ -0,0 +1,3 @@
+# 運用ログ（約定・明細・KPI・バーのバイナリストリーム など）を“追記だけで”保存する永続化レイヤの名前空間です。
+# ここでは import を行わず、各モジュール（executions など）を直接読み込む前提にします。
+__all__ = []  # 公開対象は各サブモジュール側で宣言します
@@ -0,0 +1,100 @@
+# 1分バーの (銘柄, t) 索引です。再接続で同じバーがもう一度届いても捨て、訂正（Alpaca の updatedBars "u"）は
+# 同じマスを上書きするために使います。
+# ねらい：
+#  - 受信側（alpaca_iex_ws の受信ループ）と読み手（compute_indicators の _read_bars_ndjson / リプレイ）で
+#    “同じ判定”を使い、保存後に1日分を並べ替えて重複除去し直す処理を要らなくする。
+#  - 判定は3通り：NEW（初見）/ DUP（同じ値の再送 → 捨てる）/ UPDATE（値が違う → 後勝ちで上書き）。
+#    値が違えば T="b" の再送でも UPDATE 扱いにします（Alpaca は後から来た方が正）。
+# 保存形式：NDJSON には訂正も追記します（"u": 1 の印付き）。追記だけの形は変えず、読み手が後勝ちで畳みます。
+
+from __future__ import annotations
+from pathlib import Path
+import orjson
+
+NEW, DUP, UPDATE = "new", "dup", "update"
+
+_Key = tuple[str, int]
+_Vals = tuple
+
+def _vals(bar: dict) -> _Vals:
+    # 何をする関数？：同一判定に使う値（o/h/l/c/v）。数値の型違い（1 と 1.0）は同じ値として扱う。
+    return tuple(float(bar.get(k) or 0.0) for k in ("o", "h", "l", "c", "v"))
+
+class BarIndex:
+    """
+    何をするクラス？：
+      - (銘柄, t[ns]) ごとに最後に採用したバーの値を覚え、届いたバーが NEW / DUP / UPDATE のどれかを返します。
+      - 1セッション分を持つ前提です（日付が変わったら clear() するか作り直してください）。
+    使い方：
+      idx = BarIndex()
+      kind, prev = idx.offer_bar(standardize_bar(msg))
+      if kind == DUP: continue          # 再送は保存しない
+      if kind == UPDATE: ...            # prev（訂正前の値 o,h,l,c,v）を使って指標の寄与を差し替える
+    """
+
+    __slots__ = ("_seen", "dups", "updates")
+
+    def __init__(self):
+        self._seen: dict[_Key, _Vals] = {}
+        self.dups = 0
+        self.updates = 0
+
+    def __len__(self) -> int:
+        return len(self._seen)
+
+    def __contains__(self, key: _Key) -> bool:
+        return key in self._seen
+
+    def get(self, symbol: str, t_ns: int) -> _Vals | None:
+        """何をする関数？：採用済みの値 (o, h, l, c, v) を返します（未見なら None）。"""
+        return self._seen.get((symbol, int(t_ns)))
+
+    def offer(self, symbol: str, t_ns: int, vals: _Vals) -> tuple[str, _Vals | None]:
+        """
+        何をする関数？：
+          - (symbol, t_ns) に vals（o, h, l, c, v）を出し、判定と“それまで採用していた値”を返します。
+          - DUP のときは何も変えません。NEW/UPDATE のときは vals を採用します。
+        """
+        key = (symbol, int(t_ns))
+        prev = self._seen.get(key)
+        if prev is None:
+            self._seen[key] = vals
+            return NEW, None
+        if prev == vals:
+            self.dups += 1
+            return DUP, prev
+        self._seen[key] = vals
+        self.updates += 1
+        return UPDATE, prev
+
+    def offer_bar(self, bar: dict) -> tuple[str, _Vals | None]:
+        """何をする関数？：standardize_bar の dict（S/t/o/h/l/c/v）で offer します。"""
+        return self.offer(str(bar.get("S") or "").upper(), int(bar.get("t") or 0), _vals(bar))
+
+    def clear(self) -> None:
+        """何をする関数？：索引と件数を空にします（セッションが変わったとき）。"""
+        self._seen.clear()
+        self.dups = 0
+        self.updates = 0
+
+    @classmethod
+    def from_ndjson(cls, path: str | Path) -> "BarIndex":
+        """
+        何をする関数？：
+          - 保存済みの bars_YYYYMMDD.ndjson から索引を作り直します（同じ日に WS を再起動したとき、
+            既に保存したバーの再送を捨てられるように）。t は ns 整数（standardize_bar の出力）を前提にします。
+        """
+        idx = cls()
+        p = Path(path)
+        if not p.exists():
+            return idx
+        with open(p, "rb") as f:
+            for line in f:
+                try:
+                    m = orjson.loads(line)
+                except Exception:
+                    continue
+                if isinstance(m, dict) and (m.get("T") or m.get("type")) in ("b", "bar") and isinstance(m.get("t"), int):
+                    idx.offer_bar(m)
+        idx.dups = idx.updates = 0  # 読み直しで数えた分は“今回の受信”の件数に混ぜない
+        return idx
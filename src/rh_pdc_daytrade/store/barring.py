@@ -0,0 +1,266 @@
+# WSプロセスが受信したバーを、共有メモリ上のリングバッファで他プロセスへ“そのまま”渡すための仕組みです。
+# ねらい：
+#  - いまは bars が NDJSON に書かれてから後段（指標・シグナル・監視）が読むので、ディスク往復と再パースが入る。
+#  - ここでは multiprocessing.shared_memory 上に固定長レコードの輪っかを置き、WS側（書き手1つ）が publish、
+#    後段（読み手は何プロセスでも）が poll するだけにします。シリアライズもファイルも介しません。
+#  - レコードごとに通し番号（seq）を持たせ、読み手は「どこまで読んだか」を自分で覚えます。
+#    追い越された（遅すぎた）読み手は、取りこぼした件数を数えたうえで最新側に追いつきます。
+#  - 書き手の“世代”（起動ごとに変わる epoch）をヘッダに持たせ、読み手は世代が変わったら名前で接続し直します
+#    （書き手が落ちて別の共有メモリとして作り直されても、古い領域を見続けて黙って止まらない）。
+# 形：先頭に u8×4 のヘッダ（MAGIC, 容量, 書き込み済みseq, 世代）、その後ろに RING_DTYPE × 容量。
+
+from __future__ import annotations
+import os                       # 共有メモリ名（BARS_SHM_NAME）の参照
+import time                     # 世代（epoch）の採番・再接続確認の間隔
+import numpy as np              # 共有メモリ上のレコード配列
+from multiprocessing import shared_memory
+
+MAGIC = 0x5248_4252_494E_4731   # "RHBRING1"
+DEFAULT_NAME = "rh_pdc_bars"
+DEFAULT_CAPACITY = 65_536       # 30銘柄×390分を余裕で1日分保持できる本数
+
+_OWNED: set[str] = set()       # このプロセスの書き手が作った共有メモリ名（同一プロセスの読み手は追跡解除しない）
+
+_HDR_WORDS = 4
+_HDR_SIZE = _HDR_WORDS * 8
+_H_MAGIC, _H_CAP, _H_SEQ, _H_EPOCH = 0, 1, 2, 3
+
+# 1レコード=64バイト。seq は 1 始まり（0 は“まだ書かれていない/書き込み中”）。
+RING_DTYPE = np.dtype([
+    ("seq", "<u8"),
+    ("S", "S8"),                                    # シンボル（ASCII、8文字まで）
+    ("t", "<i8"),                                   # UTCのnsエポック（standardize_bar と同じ）
+    ("o", "<f8"), ("h", "<f8"), ("l", "<f8"), ("c", "<f8"),
+    ("v", "<i8"),
+])
+
+def shm_name() -> str:
+    """何をする関数？：共有メモリ名を返します（環境変数 BARS_SHM_NAME で変更可、既定 rh_pdc_bars）。"""
+    return os.environ.get("BARS_SHM_NAME", DEFAULT_NAME).strip() or DEFAULT_NAME
+
+def _views(buf, capacity: int) -> tuple[np.ndarray, np.ndarray]:
+    # 何をする関数？：共有メモリのバッファ上に、ヘッダ配列とレコード配列の“ビュー”を作る（コピーしない）。
+    hdr = np.ndarray((_HDR_WORDS,), dtype="<u8", buffer=buf, offset=0)
+    ring = np.ndarray((capacity,), dtype=RING_DTYPE, buffer=buf, offset=_HDR_SIZE)
+    return hdr, ring
+
+def _open_ring(name: str) -> tuple[shared_memory.SharedMemory, int, int] | None:
+    # 何をする関数？：名前で既存の共有メモリに接続し、初期化済みのリングなら (shm, 容量, 世代) を返す
+    #                （初期化中/別物なら None、名前が無ければ FileNotFoundError）。
+    shm = shared_memory.SharedMemory(name=name)
+    _untrack(shm)
+    hdr = np.ndarray((_HDR_WORDS,), dtype="<u8", buffer=shm.buf, offset=0)
+    magic, cap, epoch = int(hdr[_H_MAGIC]), int(hdr[_H_CAP]), int(hdr[_H_EPOCH])
+    del hdr
+    if magic != MAGIC or shm.size < _HDR_SIZE + cap * RING_DTYPE.itemsize:
+        shm.close()
+        return None
+    return shm, cap, epoch
+
+class BarRingWriter:
+    """
+    何をするクラス？：
+      - 共有メモリのリングを作り（同名の古いものが同じ容量なら消さずに使い回す）、standardize_bar の出力を publish します。
+      - 起動ごとに新しい世代（epoch）をヘッダに書くので、前の書き手に接続していた読み手は次の poll で作り直しに気づきます。
+      - 書き手は1プロセスだけの前提です（WSの受信ループ）。
+    使い方：
+      ring = BarRingWriter()
+      ring.publish(standardize_bar(msg))
+    """
+
+    def __init__(self, name: str | None = None, capacity: int = DEFAULT_CAPACITY):
+        self.name = name or shm_name()
+        size = _HDR_SIZE + int(capacity) * RING_DTYPE.itemsize
+        try:
+            self._shm = shared_memory.SharedMemory(name=self.name, create=True, size=size)
+        except FileExistsError:
+            # 前回の異常終了で残った領域：同じ容量ならそのまま使い回す（接続中の読み手は世代の変化で気づく）。
+            # 容量が違うときだけ、閉じた印（MAGIC=0）を付けてから消して作り直す（古い領域の読み手は名前で接続し直す）。
+            old = shared_memory.SharedMemory(name=self.name)
+            hdr = np.ndarray((_HDR_WORDS,), dtype="<u8", buffer=old.buf, offset=0)
+            if old.size >= size and int(hdr[_H_CAP]) == int(capacity):
+                del hdr
+                self._shm = old
+            else:
+                hdr[_H_MAGIC] = 0
+                del hdr
+                old.close()
+                old.unlink()
+                self._shm = shared_memory.SharedMemory(name=self.name, create=True, size=size)
+        _OWNED.add(self.name)
+        self.capacity = int(capacity)
+        self._hdr, self._ring = _views(self._shm.buf, self.capacity)
+        self._hdr[_H_MAGIC] = 0        # 何をする行？：初期化中は読み手に見せない（使い回しのときに古い中身を読ませない）
+        self._ring[:] = np.zeros(self.capacity, dtype=RING_DTYPE)
+        self._hdr[_H_CAP] = self.capacity
+        self._hdr[_H_SEQ] = 0
+        self.epoch = max(time.time_ns(), int(self._hdr[_H_EPOCH]) + 1)  # 何をする行？：起動ごとに必ず変わる世代番号
+        self._hdr[_H_EPOCH] = self.epoch
+        self._hdr[_H_MAGIC] = MAGIC    # 何をする行？：最後に MAGIC を立て、読み手には初期化済みの状態だけを見せる
+
+    @property
+    def seq(self) -> int:
+        """何をする関数？：これまでに publish した本数（最後のレコードの seq）を返します。"""
+        return int(self._hdr[_H_SEQ])
+
+    def publish(self, bar: dict) -> int:
+        """
+        何をする関数？：
+          - 1本を次のスロットに書き、ヘッダの seq を進めます。戻り値はそのレコードの seq。
+          - スロットの seq を 0 にしてから中身を書き、最後に seq を入れるので、読み手は書き途中を読み飛ばせます。
+        """
+        seq = int(self._hdr[_H_SEQ]) + 1
+        slot = self._ring[(seq - 1) % self.capacity]
+        slot["seq"] = 0
+        slot["S"] = str(bar.get("S") or "").upper().encode("ascii", "replace")[:8]
+        slot["t"] = int(bar.get("t") or 0)
+        slot["o"] = float(bar.get("o") or 0.0)
+        slot["h"] = float(bar.get("h") or 0.0)
+        slot["l"] = float(bar.get("l") or 0.0)
+        slot["c"] = float(bar.get("c") or 0.0)
+        slot["v"] = int(bar.get("v") or 0)
+        slot["seq"] = seq
+        self._hdr[_H_SEQ] = seq
+        return seq
+
+    def close(self, unlink: bool = True) -> None:
+        """
+        何をする関数？：共有メモリを閉じ、既定では名前も削除します（書き手の終了時）。
+          削除する前に MAGIC を消しておき、接続したままの読み手に“この領域はもう書かれない”ことを知らせます。
+        """
+        if unlink and self._hdr is not None:
+            self._hdr[_H_MAGIC] = 0
+        self._hdr = self._ring = None  # バッファを参照するビューを先に手放す（close の BufferError 回避）
+        self._shm.close()
+        _OWNED.discard(self.name)
+        if unlink:
+            try:
+                self._shm.unlink()
+            except FileNotFoundError:
+                pass
+
+class BarRingReader:
+    """
+    何をするクラス？：
+      - 既存のリングに接続し、前回以降に publish されたバーを poll() でまとめて受け取ります（読み手は何人でも可）。
+      - start="latest" なら接続時点より後の分だけ、"oldest" ならリングに残っている一番古い分から読みます。
+      - 追い越されて読めなかった本数は dropped に積算します。
+      - 書き手が作り直されたら（世代が変わった・閉じられた）名前で接続し直し、新しい世代を先頭から読みます（restarts に積算）。
+        書き手が居ない間は、recheck_s 秒ごとに接続し直しを試みながら空の配列を返します。
+    使い方：
+      rd = BarRingReader()
+      for rec in rd.poll():   # RING_DTYPE の構造化配列（コピー）
+          ...
+    """
+
+    def __init__(self, name: str | None = None, start: str = "latest", recheck_s: float = 1.0):
+        self.name = name or shm_name()
+        got = _open_ring(self.name)
+        if got is None:
+            raise ValueError(f"shared memory {self.name!r} is not a bar ring")
+        self._attach(*got)
+        head = int(self._hdr[_H_SEQ])
+        self.next_seq = head + 1 if start == "latest" else max(1, head - self.capacity + 1)
+        self.dropped = 0
+        self.restarts = 0
+        self.recheck_s = float(recheck_s)
+        self._next_check = time.monotonic() + self.recheck_s
+
+    def _attach(self, shm: shared_memory.SharedMemory, capacity: int, epoch: int) -> None:
+        # 何をする関数？：接続先（共有メモリ・容量・世代）を差し替えます。
+        self._shm, self.capacity, self.epoch = shm, capacity, epoch
+        self._hdr, self._ring = _views(self._shm.buf, self.capacity)
+
+    def _same_segment(self, shm: shared_memory.SharedMemory) -> bool:
+        # 何をする関数？：名前で開き直した領域が、いま読んでいる領域と同じ実体かを返します。
+        #                （POSIX は名前を消して作り直せるので inode で比べる。Windows は誰かが開いている間は作り直せない）
+        if os.name != "posix":
+            return True
+        try:
+            return os.fstat(shm._fd).st_ino == os.fstat(self._shm._fd).st_ino
+        except (AttributeError, OSError):
+            return True
+
+    def _reattach(self) -> bool:
+        # 何をする関数？：名前の指す共有メモリを開き直し、今と違う世代の書き手が居れば乗り換えて True を返します。
+        try:
+            got = _open_ring(self.name)
+        except FileNotFoundError:
+            return False
+        if got is None:
+            return False
+        shm, cap, epoch = got
+        if epoch == self.epoch and int(self._hdr[_H_MAGIC]) == MAGIC and self._same_segment(shm):
+            shm.close()
+            return False
+        self._hdr = self._ring = None
+        self._shm.close()
+        self._attach(shm, cap, epoch)
+        self.next_seq = 1
+        self.restarts += 1
+        return True
+
+    def _writer_changed(self) -> bool:
+        # 何をする関数？：書き手の作り直しに気づいたら接続し直して True。
+        #                同じ領域の使い回しは世代の比較だけで分かる。領域ごと作り直された場合は、
+        #                閉じた印（MAGIC=0）か、新着が無いときの recheck_s ごとの名前の引き直しで見つける。
+        if int(self._hdr[_H_MAGIC]) == MAGIC and int(self._hdr[_H_EPOCH]) == self.epoch:
+            if time.monotonic() < self._next_check:
+                return False
+            self._next_check = time.monotonic() + self.recheck_s
+        return self._reattach()
+
+    def poll(self, max_items: int | None = None) -> np.ndarray:
+        """
+        何をする関数？：
+          - 読んでいない分（next_seq..最新）を RING_DTYPE の配列で返し、next_seq を進めます。無ければ長さ0。
+          - 書き手に追い越された分は捨てて dropped に数え、書き込み中のスロットに当たったらそこで止めます（次回続きから）。
+        """
+        if int(self._hdr[_H_MAGIC]) != MAGIC or int(self._hdr[_H_EPOCH]) != self.epoch \
+                or int(self._hdr[_H_SEQ]) < self.next_seq:
+            # 書き手が作り直された/閉じた、または新着が無い → 必要なら接続し直して新しい世代を先頭から読む
+            if not self._writer_changed() and int(self._hdr[_H_MAGIC]) != MAGIC:
+                return np.zeros(0, dtype=RING_DTYPE)
+        head = int(self._hdr[_H_SEQ])
+        oldest = max(1, head - self.capacity + 1)
+        if self.next_seq < oldest:
+            self.dropped += oldest - self.next_seq
+            self.next_seq = oldest
+        last = head if max_items is None else min(head, self.next_seq + int(max_items) - 1)
+        if last < self.next_seq:
+            return np.zeros(0, dtype=RING_DTYPE)
+        idx = (np.arange(self.next_seq, last + 1, dtype=np.int64) - 1) % self.capacity
+        out = self._ring[idx].copy()
+        want = np.arange(self.next_seq, last + 1, dtype=np.uint64)
+        ok = out["seq"] == want
+        # コピー後にもう一度 seq を見て、コピー中に上書きされたスロットを除く
+        ok &= self._ring["seq"][idx] == want
+        if not ok.all():
+            bad = int(np.argmin(ok))
+            out = out[:bad]
+        self.next_seq += len(out)
+        return out
+
+    def close(self) -> None:
+        """何をする関数？：接続を閉じます（名前は書き手が消すので unlink しません）。"""
+        self._hdr = self._ring = None
+        self._shm.close()
+
+def _untrack(shm: shared_memory.SharedMemory) -> None:
+    # 何をする関数？：Python 3.12 以前の POSIX では、接続しただけの読み手の終了時にも共有メモリが unlink されるため、
+    #                読み手側は resource_tracker の管理から外す（後始末は書き手だけが行う）。
+    if os.name != "posix" or shm.name in _OWNED:
+        return
+    try:
+        from multiprocessing import resource_tracker  # 関数内だけで使うためここでインポート
+        resource_tracker.unregister(shm._name, "shared_memory")
+    except Exception:
+        pass
+
+def to_bar_dicts(recs: np.ndarray) -> list[dict]:
+    """何をする関数？：poll() の配列を standardize_bar と同じ形の dict リストに戻します（既存処理へ渡す用）。"""
+    return [
+        {"type": "bar", "S": r["S"].decode("ascii", "replace"), "t": int(r["t"]),
+         "o": float(r["o"]), "h": float(r["h"]), "l": float(r["l"]), "c": float(r["c"]), "v": int(r["v"])}
+        for r in recs
+    ]
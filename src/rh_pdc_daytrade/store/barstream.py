@@ -0,0 +1,184 @@
+# 1分バーを“固定長バイナリ”で追記保存し、np.memmap で構造化配列としてそのまま読むためのストアです。
+# ねらい：
+#  - NDJSON はテキストなので、compute_indicators が毎回1行ずつ JSON を解釈し直す必要がある（t は既に ns 整数なのに）。
+#  - ここでは 1レコード=固定バイト数（symbol_id, t[ns], o/h/l/c[float64], v[int64]）で追記し、
+#    読み手は mmap するだけ（パース無し）。1日分のロードがファイルサイズに依らずほぼ一定時間になります。
+#  - シンボル文字列は“辞書サイドカー”（1行=1銘柄、行番号=symbol_id）に分けて持ちます。
+# 置き場所：data/stream/bars_YYYYMMDD.bin ＋ bars_YYYYMMDD.symbols.txt（NDJSON と同じフォルダ・同じ日付）
+
+from __future__ import annotations
+from pathlib import Path        # 出力ファイルのパス操作
+import struct                   # ファイルヘッダの読み書き
+import numpy as np              # レコード型と memmap
+import pandas as pd             # DataFrame への変換（compute_indicators と同じ列形）
+
+MAGIC = b"RHBARS\x00\x00"       # ファイル先頭の識別子（8バイト）
+FORMAT_VERSION = 1
+# ヘッダ：MAGIC(8) + version(u4) + record_size(u4) = 16バイト。以後はレコードが隙間なく並ぶ。
+_HEADER = struct.Struct("<8sII")
+HEADER_SIZE = _HEADER.size
+
+# 1レコード=56バイト（8バイト境界にそろえるため symbol_id の後ろに4バイトの詰め物を入れる）
+BAR_DTYPE = np.dtype([
+    ("sym", "<u4"), ("_pad", "<u4"),
+    ("t", "<i8"),                                   # UTCのnsエポック（standardize_bar と同じ）
+    ("o", "<f8"), ("h", "<f8"), ("l", "<f8"), ("c", "<f8"),
+    ("v", "<i8"),
+])
+
+def symbols_path(bin_path: str | Path) -> Path:
+    """何をする関数？：bars_YYYYMMDD.bin に対応する辞書サイドカー（bars_YYYYMMDD.symbols.txt）のパスを返します。"""
+    p = Path(bin_path)
+    return p.with_name(p.stem + ".symbols.txt")
+
+def read_symbols(bin_path: str | Path) -> list[str]:
+    """何をする関数？：辞書サイドカーを読み、symbol_id 順の銘柄リストを返します（無ければ空）。"""
+    sp = symbols_path(bin_path)
+    if not sp.exists():
+        return []
+    return [s for s in sp.read_text(encoding="utf-8").splitlines() if s]
+
+def _check_header(raw: bytes, p: Path) -> None:
+    # 何をする関数？：先頭16バイトを検査し、別形式・別版数のファイルを誤って読まないようにする。
+    magic, ver, rec = _HEADER.unpack(raw)
+    if magic != MAGIC:
+        raise ValueError(f"not a bar stream file: {p}")
+    if ver != FORMAT_VERSION or rec != BAR_DTYPE.itemsize:
+        raise ValueError(f"unsupported bar stream format v{ver} (record={rec}B): {p}")
+
+class BarStreamWriter:
+    """
+    何をするクラス？：
+      - 固定長バーを1件ずつ追記します（WS受信ループから呼ぶ想定。ファイルは開きっぱなしで、1件ごとに flush）。
+      - 初めて見た銘柄は、レコードより先に辞書サイドカーへ追記するので、読み手が未知の id を見ることはありません。
+      - 再起動時は既存の辞書を読み直して id を引き継ぎます（同じ日付のファイルへ追記を続けられる）。
+    使い方：
+      w = BarStreamWriter(stream_dir() / "bars_20250909.bin")
+      w.append(standardize_bar(msg))
+    """
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._ids: dict[str, int] = {s: i for i, s in enumerate(read_symbols(self.path))}
+        new = not self.path.exists() or self.path.stat().st_size == 0
+        if not new:
+            with open(self.path, "rb") as f:
+                _check_header(f.read(HEADER_SIZE), self.path)
+        self._f = open(self.path, "ab")
+        if new:
+            self._f.write(_HEADER.pack(MAGIC, FORMAT_VERSION, BAR_DTYPE.itemsize))
+            self._f.flush()
+        else:
+            # 前回の異常終了で最後のレコードが途中までしか書けていなければ、その端数を切り捨ててから追記する
+            tail = (self.path.stat().st_size - HEADER_SIZE) % BAR_DTYPE.itemsize
+            if tail:
+                self._f.truncate(self.path.stat().st_size - tail)
+        self._one = np.zeros(1, dtype=BAR_DTYPE)  # 追記用の使い回しバッファ
+
+    def symbol_id(self, symbol: str) -> int:
+        """何をする関数？：銘柄の id を返します（初見ならサイドカーに追記して採番）。"""
+        s = str(symbol or "").upper()
+        sid = self._ids.get(s)
+        if sid is None:
+            sid = len(self._ids)
+            with open(symbols_path(self.path), "a", encoding="utf-8") as f:
+                f.write(s + "\n")
+            self._ids[s] = sid
+        return sid
+
+    def append(self, bar: dict) -> None:
+        """
+        何をする関数？：
+          - standardize_bar の出力（S/t/o/h/l/c/v）を1レコードとして追記します。
+        """
+        r = self._one[0]
+        r["sym"] = self.symbol_id(bar.get("S"))
+        r["t"] = int(bar.get("t") or 0)
+        r["o"] = float(bar.get("o") or 0.0)
+        r["h"] = float(bar.get("h") or 0.0)
+        r["l"] = float(bar.get("l") or 0.0)
+        r["c"] = float(bar.get("c") or 0.0)
+        r["v"] = int(bar.get("v") or 0)
+        self._f.write(self._one.tobytes())
+        self._f.flush()  # 何をする行？：同時に読む compute_indicators から“書いた分はすぐ見える”ようにする
+
+    def close(self) -> None:
+        """何をする関数？：ファイルを閉じます（何度呼んでも安全）。"""
+        if not self._f.closed:
+            self._f.close()
+
+    def __enter__(self) -> "BarStreamWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+def write_bars(path: str | Path, symbols: list[str], sym_ids, t_ns, o, h, l, c, v) -> Path:
+    """
+    何をする関数？：
+      - 配列でまとめて1ファイルを書き出します（合成データやバックフィルの一括出力用。既存ファイルは上書き）。
+      - sym_ids は symbols の添字（行番号）です。辞書サイドカーも symbols で作り直します。
+    戻り値：書き出した .bin の Path
+    """
+    p = Path(path)
+    p.parent.mkdir(parents=True, exist_ok=True)
+    arr = np.zeros(len(np.asarray(t_ns)), dtype=BAR_DTYPE)
+    arr["sym"], arr["t"] = sym_ids, t_ns
+    arr["o"], arr["h"], arr["l"], arr["c"], arr["v"] = o, h, l, c, v
+    symbols_path(p).write_text("".join(f"{s}\n" for s in symbols), encoding="utf-8")
+    with open(p, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, FORMAT_VERSION, BAR_DTYPE.itemsize))
+        f.write(arr.tobytes())
+    return p
+
+def open_bars(path: str | Path) -> np.ndarray:
+    """
+    何をする関数？：
+      - bars_YYYYMMDD.bin を BAR_DTYPE の構造化配列として memmap します（読み取り専用・パース無し）。
+      - 書き込み途中の端数バイトは無視し、完全なレコードだけを見せます。
+    戻り値：np.memmap（レコードが0件なら長さ0の配列）
+    """
+    p = Path(path)
+    size = p.stat().st_size
+    with open(p, "rb") as f:
+        _check_header(f.read(HEADER_SIZE), p)
+    n = (size - HEADER_SIZE) // BAR_DTYPE.itemsize
+    if n <= 0:
+        return np.zeros(0, dtype=BAR_DTYPE)
+    return np.memmap(p, dtype=BAR_DTYPE, mode="r", offset=HEADER_SIZE, shape=(n,))
+
+def to_frame(arr: np.ndarray, symbols: list[str], only: list[str] | None = None) -> pd.DataFrame:
+    """
+    何をする関数？：
+      - open_bars の配列を compute_indicators と同じ列（symbol, et[ET], o,h,l,c,v）・同じコンパクト列型の DataFrame にします。
+      - only を渡すとその銘柄だけに絞ります（id 配列の比較だけで絞るので文字列比較はしません）。
+      - 同じ (銘柄, t) が複数あれば最後に追記されたもの（updatedBars の訂正）を採ります。
+    """
+    from rh_pdc_daytrade.utils.timeutil import get_et_tz  # 関数内だけで使うためここでインポート
+    from rh_pdc_daytrade.utils.io import compact_frame
+    if only:
+        want = {s.upper() for s in only}
+        ids = np.array([i for i, s in enumerate(symbols) if s in want], dtype=np.uint32)
+        arr = arr[np.isin(arr["sym"], ids)]
+    if len(arr) == 0:
+        return pd.DataFrame(columns=["symbol", "et", "o", "h", "l", "c", "v"])
+    # 何をする行？：(銘柄, t) の順に安定ソートし、同じマスが続いたら最後（＝後から追記された訂正）だけを残す
+    sym, t = np.asarray(arr["sym"]), np.asarray(arr["t"])
+    order = np.lexsort((t, sym))
+    sym, t = sym[order], t[order]
+    last = np.ones(len(order), dtype=bool)
+    last[:-1] = (sym[1:] != sym[:-1]) | (t[1:] != t[:-1])
+    order = order[last]
+    df = pd.DataFrame({
+        "symbol": pd.Categorical.from_codes(np.asarray(arr["sym"][order], dtype=np.int32), categories=symbols),  # id がそのままコード
+        "et": pd.to_datetime(np.asarray(arr["t"][order]), unit="ns", utc=True).tz_convert(get_et_tz()),
+        "o": np.asarray(arr["o"][order]), "h": np.asarray(arr["h"][order]),
+        "l": np.asarray(arr["l"][order]), "c": np.asarray(arr["c"][order]),
+        "v": np.asarray(arr["v"][order]),
+    })
+    return compact_frame(df)  # 何をする行？：_read_bars_ndjson と同じコンパクト列型にそろえる（並びは lexsort で済んでいる）
+
+def read_bars_bin(path: str | Path, symbols: list[str] | None = None) -> pd.DataFrame:
+    """何をする関数？：open_bars → to_frame をまとめて行い、1日分のバーを DataFrame で返します。"""
+    return to_frame(open_bars(path), read_symbols(path), only=symbols)
@@ -0,0 +1,203 @@
+# 約定ログ（executions）とトレード明細（strategy）を、月ごとの SQLite ファイルに追記保存するストアです。
+# ねらい：
+#  - CSV だと「毎回ファイル全体を読んでヘッダーを確認し、列が違えば全体を書き直す」ため、履歴が増えるほど遅くなる。
+#  - ここでは PRAGMA user_version にスキーマ版数を持たせ、確認は O(1)・追記は INSERT だけ（過去行は読まない）にします。
+#  - 列の追加は ALTER TABLE ADD COLUMN（既存行は書き換えない）で行い、版数を上げるだけで後方互換を保ちます。
+# 置き場所：data/logs/executions/executions_YYYYMM.sqlite（ET日付の月で分割）
+
+from __future__ import annotations
+from pathlib import Path                 # ストアファイルの場所
+from datetime import datetime            # ET時刻の記録
+from typing import Iterable, Any
+import sqlite3                           # 追記専用の月次ストア（標準ライブラリ）
+import pandas as pd                      # 読み出し結果を DataFrame で返す
+
+from rh_pdc_daytrade.utils.timeutil import get_et_tz  # ET日付で月ファイルを決める
+
+SCHEMA_VERSION = 2
+
+# 列定義（名前, SQLite型）。列を増やすときは末尾に足して SCHEMA_VERSION を上げます（既存行は NULL のまま）。
+EXEC_COLUMNS: list[tuple[str, str]] = [
+    ("date", "TEXT"), ("timestamp_et", "TEXT"), ("symbol", "TEXT"), ("setup", "TEXT"),
+    ("entry_type", "TEXT"), ("qty", "INTEGER"), ("entry_price", "REAL"), ("tp_price", "REAL"),
+    ("sl_price", "REAL"), ("notes", "TEXT"),
+    # v2：バー→発注の遅れトレース（UTC ns エポック。utils/latency.py の STAMPS）
+    ("bar_t_ns", "INTEGER"), ("ws_recv_ns", "INTEGER"), ("persisted_ns", "INTEGER"),
+    ("indicator_ns", "INTEGER"), ("signal_ns", "INTEGER"), ("order_ns", "INTEGER"),
+]
+STRATEGY_COLUMNS: list[tuple[str, str]] = [
+    ("date", "TEXT"), ("entry_time_et", "TEXT"), ("symbol", "TEXT"), ("setup", "TEXT"),
+    ("entry_type", "TEXT"), ("entry_price", "REAL"), ("qty", "INTEGER"),
+    ("tp_price", "REAL"), ("sl_price", "REAL"), ("notes", "TEXT"),
+    ("exit_time_et", "TEXT"), ("exit_price", "REAL"), ("R", "REAL"), ("slippage_pct", "REAL"), ("spread_pct", "REAL"),
+]
+TABLES: dict[str, list[tuple[str, str]]] = {"executions": EXEC_COLUMNS, "strategy": STRATEGY_COLUMNS}
+
+_CONNS: dict[Path, sqlite3.Connection] = {}  # プロセス内で月ファイルごとに接続を使い回す（版数確認は初回だけ）
+
+def store_dir(root: str | Path | None = None) -> Path:
+    """何をする関数？：月次ストアの置き場所（既定 data/logs/executions/）を返し、無ければ作ります。"""
+    d = Path(root) if root else (Path("data") / "logs" / "executions")
+    d.mkdir(parents=True, exist_ok=True)
+    return d
+
+def month_path(yyyymm: str, root: str | Path | None = None) -> Path:
+    """何をする関数？：YYYYMM の月次ストアファイルのパスを返します。"""
+    return store_dir(root) / f"executions_{yyyymm}.sqlite"
+
+def _ensure_schema(conn: sqlite3.Connection) -> None:
+    """
+    何をする関数？：
+      - PRAGMA user_version を1回読むだけで版数を確認し（O(1)）、古ければ足りない表・列・索引を追加します。
+      - 既存行の読み直しや書き直しは行いません。
+    """
+    ver = conn.execute("PRAGMA user_version").fetchone()[0]
+    if ver == SCHEMA_VERSION:
+        return
+    if ver > SCHEMA_VERSION:
+        raise ValueError(f"executions store schema v{ver} is newer than supported v{SCHEMA_VERSION}")
+    with conn:
+        for table, cols in TABLES.items():
+            col_sql = ", ".join(f'"{n}" {t}' for n, t in cols)
+            conn.execute(f'CREATE TABLE IF NOT EXISTS "{table}" (id INTEGER PRIMARY KEY AUTOINCREMENT, {col_sql})')
+            have = {r[1] for r in conn.execute(f'PRAGMA table_info("{table}")')}
+            for n, t in cols:
+                if n not in have:
+                    conn.execute(f'ALTER TABLE "{table}" ADD COLUMN "{n}" {t}')
+            conn.execute(f'CREATE INDEX IF NOT EXISTS "ix_{table}_date" ON "{table}"(date)')
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+def connect(yyyymm: str, root: str | Path | None = None) -> sqlite3.Connection:
+    """
+    何をする関数？：
+      - 月次ストアへの接続を返します（プロセス内キャッシュ）。初回だけスキーマ版数を確認します。
+    """
+    p = month_path(yyyymm, root).resolve()
+    conn = _CONNS.get(p)
+    if conn is None:
+        conn = sqlite3.connect(str(p))
+        conn.execute("PRAGMA journal_mode=WAL")     # 追記中も読み手（KPI）をブロックしない
+        conn.execute("PRAGMA synchronous=NORMAL")   # WALでは十分な耐久性で、追記1回あたりの fsync を減らす
+        _ensure_schema(conn)
+        _CONNS[p] = conn
+    return conn
+
+def close_all() -> None:
+    """何をする関数？：キャッシュ済みの接続をすべて閉じます（テストや長時間プロセスの後始末用）。"""
+    for conn in _CONNS.values():
+        try:
+            conn.close()
+        except Exception:
+            pass
+    _CONNS.clear()
+
+def _insert(table: str, rows: Iterable[dict], yyyymm: str, root: str | Path | None = None) -> int:
+    """何をする関数？：指定表に行をまとめて INSERT します（列に無いキーは無視、足りないキーは NULL）。"""
+    names = [n for n, _ in TABLES[table]]
+    placeholders = ", ".join("?" for _ in names)
+    col_sql = ", ".join(f'"{n}"' for n in names)
+    values = [tuple(_none_if_blank(r.get(n)) for n in names) for r in rows]
+    if not values:
+        return 0
+    conn = connect(yyyymm, root)
+    with conn:
+        conn.executemany(f'INSERT INTO "{table}" ({col_sql}) VALUES ({placeholders})', values)
+    return len(values)
+
+def _none_if_blank(v: Any) -> Any:
+    # CSV由来の空文字は NULL に寄せる（数値列の集計で落ちないように）
+    return None if (isinstance(v, str) and v == "") else v
+
+def append_execution(row: dict, ts: datetime | None = None, root: str | Path | None = None) -> Path:
+    """
+    何をする関数？：
+      - 約定ログ1行を当月のストアに追記します。date / timestamp_et が無ければ ts（既定：いまのET）から補います。
+    使い方：
+      append_execution({"symbol": "AAPL", "setup": "A", "qty": 10, "entry_price": 10.1, ...})
+    戻り値：書き込んだ月次ファイルの Path
+    """
+    ts = ts or datetime.now(get_et_tz())
+    rec = {"date": ts.strftime("%Y%m%d"), "timestamp_et": ts.strftime("%H:%M:%S"), **row}
+    yyyymm = str(rec["date"])[:6]
+    _insert("executions", [rec], yyyymm, root)
+    return month_path(yyyymm, root)
+
+def append_strategy_entry(row: dict, ts: datetime | None = None, root: str | Path | None = None) -> Path:
+    """
+    何をする関数？：
+      - トレード明細（ENTRY）1行を当月のストアに追記します。exit_* / R などは後で update_strategy_exit で埋めます。
+    戻り値：書き込んだ月次ファイルの Path
+    """
+    ts = ts or datetime.now(get_et_tz())
+    rec = {"date": ts.strftime("%Y%m%d"), "entry_time_et": ts.strftime("%H:%M:%S"), **row}
+    yyyymm = str(rec["date"])[:6]
+    _insert("strategy", [rec], yyyymm, root)
+    return month_path(yyyymm, root)
+
+def _read_table(table: str, date: str, root: str | Path | None = None) -> pd.DataFrame:
+    """何をする関数？：指定日の行だけを date 索引で読み出します（その月のファイルしか開きません）。"""
+    names = [n for n, _ in TABLES[table]]
+    p = month_path(str(date)[:6], root)
+    if not p.exists():
+        return pd.DataFrame(columns=["id", *names])
+    conn = connect(str(date)[:6], root)
+    col_sql = ", ".join(f'"{n}"' for n in ["id", *names])
+    return pd.read_sql_query(f'SELECT {col_sql} FROM "{table}" WHERE date = ? ORDER BY id', conn, params=(str(date),))
+
+def read_executions(date: str, root: str | Path | None = None) -> pd.DataFrame:
+    """何をする関数？：YYYYMMDD の約定ログを DataFrame で返します（無ければ列だけの空DataFrame）。"""
+    return _read_table("executions", date, root)
+
+def read_strategy(date: str, root: str | Path | None = None) -> pd.DataFrame:
+    """何をする関数？：YYYYMMDD のトレード明細を DataFrame で返します（無ければ列だけの空DataFrame）。"""
+    return _read_table("strategy", date, root)
+
+def update_strategy_exit(date: str, row_id: int, exit_price: float, exit_time_et: str,
+                         slippage_pct: float | None = None, spread_pct: float | None = None,
+                         root: str | Path | None = None) -> float | None:
+    """
+    何をする関数？：
+      - 明細1行（id）に EXIT 情報を書き込み、R = (exit − entry) / (entry − SL) を計算して保存します。
+      - entry−SL が 0 以下（リスク不定）のときは R を NULL にします。
+    戻り値：保存した R（計算できなければ None）
+    """
+    conn = connect(str(date)[:6], root)
+    hit = conn.execute('SELECT entry_price, sl_price FROM "strategy" WHERE id = ?', (int(row_id),)).fetchone()
+    if hit is None:
+        raise KeyError(f"strategy row not found: {date} id={row_id}")
+    entry, sl = hit
+    r_val = None
+    if entry is not None and sl is not None and float(entry) - float(sl) > 0:
+        r_val = (float(exit_price) - float(entry)) / (float(entry) - float(sl))
+    with conn:
+        conn.execute(
+            'UPDATE "strategy" SET exit_price = ?, exit_time_et = ?, R = ?, slippage_pct = ?, spread_pct = ? WHERE id = ?',
+            (float(exit_price), exit_time_et, r_val, slippage_pct, spread_pct, int(row_id)),
+        )
+    return r_val
+
+def migrate_csv(csv_path: str | Path, table: str, root: str | Path | None = None, batch: int = 5_000) -> int:
+    """
+    何をする関数？：
+      - 旧形式の CSV（executions.csv / strategy.csv）を1行ずつ読み、date の月ごとに月次ストアへ移します（一度きりの移行用）。
+      - 旧ヘッダーに無い列は NULL、知らない列は無視します（どの世代の CSV でも受け付ける）。
+    戻り値：移した行数
+    """
+    import csv  # この関数内だけで使うため関数内インポートにします
+    if table not in TABLES:
+        raise ValueError(f"unknown table: {table}")
+    total = 0
+    pending: dict[str, list[dict]] = {}
+    with open(csv_path, "r", encoding="utf-8", newline="") as f:
+        for rec in csv.DictReader(f):
+            d = str(rec.get("date") or "").strip()
+            if len(d) < 6 or not d[:6].isdigit():
+                continue
+            bucket = pending.setdefault(d[:6], [])
+            bucket.append(rec)
+            if len(bucket) >= batch:
+                total += _insert(table, bucket, d[:6], root)
+                bucket.clear()
+    for yyyymm, rows in pending.items():
+        total += _insert(table, rows, yyyymm, root)
+    return total
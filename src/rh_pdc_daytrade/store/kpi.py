@@ -0,0 +1,301 @@
+# 日次KPIと、セットアップ別の日次集計を SQLite（data/logs/kpi.sqlite）に upsert し、
+# 期間ロールアップ（勝率・R分布・累積リスク・ドローダウン）を“日次行の合計”だけで即座に返すストアです。
+# ねらい：
+#  - 当日分は約定ストアの当日パーティションだけから計算し、過去の約定は読み直さない。
+#  - 累積R・ピーク・ドローダウンは「前日行 + 当日」で O(1) 更新し、年初来レポートは日次行（≦252行）を足すだけにする。
+
+from __future__ import annotations
+from pathlib import Path                 # ストアファイルの場所
+from typing import Any
+import sqlite3                           # KPIストア（標準ライブラリ）
+import numpy as np                       # R分布のビン分け
+import pandas as pd                      # 集計入力/レポート出力
+
+SCHEMA_VERSION = 2   # v2：旧 kpi_daily.csv の履歴を初回だけ取り込む
+
+# R分布のビン境界（R<-1, -1≦R<0, 0≦R<1, 1≦R<2, 2≦R）。列名は r_bin_0..4。
+R_BIN_EDGES: list[float] = [-1.0, 0.0, 1.0, 2.0]
+R_BIN_COLUMNS: list[str] = [f"r_bin_{i}" for i in range(len(R_BIN_EDGES) + 1)]
+
+DAILY_COLUMNS: list[tuple[str, str]] = [
+    ("date", "TEXT PRIMARY KEY"), ("trades", "INTEGER"), ("setup_A", "INTEGER"), ("setup_B", "INTEGER"),
+    ("avg_entry_price", "REAL"), ("avg_tp_pct", "REAL"), ("avg_sl_pct", "REAL"), ("avg_qty", "REAL"),
+    ("total_risk_usd", "REAL"),
+    ("closed_trades", "INTEGER"), ("wins", "INTEGER"), ("losses", "INTEGER"), ("sum_R", "REAL"),
+    ("cum_R", "REAL"), ("peak_R", "REAL"), ("drawdown_R", "REAL"), ("cum_risk_usd", "REAL"),
+]
+SETUP_COLUMNS: list[tuple[str, str]] = [
+    ("date", "TEXT"), ("setup", "TEXT"), ("trades", "INTEGER"), ("risk_usd", "REAL"),
+    ("closed_trades", "INTEGER"), ("wins", "INTEGER"), ("losses", "INTEGER"),
+    ("sum_R", "REAL"), ("sum_R2", "REAL"),
+    *[(c, "INTEGER") for c in R_BIN_COLUMNS],
+]
+# KPI CSV（人が見る用）に出す列。既存の kpi_daily.csv と同じ並びを先頭に保ちます。
+CSV_COLUMNS: list[str] = [n for n, _ in DAILY_COLUMNS]
+# ストア導入前の日次KPI（ストアと同じフォルダ）。ストア作成/移行時に一度だけ取り込みます。
+LEGACY_CSV = "kpi_daily.csv"
+
+_CONNS: dict[Path, sqlite3.Connection] = {}
+
+def kpi_path(root: str | Path | None = None) -> Path:
+    """何をする関数？：KPIストア（既定 data/logs/kpi.sqlite）のパスを返し、親フォルダを作ります。"""
+    d = Path(root) if root else (Path("data") / "logs")
+    d.mkdir(parents=True, exist_ok=True)
+    return d / "kpi.sqlite"
+
+def connect(root: str | Path | None = None) -> sqlite3.Connection:
+    """何をする関数？：KPIストアへの接続を返します（プロセス内キャッシュ・初回だけ版数確認）。"""
+    p = kpi_path(root).resolve()
+    conn = _CONNS.get(p)
+    if conn is not None:
+        return conn
+    conn = sqlite3.connect(str(p))
+    ver = conn.execute("PRAGMA user_version").fetchone()[0]
+    if ver > SCHEMA_VERSION:
+        raise ValueError(f"kpi store schema v{ver} is newer than supported v{SCHEMA_VERSION}")
+    if ver < SCHEMA_VERSION:
+        with conn:
+            cols = ", ".join(f'"{n}" {t}' for n, t in DAILY_COLUMNS)
+            conn.execute(f'CREATE TABLE IF NOT EXISTS kpi_daily ({cols})')
+            cols = ", ".join(f'"{n}" {t}' for n, t in SETUP_COLUMNS)
+            conn.execute(f'CREATE TABLE IF NOT EXISTS kpi_setup_daily ({cols}, PRIMARY KEY (date, setup))')
+            if ver < 2 and (p.parent / LEGACY_CSV).exists():
+                _import_legacy_csv(conn, p.parent / LEGACY_CSV)  # 何をする行？：ストア導入前の履歴を消さないよう、初回だけ取り込む
+            conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    _CONNS[p] = conn
+    return conn
+
+def _import_legacy_csv(conn: sqlite3.Connection, csv_path: Path) -> int:
+    """
+    何をする関数？：
+      - 旧形式の kpi_daily.csv（ストア導入前の日次行）を kpi_daily に取り込みます（connect の移行時に一度だけ呼ばれる）。
+      - 旧ヘッダーに無い列は NULL（実現R系は 0）、知らない列は無視し、ストアに既にある日付は上書きしません。
+      - 取り込んだあと、累積R・ピーク・ドローダウン・累積リスクを全期間で付け直します。
+    戻り値：取り込んだ行数
+    """
+    import csv  # この関数内だけで使うため関数内インポートにします
+    names = [n for n, _ in DAILY_COLUMNS]
+    rows: dict[str, list] = {}
+    with open(csv_path, "r", encoding="utf-8", newline="") as f:
+        for rec in csv.DictReader(f):
+            d = str(rec.get("date") or "").strip()
+            if len(d) != 8 or not d.isdigit():
+                continue
+            vals = {n: (rec.get(n) if rec.get(n) not in ("", None) else None) for n in names}
+            for n in ("closed_trades", "wins", "losses", "sum_R"):
+                vals[n] = vals[n] if vals[n] is not None else 0
+            vals["date"] = d
+            rows[d] = [vals[n] for n in names]   # 何をする行？：同じ日付が複数あれば最後の行を採る（旧CSVの upsert と同じ）
+    before = conn.execute("SELECT COUNT(*) FROM kpi_daily").fetchone()[0]
+    conn.executemany(
+        f'INSERT OR IGNORE INTO kpi_daily ({", ".join(names)}) VALUES ({", ".join("?" for _ in names)})',
+        list(rows.values()),
+    )
+    _rechain(conn, "", (0.0, 0.0, 0.0))
+    return int(conn.execute("SELECT COUNT(*) FROM kpi_daily").fetchone()[0] - before)
+
+# ---- 当日の集計（当日パーティションだけを入力にする） ------------------------------------------------
+def realized_r(strat: pd.DataFrame) -> pd.Series:
+    """
+    何をする関数？：
+      - 明細（strategy）から、EXITが記録済みの行の R を返します。
+      - R 列が空でも exit/entry/SL がそろっていれば (exit−entry)/(entry−SL) で補います。
+    """
+    if strat is None or strat.empty:
+        return pd.Series(dtype=float)
+    r = pd.to_numeric(strat.get("R"), errors="coerce") if "R" in strat.columns else pd.Series(np.nan, index=strat.index)
+    if {"exit_price", "entry_price", "sl_price"}.issubset(strat.columns):
+        ex = pd.to_numeric(strat["exit_price"], errors="coerce")
+        en = pd.to_numeric(strat["entry_price"], errors="coerce")
+        sl = pd.to_numeric(strat["sl_price"], errors="coerce")
+        risk = (en - sl).where((en - sl) > 0)
+        r = r.fillna((ex - en) / risk)
+    return r.dropna().astype(float)
+
+def setup_day_stats(date: str, execs: pd.DataFrame, strat: pd.DataFrame) -> list[dict]:
+    """
+    何をする関数？：
+      - 当日の約定（execs）と明細（strategy）から、セットアップ別の集計行（件数・想定リスク・実現R・R分布）を作ります。
+    戻り値：kpi_setup_daily に入れる dict のリスト（setup ごと1行）
+    """
+    rows: dict[str, dict[str, Any]] = {}
+
+    def _row(setup: str) -> dict[str, Any]:
+        return rows.setdefault(setup, {
+            "date": str(date), "setup": setup, "trades": 0, "risk_usd": 0.0,
+            "closed_trades": 0, "wins": 0, "losses": 0, "sum_R": 0.0, "sum_R2": 0.0,
+            **{c: 0 for c in R_BIN_COLUMNS},
+        })
+
+    if execs is not None and not execs.empty:
+        e = execs.copy()
+        e["setup"] = e["setup"].fillna("").astype(str) if "setup" in e.columns else ""
+        qty = pd.to_numeric(e.get("qty"), errors="coerce").fillna(0)
+        risk = (pd.to_numeric(e.get("entry_price"), errors="coerce")
+                - pd.to_numeric(e.get("sl_price"), errors="coerce")).clip(lower=0).fillna(0) * qty
+        for setup, idx in e.groupby("setup").groups.items():
+            r = _row(str(setup))
+            r["trades"] += int(len(idx))
+            r["risk_usd"] += float(risk.loc[idx].sum())
+
+    if strat is not None and not strat.empty:
+        rs = realized_r(strat)
+        if not rs.empty:
+            setups = strat.loc[rs.index, "setup"].fillna("").astype(str) if "setup" in strat.columns else pd.Series("", index=rs.index)
+            bins = np.digitize(rs.to_numpy(), R_BIN_EDGES, right=False)
+            for setup, grp in rs.groupby(setups):
+                r = _row(str(setup))
+                vals = grp.to_numpy()
+                r["closed_trades"] += int(len(vals))
+                r["wins"] += int((vals > 0).sum())
+                r["losses"] += int((vals <= 0).sum())
+                r["sum_R"] += float(vals.sum())
+                r["sum_R2"] += float((vals ** 2).sum())
+                for b in bins[rs.index.get_indexer(grp.index)]:
+                    r[R_BIN_COLUMNS[int(b)]] += 1
+    return list(rows.values())
+
+# ---- upsert（累積値は前日行から O(1) で更新） -------------------------------------------------------
+def _prev_row(conn: sqlite3.Connection, date: str) -> tuple[float, float, float]:
+    hit = conn.execute(
+        "SELECT cum_R, peak_R, cum_risk_usd FROM kpi_daily WHERE date < ? ORDER BY date DESC LIMIT 1", (date,)
+    ).fetchone()
+    if hit is None:
+        return 0.0, 0.0, 0.0
+    return tuple(float(x or 0.0) for x in hit)  # type: ignore[return-value]
+
+def _chain(prev: tuple[float, float, float], sum_r: float, risk: float) -> dict:
+    cum_r = prev[0] + sum_r
+    peak = max(prev[1], cum_r)
+    return {"cum_R": cum_r, "peak_R": peak, "drawdown_R": cum_r - peak, "cum_risk_usd": prev[2] + risk}
+
+def _rechain(conn: sqlite3.Connection, after: str, prev: tuple[float, float, float]) -> None:
+    """何をする関数？：after より後の日の累積値（cum_R・peak_R・drawdown_R・cum_risk_usd）を prev から日付順に付け直します。"""
+    later = conn.execute(
+        "SELECT date, sum_R, total_risk_usd FROM kpi_daily WHERE date > ? ORDER BY date", (after,)
+    ).fetchall()
+    for d, s, rk in later:
+        ch = _chain(prev, float(s or 0.0), float(rk or 0.0))
+        conn.execute("UPDATE kpi_daily SET cum_R=?, peak_R=?, drawdown_R=?, cum_risk_usd=? WHERE date=?",
+                     (ch["cum_R"], ch["peak_R"], ch["drawdown_R"], ch["cum_risk_usd"], d))
+        prev = (ch["cum_R"], ch["peak_R"], ch["cum_risk_usd"])
+
+def upsert_day(daily: dict, setup_rows: list[dict], root: str | Path | None = None) -> dict:
+    """
+    何をする関数？：
+      - 当日のKPI行とセットアップ別行を upsert し、累積R・ピーク・ドローダウン・累積リスクを前日行から更新します。
+      - 過去日を再計算した場合だけ、その日以降の累積値を日付順に付け直します（通常運用では当日1行のみ）。
+    戻り値：保存した日次行（累積値入り）
+    """
+    conn = connect(root)
+    date = str(daily["date"])
+    sum_r = float(sum(r["sum_R"] for r in setup_rows))
+    risk = float(daily.get("total_risk_usd") or 0.0)
+    row = {n: daily.get(n) for n, _ in DAILY_COLUMNS}
+    row.update({
+        "date": date,
+        "closed_trades": int(sum(r["closed_trades"] for r in setup_rows)),
+        "wins": int(sum(r["wins"] for r in setup_rows)),
+        "losses": int(sum(r["losses"] for r in setup_rows)),
+        "sum_R": sum_r,
+        **_chain(_prev_row(conn, date), sum_r, risk),
+    })
+    names = [n for n, _ in DAILY_COLUMNS]
+    s_names = [n for n, _ in SETUP_COLUMNS]
+    with conn:
+        conn.execute(
+            f'INSERT OR REPLACE INTO kpi_daily ({", ".join(names)}) VALUES ({", ".join("?" for _ in names)})',
+            [row[n] for n in names],
+        )
+        conn.execute("DELETE FROM kpi_setup_daily WHERE date = ?", (date,))
+        conn.executemany(
+            f'INSERT INTO kpi_setup_daily ({", ".join(s_names)}) VALUES ({", ".join("?" for _ in s_names)})',
+            [[r[n] for n in s_names] for r in setup_rows],
+        )
+        # 過去日の再計算：後続日の累積値だけを付け直す
+        _rechain(conn, date, (row["cum_R"], row["peak_R"], row["cum_risk_usd"]))
+    return row
+
+# ---- 期間ロールアップ -------------------------------------------------------------------------------
+def rollup(start: str, end: str, root: str | Path | None = None) -> dict:
+    """
+    何をする関数？：
+      - [start, end]（YYYYMMDD）の日次行を合計して、セットアップ別の勝率・平均R・R標準偏差・R分布・累積リスクと、
+        期間内の累積R・最大ドローダウンを返します（約定は読まず、日次行だけで計算）。
+    戻り値：{"by_setup": DataFrame, "total_R": float, "max_drawdown_R": float, "risk_usd": float, "days": int}
+    """
+    conn = connect(root)
+    sums = ", ".join(f"SUM({c}) AS {c}" for c in ["trades", "risk_usd", "closed_trades", "wins", "losses",
+                                                      "sum_R", "sum_R2", *R_BIN_COLUMNS])
+    by_setup = pd.read_sql_query(
+        f"SELECT setup, {sums} FROM kpi_setup_daily WHERE date BETWEEN ? AND ? GROUP BY setup ORDER BY setup",
+        conn, params=(str(start), str(end)),
+    )
+    if not by_setup.empty:
+        n = by_setup["closed_trades"].replace(0, np.nan)
+        by_setup["win_rate"] = by_setup["wins"] / n
+        by_setup["avg_R"] = by_setup["sum_R"] / n
+        var = by_setup["sum_R2"] / n - by_setup["avg_R"] ** 2
+        by_setup["std_R"] = np.sqrt(var.clip(lower=0))
+
+    daily = pd.read_sql_query(
+        "SELECT date, sum_R, total_risk_usd FROM kpi_daily WHERE date BETWEEN ? AND ? ORDER BY date",
+        conn, params=(str(start), str(end)),
+    )
+    eq = daily["sum_R"].fillna(0.0).to_numpy(dtype=float).cumsum()
+    dd = float((eq - np.maximum.accumulate(np.concatenate([[0.0], eq]))[1:]).min()) if len(eq) else 0.0
+    return {
+        "by_setup": by_setup,
+        "total_R": float(eq[-1]) if len(eq) else 0.0,
+        "max_drawdown_R": dd,
+        "risk_usd": float(daily["total_risk_usd"].fillna(0.0).sum()),
+        "days": int(len(daily)),
+    }
+
+def read_daily(start: str | None = None, end: str | None = None, root: str | Path | None = None) -> pd.DataFrame:
+    """何をする関数？：日次KPI行を日付順に返します（期間指定なしなら全期間）。"""
+    conn = connect(root)
+    names = ", ".join(CSV_COLUMNS)
+    return pd.read_sql_query(
+        f"SELECT {names} FROM kpi_daily WHERE date BETWEEN ? AND ? ORDER BY date",
+        conn, params=(str(start or "00000000"), str(end or "99999999")),
+    )
+
+def export_daily_csv(p_csv: str | Path, root: str | Path | None = None) -> Path:
+    """何をする関数？：日次KPI行を全期間ぶん、人が見る用の CSV に書き出します（必要なときだけ呼ぶ全量出力）。"""
+    read_daily(root=root).to_csv(p_csv, index=False)
+    return Path(p_csv)
+
+def _csv_head_tail(p_csv: Path) -> tuple[str, str]:
+    """何をする関数？：CSV の1行目（見出し）と最後の行だけを返します（ファイル全体は読まない）。"""
+    with open(p_csv, "rb") as f:
+        head = f.readline().decode("utf-8").rstrip("\r\n")
+        f.seek(0, 2)
+        f.seek(max(0, f.tell() - 4096))
+        lines = f.read().decode("utf-8", errors="ignore").splitlines()
+    return head, (lines[-1] if lines else "")
+
+def append_daily_csv(row: dict, p_csv: str | Path, root: str | Path | None = None) -> str:
+    """
+    何をする関数？：
+      - upsert_day が返した当日行を、人が見る用の CSV の末尾に1行だけ追記します（既存行は読み直さない：見出しと最後の行だけ見る）。
+      - CSV が無い・見出しが今の列と違う（旧形式）・最後の行が当日以降（同じ日の再実行や過去日の再計算）のときだけ、
+        export_daily_csv で全期間を書き出し直します。
+    戻り値："append" または "export"
+    """
+    import csv  # この関数内だけで使うため関数内インポートにします
+    p_csv = Path(p_csv)
+    if p_csv.exists() and p_csv.stat().st_size > 0:
+        head, tail = _csv_head_tail(p_csv)
+        last = tail.split(",", 1)[0].strip().strip('"')
+        if head == ",".join(CSV_COLUMNS) and last.isdigit() and last < str(row["date"]):
+            with open(p_csv, "rb") as f:
+                f.seek(-1, 2)
+                newline = f.read(1) != b"\n"
+            with open(p_csv, "a", encoding="utf-8", newline="") as f:
+                if newline:
+                    f.write("\n")   # 何をする行？：手で編集されて末尾改行が無いCSVでも行がつながらないようにする
+                csv.writer(f, lineterminator="\n").writerow(["" if row.get(c) is None else row.get(c) for c in CSV_COLUMNS])
+            return "append"
+    export_daily_csv(p_csv, root=root)
+    return "export"
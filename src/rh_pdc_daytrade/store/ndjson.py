@@ -0,0 +1,113 @@
+# WS が保存した bars_YYYYMMDD.ndjson を、決まった行数ごとの“塊”（DataFrame）で読むリーダです。
+# ねらい：
+#  - 1行ずつ dict を作って丸ごとリストに溜めてから DataFrame にすると、ピークのメモリがファイルの数倍になる。
+#    ここでは列ごとの配列に batch_rows 行だけ溜めて塊を返し、次の塊へ進む前に手放します（メモリは塊の大きさで決まる）。
+#  - t の解釈（ns/us/ms/s の数値・ISO 文字列）は1本ずつではなく塊ごとに配列でまとめて行います。
+# 塊の列は compute_indicators の 1分バーと同じ（symbol, et[ET], o,h,l,c,v, ws_recv_ns, persisted_ns）＋到着順の u（訂正印）です。
+# 並べ替え・重複除去はしません（到着順のまま。畳むのは indicators.chunked の役目）。
+
+from __future__ import annotations
+from pathlib import Path
+from typing import Iterator
+import numpy as np
+import pandas as pd
+import orjson
+
+from rh_pdc_daytrade.utils.timeutil import get_et_tz  # et 列のタイムゾーン
+
+NAT_NS = np.iinfo(np.int64).min   # datetime64[ns] の NaT と同じビット列
+BAR_TYPES = ("b", "bar", "u")     # バーとして読む印（IEX の T / standardize_bar の type / updatedBars）
+
+def parse_t_ns(values) -> np.ndarray:
+    """
+    何をする関数？：
+      - Alpaca の t（ns/us/ms/s の数値 or '...Z' の ISO 文字列）の並びを、UTC の ns エポック int64 配列にまとめて直します。
+      - 数値は桁数で単位を推定します（10^18台=ns, 10^15台=us, 10^12台=ms, それ以外=s）。解釈できないものは NAT_NS。
+    """
+    n = len(values)
+    try:
+        raw = np.asarray(values, dtype=np.int64)   # 速い道：全部が数値（standardize_bar の出力はこちら）
+        strs = None
+    except (TypeError, ValueError, OverflowError):
+        raw = np.zeros(n, dtype=np.int64)
+        strs = {}
+        for i, v in enumerate(values):
+            if isinstance(v, (int, float)) and not isinstance(v, bool):
+                raw[i] = int(v)
+            elif isinstance(v, str) and v.strip().isdigit():
+                raw[i] = int(v.strip())
+            else:
+                strs[i] = v
+    a = np.abs(raw)
+    out = np.select([a >= 10**18, a >= 10**15, a >= 10**12], [raw, raw * 1_000, raw * 1_000_000], raw * 1_000_000_000)
+    if strs:
+        idx = np.fromiter(strs.keys(), dtype=np.int64, count=len(strs))
+        txt = [str(v).strip().replace("Z", "+00:00") if v is not None else "" for v in strs.values()]
+        dt = pd.to_datetime(pd.Series(txt), utc=True, format="ISO8601", errors="coerce")
+        out[idx] = dt.dt.as_unit("ns").to_numpy(dtype="datetime64[ns]").view(np.int64)  # NaT は NAT_NS のまま
+    return out
+
+def to_et(t_ns: np.ndarray) -> pd.DatetimeIndex:
+    """何をする関数？：UTC の ns エポック配列を ET の DatetimeIndex にします（NAT_NS は NaT）。"""
+    return pd.DatetimeIndex(np.asarray(t_ns, dtype=np.int64).view("datetime64[ns]")).tz_localize("UTC").tz_convert(get_et_tz())
+
+def _nullable_ns(vals: list) -> pd.arrays.IntegerArray:
+    # 何をする関数？：rt/pt（無い行は None）を欠損ありの Int64 にする（float を通すと ns が丸まるため）。
+    return pd.array(vals, dtype="Int64")
+
+def iter_bar_batches(path: str | Path, batch_rows: int = 100_000, symbols: list[str] | None = None) -> Iterator[pd.DataFrame]:
+    """
+    何をする関数？：
+      - NDJSON を先頭から読み、バーを batch_rows 行ずつの DataFrame にして順に返します（最後の塊は短いことがある）。
+      - symbols を渡すとその銘柄だけにします。壊れた行・バー以外の行は飛ばします。
+    使い方：
+      for chunk in iter_bar_batches("data/stream/bars_20250909.ndjson", 200_000):
+          ...
+    """
+    want = {s.upper() for s in symbols} if symbols else None
+    batch_rows = max(1, int(batch_rows))
+    cols: dict[str, list] = {k: [] for k in ("S", "t", "o", "h", "l", "c", "v", "rt", "pt", "u")}
+
+    def _flush() -> pd.DataFrame:
+        t_ns = parse_t_ns(cols["t"])
+        df = pd.DataFrame({
+            "symbol": np.asarray(cols["S"], dtype=object),
+            "et": to_et(t_ns),
+            "o": np.asarray(cols["o"], dtype=np.float64), "h": np.asarray(cols["h"], dtype=np.float64),
+            "l": np.asarray(cols["l"], dtype=np.float64), "c": np.asarray(cols["c"], dtype=np.float64),
+            "v": np.asarray(cols["v"], dtype=np.float64),
+            "ws_recv_ns": _nullable_ns(cols["rt"]), "persisted_ns": _nullable_ns(cols["pt"]),
+            "u": np.asarray(cols["u"], dtype=bool),
+        })
+        for lst in cols.values():
+            lst.clear()
+        return df[df["et"].notna()].reset_index(drop=True)
+
+    with open(path, "rb") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                m = orjson.loads(line)
+            except Exception:
+                continue
+            if not isinstance(m, dict):
+                continue
+            tmark = m.get("T") or m.get("type")
+            if tmark not in BAR_TYPES:
+                continue
+            s = str(m.get("S") or "").upper()
+            if want is not None and s not in want:
+                continue
+            cols["S"].append(s)
+            cols["t"].append(m.get("t"))
+            for k in ("o", "h", "l", "c", "v"):
+                x = m.get(k)
+                cols[k].append(float(x) if x is not None else 0.0)
+            cols["rt"].append(m.get("rt"))
+            cols["pt"].append(m.get("pt"))
+            cols["u"].append(tmark == "u" or bool(m.get("u")))
+            if len(cols["S"]) >= batch_rows:
+                yield _flush()
+    if cols["S"]:
+        yield _flush()
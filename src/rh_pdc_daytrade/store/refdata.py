@@ -0,0 +1,190 @@
+# 場中スクリプトが何度も読む“参照データ”（ウォッチリスト・最新のEOD特徴量・ユニバース/手動リスト）の
+# プロセス内キャッシュです。
+# ねらい：
+#  - ファイルは (パス, mtime_ns, サイズ) をキーに1回だけ読み、変わっていなければ stat 1回で前回の結果を返す。
+#  - 「最新のEOD特徴量」は data/eod/latest.json（マニフェスト）で引く。glob＋全ファイル stat の走査は、
+#    マニフェストが無い・指す先が消えたときだけのフォールバックにする。
+#  - 返す値は共有物です（リストはタプル、集合は frozenset）。DataFrame は書き換えずに、必要なら .copy() してください。
+# マニフェストの書き手は nightly_screen（EOD特徴量・ウォッチリストを保存したとき update_manifest を呼ぶ）。
+
+from __future__ import annotations
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable
+import csv
+import os
+import threading
+import orjson
+
+from rh_pdc_daytrade.utils.timeutil import get_et_tz  # 場中スキャナのファイルの ET 日付
+
+MANIFEST_NAME = "latest.json"
+
+_CACHE: dict[tuple[str, str], tuple[tuple[int, int], Any]] = {}   # (種類, パス) -> ((mtime_ns, size), 値)
+_LOCK = threading.Lock()
+
+def eod_dir(path: str | os.PathLike[str] | None = None) -> Path:
+    """何をする関数？：EODの置き場（引数 → 環境変数 EOD_DIR → data/eod の順）を返します。"""
+    return Path(path or os.getenv("EOD_DIR") or Path("data") / "eod")
+
+def _stamp(p: Path) -> tuple[int, int] | None:
+    # 何をする関数？：ファイルの“版”（mtime_ns, サイズ）。無ければ None。
+    try:
+        st = os.stat(p)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+def cached(kind: str, path: str | os.PathLike[str], loader: Callable[[Path], Any], default: Any = None) -> Any:
+    """
+    何をする関数？：
+      - path を loader で読んだ結果を、(kind, path) ごとに (mtime_ns, サイズ) が変わるまで使い回します。
+      - ファイルが無い・読めないときは default を返します（読めなかった版も覚えて、同じ壊れ方で読み直さない）。
+    使い方：
+      syms = cached("txt", "configs/manual_watchlist.txt", _read_txt, ())
+    """
+    p = Path(path)
+    stamp = _stamp(p)
+    if stamp is None:
+        return default
+    key = (kind, os.fspath(p))
+    hit = _CACHE.get(key)
+    if hit is not None and hit[0] == stamp:
+        return hit[1]
+    with _LOCK:
+        hit = _CACHE.get(key)
+        if hit is not None and hit[0] == stamp:
+            return hit[1]
+        try:
+            val = loader(p)
+        except Exception:
+            val = default
+        _CACHE[key] = (stamp, val)
+        return val
+
+def clear_cache() -> None:
+    """何をする関数？：キャッシュを空にします（テストや手動の作り直し用）。"""
+    with _LOCK:
+        _CACHE.clear()
+
+# ---- 銘柄リスト ---------------------------------------------------------------------------------------
+
+def _normalize(raw) -> tuple[str, ...]:
+    # 何をする関数？：空白除去・大文字化・重複除去（順序は維持）。
+    out, seen = [], set()
+    for s in raw:
+        t = str(s).strip().upper()
+        if t and t not in seen:
+            seen.add(t)
+            out.append(t)
+    return tuple(out)
+
+def _read_watchlist_json(p: Path) -> tuple[str, ...]:
+    data = orjson.loads(p.read_bytes())
+    raw = data.get("symbols") if isinstance(data, dict) else None
+    return _normalize(s for s in (raw or []) if isinstance(s, str))
+
+def _read_symbol_file(p: Path) -> tuple[str, ...]:
+    # 何をする関数？：TXT（1行1銘柄、# はコメント）か CSV（symbol/ticker 列、無ければ先頭列）から銘柄を読む。
+    text = p.read_text(encoding="utf-8-sig")
+    if p.suffix.lower() != ".csv":
+        return _normalize(l for l in text.splitlines() if l.strip() and not l.strip().startswith("#"))
+    rows = [r for r in csv.reader(text.splitlines()) if r]
+    if not rows:
+        return ()
+    header = [c.strip().lower() for c in rows[0]]
+    col = next((header.index(c) for c in ("symbol", "ticker") if c in header), 0)
+    body = rows[1:] if any(h.isalpha() for h in header) else rows
+    return _normalize(r[col] for r in body if col < len(r) and r[col].strip() and not r[col].strip().startswith("#"))
+
+def watchlist_path(setup: str, base: str | os.PathLike[str] | None = None) -> Path:
+    """何をする関数？：戦略A/Bのウォッチリスト（data/eod/watchlist_{A|B}.json）の場所を返します（マニフェストがあればそれに従う）。"""
+    s = "B" if str(setup).strip().upper() == "B" else "A"
+    d = eod_dir(base)
+    name = ((manifest(d).get("watchlists") or {}).get(s))
+    if name and (d / name).exists():
+        return d / name
+    return d / f"watchlist_{s}.json"
+
+def read_watchlist(path: str | os.PathLike[str]) -> tuple[str, ...]:
+    """何をする関数？：ウォッチリストJSON（{"symbols": [...]}）の銘柄（大文字・重複なし・順位順）を返します。無い・壊れていれば空タプル。"""
+    return cached("watchlist", path, _read_watchlist_json, ())
+
+def watchlist_symbols(setup: str, base: str | os.PathLike[str] | None = None) -> tuple[str, ...]:
+    """何をする関数？：戦略A/Bのウォッチリストの銘柄を返します（read_watchlist(watchlist_path(setup))）。"""
+    return read_watchlist(watchlist_path(setup, base))
+
+def watchlist_set(setup: str, base: str | os.PathLike[str] | None = None) -> frozenset[str] | None:
+    """何をする関数？：ウォッチリストの銘柄集合を返します。無い・空なら None（= 絞り込まない）。"""
+    p = watchlist_path(setup, base)
+    return cached("watchlist_set", p, lambda q: frozenset(_read_watchlist_json(q)) or None, None)
+
+def symbol_list(path: str | os.PathLike[str]) -> tuple[str, ...]:
+    """何をする関数？：手動ウォッチリスト/ユニバースの TXT・CSV から銘柄を返します（無ければ空タプル）。"""
+    return cached("symbols", path, _read_symbol_file, ())
+
+def scan_symbols(day: str | None = None, stream: str | os.PathLike[str] | None = None) -> tuple[str, ...]:
+    """
+    何をする関数？：場中スキャナ（alpaca_iex_ws.ScanLink）がいま足している銘柄（STREAM_DIR/scan_YYYYMMDD.json の symbols）を返します。
+    day（YYYYMMDD）の既定は ET のきょう。スキャナを動かしていなければ空タプル。
+    """
+    d = Path(stream or os.environ.get("STREAM_DIR") or Path("data") / "stream")
+    return read_watchlist(d / f"scan_{day or datetime.now(get_et_tz()).strftime('%Y%m%d')}.json")
+
+# ---- マニフェストと最新のEOD特徴量 ----------------------------------------------------------------------
+
+def manifest(base: str | os.PathLike[str] | None = None) -> dict:
+    """何をする関数？：data/eod/latest.json を読みます（無ければ空 dict。共有物なので書き換えないこと）。"""
+    return cached("manifest", eod_dir(base) / MANIFEST_NAME, lambda p: orjson.loads(p.read_bytes()) or {}, {})
+
+def update_manifest(base: str | os.PathLike[str] | None = None, **entries: Any) -> Path:
+    """
+    何をする関数？：
+      - マニフェストの項目（eod_features={"parquet": 名前, "csv": 名前, "date": YYYYMMDD} / watchlists={"A": 名前, ...}）を
+        上書きして保存します。ファイル名は EOD フォルダからの相対名です。
+      - 一時ファイルに書いて置き換えるので、読み手が書きかけを見ることはありません。
+    使い方：
+      update_manifest(out_dir, eod_features={"parquet": p.name, "csv": c.name, "date": "20250912"})
+    """
+    d = eod_dir(base)
+    d.mkdir(parents=True, exist_ok=True)
+    p = d / MANIFEST_NAME
+    doc = dict(manifest(d))
+    for k, v in entries.items():
+        doc[k] = {**(doc.get(k) or {}), **v} if isinstance(v, dict) else v
+    doc["updated_at"] = datetime.now().astimezone().isoformat(timespec="seconds")
+    tmp = p.with_suffix(p.suffix + ".tmp")
+    tmp.write_bytes(orjson.dumps(doc, option=orjson.OPT_INDENT_2))
+    os.replace(tmp, p)
+    return p
+
+def _scan_latest_eod(d: Path) -> Path | None:
+    # 何をする関数？：マニフェストが使えないときのフォールバック（glob して最終更新が最新のもの）。
+    cands = list(d.glob("eod_features_*.parquet")) + list(d.glob("eod_features_*.csv"))
+    return max(cands, key=lambda p: p.stat().st_mtime) if cands else None
+
+def latest_eod_features_path(base: str | os.PathLike[str] | None = None, prefer: str = "parquet") -> Path | None:
+    """
+    何をする関数？：
+      - 最新の eod_features_YYYYMMDD.(parquet|csv) のパスを返します（マニフェスト優先、無ければ走査）。
+    """
+    d = eod_dir(base)
+    ent = manifest(d).get("eod_features") or {}
+    for fmt in (prefer, "csv" if prefer == "parquet" else "parquet"):
+        name = ent.get(fmt)
+        if name and (d / name).exists():
+            return d / name
+    return _scan_latest_eod(d)
+
+def _read_eod_frame(p: Path):
+    import pandas as pd  # 関数内だけで使うためここでインポート（銘柄リストだけ使う呼び出し側に pandas を強いない）
+    return pd.read_parquet(p) if p.suffix == ".parquet" else pd.read_csv(p)
+
+def read_eod_features(path: str | os.PathLike[str]):
+    """何をする関数？：EOD特徴量（parquet/csv）を読みます（同じ版なら前回の DataFrame。書き換えるなら .copy()）。"""
+    return cached("eod_features", path, _read_eod_frame, None)
+
+def latest_eod_features(base: str | os.PathLike[str] | None = None):
+    """何をする関数？：最新のEOD特徴量 DataFrame を返します（無ければ None）。"""
+    p = latest_eod_features_path(base)
+    return read_eod_features(p) if p is not None else None
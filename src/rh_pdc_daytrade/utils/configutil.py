@@ -1,10 +1,19 @@
 # 設定ファイル（configs/config.yaml / configs/symbols.yml）を読み込む共通ユーティリティです。
 # 目的：どのスクリプトからでも同じ方法で設定と銘柄リストを取得し、欠けたキーは安全な既定値で補う。  :contentReference[oaicite:3]{index=3}
+# 追加：YAML の解析結果はファイルの更新時刻（mtime）でメモ化し、risk/bracket/strategy/orders は検証済みの
+#       “凍結スナップショット”（Settings）として渡せるようにする。常駐プロセスは ConfigWatcher で変更を拾って差し替える。
 
 from __future__ import annotations
+from dataclasses import dataclass, replace   # 凍結スナップショットの入れ物
+from datetime import time as _dtime         # orders の締切・AVWAP アンカー
 from pathlib import Path            # プロジェクト直下や ./configs の場所を扱う
+from types import MappingProxyType  # 読み取り専用の dict ビュー（スナップショットの raw）
+from typing import Any, Callable, Mapping
+import copy                         # load_config は呼び出し側が書き換えてもキャッシュを汚さないよう複製を返す
 import os                           # RUN_MODE など環境変数の既定値を参照するため
+import threading                    # メモ化の排他と ConfigWatcher の監視スレッド
 import yaml                         # YAMLの読込（pyprojectで追加済み）
+from loguru import logger           # 再読込の失敗を記録（止めずに前の設定を使い続ける）
 
 def _project_root() -> Path:
     # このファイルは src/rh_pdc_daytrade/utils/configutil.py にあるので、3つ上がプロジェクト直下です。
@@ -22,18 +31,40 @@ def _load_yaml(p: str | os.PathLike[str]) -> dict:
         data = yaml.safe_load(f)
     return data or {}
 
+_YAML_CACHE: dict[str, tuple[tuple[int, int], dict]] = {}   # パス -> ((mtime_ns, size), 解析結果)
+_CACHE_LOCK = threading.Lock()
+
+def _stamp(p: Path) -> tuple[int, int]:
+    # 何をする関数？：ファイルの“版”（更新時刻 ns とサイズ）。同じ秒内の書き換えもサイズ差で拾いやすくする。
+    st = p.stat()
+    return st.st_mtime_ns, st.st_size
+
+def _load_yaml_cached(p: Path) -> tuple[tuple[int, int], dict]:
+    # 何をする関数？：mtime/サイズが変わっていなければ前回の解析結果を返す（呼び出し側は書き換えないこと）。
+    key = os.fspath(p)
+    stamp = _stamp(p)
+    with _CACHE_LOCK:
+        hit = _YAML_CACHE.get(key)
+        if hit is not None and hit[0] == stamp:
+            return hit
+    data = _load_yaml(p)
+    with _CACHE_LOCK:
+        _YAML_CACHE[key] = (stamp, data)
+    return stamp, data
+
 def load_config(config_path: str | os.PathLike[str] | None = None) -> dict:
     """
     何をする関数？：
       - configs/config.yaml を読み、最低限のキー（runtime, data）を既定値で補って返します。
       - 既定値：timezone="America/New_York"、mode=os.getenv("RUN_MODE","paper")、symbols_file="configs/symbols.yml"
+      - 毎回新しい dict を返します（書き換えてよい）。検証済み・読み取り専用で十分なら load_settings() を使ってください。
     使い方：
       from rh_pdc_daytrade.utils.configutil import load_config
       cfg = load_config()
     """
-    # 1) パス決定：指定が無ければ ./configs/config.yaml
+    # 1) パス決定：指定が無ければ ./configs/config.yaml（解析結果は mtime でメモ化、返すのは複製）
     cfg_path = Path(config_path) if config_path else (_configs_dir() / "config.yaml")
-    cfg = _load_yaml(cfg_path)
+    cfg = copy.deepcopy(_load_yaml_cached(cfg_path)[1])
 
     # 2) 最低限のキーを補完（欠けても動くように安全側に倒します）
     runtime = cfg.setdefault("runtime", {})
@@ -45,6 +76,255 @@ def load_config(config_path: str | os.PathLike[str] | None = None) -> dict:
 
     return cfg
 
+# ---- 凍結スナップショット（検証済み） ------------------------------------------------------------------
+
+class ConfigError(ValueError):
+    """何をする例外？：config.yaml の値が範囲外・型違いのとき（まとめて全項目のエラーを持ちます）。"""
+
+@dataclass(frozen=True)
+class RiskConfig:
+    """何をする入れ物？：config.risk（1トレードのリスク％と、シグナル全体にかける上限）。None は“上限なし”。"""
+    account_size_usd: float = 10_000.0
+    risk_per_trade_pct: float = 0.005
+    daily_stop_R: float | None = 3.0
+    max_notional_per_symbol_usd: float | None = None
+    buying_power_usd: float | None = None
+    round_lot: int = 1
+    max_qty: int | None = None
+    spread_pct_max: float = 0.005
+    slippage_warn_pct: float = 0.003
+
+@dataclass(frozen=True)
+class BracketConfig:
+    """何をする入れ物？：config.bracket（利確％は近い順のタプル、損切％、半利確後に建値へ移すか）。"""
+    take_profit_pct: tuple[float, ...] = (0.05, 0.10)
+    stop_loss_pct: float = 0.025
+    move_to_breakeven_after_first_tp: bool = True
+
+@dataclass(frozen=True)
+class StrategyConfig:
+    """何をする入れ物？：config.strategy（同日は A/B の片方だけ）。"""
+    active_setup: str = "A"
+    orb_minutes: int = 5
+    avwap_anchor: _dtime = _dtime(9, 30)
+    vwap_reset_daily: bool = True
+
+@dataclass(frozen=True)
+class OrdersConfig:
+    """何をする入れ物？：config.orders（未約定取消と強制クローズの ET 時刻）。"""
+    cancel_unfilled_by: _dtime = _dtime(10, 30)
+    force_close_by: _dtime = _dtime(15, 55)
+
+@dataclass(frozen=True)
+class Settings:
+    """
+    何をする入れ物？：
+      - config.yaml 1版ぶんの凍結スナップショットです（version＝(mtime_ns, size)）。
+      - risk/bracket/strategy/orders は検証済みの型付き値、それ以外は raw（読み取り専用 dict、リストはタプル）で読みます。
+      - raw は dict と同じく .get() で読めるので、apply_hard_filters(df, st.raw) のように既存の関数へそのまま渡せます。
+    """
+    path: str
+    version: tuple[int, int]
+    risk: RiskConfig
+    bracket: BracketConfig
+    strategy: StrategyConfig
+    orders: OrdersConfig
+    raw: Mapping[str, Any]
+
+    def with_setup(self, setup: str) -> "Settings":
+        """何をする関数？：active_setup だけ差し替えた新しいスナップショットを返します（ACTIVE_SETUP の一時上書き用）。"""
+        return replace(self, strategy=replace(self.strategy, active_setup=str(setup).strip().upper()))
+
+def _freeze(x: Any) -> Any:
+    # 何をする関数？：dict → MappingProxyType、list → tuple に再帰で変換し、スナップショットを書き換えられなくする。
+    if isinstance(x, dict):
+        return MappingProxyType({k: _freeze(v) for k, v in x.items()})
+    if isinstance(x, (list, tuple)):
+        return tuple(_freeze(v) for v in x)
+    return x
+
+def _parse_settings(cfg: Mapping[str, Any], path: str = "", version: tuple[int, int] = (0, 0)) -> Settings:
+    """
+    何をする関数？：
+      - load_config() 形式の dict を検証して Settings にします。問題は全部集めて ConfigError で一度に報告します。
+    """
+    errors: list[str] = []
+
+    def num(sec: Mapping, key: str, default, lo=None, hi=None, optional=False, integer=False):
+        v = sec.get(key, default)
+        if v is None:
+            if optional:
+                return None
+            errors.append(f"{key}: required")
+            return default
+        try:
+            v = int(v) if integer else float(v)
+        except (TypeError, ValueError):
+            errors.append(f"{key}: not a number ({v!r})")
+            return default
+        if (lo is not None and v < lo) or (hi is not None and v > hi):
+            errors.append(f"{key}: {v} out of range [{lo}, {hi}]")
+        return v
+
+    def hhmmss(sec: Mapping, key: str, default: _dtime) -> _dtime:
+        v = sec.get(key)
+        if v is None:
+            return default
+        try:
+            return v if isinstance(v, _dtime) else _dtime.fromisoformat(str(v))
+        except ValueError:
+            errors.append(f"{key}: invalid time ({v!r})")
+            return default
+
+    r = cfg.get("risk") or {}
+    account = num(r, "account_size_usd", 10_000.0, lo=0.01)
+    risk = RiskConfig(
+        account_size_usd=account,
+        risk_per_trade_pct=num(r, "risk_per_trade_pct", 0.005, lo=0.0, hi=0.05),
+        daily_stop_R=num(r, "daily_stop_R", 3.0, lo=0.0, optional=True),
+        max_notional_per_symbol_usd=num(r, "max_notional_per_symbol_usd", None, lo=0.0, optional=True),
+        buying_power_usd=num(r, "buying_power_usd", account, lo=0.0, optional=True),  # キーが無ければ口座サイズ、null は上限なし
+        round_lot=num(r, "round_lot", 1, lo=1, integer=True),
+        max_qty=num(r, "max_qty", None, lo=1, optional=True, integer=True),
+        spread_pct_max=num(r, "spread_pct_max", 0.005, lo=0.0, hi=1.0),
+        slippage_warn_pct=num(r, "slippage_warn_pct", 0.003, lo=0.0, hi=1.0),
+    )
+
+    b = cfg.get("bracket") or {}
+    tps_raw = b.get("take_profit_pct", (0.05, 0.10))
+    tps_raw = tps_raw if isinstance(tps_raw, (list, tuple)) else [tps_raw]
+    try:
+        tps = tuple(float(x) for x in tps_raw)
+    except (TypeError, ValueError):
+        errors.append(f"take_profit_pct: not numbers ({tps_raw!r})")
+        tps = (0.05, 0.10)
+    if not tps or any(not (0.0 < x < 10.0) for x in tps) or list(tps) != sorted(tps):
+        errors.append(f"take_profit_pct: need ascending positive values ({tps!r})")
+    bracket = BracketConfig(
+        take_profit_pct=tps,
+        stop_loss_pct=num(b, "stop_loss_pct", 0.025, lo=0.0001, hi=0.99),
+        move_to_breakeven_after_first_tp=bool(b.get("move_to_breakeven_after_first_tp", True)),
+    )
+
+    st = cfg.get("strategy") or {}
+    setup = str(st.get("active_setup", "A")).strip().upper()
+    if setup not in ("A", "B"):
+        errors.append(f"active_setup: must be A or B ({setup!r})")
+    strategy = StrategyConfig(
+        active_setup=setup,
+        orb_minutes=num(st, "orb_minutes", 5, lo=1, hi=120, integer=True),
+        avwap_anchor=hhmmss(st, "avwap_anchor", _dtime(9, 30)),
+        vwap_reset_daily=bool(st.get("vwap_reset_daily", True)),
+    )
+
+    o = cfg.get("orders") or {}
+    orders = OrdersConfig(
+        cancel_unfilled_by=hhmmss(o, "cancel_unfilled_by", _dtime(10, 30)),
+        force_close_by=hhmmss(o, "force_close_by", _dtime(15, 55)),
+    )
+    if orders.cancel_unfilled_by > orders.force_close_by:
+        errors.append("orders: cancel_unfilled_by must not be later than force_close_by")
+
+    if errors:
+        raise ConfigError(f"{path or 'config'}: " + "; ".join(errors))
+    return Settings(path=path, version=version, risk=risk, bracket=bracket, strategy=strategy, orders=orders,
+                    raw=_freeze(dict(cfg)))
+
+_SETTINGS_CACHE: dict[str, Settings] = {}   # パス -> 最後に作ったスナップショット
+
+def _default_config_path() -> Path:
+    # 何をする関数？：既定の configs/config.yaml（ホットパスで毎回フォルダ作成を走らせないよう1回だけ決める）。
+    global _DEFAULT_PATH
+    if _DEFAULT_PATH is None:
+        _DEFAULT_PATH = _configs_dir() / "config.yaml"
+    return _DEFAULT_PATH
+
+_DEFAULT_PATH: Path | None = None
+
+def load_settings(config_path: str | os.PathLike[str] | None = None) -> Settings:
+    """
+    何をする関数？：
+      - config.yaml を検証済みの凍結スナップショット（Settings）で返します。
+      - ファイルの mtime/サイズが変わっていなければ同じオブジェクトを返すので、ホットパスから何度呼んでも解析は走りません。
+      - 値が不正なら ConfigError（起動時に気付けるように、ここでは補正せずに止めます）。
+    使い方：
+      st = load_settings()
+      st.bracket.stop_loss_pct, st.orders.force_close_by
+    """
+    cfg_path = Path(config_path) if config_path else _default_config_path()
+    key = os.fspath(cfg_path)
+    stamp = _stamp(cfg_path)
+    hit = _SETTINGS_CACHE.get(key)
+    if hit is not None and hit.version == stamp:
+        return hit
+    stamp, _ = _load_yaml_cached(cfg_path)
+    st = _parse_settings(load_config(cfg_path), path=key, version=stamp)
+    _SETTINGS_CACHE[key] = st
+    return st
+
+class ConfigWatcher:
+    """
+    何をするクラス？：
+      - config.yaml の更新（mtime/サイズの変化）を見張り、新しい Settings を作って購読者に (new, old) で知らせます。
+      - 新しい設定が不正なら、エラーをログに出して前の設定を使い続けます（常駐プロセスを止めない）。
+      - 2通りの使い方：イベントループ側で poll() を定期的に呼ぶ（コールバックは呼び出したスレッドで動く）か、
+        start() で監視スレッドを立てる（コールバックは監視スレッドで動く）。
+    使い方：
+      w = ConfigWatcher()
+      w.subscribe(lambda new, old: sch.reschedule(new.orders.cancel_unfilled_by, new.orders.force_close_by))
+      ...
+      w.poll()   # 変わっていれば True
+    """
+
+    def __init__(self, config_path: str | os.PathLike[str] | None = None, interval_s: float = 2.0):
+        self.path = Path(config_path) if config_path else _default_config_path()
+        self.interval_s = float(interval_s)
+        self.current: Settings = load_settings(self.path)
+        self._subs: list[Callable[[Settings, Settings], None]] = []
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def subscribe(self, fn: Callable[[Settings, Settings], None]) -> Callable[[Settings, Settings], None]:
+        """何をする関数？：変更時に呼ぶ関数 fn(new, old) を登録します（デコレータとしても使えます）。"""
+        self._subs.append(fn)
+        return fn
+
+    def poll(self) -> bool:
+        """何をする関数？：ファイルが変わっていれば読み直して購読者に知らせ、True を返します。"""
+        try:
+            if _stamp(self.path) == self.current.version:
+                return False
+            new = load_settings(self.path)
+        except FileNotFoundError:
+            return False
+        except Exception as e:  # ConfigError / YAML の書きかけなど
+            logger.error("config reload rejected; keep previous settings ({})", e)
+            _SETTINGS_CACHE.pop(os.fspath(self.path), None)
+            self.current = replace(self.current, version=_stamp(self.path))  # 同じ版で何度もエラーを出さない
+            return False
+        old, self.current = self.current, new
+        logger.info("config reloaded: {}", self.path)
+        for fn in list(self._subs):
+            try:
+                fn(new, old)
+            except Exception as e:
+                logger.error("config change hook failed ({})", e)
+        return True
+
+    def start(self) -> "ConfigWatcher":
+        """何をする関数？：interval_s 秒ごとに poll() する監視スレッド（デーモン）を起動します。"""
+        if self._thread is None:
+            def _loop() -> None:
+                while not self._stop.wait(self.interval_s):
+                    self.poll()
+            self._thread = threading.Thread(target=_loop, name="config-watch", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """何をする関数？：監視スレッドを止めます。"""
+        self._stop.set()
+
 def load_symbols(group: str, symbols_file: str | os.PathLike[str] | None = None) -> list[str]:
     """
     何をする関数？：
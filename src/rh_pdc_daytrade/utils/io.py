@@ -1,5 +1,12 @@
 # DataFrame を Parquet/CSV に保存するためのユーティリティです。
 # ねらい：保存形式を Parquet に統一（高速・省容量）、人が見る用に CSV も用意します。 :contentReference[oaicite:1]{index=1}
+#
+# 1分バー／指標の“コンパクト列型”（compact=True で保存・読込するときの約束）：
+#   symbol            … category（Parquet では辞書エンコード。銘柄文字列は1回だけ持つ）
+#   et                … datetime64[ns, America/New_York]（中身は int64 の UTC ns、タイムゾーンは列のメタデータ）
+#   o/h/l/c, vwap, avwap, orb_high, orb_low … float32（有効7桁：$10万未満なら 1セント単位を保てる）
+#   v                 … uint32（1分出来高は 42億株未満）
+# 計算（累積和など）は float64 で行い、保存・保持のときだけこの型に落とします。
 
 from __future__ import annotations
 from pathlib import Path  # パス操作（保存先フォルダの作成に使う）
@@ -35,19 +42,59 @@ def _choose_parquet_engine() -> str:
     except Exception as e:
         raise ValueError("No Parquet engine found: install pyarrow or fastparquet") from e
 
-def write_parquet(df: pd.DataFrame, path: str | Path, compression: str = "snappy") -> Path:
+BAR_DTYPES: dict[str, str] = {
+    "symbol": "category",
+    "o": "float32", "h": "float32", "l": "float32", "c": "float32",
+    "v": "uint32",
+    "vwap": "float32", "avwap": "float32", "orb_high": "float32", "orb_low": "float32",
+}
+
+def compact_frame(df: pd.DataFrame, dtypes: dict[str, str] | None = None) -> pd.DataFrame:
+    """
+    何をする関数？：
+      - 1分バー／指標の DataFrame を上の“コンパクト列型”にそろえたコピーを返します（無い列は無視）。
+      - 出来高の欠損は 0、範囲外は uint32 に収まるよう切り詰めます。et は ns 解像度にそろえます。
+    使い方：
+      df = compact_frame(df)
+    """
+    want = dtypes or BAR_DTYPES
+    out = df.copy()
+    for col, dt in want.items():
+        if col not in out.columns or str(out[col].dtype) == dt:
+            continue
+        if dt == "uint32":
+            out[col] = pd.to_numeric(out[col], errors="coerce").fillna(0).clip(0, 4_294_967_295).astype(dt)
+        else:
+            out[col] = out[col].astype(dt)
+    if "et" in out.columns and pd.api.types.is_datetime64_any_dtype(out["et"].dtype):
+        out["et"] = out["et"].dt.as_unit("ns")
+    return out
+
+def read_parquet(path: str | Path, columns: list[str] | None = None, compact: bool = True) -> pd.DataFrame:
+    """
+    何をする関数？：
+      - Parquet を読み、compact=True なら“コンパクト列型”にそろえて返します（古い float64 のファイルも同じ型になる）。
+    使い方：
+      df = read_parquet('data/bars/bars_1m_20250909.parquet')
+    """
+    df = pd.read_parquet(Path(path), engine=_choose_parquet_engine(), columns=columns)
+    return compact_frame(df) if compact else df
+
+def write_parquet(df: pd.DataFrame, path: str | Path, compression: str = "snappy", compact: bool = False) -> Path:
     """
     何をする関数？：
       - DataFrame を Parquet で保存します（既定圧縮=snappy）。
       - ランブックの推奨どおり、標準の保存形式として利用します。 :contentReference[oaicite:3]{index=3}
+      - compact=True なら“コンパクト列型”（BAR_DTYPES）に落としてから保存します（1分バー／指標向け）。
     使い方：
       write_parquet(df, 'data/eod/xxx.parquet')
+      write_parquet(df_1m, 'data/bars/bars_1m_YYYYMMDD.parquet', compact=True)
     戻り値：
       書き出したファイルの Path
     """
     p = _ensure_parent(Path(path))
     engine = _choose_parquet_engine()
-    df.to_parquet(p, engine=engine, compression=compression, index=False)
+    (compact_frame(df) if compact else df).to_parquet(p, engine=engine, compression=compression, index=False)
     return p
 
 def write_csv(df: pd.DataFrame, path: str | Path) -> Path:
@@ -62,3 +109,69 @@ def write_csv(df: pd.DataFrame, path: str | Path) -> Path:
     p = _ensure_parent(Path(path))
     df.to_csv(p, index=False, encoding="utf-8")
     return p
+
+class ParquetAppender:
+    """
+    何をするクラス？：
+      - 1つの Parquet ファイルへ、DataFrame を塊ごとに追記します（1回の append = 1つの row group）。
+      - 1日分を丸ごとメモリに載せずに保存するための口です（chunked 処理の出力用）。列と型は最初の塊で決まります。
+      - symbol は辞書型（dictionary<int32, string>）に固定して書きます。塊ごとに category の中身や本数が違っても同じ型で書け、
+        write_parquet(compact=True) で1日分を保存したファイルと同じく pandas では category で読めます
+        （fastparquet しか無い環境では文字列で書くので、read_parquet(compact=True) で category に戻してください）。
+    使い方：
+      with ParquetAppender("data/bars/bars_1m_20250909.parquet") as w:
+          for part in parts:
+              w.append(part)
+    """
+
+    def __init__(self, path: str | Path, compression: str = "snappy", compact: bool = True):
+        self.path = _ensure_parent(Path(path))
+        self.compression = compression
+        self.compact = bool(compact)
+        self.engine = _choose_parquet_engine()
+        self.rows = 0
+        self._writer = None
+        self._schema = None
+
+    def _prepare(self, df: pd.DataFrame) -> pd.DataFrame:
+        out = compact_frame(df) if self.compact else df.copy()
+        if "symbol" in out.columns and self.engine != "pyarrow":
+            out["symbol"] = out["symbol"].astype(str)
+        return out.reset_index(drop=True)
+
+    def append(self, df: pd.DataFrame) -> None:
+        """何をする関数？：1つの塊を追記します（空なら何もしない）。"""
+        if df is None or df.empty:
+            return
+        out = self._prepare(df)
+        if self.engine == "pyarrow":
+            import pyarrow as pa            # 関数内だけで使うためここでインポート
+            import pyarrow.parquet as pq
+            table = pa.Table.from_pandas(out, preserve_index=False)
+            if self._writer is None:
+                schema = table.schema
+                if "symbol" in schema.names:
+                    # 何をする行？：category の本数でコードの幅（int8/int16）が変わらないよう、辞書型の幅を固定する
+                    i = schema.get_field_index("symbol")
+                    schema = schema.set(i, pa.field("symbol", pa.dictionary(pa.int32(), pa.string())))
+                self._schema = schema
+                self._writer = pq.ParquetWriter(self.path, self._schema, compression=self.compression)
+            self._writer.write_table(table.cast(self._schema))
+        else:
+            import fastparquet              # 関数内だけで使うためここでインポート
+            fastparquet.write(str(self.path), out, compression=self.compression.upper(), append=self.rows > 0,
+                              write_index=False)
+        self.rows += len(out)
+
+    def close(self) -> Path:
+        """何をする関数？：ファイルを閉じて Path を返します（何度呼んでも安全）。"""
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        return self.path
+
+    def __enter__(self) -> "ParquetAppender":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
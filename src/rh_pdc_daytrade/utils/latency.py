@@ -0,0 +1,88 @@
+# バー→発注までの“各区間の遅れ”を測るための時刻スタンプ（トレース）の約束と集計をまとめたモジュールです。
+# ねらい：シグナルが実行されるとき、そのバーが“どれだけ古いか”と、どの区間（受信・保存・指標・シグナル・発注）で
+#         時間を使ったかを、1件ごとに残して日ごとの分位点で見られるようにする。
+# スタンプ（すべて UTC の ns エポック整数。無い区間は None）：
+#   bar_t      … 取引所側のバー時刻（Alpaca の t＝バーの開始。バーが確定するのは bar_t + 60秒）
+#   ws_recv    … WS でフレームを受け取った時刻（standardize_bar が rt として付ける）
+#   persisted  … NDJSON に書き込んだ時刻（書き込む直前に pt として付ける）
+#   indicator  … compute_indicators が指標を計算し終えた時刻（indicators の computed_ns）
+#   signal     … run_signals がシグナルJSONを書き出した時刻
+#   order      … place_orders が発注（いまは紙トレ記録）した時刻
+# 流れ：NDJSON（rt/pt）→ bars_1m（ws_recv_ns/persisted_ns 列）→ シグナルJSON の "trace" → executions の *_ns 列。
+
+from __future__ import annotations
+import time
+import numpy as np
+import pandas as pd
+
+STAMPS: list[str] = ["bar_t", "ws_recv", "persisted", "indicator", "signal", "order"]
+BAR_NS = 60_000_000_000  # 1分バー：bar_t から確定までの長さ
+
+# 区間（名前, 始点, 終点）。bar_close は bar_t + 1分（確定してからの遅れを測る）。
+HOPS: list[tuple[str, str, str]] = [
+    ("bar_close_to_recv", "bar_close", "ws_recv"),
+    ("recv_to_persisted", "ws_recv", "persisted"),
+    ("persisted_to_indicator", "persisted", "indicator"),
+    ("indicator_to_signal", "indicator", "signal"),
+    ("signal_to_order", "signal", "order"),
+    ("bar_close_to_order", "bar_close", "order"),
+]
+
+def now_ns() -> int:
+    """何をする関数？：スタンプ用の現在時刻（UTC ns エポック）を返します。"""
+    return time.time_ns()
+
+def _int_or_none(v) -> int | None:
+    # 何をする関数？：NaN/NA/None を None に、数値を int にそろえる（シグナルJSONに素直に書ける形）。
+    try:
+        if v is None or pd.isna(v):
+            return None
+        return int(v)
+    except (TypeError, ValueError):
+        return None
+
+def bar_trace(bar: pd.Series | dict, indicator_ns=None) -> dict:
+    """
+    何をする関数？：
+      - 1分バーの1行（et と、あれば ws_recv_ns / persisted_ns）から、シグナルに持たせる trace dict を作ります。
+      - signal / order は後段（書き出し・発注）で埋めます。
+    """
+    et = bar.get("et")
+    bar_t = None
+    if et is not None and not pd.isna(et):
+        bar_t = int(pd.Timestamp(et).as_unit("ns").value)
+    return {"bar_t": bar_t, "ws_recv": _int_or_none(bar.get("ws_recv_ns")),
+            "persisted": _int_or_none(bar.get("persisted_ns")), "indicator": _int_or_none(indicator_ns),
+            "signal": None, "order": None}
+
+def trace_columns(trace: dict | None) -> dict:
+    """何をする関数？：trace dict を executions の列（bar_t_ns, ws_recv_ns, …, order_ns）に展開します。"""
+    tr = trace or {}
+    return {f"{k}_ns": _int_or_none(tr.get(k)) for k in STAMPS}
+
+def hop_latencies_ms(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    何をする関数？：
+      - *_ns 列（bar_t_ns …… order_ns）を持つ表から、HOPS の各区間の遅れ（ミリ秒）を列にした表を返します。
+      - どちらかのスタンプが無い行の区間は NaN です。
+    """
+    # ns エポックを float64 にすると 256ns 程度の丸めが入るが、ミリ秒の遅れを見るには十分
+    st = {k: (pd.to_numeric(df[f"{k}_ns"], errors="coerce").astype("float64") if f"{k}_ns" in df.columns
+              else pd.Series(np.nan, index=df.index)) for k in STAMPS}
+    st["bar_close"] = st["bar_t"] + BAR_NS
+    out = pd.DataFrame(index=df.index)
+    for name, a, b in HOPS:
+        out[name] = (st[b] - st[a]) / 1e6
+    return out
+
+def percentile_table(lat_ms: pd.DataFrame, qs: tuple[float, ...] = (50, 90, 95, 99)) -> pd.DataFrame:
+    """何をする関数？：区間ごとの件数・分位点・最大（ミリ秒）を1行ずつの表にします（NaN は除外）。"""
+    rows = []
+    for name in lat_ms.columns:
+        x = lat_ms[name].dropna().to_numpy()
+        row = {"hop": name, "count": int(x.size)}
+        for q in qs:
+            row[f"p{q:g}_ms"] = float(np.percentile(x, q)) if x.size else np.nan
+        row["max_ms"] = float(x.max()) if x.size else np.nan
+        rows.append(row)
+    return pd.DataFrame(rows)
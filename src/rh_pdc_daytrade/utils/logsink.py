@@ -0,0 +1,198 @@
+# loguru 用の“まとめ書き・ローテーション付き”ファイルシンクです（logutil.configure_logging から使います）。
+# ねらい：
+#  - 1行ごとに write/flush せず、メモリに溜めて batch 件・flush_s 秒ごと（WARNING 以上は即時）に1回の write で書く。
+#  - ファイル名の {date} は“その行の ET 日付”。常駐プロセスが日付をまたいでも、翌日の行は翌日のファイルへ入る。
+#  - max_bytes を超えたら  名前.YYYYmmdd_HHMMSS.拡張子 に改名し、別スレッドで gzip 圧縮する（サイズローテーション）。
+#  - json=True なら1行1オブジェクトの構造化ログ（ts/level/msg/name/function/line/process/thread/extra/exception）。
+# 複数プロセスが同じファイルに追記しても、1バッチ＝1回の追記 write なので行が混ざりにくく、
+# 他プロセスがローテーションしたら（inode が変わったら）次のバッチで開き直します。
+
+from __future__ import annotations
+from datetime import datetime, time as _dtime, timedelta
+from pathlib import Path
+import gzip
+import os
+import shutil
+import threading
+import orjson
+
+from rh_pdc_daytrade.utils.timeutil import get_et_tz  # ファイル名の日付は ET
+
+_LEVEL_FLUSH = 30  # WARNING 以上は溜めずにすぐ書く
+
+class RollingFileSink:
+    """
+    何をするクラス？：
+      - loguru の logger.add(sink) に渡す呼び出し可能オブジェクトです（message を受け取り、溜めてまとめて書く）。
+    使い方：
+      sink = RollingFileSink("data/logs/bot.{date}.jsonl", json=True)
+      logger.add(sink, format="{message}")   # シンク側でまとめ書きするので enqueue は不要
+      ...
+      sink.close()   # 残りを書き出す（atexit でも呼ばれる）
+    """
+
+    def __init__(self, path_template: str | os.PathLike[str], json: bool = False, max_bytes: int = 100 * 1024 * 1024,
+                 batch: int = 256, flush_s: float = 0.5, compress: bool = True):
+        self.template = str(path_template)
+        self.json = bool(json)
+        self.max_bytes = int(max_bytes)
+        self.batch = max(1, int(batch))
+        self.flush_s = float(flush_s)
+        self.compress = bool(compress)
+        self._buf: list[bytes] = []
+        self._buf_bytes = 0
+        self._lock = threading.Lock()
+        self._fh = None
+        self._ino: int | None = None
+        self._path: Path | None = None
+        self._size = 0
+        self._day_end = 0.0            # いまのファイルの ET 日付が終わる時刻（epoch 秒）
+        self._day: str | None = None
+        self._compressors: list[threading.Thread] = []
+        self._stop = threading.Event()
+        self._timer = threading.Thread(target=self._tick, name="log-flush", daemon=True)
+        self._timer.start()
+
+    # ---- loguru から呼ばれる入口 ----------------------------------------------------------------
+
+    def __call__(self, message) -> None:
+        rec = message.record
+        ts = rec["time"].timestamp()
+        if self._day is None or ts >= self._day_end:
+            with self._lock:
+                self._roll_day(rec["time"])
+        line = self._json_line(rec) if self.json else str(message).encode("utf-8")
+        with self._lock:
+            self._buf.append(line)
+            self._buf_bytes += len(line)
+            if len(self._buf) >= self.batch or rec["level"].no >= _LEVEL_FLUSH:
+                self._flush_locked()
+
+    @staticmethod
+    def _json_line(rec) -> bytes:
+        # 何をする関数？：loguru の record を1行の JSON（改行付き）にする。extra は bind() で付けた項目。
+        exc = rec["exception"]
+        doc = {
+            "ts": rec["time"].isoformat(timespec="microseconds"),
+            "level": rec["level"].name,
+            "msg": rec["message"],
+            "name": rec["name"], "function": rec["function"], "line": rec["line"],
+            "process": rec["process"].id, "thread": rec["thread"].name,
+        }
+        if rec["extra"]:
+            doc["extra"] = rec["extra"]
+        if exc is not None:
+            doc["exception"] = f"{exc.type.__name__ if exc.type else ''}: {exc.value}"
+        return orjson.dumps(doc, option=orjson.OPT_APPEND_NEWLINE | orjson.OPT_SERIALIZE_NUMPY, default=str)
+
+    # ---- 日付・サイズのローテーション --------------------------------------------------------------
+
+    def _roll_day(self, when: datetime) -> None:
+        # 何をする関数？：行の ET 日付が変わったら、溜めた分を前日のファイルに書いてから新しい日付のファイルへ切り替える。
+        et = when.astimezone(get_et_tz())
+        day = et.strftime("%Y-%m-%d")
+        if day == self._day:
+            return
+        self._flush_locked()
+        self._close_fh()
+        self._day = day
+        nxt = datetime.combine(et.date() + timedelta(days=1), _dtime(0, 0), tzinfo=get_et_tz())
+        self._day_end = nxt.timestamp()
+        self._path = Path(self.template.replace("{date}", day))
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+
+    def _open(self) -> None:
+        self._fh = open(self._path, "ab")
+        st = os.fstat(self._fh.fileno())
+        self._ino = st.st_ino
+        self._size = st.st_size
+
+    def _close_fh(self) -> None:
+        if self._fh is not None:
+            try:
+                self._fh.close()
+            except Exception:
+                pass
+            self._fh = None
+
+    def _reopen_if_moved(self) -> None:
+        # 何をする関数？：他プロセスがローテーションでファイルを改名していたら、元の名前で開き直す。
+        try:
+            st = os.stat(self._path)
+            if st.st_ino == self._ino:
+                return
+        except FileNotFoundError:
+            pass
+        self._close_fh()
+        self._open()
+
+    def _rotate_size(self) -> None:
+        # 何をする関数？：サイズ上限を超えたら改名して、圧縮は別スレッドへ（書き込みを止めない）。
+        self._close_fh()
+        stamp = datetime.now(get_et_tz()).strftime("%Y%m%d_%H%M%S")
+        dest = self._path.with_name(f"{self._path.stem}.{stamp}{self._path.suffix}")
+        k = 0
+        while dest.exists() or Path(str(dest) + ".gz").exists():  # 同じ秒に2回回したときに上書きしない
+            k += 1
+            dest = self._path.with_name(f"{self._path.stem}.{stamp}_{k}{self._path.suffix}")
+        try:
+            os.replace(self._path, dest)
+        except OSError:
+            # Windows で他プロセスが開いていると改名できない。次のバッチで再挑戦し、書き込みは続ける。
+            self._open()
+            return
+        self._open()
+        if self.compress:
+            t = threading.Thread(target=_gzip_file, args=(dest,), name="log-gzip", daemon=True)
+            t.start()
+            self._compressors = [c for c in self._compressors if c.is_alive()] + [t]
+
+    # ---- 書き出し ----------------------------------------------------------------------------------
+
+    def _flush_locked(self) -> None:
+        if not self._buf or self._path is None:
+            return
+        data = b"".join(self._buf)
+        self._buf.clear()
+        self._buf_bytes = 0
+        try:
+            if self._fh is None:
+                self._open()
+            else:
+                self._reopen_if_moved()
+            self._fh.write(data)   # 1バッチ＝1回の追記
+            self._fh.flush()
+            self._size += len(data)
+            if self.max_bytes > 0 and self._size >= self.max_bytes:
+                self._rotate_size()
+        except Exception:
+            self._close_fh()  # ログ書き込みの失敗で本処理を止めない（次のバッチで開き直す）
+
+    def flush(self) -> None:
+        """何をする関数？：溜まっている行をいま書き出します。"""
+        with self._lock:
+            self._flush_locked()
+
+    def _tick(self) -> None:
+        # 何をする関数？：flush_s ごとに溜まった分を書く（流量が少ないときも遅れが flush_s を超えないように）。
+        while not self._stop.wait(self.flush_s):
+            if self._buf:
+                self.flush()
+
+    def close(self) -> None:
+        """何をする関数？：残りを書き出してファイルを閉じ、圧縮スレッドの終了を少し待ちます。"""
+        self._stop.set()
+        with self._lock:
+            self._flush_locked()
+            self._close_fh()
+        for t in self._compressors:
+            t.join(timeout=5.0)
+
+def _gzip_file(p: Path) -> None:
+    # 何をする関数？：ローテーション済みファイルを p.gz に圧縮して元を消す（失敗したら元のまま残す）。
+    try:
+        with open(p, "rb") as src, gzip.open(str(p) + ".gz", "wb", compresslevel=6) as dst:
+            shutil.copyfileobj(src, dst, length=1024 * 1024)
+        os.remove(p)
+    except Exception:
+        pass
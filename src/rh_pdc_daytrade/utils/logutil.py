@@ -2,11 +2,12 @@
 # Runbookの想定どおり data/logs/bot.log に集約します。 :contentReference[oaicite:3]{index=3}
 from __future__ import annotations
 from pathlib import Path
-from datetime import datetime
 import os, sys
+import random     # log_sampled の抽選
+import threading  # 間引きカウンタのロック
+import time       # log_every の間隔（monotonic）
 from loguru import logger
 from rh_pdc_daytrade.utils.envutil import load_dotenv_if_exists
-from rh_pdc_daytrade.utils.timeutil import get_et_tz  # ← 日付ファイル名にET日付を使う場合に便利
 
 _CONFIGURED = False
 
@@ -14,13 +15,20 @@ def _project_root() -> Path:
     # 既存実装に合わせてください（省略）
     return Path(__file__).resolve().parents[3]  # 例: rh_pdc_daytrade/utils/ からプロジェクト直下へ
 
+def _env_int(name: str, default: int) -> int:
+    # 何をする関数？：数値の環境変数を読む（空・不正なら既定値）。
+    v = os.getenv(name, "").strip()
+    return int(v) if v.isdigit() else default
+
 def configure_logging(log_file: str | os.PathLike[str] | None = None,
                       level: str | None = None) -> Path:
     """
     - 共通ログ: コンソール + ファイル
-    - ファイルは:
-        1) 固定: data/logs/bot.log（**ローテなし**・常に追記）
-        2) 監査: data/logs/bot.YYYY-MM-DD.log（**その日のファイル名**。各プロセス起動時に当日名でopen）
+    - ファイルは（どれも utils/logsink.RollingFileSink：まとめ書き＋サイズ超過で改名→gzip）:
+        1) 固定: data/logs/bot.log（LOG_MAX_MB を超えたら bot.YYYYmmdd_HHMMSS.log.gz へ退避して続きを書く）
+        2) 監査: data/logs/bot.YYYY-MM-DD.log（**各行の ET 日付**のファイル。常駐プロセスが日付をまたいでも翌日分は翌日のファイルへ）
+        3) 構造化: data/logs/bot.YYYY-MM-DD.jsonl（1行1JSON。LOG_JSON=0 で無効）
+    - ファイルへの書き込みは LOG_BATCH 行 / LOG_FLUSH_MS ミリ秒ごとに1回（WARNING 以上は即時）。終了時に残りを書き出します。
     - .envの LOG_LEVEL を尊重（未設定は INFO）
     - 冪等（多重add防止）
     戻り値: 固定ログ（bot.log）の Path
@@ -30,6 +38,8 @@ def configure_logging(log_file: str | os.PathLike[str] | None = None,
         root = _project_root()
         return Path(log_file) if log_file else (root / "data" / "logs" / "bot.log")
 
+    from rh_pdc_daytrade.utils.logsink import RollingFileSink  # 関数内だけで使うためここでインポート
+
     # 1) .env
     load_dotenv_if_exists()
 
@@ -52,34 +62,80 @@ def configure_logging(log_file: str | os.PathLike[str] | None = None,
         format="<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level}</level> | {message}",
     )
 
-    # 3-1) 固定ファイル（**ローテーションなし** / renameしない）
+    # 3-1) ファイル（シンク側でまとめ書きするので enqueue は使わない：1行ごとの pickle/キュー往復を避ける）
+    opts = dict(max_bytes=_env_int("LOG_MAX_MB", 100) * 1024 * 1024, batch=_env_int("LOG_BATCH", 256),
+                flush_s=_env_int("LOG_FLUSH_MS", 500) / 1000.0)
     file_fmt = "{time:YYYY-MM-DD HH:mm:ss} | {level} | {message}"
-    logger.add(
-        str(logfile_path),
-        level=log_level,
-        enqueue=True,
-        delay=True, encoding="utf-8",
-        backtrace=False, diagnose=False, catch=True,
-        format=file_fmt,
-        # rotation・retention を**付けない**（= ローテしない）
-    )
+    sinks = [(RollingFileSink(logfile_path, **opts), file_fmt),
+             (RollingFileSink(logs_dir / "bot.{date}.log", **opts), file_fmt)]
+    if os.getenv("LOG_JSON", "1").lower() not in ("0", "false", "no", "off"):
+        sinks.append((RollingFileSink(logs_dir / "bot.{date}.jsonl", json=True, **opts), "{message}"))
+    for sink, fmt in sinks:
+        logger.add(sink, level=log_level, backtrace=False, diagnose=False, catch=True, format=fmt)
 
-    # 3-2) 監査用・当日ファイル（各プロセス起動時に当日名でopen）
-    et_today = datetime.now(get_et_tz()).strftime("%Y-%m-%d")
-    daily_path = logs_dir / f"bot.{et_today}.log"
-    logger.add(
-        str(daily_path),
-        level=log_level,
-        enqueue=True,
-        delay=True, encoding="utf-8",
-        backtrace=False, diagnose=False, catch=True,
-        format=file_fmt,
-        # rotationは付けない（次のプロセス起動時には日付が変わって別名でopenされる想定）
-    )
+    import atexit  # 関数内だけで使うためここでインポート
+
+    def _close_sinks() -> None:
+        # 何をする関数？：キュー（コンソール）に残った行を流し切ってから、各ファイルの溜まりを書き出して閉じる。
+        try:
+            logger.complete()
+        except Exception:
+            pass
+        for sink, _ in sinks:
+            sink.close()
+
+    atexit.register(_close_sinks)
 
     _CONFIGURED = True
     return logfile_path
 
+# ---- ホットループ用：間引きログ --------------------------------------------------------------------
+# 1バー・1銘柄ごとのログは、同じ内容が大量に出て I/O と整形の時間を食う。key ごとに間引いて、
+# 捨てた件数は次に出す行の末尾（+N suppressed）に付けます。呼び出し位置（関数名/行）は呼び出し元のものを記録します。
+
+_THROTTLE: dict[str, list] = {}   # key -> [次に出してよい時刻(monotonic), 捨てた件数]
+_FIRST_N: dict[str, int] = {}
+_THROTTLE_LOCK = threading.Lock()
+
+def log_every(key: str, seconds: float, level: str, message: str, *args, **kwargs) -> bool:
+    """
+    何をする関数？：
+      - 同じ key のログを seconds 秒に1回だけ出します（間の分は件数だけ数える）。出したら True。
+    使い方：
+      log_every("ws.ts_parse", 10, "WARNING", "timestamp parse failed: {}", ts)
+    """
+    now = time.monotonic()
+    with _THROTTLE_LOCK:
+        st = _THROTTLE.setdefault(key, [0.0, 0])
+        if now < st[0]:
+            st[1] += 1
+            return False
+        dropped, st[0], st[1] = st[1], now + float(seconds), 0
+    if dropped:
+        message, args = message + " (+{} suppressed)", (*args, dropped)
+    logger.opt(depth=1).log(level, message, *args, **kwargs)
+    return True
+
+def log_first_n(key: str, n: int, level: str, message: str, *args, **kwargs) -> bool:
+    """何をする関数？：同じ key のログを最初の n 回だけ出します（n 回目に“以降は省略”と添える）。出したら True。"""
+    with _THROTTLE_LOCK:
+        k = _FIRST_N.get(key, 0) + 1
+        _FIRST_N[key] = k
+    if k > n:
+        return False
+    if k == n:
+        message = message + " (further '{}' messages suppressed)"
+        args = (*args, key)
+    logger.opt(depth=1).log(level, message, *args, **kwargs)
+    return True
+
+def log_sampled(rate: float, level: str, message: str, *args, **kwargs) -> bool:
+    """何をする関数？：rate（0–1）の確率でだけ出します（大量に出る定常ログの“様子見”用）。出したら True。"""
+    if rate < 1.0 and random.random() >= rate:
+        return False
+    logger.opt(depth=1).log(level, message, *args, **kwargs)
+    return True
+
 
 def get_logs_dir() -> Path:
     """
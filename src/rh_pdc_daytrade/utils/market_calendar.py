@@ -0,0 +1,286 @@
+# 米国株（NYSE/Nasdaq）の取引カレンダーです。休場日・短縮取引日（13:00 引け）を規則から計算し、
+# 何十年ぶんのセッション（開場/引けの UTC ns、短縮フラグ）を配列に前計算しておきます。
+# ねらい：
+#  - 「平日＝営業日」の簡易判定をやめ、祝日と半日立会いを1か所で扱う（force_close_by 15:55 は半日の日には遅すぎる）。
+#  - 日付→セッションは“日数オフセットの配列”で O(1)、時刻→セッションは bisect（np.searchsorted）で引く。
+#  - Polygon の取得期間（直近 N 営業日）・合成データの営業日列・締切スケジューラの共通の入口にする。
+# 規則（NYSE）：元日・MLK（1月第3月曜）・大統領の日（2月第3月曜）・聖金曜日・メモリアルデー（5月最終月曜）・
+#   ジューンティーンス（2022年から）・独立記念日・レイバーデー（9月第1月曜）・感謝祭（11月第4木曜）・クリスマス。
+#   土曜の祝日は前の金曜、日曜は翌月曜に振替（元日が土曜のときだけは前年12/31を休みにしない）。
+#   短縮（13:00）：7/3（平日で休場でない日）・感謝祭の翌日・12/24（平日で休場でない日）。
+#   臨時休場（ハリケーン、国葬など）は _SPECIAL_CLOSURES に列挙します。
+
+from __future__ import annotations
+from bisect import bisect_right           # 時刻→セッションの二分探索
+from dataclasses import dataclass         # セッション1件の入れ物
+from datetime import date, datetime, time as _dtime, timedelta
+from functools import lru_cache           # カレンダーはプロセスで1回だけ作る
+import numpy as np
+
+from rh_pdc_daytrade.utils.timeutil import get_et_tz, to_et  # ETのtzinfo（フォールバック付）
+
+REGULAR_OPEN = _dtime(9, 30)
+REGULAR_CLOSE = _dtime(16, 0)
+EARLY_CLOSE = _dtime(13, 0)
+_NS = 1_000_000_000
+
+# 規則では決まらない臨時休場（国葬・天災など）
+_SPECIAL_CLOSURES: frozenset[date] = frozenset({
+    date(2001, 9, 11), date(2001, 9, 12), date(2001, 9, 13), date(2001, 9, 14),  # 同時多発テロ
+    date(2004, 6, 11),                                                            # レーガン元大統領の国葬
+    date(2007, 1, 2),                                                             # フォード元大統領の国葬
+    date(2012, 10, 29), date(2012, 10, 30),                                       # ハリケーン・サンディ
+    date(2018, 12, 5),                                                            # ブッシュ（父）元大統領の国葬
+    date(2025, 1, 9),                                                             # カーター元大統領の国葬
+})
+
+@dataclass(frozen=True)
+class Session:
+    """何をする入れ物？：1営業日のセッション（ET日付、開場/引けの UTC ns、短縮取引かどうか）。"""
+    day: date
+    open_ns: int
+    close_ns: int
+    early_close: bool
+
+    @property
+    def open(self) -> datetime:
+        """何をする関数？：開場時刻（ET, aware）を返します。"""
+        return datetime.fromtimestamp(self.open_ns / _NS, tz=get_et_tz())
+
+    @property
+    def close(self) -> datetime:
+        """何をする関数？：引け時刻（ET, aware）を返します（短縮日は 13:00）。"""
+        return datetime.fromtimestamp(self.close_ns / _NS, tz=get_et_tz())
+
+# ---- 休場日・短縮日の規則 ----------------------------------------------------------------------------
+
+def _nth_weekday(year: int, month: int, weekday: int, n: int) -> date:
+    # 何をする関数？：month 月の第 n 週の weekday（月=0）を返す。n=-1 は最終週。
+    if n > 0:
+        d = date(year, month, 1)
+        d += timedelta(days=(weekday - d.weekday()) % 7)
+        return d + timedelta(weeks=n - 1)
+    nxt = date(year + (month == 12), month % 12 + 1, 1)
+    d = nxt - timedelta(days=1)
+    return d - timedelta(days=(d.weekday() - weekday) % 7)
+
+def _easter(year: int) -> date:
+    # 何をする関数？：復活祭（グレゴリオ暦、Anonymous Gregorian algorithm）の日付。聖金曜日はこの2日前。
+    a, b, c = year % 19, year // 100, year % 100
+    d, e = b // 4, b % 4
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = c // 4, c % 4
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month = (h + l - 7 * m + 114) // 31
+    return date(year, month, (h + l - 7 * m + 114) % 31 + 1)
+
+def _observed(d: date) -> date:
+    # 何をする関数？：土曜の祝日は前の金曜、日曜の祝日は翌月曜に振り替える。
+    if d.weekday() == 5:
+        return d - timedelta(days=1)
+    if d.weekday() == 6:
+        return d + timedelta(days=1)
+    return d
+
+def holidays(year: int) -> set[date]:
+    """何をする関数？：その年の全日休場日（規則による祝日＋臨時休場）を返します。"""
+    out = {
+        _nth_weekday(year, 2, 0, 3),                      # Presidents' Day
+        _easter(year) - timedelta(days=2),                # Good Friday
+        _nth_weekday(year, 5, 0, -1),                     # Memorial Day
+        _observed(date(year, 7, 4)),                      # Independence Day
+        _nth_weekday(year, 9, 0, 1),                      # Labor Day
+        _nth_weekday(year, 11, 3, 4),                     # Thanksgiving
+        _observed(date(year, 12, 25)),                    # Christmas
+    }
+    if date(year, 1, 1).weekday() != 5:                   # 元日が土曜なら振替なし（12/31 は取引する）
+        out.add(_observed(date(year, 1, 1)))
+    if year >= 1998:
+        out.add(_nth_weekday(year, 1, 0, 3))              # Martin Luther King Jr. Day
+    if year >= 2022:
+        out.add(_observed(date(year, 6, 19)))             # Juneteenth
+    out |= {d for d in _SPECIAL_CLOSURES if d.year == year}
+    return out
+
+def early_closes(year: int, hol: set[date] | None = None) -> set[date]:
+    """何をする関数？：その年の短縮取引日（13:00 引け）を返します。"""
+    hol = holidays(year) if hol is None else hol
+    cands = [date(year, 7, 3), _nth_weekday(year, 11, 3, 4) + timedelta(days=1), date(year, 12, 24)]
+    return {d for d in cands if d.weekday() < 5 and d not in hol}
+
+# ---- 前計算したセッション表 --------------------------------------------------------------------------
+
+class ExchangeCalendar:
+    """
+    何をするクラス？：
+      - start_year〜end_year の全セッションを numpy 配列（days / open_ns / close_ns / early）に前計算して持ちます。
+      - 日付の判定は「基準日からの日数」で引く配列（_pos）で O(1)、時刻の判定は open_ns の二分探索です。
+    使い方：
+      cal = get_calendar()
+      cal.is_session(date(2025, 7, 4))          # False（独立記念日）
+      cal.session(date(2025, 11, 28)).close      # 13:00 ET（感謝祭の翌日）
+      cal.last_n_sessions(260)                   # 直近260営業日（きょうを含まない、古い順）
+    """
+
+    def __init__(self, start_year: int = 2000, end_year: int = 2050):
+        self.first = date(start_year, 1, 1)
+        self.last = date(end_year, 12, 31)
+        import pandas as pd  # 前計算のときだけ使うので関数内でインポート
+        days, early = [], []
+        for y in range(start_year, end_year + 1):
+            hol = holidays(y)
+            ec = early_closes(y, hol)
+            d = date(y, 1, 1)
+            while d.year == y:
+                if d.weekday() < 5 and d not in hol:
+                    days.append(d)
+                    early.append(d in ec)
+                d += timedelta(days=1)
+        self.days = np.array(days, dtype="datetime64[D]")
+        self.early = np.array(early, dtype=bool)
+        # 何をする行？：「ETの壁時計の開場/引け」を一括で UTC ns にする（夏時間の切替は tz_localize が面倒を見る）
+        wall = self.days.astype("datetime64[ns]")
+        to_ns = lambda tt: pd.DatetimeIndex(wall + np.timedelta64((tt.hour * 60 + tt.minute) * 60, "s")) \
+            .tz_localize(get_et_tz()).as_unit("ns").asi8
+        self.open_ns = to_ns(REGULAR_OPEN)
+        self.close_ns = np.where(self.early, to_ns(EARLY_CLOSE), to_ns(REGULAR_CLOSE))
+        opens = self.open_ns.tolist()
+        self._dates = days
+        self._open_list = opens  # bisect 用（Python の int リストのほうが1件引きは速い）
+        # 何をする行？：日付オフセット → 「その日以前で最後のセッション番号」。営業日かどうかは days と比べて判定。
+        offs = (self.days - np.datetime64(self.first, "D")).astype(np.int64)
+        span = (self.last - self.first).days + 1
+        self._pos = np.searchsorted(offs, np.arange(span), side="right").astype(np.int32) - 1
+        self._is = np.zeros(span, dtype=bool)
+        self._is[offs] = True
+
+    def __len__(self) -> int:
+        return len(self._dates)
+
+    # ---- 日付で引く（O(1)） --------------------------------------------------------------------------
+
+    def _off(self, d: date) -> int:
+        off = (d - self.first).days
+        if off < 0 or off >= len(self._is):
+            raise ValueError(f"date {d} is outside the calendar range {self.first}..{self.last}")
+        return off
+
+    def is_session(self, d: date) -> bool:
+        """何をする関数？：その ET 日付が営業日（全日休場でない）かを返します。"""
+        return bool(self._is[self._off(d)])
+
+    def session(self, d: date) -> Session | None:
+        """何をする関数？：その日のセッション（休場日は None）を返します。"""
+        off = self._off(d)
+        if not self._is[off]:
+            return None
+        return self._at(int(self._pos[off]))
+
+    def _at(self, i: int) -> Session:
+        return Session(self._dates[i], int(self.open_ns[i]), int(self.close_ns[i]), bool(self.early[i]))
+
+    def index_on_or_before(self, d: date) -> int:
+        """何をする関数？：d 以前で最後の営業日の番号（days の添字）を返します（範囲より前なら -1）。"""
+        return int(self._pos[self._off(d)])
+
+    def previous_session(self, d: date) -> date:
+        """何をする関数？：d より前の直近の営業日を返します。"""
+        return self._dates[self.index_on_or_before(d - timedelta(days=1))]
+
+    def next_session(self, d: date, include: bool = False) -> date:
+        """何をする関数？：d より後（include=True なら d 自身を含む）の直近の営業日を返します。"""
+        i = self.index_on_or_before(d)
+        if include and self.is_session(d):
+            return d
+        return self._dates[i + 1]
+
+    # ---- 営業日の列 --------------------------------------------------------------------------------
+
+    def sessions_in_range(self, start: date, end: date) -> list[date]:
+        """何をする関数？：start〜end（両端含む）の営業日を古い順に返します。"""
+        i = self.index_on_or_before(start - timedelta(days=1)) + 1
+        j = self.index_on_or_before(end) + 1
+        return self._dates[i:j]
+
+    def sessions_from(self, start: date, n: int) -> list[date]:
+        """何をする関数？：start 以降（start を含む）の営業日を n 日ぶん、古い順に返します。"""
+        i = self.index_on_or_before(start - timedelta(days=1)) + 1
+        out = self._dates[i:i + int(n)]
+        if len(out) < n:
+            raise ValueError(f"calendar ends at {self.last}; cannot take {n} sessions from {start}")
+        return out
+
+    def last_n_sessions(self, n: int, end: date | None = None, include_end: bool = False) -> list[date]:
+        """
+        何をする関数？：
+          - end（既定：ETのきょう）より前の営業日を n 日ぶん、古い順に返します。
+          - include_end=True なら end が営業日のとき end 自身も数に入れます（引け後に当日まで含めたいとき）。
+        """
+        end = end or datetime.now(get_et_tz()).date()
+        j = self.index_on_or_before(end if include_end else end - timedelta(days=1)) + 1
+        i = j - int(n)
+        if i < 0:
+            raise ValueError(f"calendar starts at {self.first}; cannot take {n} sessions before {end}")
+        return self._dates[i:j]
+
+    def daterange_last_n(self, n: int, end: date | None = None, include_end: bool = True) -> tuple[str, str]:
+        """何をする関数？：直近 n 営業日を覆う最小の日付レンジ（ISO文字列の start, end）を返します（REST の from/to 用）。"""
+        ds = self.last_n_sessions(n, end, include_end=include_end)
+        return ds[0].isoformat(), ds[-1].isoformat()
+
+    # ---- 時刻で引く（bisect） ------------------------------------------------------------------------
+
+    def session_at(self, ts: datetime | int) -> Session | None:
+        """何をする関数？：その時刻（aware/naive datetime か UTC ns）が場中なら、そのセッションを返します（場外は None）。"""
+        t_ns = ts if isinstance(ts, (int, np.integer)) else int(to_et(ts).timestamp() * _NS)
+        i = bisect_right(self._open_list, int(t_ns)) - 1
+        if i < 0 or t_ns >= self.close_ns[i]:
+            return None
+        return self._at(i)
+
+    def is_open(self, ts: datetime | int) -> bool:
+        """何をする関数？：その時刻が場中（開場 <= t < 引け、短縮日は 13:00 まで）かを返します。"""
+        return self.session_at(ts) is not None
+
+    def open_mask(self, t_ns) -> np.ndarray:
+        """何をする関数？：UTC ns 配列の各要素が場中かの bool 配列を返します（is_open の配列版）。"""
+        t = np.asarray(t_ns, dtype=np.int64)
+        i = np.searchsorted(self.open_ns, t, side="right") - 1
+        ok = i >= 0
+        ic = np.clip(i, 0, None)
+        return ok & (t < self.close_ns[ic])
+
+    # ---- 締切（取消・強制クローズ） --------------------------------------------------------------------
+
+    def session_deadline(self, d: date, t: _dtime) -> datetime:
+        """
+        何をする関数？：
+          - 設定の締切時刻 t（通常日の ET 時刻、例：force_close_by 15:55）を、その日のセッションに合わせた aware datetime にします。
+          - 短縮日で t が引け以降（通常の引けまでの“残り時間”で決めた締切）なら、同じ“引けまでの残り時間”を実際の引けから引きます。
+            例：15:55（引け5分前）→ 半日の日は 12:55。10:30 のように引けより前の締切はそのままです。
+          - 休場日はそのまま d の t を返します（呼び出し側で is_session を見て動かないようにする）。
+        """
+        tz = get_et_tz()
+        at = datetime.combine(d, t, tzinfo=tz)
+        s = self.session(d)
+        if s is None or not s.early_close:
+            return at
+        close = s.close
+        if at < close:
+            return at
+        before = datetime.combine(d, REGULAR_CLOSE, tzinfo=tz) - at
+        return max(close - max(before, timedelta(0)), s.open)
+
+@lru_cache(maxsize=1)
+def get_calendar() -> ExchangeCalendar:
+    """
+    何をする関数？：
+      - 既定範囲（2000〜2050年）のカレンダーを作って返します（プロセスで1回だけ作り、以後は使い回し）。
+    使い方：
+      from rh_pdc_daytrade.utils.market_calendar import get_calendar
+      if get_calendar().is_session(d): ...
+    """
+    return ExchangeCalendar()
@@ -0,0 +1,285 @@
+# 段ごとの所要時間や件数を軽く数えるための計測ユーティリティです（“9:30–9:35 の持ち時間がどこに消えたか”を見る道具）。
+# ねらい：
+#  - timer()（with 文／デコレータ）で時間をヒストグラムに、incr() で件数をカウンタに、set_gauge() で最新値を記録します。
+#  - 1回の実行ぶんを data/metrics/{run}_{YYYYmmdd_HHMMSS}.json に書き出します（init_run_metrics で終了時に自動保存）。
+#  - 常駐する WS プロセスでは serve_prometheus(port) で Prometheus テキスト形式を 127.0.0.1 に公開できます（METRICS_PORT）。
+# 記録は固定バケットへの加算だけ（値を溜め込まない）なので、1バーごとに呼んでもメモリは増えません。
+# 使い方：
+#   from rh_pdc_daytrade.utils.metrics import timer, incr, init_run_metrics
+#   init_run_metrics("compute_indicators")
+#   with timer("stage_seconds", stage="vwap"):
+#       df = _compute_vwap(df)
+#   incr("bars_loaded", len(df))
+
+from __future__ import annotations
+from bisect import bisect_left          # バケット位置の探索
+from contextlib import ContextDecorator # with 文とデコレータを1つのクラスで
+from datetime import datetime
+from pathlib import Path
+import math
+import os
+import threading                        # WS スレッドと HTTP スレッドから同時に触られるためのロック
+import time
+
+# 秒の既定バケット：10µs から 2倍ずつ ~84秒まで（24本）。ms などの別単位は observe(buckets=...) で指定。
+DEFAULT_BUCKETS: tuple[float, ...] = tuple(1e-5 * (2 ** k) for k in range(24))
+
+_LabelKey = tuple[tuple[str, str], ...]
+
+def _label_key(labels: dict) -> _LabelKey:
+    # 何をする関数？：ラベル dict を“並びが決まったタプル”にして辞書キーにする。
+    return tuple(sorted((str(k), str(v)) for k, v in labels.items()))
+
+class Histogram:
+    """
+    何をするクラス？：
+      - 値を固定バケットに数えるだけのヒストグラムです（count/sum/min/max も持つ）。
+      - quantile(q) はバケット内を線形補間した近似値です（誤差はバケット幅＝2倍刻みの範囲内）。
+    """
+    __slots__ = ("bounds", "counts", "count", "sum", "min", "max")
+
+    def __init__(self, bounds: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.bounds = tuple(sorted(bounds))
+        self.counts = [0] * (len(self.bounds) + 1)  # 最後は +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def observe(self, x: float) -> None:
+        self.counts[bisect_left(self.bounds, x)] += 1
+        self.count += 1
+        self.sum += x
+        if x < self.min:
+            self.min = x
+        if x > self.max:
+            self.max = x
+
+    def quantile(self, q: float) -> float:
+        """何をする関数？：q 分位（0–1）の近似値を返します（空なら NaN）。"""
+        if self.count == 0:
+            return float("nan")
+        rank = q * self.count
+        cum = 0
+        for i, n in enumerate(self.counts):
+            if n and cum + n >= rank:
+                lo = max(self.bounds[i - 1], self.min) if i > 0 else self.min
+                hi = min(self.bounds[i], self.max) if i < len(self.bounds) else self.max
+                est = lo + (hi - lo) * ((rank - cum) / n)
+                return min(max(est, self.min), self.max)
+            cum += n
+        return self.max
+
+    def summary(self) -> dict:
+        """何をする関数？：JSON 用の要約（count/sum/mean/min/max/p50/p95/p99）を返します。"""
+        if self.count == 0:
+            return {"count": 0}
+        return {"count": self.count, "sum": self.sum, "mean": self.sum / self.count, "min": self.min, "max": self.max,
+                "p50": self.quantile(0.50), "p95": self.quantile(0.95), "p99": self.quantile(0.99)}
+
+class Metrics:
+    """
+    何をするクラス？：
+      - カウンタ／ゲージ／ヒストグラムを（名前, ラベル）ごとに持つ入れ物です。スレッドセーフ。
+      - 通常はモジュール共通の REGISTRY を、下の関数（incr/observe/timer…）経由で使います。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters: dict[tuple[str, _LabelKey], float] = {}
+        self.gauges: dict[tuple[str, _LabelKey], float] = {}
+        self.histograms: dict[tuple[str, _LabelKey], Histogram] = {}
+        self.started = time.time()
+
+    def incr(self, name: str, n: float = 1, **labels) -> None:
+        key = (name, _label_key(labels))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + n
+
+    def set_gauge(self, name: str, value: float, **labels) -> None:
+        with self._lock:
+            self.gauges[(name, _label_key(labels))] = float(value)
+
+    def observe(self, name: str, value: float, buckets: tuple[float, ...] | None = None, **labels) -> None:
+        key = (name, _label_key(labels))
+        with self._lock:
+            h = self.histograms.get(key)
+            if h is None:
+                h = self.histograms[key] = Histogram(buckets or DEFAULT_BUCKETS)
+            h.observe(float(value))
+
+    def reset(self) -> None:
+        """何をする関数？：記録を全部消します（ベンチ・再計測用）。"""
+        with self._lock:
+            self.counters.clear()
+            self.gauges.clear()
+            self.histograms.clear()
+            self.started = time.time()
+
+    def snapshot(self) -> dict:
+        """何をする関数？：いまの記録を JSON にできる dict（ラベルは dict のまま）で返します。"""
+        with self._lock:
+            return {
+                "counters": [{"name": n, "labels": dict(lk), "value": v} for (n, lk), v in sorted(self.counters.items())],
+                "gauges": [{"name": n, "labels": dict(lk), "value": v} for (n, lk), v in sorted(self.gauges.items())],
+                "histograms": [{"name": n, "labels": dict(lk), **h.summary()}
+                               for (n, lk), h in sorted(self.histograms.items())],
+            }
+
+    def prometheus_text(self) -> str:
+        """何をする関数？：Prometheus のテキスト形式（version 0.0.4）で全メトリクスを返します。"""
+        def _name(n: str) -> str:
+            return "".join(ch if (ch.isalnum() or ch in "_:") else "_" for ch in n)
+
+        def _lbl(lk: _LabelKey, extra: tuple[tuple[str, str], ...] = ()) -> str:
+            items = lk + extra
+            if not items:
+                return ""
+            esc = lambda v: v.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+            return "{" + ",".join(f'{_name(k)}="{esc(v)}"' for k, v in items) + "}"
+
+        lines: list[str] = []
+        with self._lock:
+            seen: set[str] = set()
+            for (n, lk), v in sorted(self.counters.items()):
+                pn = _name(n)
+                if pn not in seen:
+                    lines.append(f"# TYPE {pn} counter")
+                    seen.add(pn)
+                lines.append(f"{pn}{_lbl(lk)} {v:g}")
+            for (n, lk), v in sorted(self.gauges.items()):
+                pn = _name(n)
+                if pn not in seen:
+                    lines.append(f"# TYPE {pn} gauge")
+                    seen.add(pn)
+                lines.append(f"{pn}{_lbl(lk)} {v:g}")
+            for (n, lk), h in sorted(self.histograms.items()):
+                pn = _name(n)
+                if pn not in seen:
+                    lines.append(f"# TYPE {pn} histogram")
+                    seen.add(pn)
+                cum = 0
+                for b, c in zip(h.bounds, h.counts):
+                    cum += c
+                    lines.append(f"{pn}_bucket{_lbl(lk, (('le', f'{b:g}'),))} {cum}")
+                lines.append(f"{pn}_bucket{_lbl(lk, (('le', '+Inf'),))} {h.count}")
+                lines.append(f"{pn}_sum{_lbl(lk)} {h.sum:g}")
+                lines.append(f"{pn}_count{_lbl(lk)} {h.count}")
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Metrics()
+
+# ---- 入口（モジュール関数） ----------------------------------------------------------------------
+
+def incr(name: str, n: float = 1, **labels) -> None:
+    """何をする関数？：カウンタ name（ラベル付き）に n を足します。"""
+    REGISTRY.incr(name, n, **labels)
+
+def set_gauge(name: str, value: float, **labels) -> None:
+    """何をする関数？：ゲージ name を value に置き換えます（最新の遅れ・キュー長など）。"""
+    REGISTRY.set_gauge(name, value, **labels)
+
+def observe(name: str, value: float, buckets: tuple[float, ...] | None = None, **labels) -> None:
+    """何をする関数？：ヒストグラム name に value を1件加えます（buckets は初回だけ有効）。"""
+    REGISTRY.observe(name, value, buckets, **labels)
+
+class timer(ContextDecorator):
+    """
+    何をするクラス？：
+      - with 文またはデコレータで、中の処理時間（秒）をヒストグラム name に記録します。
+      - 例外で抜けたときも記録し、ラベル ok=false を付けます（失敗の遅さも見えるように）。
+    使い方：
+      with timer("stage_seconds", stage="vwap"): ...
+      @timer("stage_seconds", stage="save")
+      def _save_outputs(...): ...
+    """
+
+    def __init__(self, name: str, **labels):
+        self.name = name
+        self.labels = labels
+        self.elapsed = 0.0
+        self._t0: list[int] = []  # デコレータとして再帰・多重に入っても崩れないようスタックで持つ
+
+    def __enter__(self) -> "timer":
+        self._t0.append(time.perf_counter_ns())
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        self.elapsed = (time.perf_counter_ns() - self._t0.pop()) / 1e9
+        labels = self.labels if exc_type is None else {**self.labels, "ok": "false"}
+        REGISTRY.observe(self.name, self.elapsed, None, **labels)
+        return False
+
+# ---- 書き出し --------------------------------------------------------------------------------------
+
+def metrics_dir() -> Path:
+    """何をする関数？：実行ごとのメトリクスJSONの保存先（METRICS_DIR → 既定 data/metrics）を返します。"""
+    env = os.environ.get("METRICS_DIR", "").strip()
+    return Path(env) if env else Path(__file__).resolve().parents[3] / "data" / "metrics"
+
+def write_run_metrics(run: str, path: str | os.PathLike[str] | None = None) -> Path:
+    """
+    何をする関数？：
+      - いまの REGISTRY を、実行名・PID・開始/終了時刻・経過秒と一緒に1つの JSON に書き出します。
+    """
+    import orjson  # 関数内だけで使うためここでインポート
+    now = time.time()
+    p = Path(path) if path else metrics_dir() / f"{run}_{datetime.fromtimestamp(REGISTRY.started):%Y%m%d_%H%M%S}.json"
+    p.parent.mkdir(parents=True, exist_ok=True)
+    doc = {"run": run, "pid": os.getpid(),
+           "started": datetime.fromtimestamp(REGISTRY.started).isoformat(timespec="seconds"),
+           "finished": datetime.fromtimestamp(now).isoformat(timespec="seconds"),
+           "wall_s": now - REGISTRY.started, **REGISTRY.snapshot()}
+    p.write_bytes(orjson.dumps(doc, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY))
+    return p
+
+_RUN_REGISTERED: set[str] = set()
+
+def init_run_metrics(run: str) -> None:
+    """
+    何をする関数？：
+      - プロセス終了時（atexit）に write_run_metrics(run) を1回だけ呼ぶよう登録します（冪等）。
+      - METRICS=0 なら何もしません（記録そのものは軽いので止めません）。
+    """
+    if run in _RUN_REGISTERED or os.environ.get("METRICS", "1").lower() in ("0", "false", "no", "off"):
+        return
+    import atexit  # 関数内だけで使うためここでインポート
+    from loguru import logger  # 同上
+
+    def _flush() -> None:
+        try:
+            p = write_run_metrics(run)
+            logger.info("metrics written: {}", p)
+        except Exception as e:
+            logger.warning("metrics write failed: {}", e)
+
+    atexit.register(_flush)
+    _RUN_REGISTERED.add(run)
+
+def serve_prometheus(port: int, host: str = "127.0.0.1"):
+    """
+    何をする関数？：
+      - GET /metrics で prometheus_text() を返す小さな HTTP サーバをデーモンスレッドで起動します（WS 常駐プロセス用）。
+      - 外部公開はしない前提なので既定は 127.0.0.1 です。戻り値はサーバ（shutdown() で停止）。
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer  # 関数内だけで使うためここでインポート
+
+    class _Handler(BaseHTTPRequestHandler):
+        # 何をする行？：do_GET は http.server が決めた名前（変えられない）
+        def do_GET(self):  # noqa: N802
+            if self.path.split("?")[0] not in ("/metrics", "/"):
+                self.send_error(404)
+                return
+            body = REGISTRY.prometheus_text().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):  # アクセスログは出さない（bot.log を汚さない）
+            return
+
+    srv = ThreadingHTTPServer((host, int(port)), _Handler)
+    threading.Thread(target=srv.serve_forever, name="metrics-http", daemon=True).start()
+    return srv
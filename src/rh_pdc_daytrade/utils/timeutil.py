@@ -2,17 +2,24 @@
 # ねらい：
 #  - ZoneInfo('America/New_York') が使えないWindowsでも、dateutil→固定UTC-5でフォールバックして「止まらずに動く」ようにする設計。 :contentReference[oaicite:2]{index=2}
 #  - レギュラー時間（09:30–16:00 ET）の判定を1か所に集約し、各スクリプトから再利用できるようにする。 :contentReference[oaicite:3]{index=3}
+#  - tzinfo の解決はプロセスで1回だけ（メモ化）にし、バー配列向けの“ベクトル版”時刻ヘルパもここに置く。
 
 from __future__ import annotations
 from datetime import datetime, timezone, timedelta, time as _dtime  # 日時/タイムゾーンの基本型
+from functools import lru_cache  # tzinfo の解決結果をプロセス内で使い回す
 from zoneinfo import ZoneInfo  # IANAタイムゾーン（最優先で使う）
 
+_NS_PER_MIN = 60_000_000_000
+_NS_PER_DAY = 86_400_000_000_000
+
+@lru_cache(maxsize=1)
 def get_et_tz():
     """
     何をする関数？：
       ET（ニューヨーク時間）の tzinfo を返します。
       優先順位：ZoneInfo('America/New_York') → dateutil.tz.gettz('America/New_York') → 固定UTC-5。
       Windowsなどで IANA タイムゾーンが無い場合でも、段階的に落として「止まらない」ための設計です。 :contentReference[oaicite:4]{index=4}
+      解決結果はメモ化するので、バーごとの処理から何度呼んでもフォールバックの探索は最初の1回だけです。
     使い方：
       tz = get_et_tz()
     戻り値：
@@ -67,11 +74,130 @@ def is_regular_hours(dt: datetime) -> bool:
     何をする関数？：
       引数の日時が「レギュラー時間（09:30 <= t < 16:00 ET）」に入っているかを判定します。
       引数は naive / aware のどちらでもOK（内部で ET に統一してから判定）。
+      取引カレンダー（utils/market_calendar）の範囲内なら、休場日は False、短縮取引日は 13:00 までで判定します。
     使い方：
       if is_regular_hours(now_et()): ...
     """
     et = to_et(dt)
+    from rh_pdc_daytrade.utils.market_calendar import get_calendar  # 循環インポートを避けるため関数内でインポート
+    cal = get_calendar()
+    if cal.first <= et.date() <= cal.last:
+        return cal.is_open(et)
     t = et.time()
     start = _dtime(9, 30)
     end = _dtime(16, 0)
     return (t >= start) and (t < end)
+
+# ---- ベクトル版（nsエポック配列をまとめて ET の時刻情報に変換） ------------------------------------------
+
+def _as_utc_ns(values):
+    """
+    何をする関数？：
+      - UTCのnsエポック（int配列）/ tz付き datetime Series / naive datetime Series（ETの時計とみなす）を、
+        UTCのnsエポック int64 配列にそろえます。
+    """
+    import numpy as np   # 関数内だけで使うのでここでインポート
+    import pandas as pd
+    if isinstance(values, (pd.Series, pd.Index)) and pd.api.types.is_datetime64_any_dtype(values.dtype):
+        idx = pd.DatetimeIndex(values)
+        if idx.tz is None:
+            idx = idx.tz_localize(get_et_tz(), ambiguous="NaT", nonexistent="NaT")  # naive は to_et と同じく「ETの時計」
+        return idx.as_unit("ns").asi8  # 解像度が us/ms の列でも ns にそろえる
+    return np.asarray(values, dtype=np.int64)
+
+def et_wall_ns(values):
+    """
+    何をする関数？：
+      - UTCのnsエポック配列を「ETの壁時計で見た ns」（夏時間込みのオフセットを足したもの）に一括変換します。
+      - 以後の 分/日付 の計算は整数の割り算だけで済みます。
+    使い方：
+      wall = et_wall_ns(df["t"].to_numpy())
+    """
+    import pandas as pd
+    utc = _as_utc_ns(values)
+    idx = pd.DatetimeIndex(utc.view("datetime64[ns]")).tz_localize("UTC").tz_convert(get_et_tz())
+    return idx.tz_localize(None).as_unit("ns").asi8
+
+def time_to_ns(t: str | _dtime) -> int:
+    """何をする関数？："09:30" / "09:30:00" / time を「その日の0時からのns」に変換します（et_time_of_day_ns と比較する用）。"""
+    tt = t if isinstance(t, _dtime) else _dtime.fromisoformat(str(t))
+    return ((tt.hour * 60 + tt.minute) * 60 + tt.second) * 1_000_000_000 + tt.microsecond * 1_000
+
+def et_time_of_day_ns(values):
+    """何をする関数？：各要素の ET 時刻を「その日の0時からのns」（int64配列）で返します。"""
+    return et_wall_ns(values) % _NS_PER_DAY
+
+def et_minute_of_day(values):
+    """何をする関数？：各要素の ET 時刻を「0時からの分」（0–1439, int16配列）で返します。例：09:30 → 570。"""
+    import numpy as np
+    return (et_time_of_day_ns(values) // _NS_PER_MIN).astype(np.int16)
+
+def et_trading_date(values):
+    """何をする関数？：各要素の ET 日付を datetime64[D] 配列で返します（日付ごとの分割・集計用）。"""
+    return (et_wall_ns(values) // _NS_PER_DAY).astype("datetime64[D]")
+
+def time_window_mask(values, start: str | _dtime, end: str | _dtime):
+    """
+    何をする関数？：
+      - 各要素の ET 時刻が [start, end) に入るかの bool 配列を返します（例：勝負時間 09:30–10:30）。
+    """
+    tod = et_time_of_day_ns(values)
+    return (tod >= time_to_ns(start)) & (tod < time_to_ns(end))
+
+def _calendar_open_mask(utc, wall):
+    """
+    何をする関数？：
+      - UTC ns 配列 utc（wall はその ET 壁時計 ns）の各要素が場中かを、取引カレンダーで判定します（休場日は False、短縮日は 13:00 まで）。
+      - カレンダーの範囲外の日付は is_regular_hours と同じく 09:30 <= t < 16:00 ET で判定します。
+    """
+    import numpy as np
+    from rh_pdc_daytrade.utils.market_calendar import get_calendar  # 循環インポートを避けるため関数内でインポート
+    cal = get_calendar()
+    day = (wall // _NS_PER_DAY).astype("datetime64[D]")
+    inside = (day >= np.datetime64(cal.first, "D")) & (day <= np.datetime64(cal.last, "D"))
+    tod = wall % _NS_PER_DAY
+    fixed = (tod >= time_to_ns(_dtime(9, 30))) & (tod < time_to_ns(_dtime(16, 0)))
+    return np.where(inside, cal.open_mask(utc), fixed)
+
+def regular_hours_mask(values, start: str | _dtime | None = None, end: str | _dtime | None = None):
+    """
+    何をする関数？：
+      - is_regular_hours の配列版です。start/end を省くと同じく取引カレンダーで判定します（休場日は False、短縮日は 13:00 まで）。
+      - start/end を渡したときは、日付に関係なく ET 時刻の [start, end) で判定します（省いた側は 09:30 / 16:00）。
+    """
+    if start is None and end is None:
+        utc = _as_utc_ns(values)
+        return _calendar_open_mask(utc, et_wall_ns(utc))
+    return time_window_mask(values, start or "09:30", end or "16:00")
+
+def orb_window_mask(values, minutes: int = 5, open_time: str | _dtime = "09:30"):
+    """何をする関数？：ORB の計測窓（open_time から minutes 分、例：09:30–09:35）に入るかの bool 配列を返します。"""
+    tod = et_time_of_day_ns(values)
+    s = time_to_ns(open_time)
+    return (tod >= s) & (tod < s + int(minutes) * _NS_PER_MIN)
+
+def session_fields(values, orb_minutes: int = 5, open_time: str | _dtime = "09:30",
+                   close_time: str | _dtime | None = None) -> dict:
+    """
+    何をする関数？：
+      - 1回のタイムゾーン変換で、分（minute_of_day）・日付（date）・レギュラー時間マスク（regular）・
+        ORB窓マスク（orb）をまとめて返します（compute_indicators / run_signals / バックテストの共通入口）。
+      - regular は close_time を省くと regular_hours_mask と同じく取引カレンダーで判定します（open_time より前は除く）。
+        close_time を渡したときは、日付に関係なく [open_time, close_time) です。
+    戻り値：{"minute_of_day": int16[], "date": datetime64[D][], "regular": bool[], "orb": bool[]}
+    """
+    import numpy as np
+    utc = _as_utc_ns(values)
+    wall = et_wall_ns(utc)
+    tod = wall % _NS_PER_DAY
+    o = time_to_ns(open_time)
+    if close_time is None:
+        regular = _calendar_open_mask(utc, wall) & (tod >= o)
+    else:
+        regular = (tod >= o) & (tod < time_to_ns(close_time))
+    return {
+        "minute_of_day": (tod // _NS_PER_MIN).astype(np.int16),
+        "date": (wall // _NS_PER_DAY).astype("datetime64[D]"),
+        "regular": regular,
+        "orb": (tod >= o) & (tod < o + int(orb_minutes) * _NS_PER_MIN),
+    }